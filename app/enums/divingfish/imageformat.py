@@ -0,0 +1,8 @@
+from enum import StrEnum
+
+
+class ImageFormat(StrEnum):
+    """封面输出格式"""
+    PNG = "png"
+    JPEG = "jpeg"
+    WEBP = "webp"
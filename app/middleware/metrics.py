@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from loguru import logger
+
+from app.utils.metrics.instruments import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT
+from app.utils.metrics.profiler import SamplingProfiler
+from cfg.config import ProfilerEnabled, ProfilerSampleInterval, ProfilerSlowRequestThreshold, ProfilerOutputDir
+
+profiler = SamplingProfiler(
+    interval=ProfilerSampleInterval,
+    threshold=ProfilerSlowRequestThreshold,
+    output_dir=ProfilerOutputDir,
+) if ProfilerEnabled else None
+
+
+class MetricsMiddleware:
+    """
+    记录每个请求的耗时与状态码的 ASGI 中间件
+
+    路由标签使用路由模板（例如 /v1/divingfish/get_music_info），未匹配任何路由的请求记为 unmatched，
+    避免路径参数导致标签数量无限增长。开启采样分析器时，慢请求期间的调用栈会被写入 ProfilerOutputDir。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels()
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end = time.perf_counter()
+            in_flight.dec()
+            route_path = _route_template(scope)
+            HTTP_REQUEST_DURATION.labels(scope["method"], route_path, status_code).observe(end - start)
+            if profiler is not None and profiler.running and end - start >= profiler.threshold:
+                asyncio.get_running_loop().run_in_executor(None, _dump_profile, route_path, start, end)
+
+
+def _route_template(scope) -> str:
+    """
+    获取请求匹配到的完整路由模板
+
+    较新版本的 FastAPI 中 scope["route"].path 不含外层 include_router 的前缀，
+    这里用路由的正则在请求路径中找到匹配的后缀，再拼上前缀。
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    path = scope["path"]
+    for i, char in enumerate(path):
+        if char == "/" and route.path_regex.match(path[i:]):
+            return path[:i] + template
+    return template
+
+
+def _dump_profile(route_path: str, start: float, end: float) -> None:
+    path = profiler.dump(route_path, start, end)
+    if path is not None:
+        logger.warning(f"慢请求 {route_path} 耗时 {end - start:.3f}s，调用栈采样已写入 {path}")
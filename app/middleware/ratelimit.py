@@ -0,0 +1,110 @@
+import math
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.service.divingfish.upstream import upstream_priority
+from app.utils.http.ratelimit import KeyedRateLimiter
+from app.utils.metrics.instruments import RATE_LIMIT_REJECTED
+from app.utils.metrics.prometheus import CallbackMetric
+from cfg.config import RateLimitEnabled, RateLimits, RateLimitMaxClients, ApiKeyHeader, ApiKeys, ApiKeyRequired
+
+# 会实时请求水鱼或触发刷新的路由；未列出的路由只读取内存数据，归为 default
+ROUTE_CLASSES = {
+    "/v1/divingfish/get_user_b_scores": "player",
+    "/v1/chunithm/get_user_scores": "player",
+    "/v1/divingfish/get_music_cover": "cover",
+    "/v1/divingfish/music_update": "admin",
+    "/v1/divingfish/chart_stats_update": "admin",
+    "/v1/divingfish/cover_prefetch": "admin",
+    "/v1/divingfish/admin/bulk_sync": "admin",
+    "/v1/chunithm/music_update": "admin",
+}
+# 不限流的路由
+EXEMPT_PATHS = {"/metrics"}
+# 各路由类别发起的水鱼请求的优先级
+ROUTE_PRIORITIES = {"admin": "bulk"}
+
+rate_limiter = KeyedRateLimiter(RateLimitMaxClients)
+
+
+def route_class(path: str) -> str:
+    return ROUTE_CLASSES.get(path.rstrip("/") or "/", "default")
+
+
+class RateLimitMiddleware:
+    """
+    识别客户端并按 (客户端, 路由类别) 的令牌桶限流的 ASGI 中间件
+
+    携带有效 API key（ApiKeyHeader 头）的请求以 key 的名称为客户端，并按其倍数放大限额；
+    未携带的按客户端 IP（经反向代理时由 uvicorn 的 forwarded_allow_ips 还原）限流；
+    携带了无效 key 的请求返回 401。超出限额时返回 429 并带上 Retry-After。
+    同时按路由类别设置本次请求中水鱼调用的优先级，使管理接口触发的刷新排在用户请求之后。
+    """
+
+    def __init__(self, app, limits: dict[str, tuple[float, float]] = RateLimits,
+                 api_keys: dict[str, tuple[str, float]] = ApiKeys, enabled: bool = RateLimitEnabled,
+                 require_api_key: bool = ApiKeyRequired, limiter: KeyedRateLimiter | None = None):
+        self.app = app
+        self.limits = limits
+        self.api_keys = api_keys
+        self.enabled = enabled
+        self.require_api_key = require_api_key
+        self.header = ApiKeyHeader.lower().encode("latin-1")
+        self.limiter = limiter or rate_limiter
+
+    def _identify(self, scope) -> tuple[str | None, str, float]:
+        """
+        :return: (限流键, 指标中的客户端名, 限额倍数)；携带了无效 API key 时限流键为 None
+        """
+        for name, value in scope.get("headers", ()):
+            if name == self.header:
+                client = self.api_keys.get(value.decode("latin-1"))
+                if client is None:
+                    return None, "invalid", 0.0
+                return f"key:{client[0]}", client[0], client[1]
+        host = scope["client"][0] if scope.get("client") else "unknown"
+        return f"ip:{host}", "anonymous", 1.0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        category = route_class(scope["path"])
+        upstream_priority.set(ROUTE_PRIORITIES.get(category, "interactive"))
+        if not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        key, client, multiplier = self._identify(scope)
+        if key is None or (self.require_api_key and client == "anonymous"):
+            RATE_LIMIT_REJECTED.labels(category, client).inc()
+            await _reject(send, 401, "API key 无效" if key is None else f"需要在 {ApiKeyHeader} 头中携带 API key")
+            return
+        rate, burst = self.limits.get(category, self.limits["default"])
+        if rate > 0 and multiplier > 0:
+            retry_after = self.limiter.check((key, category), rate * multiplier, max(1.0, burst * multiplier))
+            if retry_after > 0:
+                RATE_LIMIT_REJECTED.labels(category, client).inc()
+                await _reject(send, 429, "请求过于频繁，请稍后再试",
+                              [(b"retry-after", str(math.ceil(retry_after)).encode("ascii"))])
+                return
+        await self.app(scope, receive, send)
+
+
+async def _reject(send, status: int, detail: str, headers: list[tuple[bytes, bytes]] = ()) -> None:
+    body = json.dumps({"detail": detail}, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode("ascii")),
+                    *headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+CallbackMetric("maitp_ratelimit_buckets", "限流中间件当前保留的令牌桶数", "gauge", [],
+               lambda: [((), len(rate_limiter))])
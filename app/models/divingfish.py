@@ -0,0 +1,66 @@
+from tortoise import fields
+from tortoise.models import Model
+
+
+class Player(Model):
+    """
+    水鱼玩家
+
+    username 为水鱼返回的用户名；通过 QQ 号查询过的玩家会同时记录 qq。
+    """
+    id = fields.IntField(primary_key=True)
+    username = fields.CharField(max_length=64, unique=True)
+    qq = fields.CharField(max_length=20, null=True, unique=True)
+    nickname = fields.CharField(max_length=64, default="")
+    rating = fields.IntField(default=0)
+    # 查询结果中除 charts 外的其他字段（plate、additional_rating 等），用于原样还原响应
+    profile = fields.JSONField(default=dict)
+    synced_at = fields.DatetimeField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "divingfish_player"
+
+
+class ChartRecord(Model):
+    """
+    玩家在单个谱面上的最佳成绩，(player, song_id, level_index) 唯一
+    """
+    id = fields.BigIntField(primary_key=True)
+    player = fields.ForeignKeyField("models.Player", related_name="records", on_delete=fields.CASCADE)
+    song_id = fields.IntField()
+    level_index = fields.SmallIntField()
+    title = fields.CharField(max_length=255, default="")
+    type = fields.CharField(max_length=8, default="")
+    level = fields.CharField(max_length=8, default="")
+    level_label = fields.CharField(max_length=16, default="")
+    ds = fields.FloatField(default=0)
+    achievements = fields.FloatField()
+    dx_score = fields.IntField(default=0)
+    fc = fields.CharField(max_length=8, default="")
+    fs = fields.CharField(max_length=8, default="")
+    rate = fields.CharField(max_length=8, default="")
+    ra = fields.IntField(default=0)
+    # 最近一次同步时该成绩位于 B15（新版本）还是 B35（旧版本）
+    is_new = fields.BooleanField(default=False)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:
+        table = "divingfish_chart_record"
+        unique_together = (("player", "song_id", "level_index"),)
+        indexes = (("player", "is_new", "ra"),)
+
+
+class PlayerSnapshot(Model):
+    """
+    每次同步后玩家 rating 发生变化或有成绩更新时记录一条，用于查询 rating 历史
+    """
+    id = fields.BigIntField(primary_key=True)
+    player = fields.ForeignKeyField("models.Player", related_name="snapshots", on_delete=fields.CASCADE)
+    rating = fields.IntField()
+    changed_records = fields.IntField(default=0)
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "divingfish_player_snapshot"
+        indexes = (("player", "created_at"),)
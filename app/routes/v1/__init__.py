@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+from .chunithm import router as chunithm_router
 from .divingfish import router as divingfish_router
 from .dxrating import router as dxrating_router
 
@@ -11,4 +12,5 @@ router = APIRouter(
 
 router.include_router(divingfish_router)
 router.include_router(dxrating_router)
+router.include_router(chunithm_router)
 
@@ -0,0 +1,242 @@
+import math
+import os.path
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+from typing import Dict, Any
+
+from fastapi import APIRouter, HTTPException, Request, Query, Header
+from fastapi.responses import Response
+from starlette import status
+
+from app.schema.chunithm.request import GetChuniUserScoresRequest, ComputeChuniRatingRequest
+from app.service.chunirating.engine import get_chuni_rating_engine
+from app.service.divingfish.chuni import chunithm_music_dataset, update_chunithm_music_info, \
+    ensure_chunithm_catalog, query_chunithm_music_info_encoded, query_chunithm_music_data_dump, \
+    query_chunithm_player_scores_cached
+from app.service.divingfish.search import get_search_index
+from app.service.divingfish.upstream import UPSTREAM_ERRORS
+from app.utils.http.admin import require_refresh_access
+from app.utils.http.precompressed import encoded_response
+from app.utils.http.resilience import CircuitOpenError
+from cfg.config import GameDataHttpMaxAge
+from loguru import logger
+
+router = APIRouter(
+    prefix="/chunithm",
+    tags=["chunithm"]
+)
+
+
+def _require_catalog_file() -> None:
+    if chunithm_music_dataset.get() is None and not os.path.exists(chunithm_music_dataset.data_path):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="中二歌曲信息尚未从水鱼同步完成，请稍后再试"
+        )
+
+
+def _circuit_open(e: CircuitOpenError, detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=f"{detail}: {str(e)}",
+        headers={"Retry-After": str(math.ceil(e.retry_after))}
+    )
+
+
+@router.post("/music_update", response_model=Dict[str, Any], tags=["update_data"])
+async def music_update(x_admin_token: str | None = Header(None)):
+    """
+    从水鱼更新中二节奏歌曲信息；配置了管理令牌时需要携带 X-Admin-Token
+    """
+    require_refresh_access(x_admin_token)
+    try:
+        success, use_cache = await update_chunithm_music_info()
+        if success:
+            return {"status": "success", "message": "从水鱼更新中二歌曲信息成功", "use_cache": use_cache}
+        return {"status": "failed", "message": "从水鱼更新中二歌曲信息失败", "use_cache": use_cache}
+    except CircuitOpenError as e:
+        raise _circuit_open(e, "水鱼熔断中，暂停更新中二歌曲信息")
+    except UPSTREAM_ERRORS as e:
+        logger.error(f"从水鱼更新中二歌曲信息失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_204_NO_CONTENT,
+            detail="从水鱼更新中二歌曲信息失败，水鱼服务器可能宕机，详细请联系管理员查看日志"
+        )
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"从水鱼更新中二歌曲信息失败: {str(e)}"
+        )
+
+
+@router.get("/get_music_info", response_model=Dict[str, Any], tags=["game_data"])
+async def get_music_info(music_id: int, request: Request):
+    """
+    获取中二节奏歌曲信息
+
+    格式与水鱼 chunithmprober/music_data 中的单首歌曲一致，charts[].combo 为谱面物量
+    """
+    try:
+        _require_catalog_file()
+        body = await query_chunithm_music_info_encoded(music_id)
+        if body is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"未找到歌曲 {music_id}"
+            )
+        return encoded_response(request, body, GameDataHttpMaxAge)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取中二歌曲信息失败: {str(e)}"
+        )
+
+
+@router.get("/music_data", tags=["game_data"])
+async def get_music_data(request: Request):
+    """
+    获取完整的中二节奏歌曲目录，带强 ETag 与 Cache-Control
+    """
+    try:
+        body = await query_chunithm_music_data_dump()
+        if body is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="中二歌曲信息尚未从水鱼同步完成，请稍后再试"
+            )
+        return encoded_response(request, body, GameDataHttpMaxAge)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取完整中二歌曲目录失败: {str(e)}"
+        )
+
+
+@router.get("/search", response_model=Dict[str, Any], tags=["game_data"])
+async def search(
+        q: str | None = Query(None, description="标题/曲师关键字，忽略大小写、全半角与平片假名差异"),
+        genre: str | None = Query(None, description="流派"),
+        version: str | None = Query(None, description="稼动版本（basic_info.from）"),
+        level: str | None = Query(None, description="难度等级，如 13+"),
+        ds_min: float | None = Query(None, description="最低定数"),
+        ds_max: float | None = Query(None, description="最高定数"),
+        page: int = Query(1, ge=1),
+        page_size: int = Query(20, ge=1, le=100),
+):
+    """
+    搜索中二节奏歌曲，参数与响应格式与 /divingfish/search 相同（不支持 type）
+
+    total       命中总数 \n
+    data        [{score: 匹配分数, music: 歌曲信息}] \n
+    """
+    try:
+        catalog = await ensure_chunithm_catalog()
+        if catalog is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="中二歌曲信息尚未从水鱼同步完成，请稍后再试"
+            )
+        result = get_search_index(catalog).search(q, genre, version, None, level, ds_min, ds_max, page, page_size)
+        return Response(content=json.dumps(result, ensure_ascii=False), media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"搜索中二歌曲失败: {str(e)}"
+        )
+
+
+@router.post("/get_user_scores", response_model=Dict[str, Any], tags=["score"])
+async def get_user_scores(req: GetChuniUserScoresRequest):
+    """
+    获取用户的中二节奏 B30 与 R10 成绩
+    """
+    try:
+        success, result = await query_chunithm_player_scores_cached(req.username, req.is_qq)
+        if not success:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"从水鱼获取用户成绩失败: {result}"
+            )
+        return {"status": "success", "message": "获取用户中二成绩成功", "data": result}
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise _circuit_open(e, "水鱼熔断中且无缓存的用户成绩")
+    except UPSTREAM_ERRORS:
+        raise HTTPException(
+            status_code=status.HTTP_204_NO_CONTENT,
+            detail="获取用户中二成绩失败，水鱼服务器可能宕机，详细请联系管理员查看日志"
+        )
+    except Exception as e:
+        logger.error(f"获取用户中二成绩失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取用户中二成绩失败: {str(e)}"
+        )
+
+
+@router.post("/rating/compute", response_model=Dict[str, Any], tags=["score"])
+async def compute_rating(req: ComputeChuniRatingRequest):
+    """
+    在本地计算玩家的中二节奏 rating
+
+    rating          (B30 + R10) / 40 \n
+    best_rating     B30 平均值 \n
+    recent_rating   R10 平均值 \n
+    b30 / r10       按当前定数重新计算后的成绩 \n
+    unknown         歌曲目录中不存在的成绩记录 \n
+    """
+    try:
+        catalog = await ensure_chunithm_catalog()
+        if catalog is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="中二歌曲信息尚未从水鱼同步完成，请稍后再试"
+            )
+        if req.best is not None:
+            best = [record.model_dump() for record in req.best]
+            recent = [record.model_dump() for record in req.recent]
+        elif req.username:
+            success, result = await query_chunithm_player_scores_cached(req.username, req.is_qq)
+            if not success:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"从水鱼获取用户成绩失败: {result}"
+                )
+            records = result.get("records", {})
+            best, recent = records.get("b30", []), records.get("r10", [])
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="需要提供 username 或 best"
+            )
+        result = get_chuni_rating_engine(catalog).compute(best, recent)
+        return {"status": "success", "message": "计算rating成功", "data": result}
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise _circuit_open(e, "水鱼熔断中且无缓存的用户成绩")
+    except UPSTREAM_ERRORS:
+        raise HTTPException(
+            status_code=status.HTTP_204_NO_CONTENT,
+            detail="从水鱼获取用户成绩失败，水鱼服务器可能宕机，详细请联系管理员查看日志"
+        )
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"计算rating失败: {str(e)}"
+        )
@@ -1,19 +1,43 @@
+import math
 import os.path
-from typing import Dict, Any
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
-import httpx
+try:
+    import ujson as json
+except ImportError:
+    import json
+from typing import Dict, Any, List
+
+from fastapi import APIRouter, HTTPException, Request, BackgroundTasks, Query, Header
+from fastapi.responses import FileResponse, Response
 from starlette import status
 
-from app.schema.divingfish.request import GetUserBScoresRequest
+from app.enums.divingfish.imageformat import ImageFormat
+from app.schema.divingfish.request import GetUserBScoresRequest, BatchMusicQueryRequest
 from app.schema.divingfish.response import DivingFishMusicInfo, ChartStats, DiffStats
+from app.utils.http.admin import require_admin, require_refresh_access
+from app.utils.http.conditional import cached_file_response
+from app.utils.http.precompressed import encoded_response
 from app.utils.os.path import mkdir_ignore_exists
-from app.service.divingfish import alive_check
-from app.service.divingfish.mai import update_all_music_info, query_player_scores_simple, download_music_cover, \
-    update_all_chart_stats, query_music_info, query_chart_stats, query_diff_stats
+from cfg.config import CoverHttpMaxAge, BatchQueryMaxItems, GameDataHttpMaxAge
+from app.service.divingfish import probe_upstream
+from app.service.divingfish.upstream import upstream_health, UPSTREAM_ERRORS
+from app.utils.http.resilience import CircuitOpenError
+from app.service.divingfish.catalog import get_music_catalog, ensure_music_catalog
+from app.service.divingfish.chart_stats import get_chart_stats_store
+from app.service.divingfish.cover import cover_cache
+from app.service.divingfish.search import get_search_index
+from app.service.divingfish.cover_render import get_rendered_cover, render_available, MEDIA_TYPES
+from app.service.divingfish.mai import update_all_music_info, query_player_scores_cached, \
+    update_all_chart_stats, query_music_info_encoded, query_chart_stats_encoded, query_diff_stats_encoded, \
+    query_music_data_dump, player_score_cache, \
+    query_music_info_batch, query_chart_stats_batch
 from loguru import logger
 
+from .player import router as player_router
+from .leaderboard import router as leaderboard_router
+from .score_feed import router as score_feed_router
+from .bulk_sync import router as bulk_sync_router
+
 mkdir_ignore_exists("data/divingfish/")
 
 router = APIRouter(
@@ -26,15 +50,16 @@ async def health():
     """
     获取水鱼服务状态
 
+    返回内存中的健康状态（后台定时探测与所有水鱼请求的结果），不会每次都请求水鱼；
+    仅在尚未探测过时探测一次。
+
     Returns:
-        Dict[str, Any]: 包含水鱼服务状态的字典
+        Dict[str, Any]: 包含水鱼服务状态、熔断器状态与各接口统计的字典
     """
     try:
-        is_alive, msg = await alive_check()
-        return {"is_alive": is_alive, "message": msg}
-    except httpx.NetworkError or httpx.TimeoutException as e:
-        logger.error(f"/health 无法连接水鱼服务器")
-        return {"is_alive": False, "message": "无法连接水鱼服务器"}
+        if upstream_health.checked_at is None:
+            await probe_upstream()
+        return upstream_health.stats()
     except Exception as e:
         logger.error(f"检查水鱼服务状态失败: {str(e)}")
         raise HTTPException(
@@ -43,19 +68,29 @@ async def health():
         )
 
 
-@router.get("/music_update", response_model=Dict[str, Any], tags=["update_data"])
-async def music_update():
+@router.post("/music_update", response_model=Dict[str, Any], tags=["update_data"])
+@router.get("/music_update", response_model=Dict[str, Any], tags=["update_data"], deprecated=True)
+async def music_update(x_admin_token: str | None = Header(None)):
     """
-    更新所有音乐信息
+    更新所有音乐信息；配置了管理令牌时需要携带 X-Admin-Token
+
+    GET 为兼容旧调用方保留，请改用 POST
     """
+    require_refresh_access(x_admin_token)
     try:
-        result = await update_all_music_info()
-        logger.info(f"从水鱼更新所有铺面信息成功: {result}")
-        if result[0]:
-            return {"status": "success", "message": "从水鱼更新所有铺面信息成功", "use_cache": result[0]}
+        success, use_cache = await update_all_music_info()
+        logger.info(f"从水鱼更新所有铺面信息成功: {(success, use_cache)}")
+        if success:
+            return {"status": "success", "message": "从水鱼更新所有铺面信息成功", "use_cache": use_cache}
         else:
-            return {"status": "failed", "message": "从水鱼更新所有铺面信息失败", "use_cache": result[0]}
-    except httpx.NetworkError or httpx.TimeoutException as e:
+            return {"status": "failed", "message": "从水鱼更新所有铺面信息失败", "use_cache": use_cache}
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"水鱼熔断中，暂停更新铺面信息: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except UPSTREAM_ERRORS as e:
         logger.error(f"从水鱼更新所有铺面信息失败: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_204_NO_CONTENT,
@@ -69,11 +104,15 @@ async def music_update():
         )
 
 
-@router.get("/chart_stats_update", response_model=Dict[str, Any], tags=["update_data"])
-async def chart_stats_update():
+@router.post("/chart_stats_update", response_model=Dict[str, Any], tags=["update_data"])
+@router.get("/chart_stats_update", response_model=Dict[str, Any], tags=["update_data"], deprecated=True)
+async def chart_stats_update(x_admin_token: str | None = Header(None)):
     """
-    更新所有铺面拟合难度等信息
+    更新所有铺面拟合难度等信息；配置了管理令牌时需要携带 X-Admin-Token
+
+    GET 为兼容旧调用方保留，请改用 POST
     """
+    require_refresh_access(x_admin_token)
     try:
         result = await update_all_chart_stats()
         logger.info(f"从水鱼更新所有铺面额外信息成功: {result}")
@@ -81,7 +120,13 @@ async def chart_stats_update():
             return {"status": "success", "message": "从水鱼更新所有铺面额外信息成功"}
         else:
             return {"status": "failed", "message": "从水鱼更新所有铺面额外信息失败"}
-    except httpx.NetworkError or httpx.TimeoutException as e:
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"水鱼熔断中，暂停更新铺面额外信息: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except UPSTREAM_ERRORS as e:
         logger.error(f"从水鱼更新所有铺面额外信息失败: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_204_NO_CONTENT,
@@ -101,9 +146,15 @@ async def get_user_b_scores(req: GetUserBScoresRequest):
     获取用户B50成绩
     """
     try:
-        result = await query_player_scores_simple(req.username, req.is_qq, req.b50)
+        result = await query_player_scores_cached(req.username, req.is_qq, req.b50)
         return {"status": "success", "message": "获取用户B50成绩成功", "data": result[1]}
-    except httpx.NetworkError or httpx.TimeoutException as e:
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"水鱼熔断中且无缓存的用户成绩: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except UPSTREAM_ERRORS as e:
         raise HTTPException(
             status_code=status.HTTP_204_NO_CONTENT,
             detail=f"获取用户B50成绩失败，水鱼服务器可能宕机，详细请联系管理员查看日志"
@@ -116,27 +167,61 @@ async def get_user_b_scores(req: GetUserBScoresRequest):
         )
 
 
+@router.get("/cache_stats", response_model=Dict[str, Any], tags=["health"])
+async def cache_stats():
+    """
+    获取玩家成绩缓存的命中、未命中、合并请求等统计
+    """
+    return {"player_scores": player_score_cache.stats(), "covers": cover_cache.stats()}
+
+
+@router.post("/cover_prefetch", response_model=Dict[str, Any], tags=["update_data"])
+async def cover_prefetch(background_tasks: BackgroundTasks, x_admin_token: str | None = Header(None)):
+    """
+    在后台下载歌曲目录中所有本地缺失的封面，需要管理令牌
+    """
+    require_admin(x_admin_token)
+    background_tasks.add_task(cover_cache.prefetch_all)
+    return {"status": "success", "message": "已开始预取封面"}
+
+
 @router.get("/get_music_cover", response_class=FileResponse, tags=["game_data"])
-async def get_music_cover(songs_id: int):
+async def get_music_cover(
+        songs_id: int,
+        request: Request,
+        size: int | None = Query(None, ge=16, le=1024,
+                                 description="等比缩放后的最大边长，向上取到服务端支持的尺寸，不传则为原图尺寸"),
+        image_format: ImageFormat = Query(ImageFormat.PNG, alias="format", description="输出格式"),
+        quality: int = Query(80, ge=1, le=100, description="jpeg/webp 的压缩质量，向上取到 10 的倍数"),
+):
     """
     获取音乐封面
+
+    可通过 size/format/quality 获取缩略图，转码结果会缓存在磁盘上。
+    响应带有 ETag/Last-Modified/Cache-Control，客户端缓存有效时返回 304
     """
     try:
-        file_path = f"data/divingfish/cover/{songs_id}.png"
-
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            pass
-        else:
-            d_status, d_detail = await download_music_cover(songs_id)
-            if d_status:
-                pass
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_204_NO_CONTENT,
-                    detail=f"从水鱼获取音乐封面失败，且本地无文件缓存，水鱼服务器可能宕机，详细请联系管理员查看日志"
-                )
-        return FileResponse(f"data/divingfish/cover/{songs_id}.png")
-    except httpx.NetworkError or httpx.TimeoutException as e:
+        if (size is not None or image_format != ImageFormat.PNG) and not render_available():
+            raise HTTPException(
+                status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                detail="服务端未安装 Pillow，无法缩放或转换封面格式"
+            )
+        file_path = await get_rendered_cover(songs_id, size, image_format, quality)
+        if file_path is None:
+            raise HTTPException(
+                status_code=status.HTTP_204_NO_CONTENT,
+                detail=f"从水鱼获取音乐封面失败，且本地无文件缓存，水鱼服务器可能宕机，详细请联系管理员查看日志"
+            )
+        return cached_file_response(request, file_path, CoverHttpMaxAge, media_type=MEDIA_TYPES[image_format])
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"水鱼熔断中且本地无封面缓存: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except UPSTREAM_ERRORS as e:
         raise HTTPException(
             status_code=status.HTTP_204_NO_CONTENT,
             detail=f"从水鱼获取音乐封面失败，且本地无文件缓存，水鱼服务器可能宕机，详细请联系管理员查看日志"
@@ -150,7 +235,7 @@ async def get_music_cover(songs_id: int):
 
 
 @router.get("/get_music_info", response_model=DivingFishMusicInfo, tags=["game_data"])
-async def get_music_info(music_id: int):
+async def get_music_info(music_id: int, request: Request):
     """
     获取音乐信息
 
@@ -172,19 +257,23 @@ async def get_music_info(music_id: int):
     basic_info.from 	        string 	歌曲的稼动版本（以国服为准） \n
     basic_info.is_new 	        boolean 歌曲是否为当前版本的新歌 \n
 
+    响应按数据版本预先序列化并压缩，带强 ETag 与 Cache-Control，客户端缓存有效时返回 304
     """
     try:
-        if not os.path.exists(f"data/divingfish/music_data.json"):
-            await update_all_music_info()
-        result = await query_music_info(music_id)
-        if result != {}:
-            return result
-        return {"status": "failed", "message": "无歌曲信息文件且从水鱼获取音乐信息失败"}
-    except httpx.NetworkError or httpx.TimeoutException as e:
+        if get_music_catalog() is None and not os.path.exists("data/divingfish/music_data.json"):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="歌曲信息尚未从水鱼同步完成，请稍后再试"
+            )
+        body = await query_music_info_encoded(music_id)
+        if body is not None:
+            return encoded_response(request, body, GameDataHttpMaxAge)
         raise HTTPException(
-            status_code=status.HTTP_204_NO_CONTENT,
-            detail=f"无歌曲信息文件且从水鱼获取音乐信息失败，水鱼服务器可能宕机，详细请联系管理员查看日志"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"未找到歌曲 {music_id}"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"无歌曲信息文件且从水鱼获取音乐信息失败: {str(e)}")
         raise HTTPException(
@@ -194,7 +283,7 @@ async def get_music_info(music_id: int):
 
 
 @router.get("/get_chart_stats", response_model=ChartStats, tags=["game_data"])
-async def get_chart_stats(music_id: int):
+async def get_chart_stats(music_id: int, request: Request):
     """
     获取铺面难度统计信息
 
@@ -210,17 +299,14 @@ async def get_chart_stats(music_id: int):
       - fc_dist: 全连击分布
     """
     try:
-        if not os.path.exists("data/divingfish/chart_stats.json"):
-            await update_all_chart_stats()
-        result = await query_chart_stats(music_id)
-        if result != {}:
-            return {"stats": result}
-        return {"stats": []}
-    except (httpx.NetworkError, httpx.TimeoutException):
-        raise HTTPException(
-            status_code=status.HTTP_204_NO_CONTENT,
-            detail="无铺面统计信息文件且从水鱼获取铺面统计信息失败，水鱼服务器可能宕机，详细请联系管理员查看日志"
-        )
+        if get_chart_stats_store() is None and not os.path.exists("data/divingfish/chart_stats.json"):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="铺面统计信息尚未从水鱼同步完成，请稍后再试"
+            )
+        return encoded_response(request, await query_chart_stats_encoded(music_id), GameDataHttpMaxAge)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(e)
         raise HTTPException(
@@ -229,7 +315,7 @@ async def get_chart_stats(music_id: int):
         )
 
 @router.get("/get_diff_stats", response_model=DiffStats, tags=["game_data"])
-async def get_diff_stats():
+async def get_diff_stats(request: Request):
     """
     获取铺面难度统计信息
 
@@ -240,22 +326,154 @@ async def get_diff_stats():
       fc_dist 	    难度的 Full Combo 分布（依次对应 非、fc、fcp、ap、app）\n
     """
     try:
-        if not os.path.exists("data/divingfish/chart_stats.json"):
-            await update_all_chart_stats()
-        result = await query_diff_stats()
-        if result != {}:
-            return {"stats": result}
-        return {"stats": {}}
-    except (httpx.NetworkError, httpx.TimeoutException):
+        if get_chart_stats_store() is None and not os.path.exists("data/divingfish/chart_stats.json"):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="铺面统计信息尚未从水鱼同步完成，请稍后再试"
+            )
+        return encoded_response(request, await query_diff_stats_encoded(), GameDataHttpMaxAge)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
         raise HTTPException(
-            status_code=status.HTTP_204_NO_CONTENT,
-            detail="无铺面统计信息文件且从水鱼获取铺面统计信息失败，水鱼服务器可能宕机，详细请联系管理员查看日志"
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"无铺面统计信息文件且从水鱼获取铺面统计信息失败: {str(e)}"
         )
+
+
+@router.get("/music_data", response_model=List[DivingFishMusicInfo], tags=["game_data"])
+async def get_music_data(request: Request):
+    """
+    获取完整的歌曲目录（与水鱼 music_data 格式一致）
+
+    响应体每个数据版本只压缩一次，带强 ETag 与 Cache-Control，适合 CDN 与客户端缓存
+    """
+    try:
+        body = await query_music_data_dump()
+        if body is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="歌曲信息尚未从水鱼同步完成，请稍后再试"
+            )
+        return encoded_response(request, body, GameDataHttpMaxAge)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"无铺面统计信息文件且从水鱼获取铺面统计信息失败: {str(e)}"
+            detail=f"获取完整歌曲目录失败: {str(e)}"
+        )
+
+
+def _batch_response(result: dict) -> Response:
+    not_found = result["not_found"]
+    result["status"] = "partial" if not_found["music_ids"] or not_found["cids"] else "success"
+    return Response(content=json.dumps(result, ensure_ascii=False), media_type="application/json")
+
+
+def _check_batch_size(req: BatchMusicQueryRequest) -> None:
+    if len(req.music_ids) + len(req.cids) > BatchQueryMaxItems:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多查询 {BatchQueryMaxItems} 个 id"
+        )
+
+
+@router.post("/music_info/batch", response_model=Dict[str, Any], tags=["game_data"])
+async def music_info_batch(req: BatchMusicQueryRequest):
+    """
+    批量获取音乐信息
+
+    data        歌曲id -> 歌曲信息，字段同 /get_music_info \n
+    cids        cid -> {music_id, level_index} \n
+    not_found   未找到的 music_ids 与 cids，存在时 status 为 partial \n
+    """
+    _check_batch_size(req)
+    try:
+        if get_music_catalog() is None and not os.path.exists("data/divingfish/music_data.json"):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="歌曲信息尚未从水鱼同步完成，请稍后再试"
+            )
+        return _batch_response(await query_music_info_batch(req.music_ids, req.cids))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量获取音乐信息失败: {str(e)}"
+        )
+
+
+@router.post("/chart_stats/batch", response_model=Dict[str, Any], tags=["game_data"])
+async def chart_stats_batch(req: BatchMusicQueryRequest):
+    """
+    批量获取铺面难度统计信息
+
+    data        歌曲id -> 各难度统计列表，字段同 /get_chart_stats 的 stats \n
+    cids        cid -> 对应难度的统计 \n
+    not_found   未找到的 music_ids 与 cids，存在时 status 为 partial \n
+    """
+    _check_batch_size(req)
+    try:
+        if get_chart_stats_store() is None and not os.path.exists("data/divingfish/chart_stats.json"):
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="铺面统计信息尚未从水鱼同步完成，请稍后再试"
+            )
+        return _batch_response(await query_chart_stats_batch(req.music_ids, req.cids))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"批量获取铺面统计信息失败: {str(e)}"
+        )
+
+
+@router.get("/search", response_model=Dict[str, Any], tags=["game_data"])
+async def search(
+        q: str | None = Query(None, description="标题/曲师/别名关键字，忽略大小写、全半角与平片假名差异"),
+        genre: str | None = Query(None, description="流派"),
+        version: str | None = Query(None, description="稼动版本（basic_info.from）"),
+        music_type: str | None = Query(None, alias="type", description="歌曲类型，DX 或 SD"),
+        level: str | None = Query(None, description="难度等级，如 13+"),
+        ds_min: float | None = Query(None, description="最低定数"),
+        ds_max: float | None = Query(None, description="最高定数"),
+        page: int = Query(1, ge=1),
+        page_size: int = Query(20, ge=1, le=100),
+):
+    """
+    搜索歌曲
+
+    level、ds_min/ds_max 只要任一谱面满足即视为命中 \n
+    total       命中总数 \n
+    data        [{score: 匹配分数, music: 歌曲信息}] \n
+    """
+    try:
+        catalog = await ensure_music_catalog()
+        if catalog is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="歌曲信息尚未从水鱼同步完成，请稍后再试"
+            )
+        result = get_search_index(catalog).search(q, genre, version, music_type, level, ds_min, ds_max, page, page_size)
+        return Response(content=json.dumps(result, ensure_ascii=False), media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"搜索歌曲失败: {str(e)}"
         )
 
 
+router.include_router(player_router)
+router.include_router(leaderboard_router)
+router.include_router(score_feed_router)
+router.include_router(bulk_sync_router)
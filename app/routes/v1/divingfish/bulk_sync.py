@@ -0,0 +1,67 @@
+import os.path
+from typing import Dict, Any
+
+from fastapi import APIRouter, HTTPException, Header
+from starlette import status
+
+from app.schema.divingfish.request import BulkSyncRequest
+from app.utils.http.admin import require_admin
+from app.utils.os.path import mkdir_ignore_exists
+from cfg.config import BulkSyncDataDir
+from app.service.divingfish import bulk_sync
+from .player import require_store
+from loguru import logger
+
+router = APIRouter()
+
+
+@router.post("/admin/bulk_sync", response_model=Dict[str, Any], tags=["admin"])
+async def start_bulk_sync(req: BulkSyncRequest, x_admin_token: str | None = Header(None)):
+    """
+    在后台启动批量刷新玩家成绩，同一时间只能运行一个任务
+    """
+    try:
+        require_admin(x_admin_token)
+        if req.output is None:
+            require_store()
+        file = os.path.join(BulkSyncDataDir, req.file) if req.file is not None else None
+        output = os.path.join(BulkSyncDataDir, req.output) if req.output is not None else None
+        if file is not None and not os.path.isfile(file):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"玩家列表文件 {req.file} 不存在"
+            )
+        if output is not None:
+            mkdir_ignore_exists(BulkSyncDataDir)
+        options = {k: v for k, v in (("concurrency", req.concurrency), ("rate", req.rate)) if v is not None}
+        if "rate" in options:
+            options["burst"] = max(options["rate"], 1.0)
+        if await bulk_sync.start_job(file, output, req.resume, **options) is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="已有批量刷新任务在运行"
+            )
+        return {"status": "success", "message": "批量刷新已开始"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"启动批量刷新失败: {str(e)}"
+        )
+
+
+@router.get("/admin/bulk_sync", response_model=Dict[str, Any], tags=["admin"])
+async def bulk_sync_status(x_admin_token: str | None = Header(None)):
+    """
+    获取当前（或最近一次）批量刷新任务的进度
+    """
+    require_admin(x_admin_token)
+    job = bulk_sync.get_job()
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="尚未运行过批量刷新任务"
+        )
+    return {"status": "success", "message": "获取批量刷新进度成功", "data": job.stats()}
@@ -0,0 +1,87 @@
+from typing import Dict, Any
+
+from fastapi import APIRouter, HTTPException, Query
+from starlette import status
+
+from cfg.config import LeaderboardEnabled, LeaderboardMaxPageSize
+from app.service.divingfish.leaderboard import leaderboard
+
+router = APIRouter()
+
+
+def _require_leaderboard() -> None:
+    if not LeaderboardEnabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="未启用排行榜"
+        )
+
+
+@router.get("/leaderboard", response_model=Dict[str, Any], tags=["leaderboard"])
+async def leaderboard_top(
+        offset: int = Query(0, ge=0, description="从第几位开始（从 0 开始）"),
+        limit: int = Query(20, ge=1, le=LeaderboardMaxPageSize),
+):
+    """
+    获取 rating 排行
+
+    只包含通过本服务查询过 B50 的玩家，分数相同的玩家名次相同 \n
+    total       排行中的玩家数 \n
+    data        [{rank, username, nickname, rating}] \n
+    """
+    _require_leaderboard()
+    return {"status": "success", "message": "获取排行成功", "data": leaderboard.top(offset, limit)}
+
+
+@router.get("/leaderboard/rank", response_model=Dict[str, Any], tags=["leaderboard"])
+async def leaderboard_rank(
+        username: str = Query(..., description="水鱼用户名或qq号"),
+        is_qq: bool = Query(False, description="是否为QQ"),
+        radius: int = Query(0, ge=0, le=50, description="同时返回前后各多少名玩家"),
+):
+    """
+    获取玩家的 rating 名次与百分位（rating 严格低于该玩家的比例）
+    """
+    _require_leaderboard()
+    result = leaderboard.rank(username, is_qq, radius)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"排行榜中没有玩家 {username}"
+        )
+    return {"status": "success", "message": "获取名次成功", "data": result}
+
+
+@router.get("/leaderboard/chart", response_model=Dict[str, Any], tags=["leaderboard"])
+async def leaderboard_chart_top(
+        song_id: int,
+        level_index: int = Query(..., ge=0, le=4, description="难度序号"),
+        offset: int = Query(0, ge=0, description="从第几位开始（从 0 开始）"),
+        limit: int = Query(20, ge=1, le=LeaderboardMaxPageSize),
+):
+    """
+    获取单个谱面的达成率排行
+    """
+    _require_leaderboard()
+    return {"status": "success", "message": "获取谱面排行成功",
+            "data": leaderboard.chart_top(song_id, level_index, offset, limit)}
+
+
+@router.get("/leaderboard/chart/rank", response_model=Dict[str, Any], tags=["leaderboard"])
+async def leaderboard_chart_rank(
+        song_id: int,
+        level_index: int = Query(..., ge=0, le=4, description="难度序号"),
+        username: str = Query(..., description="水鱼用户名或qq号"),
+        is_qq: bool = Query(False, description="是否为QQ"),
+):
+    """
+    获取玩家在单个谱面达成率排行中的名次与百分位
+    """
+    _require_leaderboard()
+    result = leaderboard.chart_rank(song_id, level_index, username, is_qq)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"排行榜中没有玩家 {username} 在该谱面的成绩"
+        )
+    return {"status": "success", "message": "获取谱面名次成功", "data": result}
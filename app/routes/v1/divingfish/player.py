@@ -0,0 +1,77 @@
+from typing import Dict, Any
+
+from fastapi import APIRouter, HTTPException, Query
+from starlette import status
+
+from app.service.divingfish.player_store import store_available, get_rating_history, get_chart_records
+from loguru import logger
+
+router = APIRouter()
+
+
+def require_store() -> None:
+    if not store_available():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="未启用数据库，无法查询历史成绩"
+        )
+
+
+@router.get("/player/rating_history", response_model=Dict[str, Any], tags=["score"])
+async def player_rating_history(
+        username: str = Query(..., description="水鱼用户名或qq号"),
+        is_qq: bool = Query(False, description="是否为QQ"),
+        limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    获取玩家的 rating 历史（每次同步后 rating 变化或有成绩更新时记录），按时间从新到旧
+
+    数据来自本地数据库，只包含通过本服务查询过 B50 的玩家
+    """
+    try:
+        require_store()
+        history = await get_rating_history(username, is_qq, limit)
+        if history is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"数据库中没有玩家 {username} 的记录"
+            )
+        return {"status": "success", "message": "获取rating历史成功", "data": history}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取rating历史失败: {str(e)}"
+        )
+
+
+@router.get("/player/chart_records", response_model=Dict[str, Any], tags=["score"])
+async def player_chart_records(
+        username: str = Query(..., description="水鱼用户名或qq号"),
+        is_qq: bool = Query(False, description="是否为QQ"),
+        song_id: int | None = Query(None, description="只返回该歌曲的成绩"),
+):
+    """
+    获取玩家在数据库中记录过的所有谱面最佳成绩，按单曲 rating 从高到低
+
+    包含曾经进入过 B50 但现在已被挤出的谱面
+    """
+    try:
+        require_store()
+        records = await get_chart_records(username, is_qq, song_id)
+        if records is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"数据库中没有玩家 {username} 的记录"
+            )
+        return {"status": "success", "message": "获取谱面成绩成功", "data": records}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取谱面成绩失败: {str(e)}"
+        )
@@ -0,0 +1,135 @@
+import asyncio
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+from typing import Dict, Any, List
+
+from fastapi import APIRouter, HTTPException, Request, Query, Header
+from fastapi.responses import StreamingResponse
+from starlette import status
+
+from app.utils.http.admin import is_admin
+from cfg.config import ScoreFeedEnabled, ScoreFeedKeepaliveInterval, ApiKeyHeader, ApiKeys
+from app.service.divingfish.score_feed import score_feed, Subscriber
+
+router = APIRouter()
+
+
+def _require_score_feed() -> None:
+    if not ScoreFeedEnabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="未启用成绩变化推送"
+        )
+
+
+def _require_feed_access(request: Request, subscriber: Subscriber) -> None:
+    """
+    不带过滤条件（接收所有玩家的变化）需要有效的 API key 或管理令牌
+    """
+    if subscriber.filtered or request.headers.get(ApiKeyHeader) in ApiKeys or \
+            is_admin(request.headers.get("x-admin-token")):
+        return
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"接收所有玩家的变化需要在 {ApiKeyHeader} 头中携带 API key，或指定 username / qq"
+    )
+
+
+def _sse_message(event: str, data: dict, event_id: int | None = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.get("/score_feed", tags=["score_feed"])
+async def score_feed_stream(
+        request: Request,
+        username: List[str] = Query(None, description="只接收这些水鱼用户名的变化，可重复"),
+        qq: List[str] = Query(None, description="只接收这些QQ号的变化，可重复；都不填时接收全部"),
+        last_event_id: int | None = Header(None, description="断线重连时补发该 id 之后的事件"),
+):
+    """
+    以 Server-Sent Events 订阅玩家成绩变化
+
+    每当本服务从水鱼获取到玩家的 B50（查询或批量刷新），与上次看到的成绩比较，只推送变化：\n
+    event: scores   data 为 {id, time, username, nickname, rating, rating_delta, changes} \n
+    changes         [{kind: new | updated, song_id, level_index, title, type, level_label, ds,
+                      achievements, dxScore, fc, fs, ra, previous?}]，previous 为变化字段的旧值 \n
+    event: truncated 有事件因缓冲已满或超出补发范围而丢失 \n
+    不指定 username / qq 时需要携带 API key 或管理令牌；同时连接的订阅者数有上限，超出时返回 503
+    """
+    _require_score_feed()
+    usernames, qqs = set(username or ()), set(qq or ())
+    _require_feed_access(request, Subscriber("sse", 0, usernames, qqs))
+    if score_feed.is_full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="成绩变化订阅者已满，请稍后再试"
+        )
+
+    async def stream():
+        subscriber = score_feed.subscribe("sse", usernames, qqs)
+        if subscriber is None:
+            # 返回响应之后、开始推送之前订阅者已满
+            yield "retry: 30000\n\n"
+            return
+        try:
+            yield "retry: 3000\n\n"
+            last_sent = 0
+            if last_event_id is not None:
+                events, truncated = score_feed.recent(last_event_id, subscriber)
+                if truncated:
+                    yield _sse_message("truncated", {"since_id": last_event_id})
+                for event in events:
+                    yield _sse_message("scores", event, event["id"])
+                    last_sent = event["id"]
+            reported_drops = 0
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), ScoreFeedKeepaliveInterval)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                # 订阅之后、补发之前发布的事件会同时出现在补发与队列中
+                if event["id"] <= last_sent:
+                    continue
+                if subscriber.dropped > reported_drops:
+                    yield _sse_message("truncated", {"dropped": subscriber.dropped - reported_drops})
+                    reported_drops = subscriber.dropped
+                yield _sse_message("scores", event, event["id"])
+                last_sent = event["id"]
+        finally:
+            score_feed.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"cache-control": "no-cache", "x-accel-buffering": "no"})
+
+
+@router.get("/score_feed/recent", response_model=Dict[str, Any], tags=["score_feed"])
+async def score_feed_recent(
+        request: Request,
+        since_id: int = Query(0, ge=0, description="上次收到的最后一个事件 id，首次轮询时为 0"),
+        username: List[str] = Query(None, description="只返回这些水鱼用户名的变化，可重复"),
+        qq: List[str] = Query(None, description="只返回这些QQ号的变化，可重复"),
+        limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    轮询最近的玩家成绩变化，适用于无法保持长连接的客户端
+
+    events          id 大于 since_id 的事件（格式同 /score_feed），按 id 升序 \n
+    truncated       since_id 之后有事件已超出内存中保留的范围 \n
+    last_event_id   下次轮询使用的 since_id \n
+    不指定 username / qq 时需要携带 API key 或管理令牌
+    """
+    _require_score_feed()
+    subscriber = Subscriber("poll", 0, set(username or ()), set(qq or ()))
+    _require_feed_access(request, subscriber)
+    events, truncated = score_feed.recent(since_id, subscriber)
+    events = events[:limit]
+    last_event_id = events[-1]["id"] if events else max(since_id, score_feed.stats()["last_event_id"])
+    return {"status": "success", "message": "获取成绩变化成功",
+            "data": {"events": events, "truncated": truncated, "last_event_id": last_event_id}}
@@ -1,12 +1,18 @@
+import math
 from typing import Dict, Any
 
 from fastapi import APIRouter, HTTPException
-import httpx
 from starlette import status
 
+from app.schema.dxrating.request import ComputeRatingRequest, RecommendRequest
 from app.utils.os.path import mkdir_ignore_exists
-from app.service.divingfish import alive_check
-from app.service.divingfish.mai import update_all_music_info
+from app.service.divingfish.upstream import UPSTREAM_ERRORS
+from app.utils.http.resilience import CircuitOpenError
+from app.service.divingfish.catalog import ensure_music_catalog
+from app.service.divingfish.chart_stats import ensure_chart_stats_store
+from app.service.divingfish.mai import update_all_music_info, query_player_scores_cached
+from app.service.dxrating.engine import get_rating_engine
+from app.service.dxrating.recommend import get_recommend_index
 from loguru import logger
 
 mkdir_ignore_exists("data/dxrating/")
@@ -17,3 +23,112 @@ router = APIRouter(
 )
 
 
+async def _player_records(req: ComputeRatingRequest) -> list[dict]:
+    """
+    获取用于计算的成绩记录：优先使用上传的记录，否则从水鱼获取
+    """
+    if req.records is not None:
+        return [record.model_dump() for record in req.records]
+    if not req.username:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="需要提供 username 或 records"
+        )
+    success, result = await query_player_scores_cached(req.username, req.is_qq, req.b50)
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"从水鱼获取用户成绩失败: {result}"
+        )
+    charts = result.get("charts", {})
+    return charts.get("sd", []) + charts.get("dx", [])
+
+
+@router.post("/compute", response_model=Dict[str, Any], tags=["score"])
+async def compute_rating(req: ComputeRatingRequest):
+    """
+    在本地计算玩家的 DX rating
+
+    b50 为 True 时选取旧版本 B35 + 新版本 B15，否则按旧版系数选取 B25 + B15 \n
+    rating      总 rating \n
+    old_rating  旧版本曲目 rating 之和 \n
+    new_rating  新版本曲目 rating 之和 \n
+    charts      sd 为旧版本最佳成绩，dx 为新版本最佳成绩 \n
+    unknown     歌曲目录中不存在的成绩记录 \n
+    """
+    try:
+        catalog = await ensure_music_catalog()
+        if catalog is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="歌曲信息尚未从水鱼同步完成，请稍后再试"
+            )
+        records = await _player_records(req)
+        result = get_rating_engine(catalog).compute(records, req.b50)
+        return {"status": "success", "message": "计算rating成功", "data": result}
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"水鱼熔断中且无缓存的用户成绩: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except UPSTREAM_ERRORS:
+        raise HTTPException(
+            status_code=status.HTTP_204_NO_CONTENT,
+            detail="从水鱼获取用户成绩失败，水鱼服务器可能宕机，详细请联系管理员查看日志"
+        )
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"计算rating失败: {str(e)}"
+        )
+
+
+@router.post("/recommend", response_model=Dict[str, Any], tags=["score"])
+async def recommend(req: RecommendRequest):
+    """
+    推荐预期 rating 提升最大的谱面
+
+    根据玩家当前 B50 的底分与已达成谱面的拟合难度（fit_diff）估计能力上限，
+    在能力范围内寻找达到目标达成率后可以挤进 B50 或提升自身成绩的谱面 \n
+    target_achievements 推荐的目标达成率 \n
+    gain                达成目标后预期的总 rating 提升 \n
+    in_best             谱面是否已在当前 B50 中 \n
+    """
+    try:
+        catalog = await ensure_music_catalog()
+        if catalog is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="歌曲信息尚未从水鱼同步完成，请稍后再试"
+            )
+        records = await _player_records(req)
+        best = get_rating_engine(catalog).compute(records, req.b50)
+        index = get_recommend_index(catalog, await ensure_chart_stats_store(), req.b50)
+        return {
+            "status": "success",
+            "message": "获取推荐谱面成功",
+            "data": {"rating": best["rating"], "recommend": index.recommend(best, req.limit)},
+        }
+    except HTTPException:
+        raise
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"水鱼熔断中且无缓存的用户成绩: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except UPSTREAM_ERRORS:
+        raise HTTPException(
+            status_code=status.HTTP_204_NO_CONTENT,
+            detail="从水鱼获取用户成绩失败，水鱼服务器可能宕机，详细请联系管理员查看日志"
+        )
+    except Exception as e:
+        logger.exception(e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取推荐谱面失败: {str(e)}"
+        )
@@ -0,0 +1,22 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class GetChuniUserScoresRequest(BaseModel):
+    username: str = Field(..., description="水鱼用户名或qq号")
+    is_qq: bool = Field(False, description="是否为QQ")
+
+
+class ChuniScoreRecord(BaseModel):
+    mid: int = Field(..., description="歌曲id")
+    level_index: int = Field(..., description="难度序号，0 为 Basic")
+    score: int = Field(..., description="分数")
+    fc: str = Field("", description="Full Combo 状态")
+
+
+class ComputeChuniRatingRequest(BaseModel):
+    username: Optional[str] = Field(None, description="水鱼用户名或qq号，不上传成绩时从水鱼获取")
+    is_qq: bool = Field(False, description="是否为QQ")
+    best: Optional[List[ChuniScoreRecord]] = Field(None, description="直接上传的最佳成绩记录")
+    recent: List[ChuniScoreRecord] = Field(default_factory=list, description="直接上传的最近成绩记录")
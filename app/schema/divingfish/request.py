@@ -1,7 +1,30 @@
+from typing import List
+
 from pydantic import BaseModel, Field
 
+from cfg.config import BulkSyncMaxRate
+
+# 管理接口中的文件只能是 BulkSyncDataDir 下的文件名，不能包含路径
+_FILE_NAME_PATTERN = r"^[\w\-][\w.\-]*$"
+
 
 class GetUserBScoresRequest(BaseModel):
     username: str = Field(..., description="水鱼用户名或qq号")
     is_qq: bool = Field(..., description="是否为QQ")
     b50: bool = Field(..., description="是否为b50，否则查询b40")
+
+
+class BatchMusicQueryRequest(BaseModel):
+    music_ids: List[int] = Field(default_factory=list, description="歌曲id列表")
+    cids: List[int] = Field(default_factory=list, description="谱面cid列表")
+
+
+class BulkSyncRequest(BaseModel):
+    file: str | None = Field(None, max_length=128, pattern=_FILE_NAME_PATTERN,
+                             description="BulkSyncDataDir 下的玩家列表文件名，每行一个用户名，QQ 号以 qq: 开头；"
+                                         "为空时刷新数据库中已有的玩家")
+    output: str | None = Field(None, max_length=128, pattern=_FILE_NAME_PATTERN,
+                               description="结果写入 BulkSyncDataDir 下的该 JSONL 文件而不是数据库")
+    resume: bool = Field(True, description="是否从检查点续跑")
+    concurrency: int | None = Field(None, ge=1, le=64, description="同时进行的查询数")
+    rate: float | None = Field(None, gt=0, le=BulkSyncMaxRate, description="每秒最多发起的查询数")
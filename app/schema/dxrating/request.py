@@ -0,0 +1,23 @@
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ScoreRecord(BaseModel):
+    song_id: int = Field(..., description="歌曲id")
+    level_index: int = Field(..., description="难度序号，0 为 Basic")
+    achievements: float = Field(..., description="达成率")
+    fc: str = Field("", description="Full Combo 状态")
+    fs: str = Field("", description="Full Sync 状态")
+    dxScore: int = Field(0, description="DX分数")
+
+
+class ComputeRatingRequest(BaseModel):
+    username: Optional[str] = Field(None, description="水鱼用户名或qq号，不上传成绩时从水鱼获取")
+    is_qq: bool = Field(False, description="是否为QQ")
+    records: Optional[List[ScoreRecord]] = Field(None, description="直接上传的成绩记录")
+    b50: bool = Field(True, description="是否为b50，否则按b40计算")
+
+
+class RecommendRequest(ComputeRatingRequest):
+    limit: int = Field(20, ge=1, le=100, description="返回的推荐数量")
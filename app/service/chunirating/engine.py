@@ -0,0 +1,139 @@
+import numpy as np
+
+from app.service.divingfish.catalog import MusicCatalog
+
+# 分数 >= 900000 时单曲 rating = 定数 + 偏移，偏移在各分数线之间线性变化
+_UPPER_SCORES = np.array([900000, 925000, 975000, 1000000, 1005000, 1007500, 1009000])
+_UPPER_OFFSETS = np.array([-5.0, -3.0, 0.0, 1.0, 1.5, 2.0, 2.15])
+# 分数 < 900000 时单曲 rating = (定数 - 5) * 比例
+_LOWER_SCORES = np.array([500000, 800000, 900000])
+_LOWER_RATIOS = np.array([0.0, 0.5, 1.0])
+
+# 评级下限（分数）与对应名称，按升序排列
+RANK_THRESHOLDS = np.array([0, 500000, 600000, 700000, 800000, 900000, 925000, 950000, 975000, 990000, 1000000,
+                            1005000, 1007500, 1009000])
+RANK_NAMES = ["d", "c", "b", "bb", "bbb", "a", "aa", "aaa", "s", "sp", "ss", "ssp", "sss", "sssp"]
+
+BEST_SLOTS = 30
+RECENT_SLOTS = 10
+
+
+def compute_ra(ds: np.ndarray, score: np.ndarray) -> np.ndarray:
+    """
+    按定数与分数批量计算中二节奏单曲 rating（截断到 0.01）
+
+    :param ds: 定数数组
+    :param score: 分数数组
+    """
+    upper = ds + np.interp(score, _UPPER_SCORES, _UPPER_OFFSETS)
+    lower = (ds - 5) * np.interp(score, _LOWER_SCORES, _LOWER_RATIOS)
+    ra = np.maximum(np.where(score >= _UPPER_SCORES[0], upper, lower), 0.0)
+    # 先取 6 位小数再截断，避免浮点误差导致少 0.01
+    return np.floor(np.round(ra * 100, 6)) / 100
+
+
+def rank_name(score: int) -> str:
+    return RANK_NAMES[int(np.searchsorted(RANK_THRESHOLDS, score, side="right")) - 1]
+
+
+class ChuniRatingEngine:
+    """
+    基于中二节奏歌曲目录在本地计算 rating
+
+    构建时把目录中的定数展开为 NumPy 矩阵，计算时按 (歌曲, 难度) 批量取定数。
+    rating 为最佳 30 首（B30）与最近 10 首（R10）的平均值；
+    R10 需要游玩历史，只能使用调用方（或水鱼）提供的最近成绩。
+    """
+
+    def __init__(self, catalog: MusicCatalog):
+        self.catalog = catalog
+        self.row_of: dict[str | int, int] = {}
+        self.music_ids: list[str] = []
+        max_charts = max((len(music.get("ds", [])) for music in catalog.music_list), default=0)
+        self.ds = np.zeros((len(catalog.music_list), max(max_charts, 1)), dtype=np.float64)
+        self.chart_count = np.zeros(len(catalog.music_list), dtype=np.int64)
+        for row, music in enumerate(catalog.music_list):
+            music_id = str(music["id"])
+            self.row_of[music_id] = row
+            self.row_of[int(music_id)] = row
+            self.music_ids.append(music_id)
+            self.ds[row, :len(music["ds"])] = music["ds"]
+            self.chart_count[row] = len(music["ds"])
+
+    def _rate(self, records: list[dict]) -> tuple[list[dict], list[dict]]:
+        """
+        计算每条记录的单曲 rating
+
+        :return: (按 rating 降序排列的已识别记录, 无法识别的记录)
+        """
+        count = len(records)
+        rows = np.fromiter((self.row_of.get(record.get("mid", record.get("song_id")), -1) for record in records),
+                           dtype=np.int64, count=count)
+        levels = np.fromiter((record.get("level_index", -1) for record in records), dtype=np.int64, count=count)
+        scores = np.fromiter((record.get("score", 0) for record in records), dtype=np.float64, count=count)
+        valid = (rows >= 0) & (levels >= 0) & (levels < self.chart_count[np.maximum(rows, 0)])
+        index = np.flatnonzero(valid)
+        ds = self.ds[rows[index], levels[index]]
+        ra = compute_ra(ds, scores[index])
+        order = np.lexsort((-scores[index], -ds, -ra))
+        rated = [self._record(records[index[i]], rows[index[i]], levels[index[i]], ds[i], ra[i]) for i in order]
+        return rated, [records[i] for i in np.flatnonzero(~valid)]
+
+    def compute(self, best: list[dict], recent: list[dict] | None = None) -> dict:
+        """
+        计算单个玩家的 rating
+
+        :param best: 最佳成绩记录，至少包含 mid（或 song_id）、level_index、score；同一谱面只取最高 rating
+        :param recent: 最近成绩记录，取其中 rating 最高的 10 条
+        :return: {"rating", "best_rating", "recent_rating", "b30", "r10", "unknown"}
+        """
+        rated, unknown = self._rate(best)
+        b30, seen = [], set()
+        for record in rated:
+            key = (record["mid"], record["level_index"])
+            if key in seen:
+                continue
+            seen.add(key)
+            b30.append(record)
+            if len(b30) == BEST_SLOTS:
+                break
+        r10, recent_unknown = self._rate(recent or [])
+        r10 = r10[:RECENT_SLOTS]
+        best_total = sum(record["ra"] for record in b30)
+        recent_total = sum(record["ra"] for record in r10)
+        return {
+            "rating": float(np.floor((best_total + recent_total) / (BEST_SLOTS + RECENT_SLOTS) * 100) / 100),
+            "best_rating": float(np.floor(best_total / BEST_SLOTS * 100) / 100),
+            "recent_rating": float(np.floor(recent_total / RECENT_SLOTS * 100) / 100),
+            "b30": b30,
+            "r10": r10,
+            "unknown": unknown + recent_unknown,
+        }
+
+    def _record(self, source: dict, row: int, level_index: int, ds: float, ra: float) -> dict:
+        music = self.catalog.by_id[self.music_ids[row]]
+        score = int(source.get("score", 0))
+        return {
+            "mid": int(music["id"]),
+            "title": music["title"],
+            "level_index": int(level_index),
+            "level": music["level"][level_index],
+            "ds": float(ds),
+            "score": score,
+            "ra": float(ra),
+            "rank": rank_name(score),
+            "fc": source.get("fc", ""),
+        }
+
+
+_engine: ChuniRatingEngine | None = None
+
+
+def get_chuni_rating_engine(catalog: MusicCatalog) -> ChuniRatingEngine:
+    """
+    获取与当前中二节奏歌曲目录对应的 rating 引擎，目录刷新后自动重建
+    """
+    global _engine
+    if _engine is None or _engine.catalog is not catalog:
+        _engine = ChuniRatingEngine(catalog)
+    return _engine
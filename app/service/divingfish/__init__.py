@@ -5,25 +5,43 @@ except ImportError:
 
 import httpx
 from cfg.config import DivingFishBaseUrl
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+from app.service.divingfish.client import get_client, get_timeout
+from app.service.divingfish.upstream import upstream_call, upstream_health, UPSTREAM_ERRORS
+from app.utils.http.resilience import CircuitOpenError
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_fixed(1),
-    retry=retry_if_exception_type(httpx.NetworkError) | retry_if_exception_type(httpx.TimeoutException)
-)
-async def alive_check() -> tuple[bool, dict]:
+@upstream_call("alive", attempts=1)
+async def alive_check(client: httpx.AsyncClient | None = None) -> tuple[bool, dict]:
     """
     验证水鱼是否存活
+
+    :param client: 发起请求使用的客户端，默认使用应用级共享客户端
     """
     try:
-        client = httpx.AsyncClient()
-        resp = await client.get(f"{DivingFishBaseUrl}/alive")
+        client = client or get_client()
+        resp = await client.get(f"{DivingFishBaseUrl}/alive", timeout=get_timeout("alive"))
         if resp.status_code == 200 and resp.json() == {"message":"ok"}:
             return True, resp.json()
         return False, resp.json()
-    except httpx.NetworkError or httpx.TimeoutException as e:
+    except UPSTREAM_ERRORS as e:
         raise e
     except Exception as e:
-        return False, {"message": e}
\ No newline at end of file
+        return False, {"message": str(e)}
+
+
+async def probe_upstream() -> bool:
+    """
+    探测水鱼是否存活并写入内存健康状态
+
+    熔断打开期间不会发出请求；到达恢复时间后本次探测即作为半开状态的探测请求。
+
+    :return: 是否存活
+    """
+    try:
+        is_alive, msg = await alive_check()
+    except CircuitOpenError as e:
+        is_alive, msg = False, {"message": str(e)}
+    except UPSTREAM_ERRORS as e:
+        is_alive, msg = False, {"message": f"无法连接水鱼服务器: {e!r}"}
+    upstream_health.record_probe(is_alive, msg)
+    return is_alive
\ No newline at end of file
@@ -0,0 +1,384 @@
+"""
+批量刷新玩家成绩
+
+从文件（每行一个用户名，QQ 号以 qq: 开头）或数据库中已有的玩家逐个读取，经令牌桶限速、
+有界的 worker 池向水鱼查询 B50，并按批写入数据库或 JSONL 文件。进度以检查点文件保存，中断后可以续跑。
+
+    python -m app.service.divingfish.bulk_sync --file users.txt --resume
+    python -m app.service.divingfish.bulk_sync --db --output data/divingfish/bulk_sync.jsonl
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import AsyncIterator
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+import httpx
+from loguru import logger
+
+from app.service.divingfish.leaderboard import update_leaderboard
+from app.service.divingfish.mai import query_player_scores_simple
+from app.service.divingfish.player_store import sync_player_scores_batch, iter_stored_players
+from app.service.divingfish.score_feed import observe_scores
+from app.service.divingfish.upstream import UPSTREAM_ERRORS, upstream_priority
+from app.utils.http.ratelimit import TokenBucket
+from app.utils.http.resilience import CircuitOpenError
+from app.utils.os.storage import atomic_write
+from cfg.config import BulkSyncConcurrency, BulkSyncRate, BulkSyncBurst, BulkSyncBatchSize, \
+    BulkSyncCheckpointPath, BulkSyncProgressInterval
+
+# 检查点中最多保留的失败玩家数
+MAX_RECORDED_FAILURES = 1000
+
+
+async def iter_players_from_file(path: str, chunk_size: int = 1 << 16) -> AsyncIterator[tuple[str, bool]]:
+    """
+    逐行读取玩家列表，产出 (用户名或QQ号, 是否为QQ)；空行与 # 开头的行会被跳过
+
+    :param chunk_size: 每次在线程中读取的字节数（按整行）
+    """
+    f = await asyncio.to_thread(open, path, encoding="utf-8")
+    try:
+        while lines := await asyncio.to_thread(f.readlines, chunk_size):
+            for line in lines:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if line.startswith("qq:"):
+                    yield line[3:].strip(), True
+                else:
+                    yield line, False
+    finally:
+        f.close()
+
+
+class SyncCheckpoint:
+    """
+    批量刷新的检查点
+
+    输入按顺序编号，worker 并发处理导致完成顺序不固定，因此记录「编号不超过 watermark 的输入均已完成」
+    以及 watermark 之后零散完成的编号；只有结果写入后才会标记完成。
+    """
+
+    def __init__(self, path: str | None, source: str):
+        self.path = path
+        self.source = source
+        self.watermark = -1
+        self.done: set[int] = set()
+        self.failures: list[dict] = []
+        if path is not None and os.path.exists(path):
+            with open(path, "rb") as f:
+                data = json.loads(f.read())
+            if data.get("source") == source:
+                self.watermark = data.get("watermark", -1)
+                self.done = set(data.get("done", []))
+                self.failures = data.get("failures", [])
+            else:
+                logger.warning(f"检查点 {path} 属于 {data.get('source')}，与本次的 {source} 不一致，从头开始")
+
+    def is_done(self, index: int) -> bool:
+        return index <= self.watermark or index in self.done
+
+    def mark(self, index: int) -> None:
+        self.done.add(index)
+        while self.watermark + 1 in self.done:
+            self.watermark += 1
+            self.done.discard(self.watermark)
+
+    async def save(self, stats: dict) -> None:
+        if self.path is None:
+            return
+        # 在事件循环中序列化，避免写入线程与 mark 并发访问 done
+        data = json.dumps({
+            "source": self.source,
+            "watermark": self.watermark,
+            "done": sorted(self.done),
+            "failures": self.failures[-MAX_RECORDED_FAILURES:],
+            "stats": stats,
+        }).encode("utf-8")
+        await asyncio.to_thread(atomic_write, self.path, data)
+
+
+class DatabaseSink:
+    """
+    每批结果在一个事务中增量写入数据库
+    """
+
+    async def write(self, items: list[tuple[str, bool, dict]]) -> None:
+        # 成绩变化需要与写入之前的数据比较
+        for username, is_qq, result in items:
+            await observe_scores(username, is_qq, result)
+        await sync_player_scores_batch(items)
+        for username, is_qq, result in items:
+            update_leaderboard(username, is_qq, result)
+
+
+class JsonlSink:
+    """
+    每批结果追加写入 JSONL 文件，每行为 {"username", "is_qq", "result"}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _append(self, lines: list[str]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.writelines(lines)
+
+    async def write(self, items: list[tuple[str, bool, dict]]) -> None:
+        lines = [json.dumps({"username": u, "is_qq": q, "result": r}, ensure_ascii=False) + "\n" for u, q, r in items]
+        await asyncio.to_thread(self._append, lines)
+
+
+class BulkSyncJob:
+    """
+    批量刷新任务
+
+    :param source: 产出 (用户名或QQ号, 是否为QQ) 的异步迭代器
+    :param sink: 结果写入目标，需要提供 async write(items)
+    :param checkpoint: 检查点，为 None 时不续跑也不保存进度
+    :param concurrency: 同时进行的查询数
+    :param rate: 每秒最多发起的查询数
+    :param burst: 令牌桶容量
+    :param batch_size: 每批写入的结果数
+    :param client: 发起请求使用的客户端，默认使用应用级共享客户端
+    """
+
+    def __init__(self, source: AsyncIterator[tuple[str, bool]], sink, checkpoint: SyncCheckpoint | None = None,
+                 concurrency: int = BulkSyncConcurrency, rate: float = BulkSyncRate, burst: float = BulkSyncBurst,
+                 batch_size: int = BulkSyncBatchSize, client: httpx.AsyncClient | None = None,
+                 progress_interval: float = BulkSyncProgressInterval):
+        self.source = source
+        self.sink = sink
+        self.checkpoint = checkpoint or SyncCheckpoint(None, "")
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.batch_size = batch_size
+        self.client = client
+        self.progress_interval = progress_interval
+        self._batch: list[tuple[int, str, bool, str, dict]] = []
+        self._flush_lock = asyncio.Lock()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.counts = {"queued": 0, "resumed": 0, "succeeded": 0, "skipped": 0, "failed": 0, "written": 0,
+                       "write_failed": 0}
+
+    def stats(self) -> dict:
+        end = self.finished_at or time.monotonic()
+        elapsed = end - self.started_at if self.started_at is not None else 0.0
+        processed = self.counts["succeeded"] + self.counts["skipped"] + self.counts["failed"]
+        return {
+            **self.counts,
+            "processed": processed,
+            "elapsed": round(elapsed, 3),
+            "throughput": round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+            "rate_limited_seconds": round(self.bucket.waited, 3),
+            "running": self.started_at is not None and self.finished_at is None,
+        }
+
+    async def run(self) -> dict:
+        # worker 任务继承该优先级，批量刷新让位于用户请求与后台刷新
+        upstream_priority.set("bulk")
+        self.started_at = time.monotonic()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        producer = asyncio.create_task(self._produce(queue))
+        progress = asyncio.create_task(self._report_progress())
+        tasks = [producer, *workers, progress]
+        try:
+            # 任一 worker 异常退出时立即结束，生产者不会阻塞在已无人消费的队列上
+            await asyncio.gather(producer, *workers)
+            await self._flush()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.finished_at = time.monotonic()
+            async with self._flush_lock:
+                await self.checkpoint.save(self.stats())
+        logger.info(f"批量刷新完成: {self.stats()}")
+        return self.stats()
+
+    async def _produce(self, queue: asyncio.Queue) -> None:
+        index = 0
+        async for username, is_qq in self.source:
+            if self.checkpoint.is_done(index):
+                self.counts["resumed"] += 1
+            else:
+                await queue.put((index, username, is_qq))
+                self.counts["queued"] += 1
+            index += 1
+        for _ in range(self.concurrency):
+            await queue.put(None)
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            index, username, is_qq = item
+            try:
+                outcome, result = await self._fetch(username, is_qq)
+            except Exception as e:
+                logger.error(f"批量刷新 {username} 失败: {e!r}")
+                outcome, result = "failed", {"error": repr(e)}
+            self.counts[outcome] += 1
+            self._batch.append((index, username, is_qq, outcome, result))
+            if len(self._batch) >= self.batch_size:
+                await self._flush()
+
+    async def _fetch(self, username: str, is_qq: bool) -> tuple[str, dict]:
+        while True:
+            await self.bucket.acquire()
+            try:
+                success, result = await query_player_scores_simple(username, is_qq, True, client=self.client)
+            except CircuitOpenError as e:
+                # 水鱼熔断中，等待恢复后重试同一个玩家
+                await asyncio.sleep(max(e.retry_after, 1.0))
+                continue
+            except UPSTREAM_ERRORS as e:
+                return "failed", {"error": repr(e)}
+            return ("succeeded" if success else "skipped"), result
+
+    async def _flush(self) -> None:
+        async with self._flush_lock:
+            batch, self._batch = self._batch, []
+            if not batch:
+                return
+            items = [(username, is_qq, result) for _, username, is_qq, outcome, result in batch
+                     if outcome == "succeeded"]
+            write_error = None
+            if items:
+                try:
+                    await self.sink.write(items)
+                    self.counts["written"] += len(items)
+                except Exception as e:
+                    # 整批记为失败且不标记完成，续跑时会重新查询这些玩家
+                    logger.error(f"批量刷新写入 {len(items)} 条结果失败: {e!r}")
+                    write_error = {"error": f"写入失败: {e!r}"}
+                    self.counts["write_failed"] += len(items)
+            for index, username, is_qq, outcome, result in batch:
+                if outcome == "succeeded" and write_error is not None:
+                    self.checkpoint.failures.append({"username": username, "is_qq": is_qq, **write_error})
+                    continue
+                if outcome == "failed":
+                    self.checkpoint.failures.append({"username": username, "is_qq": is_qq, **result})
+                self.checkpoint.mark(index)
+            await self.checkpoint.save(self.stats())
+
+    async def _report_progress(self) -> None:
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            logger.info(f"批量刷新进度: {self.stats()}")
+
+
+_job: BulkSyncJob | None = None
+_job_task: asyncio.Task | None = None
+
+
+_start_lock = asyncio.Lock()
+
+
+def _discard_checkpoint(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def create_job(file: str | None = None, output: str | None = None, resume: bool = True,
+                     checkpoint_path: str = BulkSyncCheckpointPath, **options) -> BulkSyncJob:
+    """
+    按参数组装批量刷新任务
+
+    :param file: 玩家列表文件，为 None 时遍历数据库中已有的玩家
+    :param output: JSONL 输出文件，为 None 时写入数据库
+    :param resume: 是否从检查点续跑；为 False 时删除已有检查点
+    """
+    source_name = f"file:{os.path.abspath(file)}" if file else "db"
+    if not resume:
+        await asyncio.to_thread(_discard_checkpoint, checkpoint_path)
+    return BulkSyncJob(
+        iter_players_from_file(file) if file else iter_stored_players(),
+        JsonlSink(output) if output else DatabaseSink(),
+        await asyncio.to_thread(SyncCheckpoint, checkpoint_path, source_name),
+        **options,
+    )
+
+
+def is_running() -> bool:
+    return _job_task is not None and not _job_task.done()
+
+
+async def start_job(file: str | None = None, output: str | None = None, resume: bool = True,
+                    **options) -> BulkSyncJob | None:
+    """
+    组装并在后台启动批量刷新任务，参数同 create_job
+
+    先确认没有任务在运行再组装，被拒绝的请求不会删除运行中任务的检查点。
+
+    :return: 启动的任务，已有任务在运行时返回 None
+    """
+    global _job, _job_task
+    async with _start_lock:
+        if is_running():
+            return None
+        job = await create_job(file, output, resume, **options)
+        _job = job
+        _job_task = asyncio.create_task(job.run(), name="bulk-sync")
+        _job_task.add_done_callback(_job_done)
+    return job
+
+
+def get_job() -> BulkSyncJob | None:
+    return _job
+
+
+def _job_done(task: asyncio.Task) -> None:
+    global _job_task
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"批量刷新失败: {task.exception()!r}")
+    # 无论成功与否都清除运行状态，之后可以重新启动
+    if _job_task is task:
+        _job_task = None
+
+
+async def _main(args: argparse.Namespace) -> None:
+    from tortoise import Tortoise
+    from app.service.divingfish.client import init_client, close_client
+    from cfg.config import TORTOISE_ORM, DatabaseGenerateSchemas
+
+    use_db = args.output is None or args.file is None
+    if use_db:
+        await Tortoise.init(config=TORTOISE_ORM)
+        if DatabaseGenerateSchemas:
+            await Tortoise.generate_schemas(safe=True)
+    await init_client()
+    try:
+        job = await create_job(args.file, args.output, args.resume, args.checkpoint, concurrency=args.concurrency,
+                               rate=args.rate, burst=args.burst, batch_size=args.batch_size)
+        print(json.dumps(await job.run(), ensure_ascii=False))
+    finally:
+        await close_client()
+        if use_db:
+            await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量刷新玩家成绩")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--file", help="玩家列表文件，每行一个用户名，QQ 号以 qq: 开头")
+    group.add_argument("--db", action="store_true", help="刷新数据库中已有的所有玩家")
+    parser.add_argument("--output", help="结果写入该 JSONL 文件而不是数据库")
+    parser.add_argument("--checkpoint", default=BulkSyncCheckpointPath)
+    parser.add_argument("--resume", action="store_true", help="从检查点续跑")
+    parser.add_argument("--concurrency", type=int, default=BulkSyncConcurrency)
+    parser.add_argument("--rate", type=float, default=BulkSyncRate, help="每秒最多发起的查询数")
+    parser.add_argument("--burst", type=float, default=BulkSyncBurst)
+    parser.add_argument("--batch-size", type=int, default=BulkSyncBatchSize)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,268 @@
+import asyncio
+import bisect
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish.dataset import GameDataset
+from app.service.divingfish.snapshot import SNAPSHOT_PATH, CatalogSnapshot, MusicList, MusicMap, open_snapshot, \
+    write_snapshot
+from app.utils.http.precompressed import EncodedBody
+from app.utils.os.storage import read_dataset
+from cfg.config import GzipLevel, BrotliQuality
+
+MUSIC_DATA_PATH = "data/divingfish/music_data.json"
+MUSIC_DATA_EXT_PATH = "data/divingfish/music_data_ext.json"
+
+
+class MusicCatalog:
+    """
+    水鱼歌曲数据的内存索引快照
+
+    构建完成后不再修改，刷新时整体替换，读取方无需加锁。
+    各游戏的歌曲数据格式基本一致，共用同一套索引；中二的歌曲 id 为 int，索引中统一使用 str。
+    """
+
+    def __init__(self, music_data: Sequence[dict], etag: str | None = None, version: str | None = None,
+                 snapshot: CatalogSnapshot | None = None, game: GameDataType = GameDataType.MAIMAI):
+        self.game = game
+        self.etag = etag
+        # 数据文件的 sha256，用于判断内存快照与本地文件是否一致
+        self.version = version
+        self.music_list: Sequence[dict] = music_data
+        self.by_id: Mapping[str, dict] = {}
+        # cid -> (歌曲id, 难度序号)
+        self.by_cid: dict[int, tuple[str, int]] = {}
+        self.by_title: dict[str, list[str]] = {}
+        self.by_artist: dict[str, list[str]] = {}
+        self.by_genre: dict[str, list[str]] = {}
+        self.by_version: dict[str, list[str]] = {}
+        self.by_level: dict[str, list[tuple[str, int]]] = {}
+        # 按定数升序排列的 (ds, 歌曲id, 难度序号)，用于区间查询
+        self._ds_sorted: list[tuple[float, str, int]] = []
+        # 构建来源的二进制快照，数值列可直接以 NumPy 数组使用
+        self.snapshot = snapshot
+        # 按需渲染的预压缩响应体，随目录一起替换，因此每个数据版本只渲染一次
+        self._encoded: dict[str, EncodedBody] = {}
+        self._dump: EncodedBody | None = None
+        self._dump_lock = asyncio.Lock()
+
+        if snapshot is not None:
+            self._index_snapshot(snapshot)
+            return
+        for music in music_data:
+            self._index_music(music)
+        self._finish_index()
+
+    def _index_music(self, music: dict) -> None:
+        music_id = str(music["id"])
+        basic_info = music.get("basic_info", {})
+        self.by_id[music_id] = music
+        self.by_title.setdefault(music["title"].casefold(), []).append(music_id)
+        self.by_artist.setdefault(basic_info.get("artist", "").casefold(), []).append(music_id)
+        self.by_genre.setdefault(basic_info.get("genre", ""), []).append(music_id)
+        self.by_version.setdefault(basic_info.get("from", ""), []).append(music_id)
+        for level_index, cid in enumerate(music.get("cids", [])):
+            self.by_cid[cid] = (music_id, level_index)
+        for level_index, level in enumerate(music.get("level", [])):
+            self.by_level.setdefault(level, []).append((music_id, level_index))
+        for level_index, ds in enumerate(music.get("ds", [])):
+            self._ds_sorted.append((ds, music_id, level_index))
+
+    def _finish_index(self) -> None:
+        self._ds_sorted.sort()
+        self._ds_keys = [item[0] for item in self._ds_sorted]
+
+    def _index_snapshot(self, snapshot: CatalogSnapshot) -> None:
+        """
+        直接用快照的列数据构建索引，不还原歌曲字典
+        """
+        s = snapshot.strings
+        ids = [s[i] for i in snapshot.song_id.tolist()]
+        self.by_id = MusicMap(ids, self.music_list)
+        for music_id, title, artist, genre, version in zip(
+                ids, snapshot.song_title.tolist(), snapshot.song_artist.tolist(),
+                snapshot.song_genre.tolist(), snapshot.song_from.tolist()):
+            self.by_title.setdefault(s[title].casefold(), []).append(music_id)
+            self.by_artist.setdefault(s[artist].casefold(), []).append(music_id)
+            self.by_genre.setdefault(s[genre], []).append(music_id)
+            self.by_version.setdefault(s[version], []).append(music_id)
+
+        # 每个谱面所属的歌曲 id 与难度序号
+        chart_count = snapshot.song_chart_count
+        chart_song = np.repeat(np.arange(snapshot.song_count), chart_count)
+        chart_level_index = np.arange(snapshot.chart_count) - np.repeat(snapshot.song_chart_start, chart_count)
+        chart_ids = [ids[i] for i in chart_song.tolist()]
+        level_index = chart_level_index.tolist()
+        for music_id, i, cid, level in zip(chart_ids, level_index, snapshot.chart_cid.tolist(),
+                                           snapshot.chart_level.tolist()):
+            if cid >= 0:
+                self.by_cid[cid] = (music_id, i)
+            self.by_level.setdefault(s[level], []).append((music_id, i))
+
+        self._ds_sorted = sorted(zip(snapshot.chart_ds.tolist(), chart_ids, level_index))
+        self._ds_keys = [item[0] for item in self._ds_sorted]
+
+    @classmethod
+    def from_snapshot(cls, snapshot: CatalogSnapshot, etag: str | None = None) -> "MusicCatalog":
+        """
+        从二进制快照构建歌曲目录，跳过 JSON 解析，歌曲字典在首次访问时才还原
+        """
+        return cls(MusicList(snapshot), etag, snapshot.source_sha256, snapshot)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, music_id: int | str) -> dict | None:
+        return self.by_id.get(str(music_id))
+
+    def get_by_cid(self, cid: int) -> tuple[dict, int] | None:
+        """
+        通过谱面cid获取歌曲信息和对应的难度序号
+        """
+        hit = self.by_cid.get(cid)
+        if hit is None:
+            return None
+        return self.by_id[hit[0]], hit[1]
+
+    def _tag(self, key: str) -> str | None:
+        return f"{self.version[:16]}-{key}" if self.version else None
+
+    def get_encoded(self, music_id: int | str) -> EncodedBody | None:
+        """
+        获取 /get_music_info 预先序列化并压缩好的响应体
+        """
+        music_id = str(music_id)
+        body = self._encoded.get(music_id)
+        if body is None:
+            music = self.by_id.get(music_id)
+            if music is None:
+                return None
+            body = EncodedBody(json.dumps(music, ensure_ascii=False).encode("utf-8"), self._tag(music_id))
+            self._encoded[music_id] = body
+        return body
+
+    async def get_dump(self, path: str = MUSIC_DATA_PATH, ext_path: str = MUSIC_DATA_EXT_PATH) -> EncodedBody:
+        """
+        获取完整歌曲目录的预压缩响应体
+
+        优先直接使用本地文件的原始字节（与目录版本一致时），避免重新序列化；压缩在线程中进行。
+        """
+        if self._dump is not None:
+            return self._dump
+        async with self._dump_lock:
+            if self._dump is None:
+                data, meta = await read_dataset(path, ext_path)
+                if self.version is None or (meta or {}).get("sha256") != self.version:
+                    data = json.dumps(list(self.music_list), ensure_ascii=False).encode("utf-8")
+                self._dump = await asyncio.to_thread(EncodedBody, data, self._tag("all"), GzipLevel, BrotliQuality)
+            return self._dump
+
+    def find_by_title(self, title: str) -> list[dict]:
+        return [self.by_id[i] for i in self.by_title.get(title.casefold(), [])]
+
+    def find_by_artist(self, artist: str) -> list[dict]:
+        return [self.by_id[i] for i in self.by_artist.get(artist.casefold(), [])]
+
+    def find_by_genre(self, genre: str) -> list[dict]:
+        return [self.by_id[i] for i in self.by_genre.get(genre, [])]
+
+    def find_by_version(self, version: str) -> list[dict]:
+        return [self.by_id[i] for i in self.by_version.get(version, [])]
+
+    def find_by_level(self, level: str) -> list[tuple[dict, int]]:
+        return [(self.by_id[i], level_index) for i, level_index in self.by_level.get(level, [])]
+
+    def find_by_ds_range(self, ds_min: float, ds_max: float) -> list[tuple[dict, int]]:
+        """
+        查询定数在 [ds_min, ds_max] 区间内的所有谱面
+
+        :return: (歌曲信息, 难度序号) 列表，按定数升序
+        """
+        lo = bisect.bisect_left(self._ds_keys, ds_min)
+        hi = bisect.bisect_right(self._ds_keys, ds_max)
+        return [(self.by_id[music_id], level_index) for _, music_id, level_index in self._ds_sorted[lo:hi]]
+
+
+class MusicCatalogBuilder:
+    """
+    边解析边构建歌曲目录：每解析出一首歌就加入索引，无需先得到完整的歌曲列表
+    """
+
+    # music_data 为歌曲数组，逐个元素构建
+    depth = 1
+
+    def __init__(self, game: GameDataType = GameDataType.MAIMAI):
+        self.catalog = MusicCatalog([], game=game)
+
+    def add(self, path: tuple, music: dict) -> None:
+        self.catalog.music_list.append(music)
+        self.catalog._index_music(music)
+
+    def finish(self, meta: dict) -> MusicCatalog:
+        self.catalog.etag = meta.get("etag")
+        self.catalog.version = meta.get("sha256")
+        self.catalog._finish_index()
+        return self.catalog
+
+
+def _load_catalog_snapshot(meta: dict | None) -> MusicCatalog | None:
+    """
+    元数据版本与二进制快照一致时直接映射快照文件，跳过 JSON 解析
+    """
+    snapshot = open_snapshot(meta.get("sha256") if meta else None)
+    if snapshot is None:
+        return None
+    return MusicCatalog.from_snapshot(snapshot, meta.get("etag"))
+
+
+async def _write_catalog_snapshot(catalog: MusicCatalog, meta: dict) -> None:
+    await asyncio.to_thread(write_snapshot, catalog.music_list, meta["sha256"], SNAPSHOT_PATH)
+
+
+# 舞萌歌曲数据；之后启动的 worker 可以直接映射二进制快照
+music_data_dataset: GameDataset[MusicCatalog] = GameDataset(
+    GameDataType.MAIMAI, "music_data", "music_data", MusicCatalogBuilder,
+    load_fast=_load_catalog_snapshot,
+    after_write=_write_catalog_snapshot,
+)
+
+
+def get_music_catalog() -> MusicCatalog | None:
+    """
+    获取当前的歌曲目录快照，尚未加载时返回 None
+    """
+    return music_data_dataset.get()
+
+
+def set_music_catalog(catalog: MusicCatalog) -> None:
+    """
+    原子替换当前的歌曲目录快照
+    """
+    music_data_dataset.set(catalog)
+
+
+async def load_music_catalog() -> MusicCatalog:
+    """
+    从本地缓存文件构建歌曲目录并替换当前快照
+
+    优先使用与元数据版本一致的二进制快照；快照缺失或过期时解析 JSON 并重新生成快照。
+
+    :return: 新的歌曲目录
+    """
+    return await music_data_dataset.load()
+
+
+async def ensure_music_catalog() -> MusicCatalog | None:
+    """
+    确保歌曲目录已加载，本地文件不存在时返回 None
+
+    多个请求同时触发首次加载时只会解析一次文件。
+    """
+    return await music_data_dataset.ensure()
@@ -0,0 +1,134 @@
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish.dataset import GameDataset
+from app.utils.http.precompressed import EncodedBody
+
+CHART_STATS_PATH = "data/divingfish/chart_stats.json"
+CHART_STATS_EXT_PATH = "data/divingfish/chart_stats_ext.json"
+
+EMPTY_CHART_STATS_BYTES = b'{"stats":[]}'
+EMPTY_DIFF_STATS_BYTES = b'{"stats":{}}'
+EMPTY_CHART_STATS = EncodedBody(EMPTY_CHART_STATS_BYTES)
+EMPTY_DIFF_STATS = EncodedBody(EMPTY_DIFF_STATS_BYTES)
+
+
+class ChartStatsStore:
+    """
+    水鱼铺面统计数据的内存快照
+
+    同时保存每首歌的统计数据和对应接口响应序列化后的 bytes，
+    /get_chart_stats 与 /get_diff_stats 可以直接返回而无需再次经过 Pydantic 校验和 JSON 编码。
+    """
+
+    def __init__(self, chart_stats: dict, version: str | None = None):
+        # 数据文件的 sha256，用于判断内存快照与本地文件是否一致
+        self.version = version
+        self.charts: dict[str, list] = {}
+        self.chart_bytes: dict[str, bytes] = {}
+        self.diff_data: dict[str, dict] = chart_stats.get("diff_data", {})
+        self.diff_bytes = b""
+        # 按需压缩的响应体，键为歌曲 id，难度统计使用 "diff"
+        self._encoded: dict[str, EncodedBody] = {}
+        for music_id, stats in chart_stats.get("charts", {}).items():
+            self._add_chart(music_id, stats)
+        self._finish()
+
+    def _add_chart(self, music_id: str, stats: list) -> None:
+        self.charts[music_id] = stats
+        self.chart_bytes[music_id] = json.dumps({"stats": stats}, ensure_ascii=False).encode("utf-8")
+
+    def _finish(self) -> None:
+        self.diff_bytes = json.dumps({"stats": self.diff_data}, ensure_ascii=False).encode("utf-8")
+
+    def get_chart(self, music_id: int | str) -> list:
+        return self.charts.get(str(music_id), [])
+
+    def get_chart_bytes(self, music_id: int | str) -> bytes:
+        return self.chart_bytes.get(str(music_id), EMPTY_CHART_STATS_BYTES)
+
+    def _get_encoded(self, key: str, content: bytes) -> EncodedBody:
+        body = self._encoded.get(key)
+        if body is None:
+            body = EncodedBody(content, f"{self.version[:16]}-{key}" if self.version else None)
+            self._encoded[key] = body
+        return body
+
+    def get_chart_encoded(self, music_id: int | str) -> EncodedBody:
+        """
+        获取 /get_chart_stats 预先序列化并压缩好的响应体
+        """
+        music_id = str(music_id)
+        if music_id not in self.chart_bytes:
+            return EMPTY_CHART_STATS
+        return self._get_encoded(music_id, self.chart_bytes[music_id])
+
+    def get_diff_encoded(self) -> EncodedBody:
+        """
+        获取 /get_diff_stats 预先序列化并压缩好的响应体
+        """
+        return self._get_encoded("diff", self.diff_bytes)
+
+
+class ChartStatsBuilder:
+    """
+    边解析边构建铺面统计：每解析出一首歌的统计就预先序列化其响应体
+    """
+
+    # {"charts": {歌曲id: [...]}, "diff_data": {难度: {...}}}，逐个歌曲/难度构建
+    depth = 2
+
+    def __init__(self):
+        self.store = ChartStatsStore({})
+
+    def add(self, path: tuple, value) -> None:
+        if len(path) != 2:
+            return
+        if path[0] == "charts":
+            self.store._add_chart(path[1], value)
+        elif path[0] == "diff_data":
+            self.store.diff_data[path[1]] = value
+
+    def finish(self, meta: dict) -> ChartStatsStore:
+        self.store.version = meta.get("sha256")
+        self.store._finish()
+        return self.store
+
+
+# 舞萌铺面统计（拟合难度、成绩分布等）
+chart_stats_dataset: GameDataset[ChartStatsStore] = GameDataset(
+    GameDataType.MAIMAI, "chart_stats", "chart_stats", ChartStatsBuilder,
+)
+
+
+def get_chart_stats_store() -> ChartStatsStore | None:
+    """
+    获取当前的铺面统计快照，尚未加载时返回 None
+    """
+    return chart_stats_dataset.get()
+
+
+def set_chart_stats_store(store: ChartStatsStore) -> None:
+    """
+    原子替换当前的铺面统计快照
+    """
+    chart_stats_dataset.set(store)
+
+
+async def load_chart_stats_store() -> ChartStatsStore:
+    """
+    从本地缓存文件构建铺面统计快照并替换当前快照
+
+    :return: 新的铺面统计快照
+    """
+    return await chart_stats_dataset.load()
+
+
+async def ensure_chart_stats_store() -> ChartStatsStore | None:
+    """
+    确保铺面统计已加载，本地文件不存在时返回 None
+    """
+    return await chart_stats_dataset.ensure()
@@ -0,0 +1,105 @@
+import httpx
+from loguru import logger
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish.catalog import MusicCatalog, MusicCatalogBuilder
+from app.service.divingfish.client import get_client, get_timeout
+from app.service.divingfish.dataset import GameDataset
+from app.service.divingfish.mai import player_score_cache, player_query_result
+from app.service.divingfish.upstream import upstream_call, UPSTREAM_ERRORS
+from app.utils.http.precompressed import EncodedBody
+from app.utils.http.resilience import CircuitOpenError
+from cfg.config import DivingFishBaseUrl
+
+DIVING_FISH_CHUNI_ENDPOINT = f"{DivingFishBaseUrl}/{GameDataType.CHUNITHM.value}"
+
+# 中二节奏歌曲数据，与舞萌共用歌曲目录索引；谱面信息为 combo 而不是 notes，因此不生成二进制快照
+chunithm_music_dataset: GameDataset[MusicCatalog] = GameDataset(
+    GameDataType.CHUNITHM, "music_data", "chunithm_music_data",
+    lambda: MusicCatalogBuilder(GameDataType.CHUNITHM),
+    data_dir="data/divingfish/chunithm",
+)
+
+
+async def update_chunithm_music_info(force: bool = False,
+                                     client: httpx.AsyncClient | None = None) -> tuple[bool, bool]:
+    """
+    从水鱼获取并更新本地的中二节奏歌曲数据
+
+    :param force: 若为True，则即使本地缓存有效也强制更新
+    :param client: 发起请求使用的客户端，默认使用应用级共享客户端
+    :return: (是否成功, 是否使用了本地缓存)
+    """
+    return await chunithm_music_dataset.update(force, client)
+
+
+async def ensure_chunithm_catalog() -> MusicCatalog | None:
+    """
+    确保中二节奏歌曲目录已加载，本地文件不存在时返回 None
+    """
+    return await chunithm_music_dataset.ensure()
+
+
+async def query_chunithm_music_info_encoded(music_id: int) -> EncodedBody | None:
+    """
+    获取中二节奏歌曲信息预先序列化并压缩好的响应体，歌曲不存在时返回 None
+    """
+    catalog = await ensure_chunithm_catalog()
+    if catalog is None:
+        return None
+    return catalog.get_encoded(music_id)
+
+
+async def query_chunithm_music_data_dump() -> EncodedBody | None:
+    """
+    获取完整中二节奏歌曲目录的预压缩响应体，本地尚无歌曲数据时返回 None
+    """
+    catalog = await ensure_chunithm_catalog()
+    if catalog is None:
+        return None
+    return await catalog.get_dump(chunithm_music_dataset.data_path, chunithm_music_dataset.ext_path)
+
+
+@upstream_call("chunithm_query_player")
+async def query_chunithm_player_scores_simple(username: str, is_qq: bool,
+                                              client: httpx.AsyncClient | None = None) -> tuple[bool, dict]:
+    """
+    从水鱼获取用户的中二节奏 B30 与 R10
+
+    :param username:
+    :param is_qq:
+    :param client: 发起请求使用的客户端，默认使用应用级共享客户端
+    :return: (是否成功, {"nickname", "rating", "records": {"b30", "r10"}, "username"} 或错误信息)
+    """
+    try:
+        client = client or get_client()
+        resp = await client.post(f"{DIVING_FISH_CHUNI_ENDPOINT}/query/player",
+                                 json={"qq" if is_qq else "username": username},
+                                 timeout=get_timeout("chunithm_query_player"))
+        return player_query_result(resp)
+    except UPSTREAM_ERRORS as e:
+        raise e
+    except Exception as e:
+        logger.exception(e)
+        return False, {"error": str(e)}
+
+
+async def query_chunithm_player_scores_cached(username: str, is_qq: bool) -> tuple[bool, dict]:
+    """
+    带缓存的 query_chunithm_player_scores_simple
+
+    与舞萌共用同一个玩家成绩缓存（键中带有游戏名），水鱼不可用时返回已过期的缓存结果。
+    """
+    key = (GameDataType.CHUNITHM.value, "qq" if is_qq else "username", username)
+    try:
+        return await player_score_cache.get_or_load(
+            key,
+            lambda: query_chunithm_player_scores_simple(username, is_qq),
+            should_cache=lambda result: result[0],
+        )
+    except (CircuitOpenError, *UPSTREAM_ERRORS) as e:
+        stale = player_score_cache.peek(key)
+        if stale is None:
+            raise
+        logger.warning(f"水鱼不可用，返回 {username} 的过期中二成绩缓存: {e!r}")
+        return stale
@@ -0,0 +1,113 @@
+import time
+
+import httpx
+from loguru import logger
+
+from app.enums.divingfish.gametype import GameDataType
+from app.utils.metrics.instruments import UPSTREAM_REQUEST_DURATION
+
+from cfg.config import DivingFishHttpMaxConnections, DivingFishHttpMaxKeepaliveConnections, \
+    DivingFishHttpKeepaliveExpiry, DivingFishHttp2, DivingFishTimeouts
+
+try:
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+_client: httpx.AsyncClient | None = None
+
+
+def upstream_endpoint(path: str) -> str:
+    """
+    把请求路径归类为水鱼接口名，用作指标标签，与 DivingFishTimeouts 及 upstream_call 使用的接口名一致
+    """
+    if "/covers/" in path:
+        return "cover"
+    # 中二节奏的接口与舞萌同名，加上前缀区分
+    prefix = "chunithm_" if f"/{GameDataType.CHUNITHM.value}/" in path else ""
+    for suffix, endpoint in (("/music_data", "music_data"), ("/chart_stats", "chart_stats"),
+                             ("/query/player", "query_player"), ("/alive", "alive")):
+        if path.endswith(suffix):
+            return prefix + endpoint
+    return "other"
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    记录每个水鱼请求从发出到收到响应头的耗时与状态码
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = upstream_endpoint(request.url.path)
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            UPSTREAM_REQUEST_DURATION.labels(endpoint, "error").observe(time.perf_counter() - start)
+            raise
+        UPSTREAM_REQUEST_DURATION.labels(endpoint, response.status_code).observe(time.perf_counter() - start)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def create_client() -> httpx.AsyncClient:
+    """
+    按配置创建访问水鱼的 httpx.AsyncClient，安装了 h2 时启用 HTTP/2
+    """
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=DivingFishHttpMaxConnections,
+            max_keepalive_connections=DivingFishHttpMaxKeepaliveConnections,
+            keepalive_expiry=DivingFishHttpKeepaliveExpiry,
+        ),
+        http2=DivingFishHttp2 and _HTTP2_AVAILABLE,
+    )
+    return httpx.AsyncClient(transport=InstrumentedTransport(transport), timeout=get_timeout("default"))
+
+
+async def init_client() -> httpx.AsyncClient:
+    """
+    创建应用级共享的水鱼客户端，应在 lifespan 启动时调用
+    """
+    global _client
+    if _client is None:
+        _client = create_client()
+        if DivingFishHttp2 and not _HTTP2_AVAILABLE:
+            logger.warning("DIVINGFISH_HTTP2 已开启但未安装 h2（httpx[http2]），使用 HTTP/1.1")
+        logger.info(f"水鱼共享连接池已创建, http2={DivingFishHttp2 and _HTTP2_AVAILABLE}")
+    return _client
+
+
+async def close_client() -> None:
+    """
+    关闭应用级共享的水鱼客户端，应在 lifespan 结束时调用
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    获取共享的水鱼客户端
+
+    未经 lifespan 初始化时（例如脚本中直接调用 service）会惰性创建一个。
+    """
+    global _client
+    if _client is None:
+        _client = create_client()
+    return _client
+
+
+def get_timeout(endpoint: str) -> httpx.Timeout:
+    """
+    获取指定水鱼接口的超时配置
+    """
+    return httpx.Timeout(DivingFishTimeouts.get(endpoint, DivingFishTimeouts["default"]))
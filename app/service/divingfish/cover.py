@@ -0,0 +1,170 @@
+import asyncio
+import os
+from collections import OrderedDict
+
+from loguru import logger
+
+from app.service.divingfish.catalog import ensure_music_catalog
+from app.service.divingfish.mai import download_music_cover
+from app.utils.metrics.instruments import register_cache
+from cfg.config import CoverCacheMaxBytes, CoverPrefetchConcurrency
+
+COVER_DIR = "data/divingfish/cover"
+
+
+def cover_path(songs_id: int) -> str:
+    return f"{COVER_DIR}/{songs_id}.png"
+
+
+class CoverCache:
+    """
+    磁盘上的歌曲封面缓存
+
+    - 同一封面的并发未命中只会下载一次
+    - 按访问顺序维护 LRU，总大小超过 max_bytes 时删除最久未访问的封面
+    """
+
+    def __init__(self, directory: str = COVER_DIR, max_bytes: int = CoverCacheMaxBytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[int, int] | None = None
+        self._bytes = 0
+        self._inflight: dict[int, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _scan(self) -> OrderedDict[int, int]:
+        """
+        扫描目录，按修改时间建立 LRU 顺序
+        """
+        files = []
+        for entry in os.scandir(self.directory):
+            name, ext = os.path.splitext(entry.name)
+            if ext == ".png" and name.isdigit() and entry.is_file():
+                stat = entry.stat()
+                files.append((stat.st_mtime, int(name), stat.st_size))
+        files.sort()
+        return OrderedDict((songs_id, size) for _, songs_id, size in files)
+
+    def _set_index(self, entries: OrderedDict[int, int]) -> None:
+        self._entries = entries
+        self._bytes = sum(entries.values())
+
+    def _index(self) -> OrderedDict[int, int]:
+        # 未调用 load 时（例如在 lifespan 之外使用）在首次使用时同步扫描
+        if self._entries is None:
+            self._set_index(self._scan())
+        return self._entries
+
+    async def load(self) -> None:
+        """
+        在线程中扫描目录建立索引，应在 lifespan 启动时调用，避免首个请求在事件循环中扫描目录
+        """
+        if self._entries is None:
+            entries = await asyncio.to_thread(self._scan)
+            if self._entries is None:
+                self._set_index(entries)
+
+    def stats(self) -> dict:
+        entries = self._index()
+        return {
+            "entries": len(entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
+
+    def contains(self, songs_id: int) -> bool:
+        return songs_id in self._index() or os.path.exists(cover_path(songs_id))
+
+    async def get(self, songs_id: int) -> str | None:
+        """
+        获取封面的本地路径，本地没有时从水鱼下载
+
+        :return: 本地文件路径，下载失败时返回 None
+        """
+        entries = self._index()
+        path = cover_path(songs_id)
+        if songs_id in entries and os.path.exists(path):
+            entries.move_to_end(songs_id)
+            self.hits += 1
+            return path
+        if songs_id not in self._inflight:
+            # 其他 worker 已经下载过
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            if size > 0:
+                self._add(songs_id, size)
+                self.hits += 1
+                return path
+
+        task = self._inflight.get(songs_id)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.create_task(self._download(songs_id))
+            self._inflight[songs_id] = task
+        return await asyncio.shield(task)
+
+    async def _download(self, songs_id: int) -> str | None:
+        try:
+            success, detail = await download_music_cover(songs_id)
+            if not success or detail.get("size", 0) == 0:
+                return None
+            self._add(songs_id, detail["size"])
+            return cover_path(songs_id)
+        finally:
+            self._inflight.pop(songs_id, None)
+
+    def _add(self, songs_id: int, size: int) -> None:
+        entries = self._index()
+        self._bytes -= entries.pop(songs_id, 0)
+        entries[songs_id] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(entries) > 1:
+            evicted_id, evicted_size = entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+            try:
+                os.remove(cover_path(evicted_id))
+            except FileNotFoundError:
+                pass
+
+    async def prefetch_all(self, concurrency: int = CoverPrefetchConcurrency) -> dict:
+        """
+        以有限并发下载歌曲目录中所有本地缺失的封面
+
+        :return: 下载统计
+        """
+        catalog = await ensure_music_catalog()
+        if catalog is None:
+            return {"total": 0, "downloaded": 0, "failed": 0}
+        missing = [int(music_id) for music_id in catalog.by_id if not self.contains(int(music_id))]
+        semaphore = asyncio.Semaphore(concurrency)
+        result = {"total": len(missing), "downloaded": 0, "failed": 0}
+
+        async def fetch(songs_id: int):
+            async with semaphore:
+                try:
+                    path = await self.get(songs_id)
+                except Exception as e:
+                    logger.warning(f"预取封面 {songs_id} 失败: {e!r}")
+                    path = None
+                result["downloaded" if path else "failed"] += 1
+
+        await asyncio.gather(*[fetch(songs_id) for songs_id in missing])
+        logger.info(f"封面预取完成: {result}")
+        return result
+
+
+cover_cache = CoverCache()
+register_cache("covers", cover_cache.stats)
@@ -0,0 +1,202 @@
+import asyncio
+import io
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from app.enums.divingfish.imageformat import ImageFormat
+from app.service.divingfish.cover import cover_cache
+from app.utils.metrics.instruments import register_cache
+from app.utils.os.path import mkdir_ignore_exists
+from app.utils.os.storage import atomic_write
+from cfg.config import CoverRenderWorkers, CoverRenderSizes, CoverDerivedMaxBytes
+
+DERIVED_COVER_DIR = "data/divingfish/cover_derived"
+
+MEDIA_TYPES = {
+    ImageFormat.PNG: "image/png",
+    ImageFormat.JPEG: "image/jpeg",
+    ImageFormat.WEBP: "image/webp",
+}
+
+mkdir_ignore_exists(DERIVED_COVER_DIR)
+
+_executor = ThreadPoolExecutor(max_workers=CoverRenderWorkers, thread_name_prefix="cover-render")
+_inflight: dict[tuple, asyncio.Task] = {}
+
+
+def render_available() -> bool:
+    """
+    是否安装了 Pillow
+    """
+    return Image is not None
+
+
+def normalize_render_params(size: int | None, fmt: ImageFormat, quality: int) -> tuple[int | None, int | None]:
+    """
+    把任意的缩放参数归到有限的几种，避免派生图的组合无限增长
+
+    size 向上取到 CoverRenderSizes 中的边长，jpeg/webp 的 quality 向上取到 10 的倍数，png 无损不使用 quality。
+
+    :return: (size, quality)
+    """
+    if size is not None and CoverRenderSizes:
+        size = next((allowed for allowed in CoverRenderSizes if allowed >= size), CoverRenderSizes[-1])
+    if fmt == ImageFormat.PNG:
+        return size, None
+    return size, min(100, -(-quality // 10) * 10)
+
+
+def derived_cover_path(songs_id: int, size: int | None, fmt: ImageFormat, quality: int | None) -> str:
+    suffix = f"_q{quality}" if quality is not None else ""
+    return f"{DERIVED_COVER_DIR}/{songs_id}_{size or 'orig'}{suffix}.{fmt.value}"
+
+
+class DerivedCoverIndex:
+    """
+    派生封面的 LRU 索引，总大小超过 max_bytes 时删除最久未访问的文件
+
+    启动时扫描目录，按修改时间建立 LRU 顺序；其他 worker 渲染的文件在首次访问时加入索引。
+    """
+
+    def __init__(self, directory: str = DERIVED_COVER_DIR, max_bytes: int = CoverDerivedMaxBytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, int] | None = None
+        self._bytes = 0
+        self.evictions = 0
+
+    def _scan(self) -> OrderedDict[str, int]:
+        files = []
+        for entry in os.scandir(self.directory):
+            # 跳过 atomic_write 的临时文件
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+        files.sort()
+        return OrderedDict((name, size) for _, name, size in files)
+
+    def _set_index(self, entries: OrderedDict[str, int]) -> None:
+        self._entries = entries
+        self._bytes = sum(entries.values())
+
+    def _index(self) -> OrderedDict[str, int]:
+        if self._entries is None:
+            self._set_index(self._scan())
+        return self._entries
+
+    async def load(self) -> None:
+        """
+        在线程中扫描目录建立索引，应在 lifespan 启动时调用
+        """
+        if self._entries is None:
+            entries = await asyncio.to_thread(self._scan)
+            if self._entries is None:
+                self._set_index(entries)
+
+    def stats(self) -> dict:
+        entries = self._index()
+        return {
+            "entries": len(entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    def lookup(self, path: str) -> bool:
+        """
+        派生图是否已在磁盘上，存在时标记为最近访问
+        """
+        entries = self._index()
+        name = os.path.basename(path)
+        if name in entries and os.path.exists(path):
+            entries.move_to_end(name)
+            return True
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            entries.pop(name, None)
+            return False
+        self.add(path, size)
+        return True
+
+    def add(self, path: str, size: int) -> None:
+        entries = self._index()
+        name = os.path.basename(path)
+        self._bytes -= entries.pop(name, 0)
+        entries[name] = size
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(entries) > 1:
+            evicted, evicted_size = entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, evicted))
+            except FileNotFoundError:
+                pass
+
+
+derived_covers = DerivedCoverIndex()
+register_cache("derived_covers", derived_covers.stats)
+
+
+def render_image(source: str, target: str, size: int | None, fmt: ImageFormat, quality: int | None) -> int:
+    """
+    缩放并转码图片，在线程池中执行
+
+    :param size: 目标边长（等比缩放到不超过 size x size），None 表示不缩放
+    :return: 写入的字节数
+    """
+    with Image.open(source) as image:
+        if size is not None:
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if fmt == ImageFormat.JPEG and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        if fmt == ImageFormat.PNG:
+            image.save(buffer, format="PNG", optimize=True)
+        else:
+            image.save(buffer, format=fmt.value.upper(), quality=quality)
+    atomic_write(target, buffer.getvalue())
+    return buffer.tell()
+
+
+async def get_rendered_cover(songs_id: int, size: int | None, fmt: ImageFormat, quality: int) -> str | None:
+    """
+    获取缩放/转码后的封面路径，派生图按归一化后的 (id, 尺寸, 格式, 质量) 缓存在磁盘上
+
+    相同参数的并发首次渲染只会执行一次。
+
+    :return: 本地文件路径，原图获取失败时返回 None
+    """
+    if size is None and fmt == ImageFormat.PNG:
+        return await cover_cache.get(songs_id)
+
+    size, quality = normalize_render_params(size, fmt, quality)
+    target = derived_cover_path(songs_id, size, fmt, quality)
+    if derived_covers.lookup(target):
+        return target
+
+    key = (songs_id, size, fmt, quality)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_render(songs_id, target, size, fmt, quality))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def _render(songs_id: int, target: str, size: int | None, fmt: ImageFormat,
+                  quality: int | None) -> str | None:
+    source = await cover_cache.get(songs_id)
+    if source is None:
+        return None
+    loop = asyncio.get_running_loop()
+    written = await loop.run_in_executor(_executor, render_image, source, target, size, fmt, quality)
+    derived_covers.add(target, written)
+    return target
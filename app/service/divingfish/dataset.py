@@ -0,0 +1,248 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Generic, Protocol, TypeVar
+
+import httpx
+from loguru import logger
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish.client import get_client, get_timeout
+from app.service.divingfish.upstream import upstream_call, UPSTREAM_ERRORS
+from app.utils.codec.json_stream import JsonStreamDecoder
+from app.utils.http.resilience import CircuitOpenError
+from app.utils.metrics.instruments import JSON_PARSE_DURATION
+from app.utils.os.path import mkdir_ignore_exists
+from app.utils.os.storage import dataset_lock, read_dataset, read_dataset_meta, touch_dataset_meta, \
+    write_dataset_stream, peek_dataset_meta
+from cfg.config import DivingFishBaseUrl, DataRefreshMinInterval
+
+# 从本地文件构建内存快照时每次解析的字节数
+_BUILD_CHUNK_SIZE = 64 * 1024
+
+T = TypeVar("T")
+T_co = TypeVar("T_co", covariant=True)
+
+
+class DatasetBuilder(Protocol[T_co]):
+    """
+    逐项构建内存快照
+
+    depth 为 JSON 中逐项产出的深度（见 JsonStreamDecoder），add 按 (路径, 值) 接收每一项，
+    finish 在全部数据接收完后以元数据（含 sha256）生成内存快照。
+    """
+    depth: int
+
+    def add(self, path: tuple, value: Any) -> None: ...
+
+    def finish(self, meta: dict) -> T_co: ...
+
+
+class GameDataset(Generic[T]):
+    """
+    一份从水鱼同步的游戏数据（如舞萌歌曲数据、舞萌铺面统计、中二歌曲数据）
+
+    统一处理条件请求、跨进程刷新锁、数据与元数据的原子写入，以及内存快照的加载与替换；
+    各数据集只需提供逐项构建内存快照的 builder。
+    刷新时响应体边下载边写入文件、计算哈希并增量解析构建索引，不会在内存中保留完整的响应体。
+    内存快照需要有 version 属性（数据文件的 sha256），用于判断与本地文件是否一致。
+
+    :param game: 游戏
+    :param resource: 水鱼接口路径，同时作为本地文件名
+    :param name: 接口名，用于超时配置、熔断/健康统计与指标标签
+    :param builder: 创建 DatasetBuilder 的函数
+    :param data_dir: 本地文件所在目录
+    :param load_fast: 从派生文件（例如二进制快照）直接加载的函数，参数为元数据，不可用时返回 None
+    :param after_write: 数据文件更新后以 (内存快照, 元数据) 调用，用于生成派生文件
+    """
+
+    def __init__(self, game: GameDataType, resource: str, name: str, builder: Callable[[], DatasetBuilder[T]],
+                 data_dir: str = "data/divingfish",
+                 load_fast: Callable[[dict | None], T | None] | None = None,
+                 after_write: Callable[[T, dict], Awaitable[None]] | None = None):
+        self.game = game
+        self.resource = resource
+        self.name = name
+        self.builder = builder
+        self.load_fast = load_fast
+        self.after_write = after_write
+        self.url = f"{DivingFishBaseUrl}/{game.value}/{resource}"
+        self.data_path = f"{data_dir}/{resource}.json"
+        self.ext_path = f"{data_dir}/{resource}_ext.json"
+        self.lock_path = f"{data_dir}/.{resource}.lock"
+        self._store: T | None = None
+        self._load_lock = asyncio.Lock()
+        self._fetch = upstream_call(name)(self._exchange)
+        mkdir_ignore_exists(data_dir)
+
+    def get(self) -> T | None:
+        """
+        获取当前的内存快照，尚未加载时返回 None
+        """
+        return self._store
+
+    def set(self, store: T) -> None:
+        """
+        原子替换当前的内存快照
+        """
+        self._store = store
+
+    def build(self, data: bytes, meta: dict) -> T:
+        """
+        从完整的本地文件内容构建内存快照
+
+        解析与构建索引耗时较长，在事件循环中应通过 asyncio.to_thread 调用。
+        按块增量解析而不是一次 json.loads：后者在一次 C 调用中持有 GIL 直到解析完成，
+        即使在线程中运行也会让事件循环停顿同样长的时间。
+        """
+        builder = self.builder()
+        decoder = JsonStreamDecoder(builder.depth)
+        view = memoryview(data)
+        with JSON_PARSE_DURATION.labels(self.name).time():
+            for start in range(0, len(view), _BUILD_CHUNK_SIZE):
+                for path, value in decoder.feed(view[start:start + _BUILD_CHUNK_SIZE]):
+                    builder.add(path, value)
+            for path, value in decoder.close():
+                builder.add(path, value)
+        return builder.finish(meta)
+
+    async def load(self) -> T:
+        """
+        从本地文件构建内存快照并替换当前快照，优先使用 load_fast
+
+        解析与构建在线程中执行，不会阻塞事件循环中的其他请求。
+        """
+        if self.load_fast is not None:
+            store = await asyncio.to_thread(self.load_fast, await peek_dataset_meta(self.ext_path))
+            if store is not None:
+                self.set(store)
+                return store
+        data, meta = await read_dataset(self.data_path, self.ext_path)
+        meta = meta or {}
+        store = await asyncio.to_thread(self.build, data, meta)
+        del data
+        if self.after_write is not None and "sha256" in meta:
+            await self.after_write(store, meta)
+        self.set(store)
+        return store
+
+    async def ensure(self) -> T | None:
+        """
+        确保内存快照已加载，本地文件不存在时返回 None
+
+        多个请求同时触发首次加载时只会解析一次文件。
+        """
+        if self._store is not None:
+            return self._store
+        async with self._load_lock:
+            if self._store is not None:
+                return self._store
+            if not os.path.exists(self.data_path):
+                return None
+            return await self.load()
+
+    async def sync(self, meta: dict) -> None:
+        """
+        内存快照与本地文件版本不一致时重新加载
+        """
+        store = self._store
+        if store is None or store.version != meta.get("sha256"):
+            await self.load()
+
+    async def update(self, force: bool = False, client: httpx.AsyncClient | None = None) -> tuple[bool, bool]:
+        """
+        从水鱼获取并更新本地数据
+
+        使用上次响应的 ETag/Last-Modified 发起条件请求，数据未变化（HTTP 304）时继续使用本地缓存；
+        其他 worker 在 DataRefreshMinInterval 内刚刷新过时直接使用本地文件。
+        刷新过程持有跨进程的数据集锁，数据与元数据均以原子方式写入。
+        排队名额、熔断与重试只覆盖与水鱼的 HTTP 交换（见 _exchange），不包括等待锁与加载派生数据。
+
+        :param force: 若为True，则即使本地缓存有效也强制更新
+        :param client: 发起请求使用的客户端，默认使用应用级共享客户端
+        :return: (是否成功, 是否使用了本地缓存)
+        :raises httpx.TransportError: 网络请求异常、超时或水鱼返回 5xx（已按重试策略重试）
+        :raises CircuitOpenError: 水鱼熔断中，未发出请求
+        """
+        try:
+            async with dataset_lock(self.lock_path):
+                meta = await read_dataset_meta(self.data_path, self.ext_path)
+                if not force and meta is not None and time.time() - meta.get("request_at", 0) < DataRefreshMinInterval:
+                    await self.sync(meta)
+                    return True, True
+
+                headers = {}
+                if not force and meta is not None:
+                    if meta.get("etag"):
+                        headers["If-None-Match"] = meta["etag"]
+                    if meta.get("last_modified"):
+                        headers["If-Modified-Since"] = meta["last_modified"]
+
+                received = await self._fetch(client or get_client(), headers)
+                if received is None:
+                    meta = await touch_dataset_meta(self.ext_path, meta)
+                    await self.sync(meta)
+                    return True, True
+                store, meta = received
+                if self.after_write is not None:
+                    await self.after_write(store, meta)
+                self.set(store)
+                return True, False
+        except (*UPSTREAM_ERRORS, CircuitOpenError) as e:
+            raise e
+        except httpx.HTTPStatusError as e:
+            logger.error(f"刷新 {self.name} 失败，水鱼返回 {e}")
+            return False, False
+        except Exception as e:
+            logger.exception(e)
+            return False, False
+
+    async def _exchange(self, client: httpx.AsyncClient, headers: dict) -> tuple[T, dict] | None:
+        """
+        发起一次条件请求并接收响应体，由 upstream_call 包装
+
+        :return: (内存快照, 元数据)，数据未变化（HTTP 304）时返回 None
+        """
+        async with client.stream("GET", self.url, headers=headers, timeout=get_timeout(self.name)) as resp:
+            if resp.status_code == 200:
+                return await self._receive(resp)
+            if resp.status_code == 304:
+                return None
+            await resp.aread()
+            if resp.status_code >= 500:
+                # 水鱼自身故障，计入熔断并按重试策略重试
+                raise httpx.NetworkError(f"status_code: {resp.status_code}; content: {resp.text}")
+            # 4xx 等不是上游故障，不计入熔断也不重试，由 update 记录后返回失败
+            raise httpx.HTTPStatusError(f"status_code: {resp.status_code}; content: {resp.text}",
+                                        request=resp.request, response=resp)
+
+    async def _receive(self, resp: httpx.Response) -> tuple[T, dict]:
+        """
+        一次遍历响应体：写入临时文件并计算 sha256，同时增量解析并构建内存快照
+
+        每个数据块的解析与构建以及最后的 finish 都在线程中执行，不会阻塞事件循环。
+        解析出错或连接中断时临时文件会被删除，本地数据保持不变。
+        """
+        builder = self.builder()
+        decoder = JsonStreamDecoder(builder.depth)
+        parse_time = 0.0
+
+        def consume(chunk: bytes | None) -> float:
+            start = time.perf_counter()
+            for path, value in decoder.feed(chunk) if chunk is not None else decoder.close():
+                builder.add(path, value)
+            return time.perf_counter() - start
+
+        async def chunks():
+            nonlocal parse_time
+            async for chunk in resp.aiter_bytes():
+                parse_time += await asyncio.to_thread(consume, chunk)
+                yield chunk
+            parse_time += await asyncio.to_thread(consume, None)
+
+        meta = await write_dataset_stream(self.data_path, self.ext_path, chunks(), {
+            "etag": resp.headers.get("etag"),
+            "last_modified": resp.headers.get("last-modified"),
+        })
+        JSON_PARSE_DURATION.labels(self.name).observe(parse_time)
+        return await asyncio.to_thread(builder.finish, meta), meta
@@ -0,0 +1,250 @@
+import asyncio
+import time
+
+from loguru import logger
+
+from app.models.divingfish import Player, ChartRecord
+from app.utils.metrics.prometheus import CallbackMetric
+from app.utils.structures.skiplist import RankedSet
+from cfg.config import LeaderboardChartRankings, LeaderboardEnabled
+
+
+class Leaderboard:
+    """
+    玩家 rating 排行榜与单谱面达成率排行
+
+    以 RankedSet（带跨度的跳表）按分数降序维护，名次、百分位与区间查询均为 O(log n)。
+    每次从水鱼获取到玩家的 B50 时增量更新；数据库是持久化来源，进程启动后从数据库重建。
+    名次采用并列排名：分数相同的玩家名次相同，下一名次跳过并列的人数。
+    """
+
+    def __init__(self, chart_rankings: bool = True):
+        self.chart_rankings = chart_rankings
+        self.players = RankedSet()
+        self.nicknames: dict[str, str] = {}
+        # QQ 号 -> 水鱼用户名
+        self.qq: dict[str, str] = {}
+        # (歌曲id, 难度序号) -> 该谱面各玩家的达成率
+        self.charts: dict[tuple[int, int], RankedSet] = {}
+        self.loaded = False
+        self.updates = 0
+
+    def stats(self) -> dict:
+        return {
+            "players": len(self.players),
+            "charts": len(self.charts),
+            "chart_entries": sum(len(ranking) for ranking in self.charts.values()),
+            "updates": self.updates,
+            "loaded": self.loaded,
+        }
+
+    def _set_chart(self, username: str, song_id: int, level_index: int, achievements: float) -> None:
+        key = (song_id, level_index)
+        ranking = self.charts.get(key)
+        if ranking is None:
+            ranking = self.charts[key] = RankedSet()
+        ranking.add(username, achievements)
+
+    def update(self, result: dict, qq: str | None = None) -> None:
+        """
+        用一次 B50 查询结果更新排行
+
+        只更新本次结果中出现的谱面，不在 B50 中的历史成绩保持不变。
+
+        :param result: query_player_scores_simple 成功时返回的数据
+        :param qq: 通过 QQ 号查询时的 QQ 号
+        """
+        username = result.get("username")
+        if not username:
+            return
+        self.players.add(username, result.get("rating", 0))
+        self.nicknames[username] = result.get("nickname") or ""
+        if qq is not None:
+            self.qq[qq] = username
+        if self.chart_rankings:
+            charts = result.get("charts", {})
+            for record in charts.get("sd", []) + charts.get("dx", []):
+                self._set_chart(username, int(record["song_id"]), int(record["level_index"]),
+                                float(record["achievements"]))
+        self.updates += 1
+
+    def _resolve(self, username: str, is_qq: bool) -> str | None:
+        return self.qq.get(username) if is_qq else username
+
+    @staticmethod
+    def _page(ranking: RankedSet, offset: int, limit: int, entry) -> list[dict]:
+        """
+        按位置取一页，并把位置换算为并列名次
+        """
+        items = ranking.range(offset, offset + limit)
+        page = []
+        rank = 0
+        previous = None
+        for i, (member, score) in enumerate(items):
+            if i == 0:
+                rank = ranking.count_above(score) + 1
+            elif score != previous:
+                rank = offset + i + 1
+            previous = score
+            page.append({"rank": rank, **entry(member, score)})
+        return page
+
+    def _player_entry(self, username: str, rating: int) -> dict:
+        return {"username": username, "nickname": self.nicknames.get(username, ""), "rating": rating}
+
+    def top(self, offset: int = 0, limit: int = 20) -> dict:
+        """
+        rating 排行中位置在 [offset, offset + limit) 的玩家
+        """
+        return {"total": len(self.players), "data": self._page(self.players, offset, limit, self._player_entry)}
+
+    @staticmethod
+    def _position(ranking: RankedSet, member: str) -> dict | None:
+        score = ranking.score(member)
+        if score is None:
+            return None
+        total = len(ranking)
+        return {
+            "rank": ranking.count_above(score) + 1,
+            "total": total,
+            # 分数严格低于该玩家的比例
+            "percentile": round(100 * (total - ranking.count_at_least(score)) / total, 2),
+            "score": score,
+        }
+
+    def rank(self, username: str, is_qq: bool = False, radius: int = 0) -> dict | None:
+        """
+        玩家在 rating 排行中的名次与百分位
+
+        :param radius: 同时返回前后各 radius 名玩家
+        :return: 玩家不在排行中时返回 None
+        """
+        username = self._resolve(username, is_qq)
+        if username is None:
+            return None
+        position = self._position(self.players, username)
+        if position is None:
+            return None
+        rating = position.pop("score")
+        result = {**self._player_entry(username, rating), **position}
+        if radius > 0:
+            index = self.players.rank(username)
+            offset = max(0, index - radius)
+            result["neighbors"] = self._page(self.players, offset, index + radius + 1 - offset, self._player_entry)
+        return result
+
+    def chart_top(self, song_id: int, level_index: int, offset: int = 0, limit: int = 20) -> dict:
+        """
+        单个谱面达成率排行中位置在 [offset, offset + limit) 的玩家
+        """
+        ranking = self.charts.get((song_id, level_index))
+        if ranking is None:
+            return {"total": 0, "data": []}
+        return {"total": len(ranking), "data": self._page(
+            ranking, offset, limit,
+            lambda member, score: {"username": member, "nickname": self.nicknames.get(member, ""),
+                                   "achievements": score})}
+
+    def chart_rank(self, song_id: int, level_index: int, username: str, is_qq: bool = False) -> dict | None:
+        """
+        玩家在单个谱面达成率排行中的名次与百分位
+
+        :return: 玩家没有该谱面的成绩时返回 None
+        """
+        username = self._resolve(username, is_qq)
+        ranking = self.charts.get((song_id, level_index))
+        if username is None or ranking is None:
+            return None
+        position = self._position(ranking, username)
+        if position is None:
+            return None
+        return {"username": username, "nickname": self.nicknames.get(username, ""),
+                "achievements": position.pop("score"), **position}
+
+    async def load_from_store(self, page_size: int = 5000) -> None:
+        """
+        从数据库重建排行，按 id 分页读取，每页之间让出事件循环
+
+        重建期间到达的增量更新不会被数据库中的旧数据覆盖。
+        """
+        start = time.perf_counter()
+        usernames: dict[int, str] = {}
+        last_id = 0
+        while True:
+            rows = await Player.filter(id__gt=last_id).order_by("id").limit(page_size) \
+                .values_list("id", "username", "qq", "nickname", "rating")
+            if not rows:
+                break
+            for player_id, username, qq, nickname, rating in rows:
+                usernames[player_id] = username
+                if username in self.players:
+                    continue
+                self.players.add(username, rating)
+                self.nicknames[username] = nickname
+                if qq:
+                    self.qq.setdefault(qq, username)
+            last_id = rows[-1][0]
+            await asyncio.sleep(0)
+
+        if self.chart_rankings:
+            last_id = 0
+            while True:
+                rows = await ChartRecord.filter(id__gt=last_id).order_by("id").limit(page_size) \
+                    .values_list("id", "player_id", "song_id", "level_index", "achievements")
+                if not rows:
+                    break
+                for _, player_id, song_id, level_index, achievements in rows:
+                    username = usernames.get(player_id)
+                    if username is None:
+                        continue
+                    ranking = self.charts.get((song_id, level_index))
+                    if ranking is None or username not in ranking:
+                        self._set_chart(username, song_id, level_index, achievements)
+                last_id = rows[-1][0]
+                await asyncio.sleep(0)
+        self.loaded = True
+        logger.info(f"从数据库重建排行榜完成，耗时 {time.perf_counter() - start:.2f}s: {self.stats()}")
+
+
+leaderboard = Leaderboard(LeaderboardChartRankings)
+
+_load_task: asyncio.Task | None = None
+
+
+def update_leaderboard(username: str, is_qq: bool, result: dict) -> None:
+    """
+    用刚从水鱼获取的 B50 更新排行榜；未启用排行榜时什么都不做
+    """
+    if LeaderboardEnabled:
+        leaderboard.update(result, username if is_qq else None)
+
+
+def start_leaderboard_loader() -> None:
+    """
+    在后台从数据库重建排行榜，应在 lifespan 中数据库初始化之后调用
+    """
+    global _load_task
+
+    async def run():
+        try:
+            await leaderboard.load_from_store()
+        except Exception as e:
+            logger.error(f"从数据库重建排行榜失败: {e!r}")
+
+    if _load_task is None:
+        _load_task = asyncio.create_task(run(), name="leaderboard:load")
+
+
+async def stop_leaderboard_loader() -> None:
+    global _load_task
+    if _load_task is not None:
+        _load_task.cancel()
+        try:
+            await _load_task
+        except asyncio.CancelledError:
+            pass
+        _load_task = None
+
+
+CallbackMetric("maitp_leaderboard_players", "排行榜中的玩家数", "gauge", [],
+               lambda: [((), len(leaderboard.players))])
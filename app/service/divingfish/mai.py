@@ -1,218 +1,350 @@
-import time
-
 from loguru import logger
 
 from app.utils.os.path import mkdir_ignore_exists
 
-try:
-    import ujson as json
-except ImportError:
-    import json
-
 import httpx
-from cfg.config import DivingFishBaseUrl, DivingFishCoverUrl
-from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
+from cfg.config import DivingFishBaseUrl, DivingFishCoverUrl, PlayerScoreCacheTtl, PlayerScoreCacheMaxBytes, \
+    PlayerScoreCacheStaleWhileRevalidate, PlayerScoreCacheStaleTtl
 from app.enums.divingfish.gametype import GameDataType
-import os
-import aiofile
+from app.service.divingfish.catalog import ensure_music_catalog, music_data_dataset
+from app.service.divingfish.chart_stats import ensure_chart_stats_store, chart_stats_dataset, EMPTY_CHART_STATS, \
+    EMPTY_DIFF_STATS
+from app.service.divingfish.client import get_client, get_timeout
+from app.service.divingfish.leaderboard import update_leaderboard
+from app.service.divingfish.player_store import store_available, get_player_best, schedule_sync
+from app.service.divingfish.score_feed import schedule_observe
+from app.service.divingfish.upstream import upstream_call, UPSTREAM_ERRORS
+from app.utils.http.precompressed import EncodedBody
+from app.utils.http.resilience import CircuitOpenError
+from app.utils.cache.async_cache import AsyncTTLCache
+from app.utils.metrics.instruments import register_cache
+from app.utils.os.storage import atomic_write_stream
 
 mkdir_ignore_exists("data/divingfish")
 mkdir_ignore_exists("data/divingfish/cover")
 
 DIVING_FISH_MAI_ENDPOINT = f"{DivingFishBaseUrl}/{GameDataType.MAIMAI.value}"
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_fixed(1),
-    retry=retry_if_exception_type(httpx.NetworkError) | retry_if_exception_type(httpx.TimeoutException)
+player_score_cache = AsyncTTLCache(
+    ttl=PlayerScoreCacheTtl,
+    max_bytes=PlayerScoreCacheMaxBytes,
+    stale_while_revalidate=PlayerScoreCacheStaleWhileRevalidate,
+    stale_ttl=PlayerScoreCacheStaleTtl,
 )
-async def update_all_music_info(force: bool = False) -> tuple[bool, bool]:
+register_cache("player_scores", player_score_cache.stats)
+
+async def update_all_music_info(force: bool = False, client: httpx.AsyncClient | None = None) -> tuple[bool, bool]:
     """
     从Diving Fish MaiMai API获取并更新本地音乐信息数据。
 
     该函数使用ETag机制检查音乐数据是否有更新，避免不必要的下载。
-    如果本地缓存是最新的（HTTP 304），则继续使用缓存数据；否则获取最新数据并更新本地文件，并记录日志。
+    如果本地缓存是最新的（HTTP 304），则继续使用缓存数据；否则获取最新数据并更新本地文件及二进制快照。
     可以通过force参数强制更新。
 
     :param force: bool, optional
         若为True，则即使本地缓存有效也强制更新。默认False。
+    :param client: httpx.AsyncClient, optional
+        发起请求使用的客户端，默认使用应用级共享客户端。
     :return: tuple[bool, bool]
         - 第一个元素为True表示操作成功，False表示失败。
         - 第二个元素为True表示使用了缓存数据（HTTP 304），False表示拉取了新数据。
-    :raises httpx.NetworkError: 网络请求异常。
-    :raises httpx.TimeoutException: 请求超时。
+    :raises httpx.TransportError: 网络请求异常或超时（已按重试策略重试）。
+    :raises CircuitOpenError: 水鱼熔断中，未发出请求。
     """
-    try:
-        headers = {}
+    return await music_data_dataset.update(force, client)
 
-        # 关于etag
-        # https://github.com/Diving-Fish/maimaidx-prober/blob/main/database/zh-api-document.md#314-%E8%8E%B7%E5%8F%96-maimai-%E7%9A%84%E6%AD%8C%E6%9B%B2%E6%95%B0%E6%8D%AE
-        if not force and os.path.exists("data/divingfish/music_data_ext.json"):
-            async with aiofile.async_open("data/divingfish/music_data_ext.json", "r", encoding="utf-8") as f:
-                headers["If-None-Match"] = json.loads(await f.read())["etag"]
 
-        client = httpx.AsyncClient()
+async def update_all_chart_stats(force: bool = False, client: httpx.AsyncClient | None = None) -> bool:
+    """
+    从Diving Fish MaiMai API获取并更新所有铺面的拟合难度等信息。
 
-        resp = await client.get(
-            f"{DIVING_FISH_MAI_ENDPOINT}/music_data",
-            headers=headers
-        )
+    使用上次响应的 ETag/Last-Modified 发起条件请求，数据未变化（HTTP 304）时继续使用本地缓存。
 
-        if resp.status_code == 200:
-            async with aiofile.async_open("data/divingfish/music_data.json", "w", encoding="utf-8") as fp:
-                await fp.write(json.dumps(resp.json()))
-            async with aiofile.async_open("data/divingfish/music_data_ext.json", "w", encoding="utf-8") as fp:
-                await fp.write(json.dumps({
-                    "request_at": time.time(),
-                    "etag": resp.headers["etag"],
-                }))
-            return True, False
-        elif resp.status_code == 304:
-            return True, True
-        else:
-            raise httpx.NetworkError(f"status_code: {resp.status_code}; content: {resp.text}")
-    except httpx.NetworkError or httpx.TimeoutException as e:
-        raise e
-    except Exception as e:
-        logger.exception(e)
-        return False, False
+    :param force: 若为True，则即使本地缓存有效也强制更新
+    :param client: 发起请求使用的客户端，默认使用应用级共享客户端
+    :return: 是否成功
+    """
+    success, _ = await chart_stats_dataset.update(force, client)
+    return success
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_fixed(1),
-    retry=retry_if_exception_type(httpx.NetworkError) | retry_if_exception_type(httpx.TimeoutException)
-)
-async def update_all_chart_stats() -> bool:
+async def query_music_info(music_id: int) -> dict:
     """
-    从Diving Fish MaiMai API获取并更新所有铺面的拟合难度等信息。
+    从内存中的歌曲目录获取铺面的信息，首次调用时从本地已缓存的水鱼歌曲文件加载
+    :param music_id:
+    :return:
+    """
+    catalog = await ensure_music_catalog()
+    if catalog is None:
+        return {}
+    return catalog.get(music_id) or {}
 
-    :return: 是否成功
+
+async def query_music_info_encoded(music_id: int) -> EncodedBody | None:
     """
-    try:
-        client = httpx.AsyncClient()
+    获取 /get_music_info 预先序列化并压缩好的响应体，歌曲不存在时返回 None
+    :param music_id:
+    :return:
+    """
+    catalog = await ensure_music_catalog()
+    if catalog is None:
+        return None
+    return catalog.get_encoded(music_id)
 
-        resp = await client.get(
-            f"{DIVING_FISH_MAI_ENDPOINT}/chart_stats"
-        )
 
-        if resp.status_code == 200:
-            async with aiofile.async_open("data/divingfish/chart_stats.json", "w", encoding="utf-8") as fp:
-                await fp.write(json.dumps(resp.json()))
-            async with aiofile.async_open("data/divingfish/chart_stats_ext.json", "w", encoding="utf-8") as fp:
-                await fp.write(json.dumps({
-                    "request_at": time.time(),
-                }))
-            return True
-        else:
-            raise httpx.NetworkError(f"status_code: {resp.status_code}; content: {resp.text}")
-    except httpx.NetworkError or httpx.TimeoutException as e:
-        raise e
-    except Exception as e:
-        logger.exception(e)
-        return False
+async def query_music_data_dump() -> EncodedBody | None:
+    """
+    获取完整歌曲目录的预压缩响应体，本地尚无歌曲数据时返回 None
+    :return:
+    """
+    catalog = await ensure_music_catalog()
+    if catalog is None:
+        return None
+    return await catalog.get_dump()
 
-async def query_music_info(music_id: int) -> dict:
+
+async def query_chart_stats(music_id: int) -> dict | list:
     """
-    从本地已缓存的水鱼歌曲文件，获取铺面的信息
+    从内存中的铺面统计快照获取铺面额外信息，首次调用时从本地已缓存的水鱼文件加载
     :param music_id:
     :return:
     """
-    async with aiofile.async_open("data/divingfish/music_data.json", "r", encoding="utf-8") as f:
-        music_data = json.loads(await f.read())
-        for music in music_data:
-            if music["id"] == str(music_id):
-                return music
+    store = await ensure_chart_stats_store()
+    if store is None:
         return {}
+    return store.charts.get(str(music_id), {})
+
+
+async def query_music_info_batch(music_ids: list[int], cids: list[int]) -> dict:
+    """
+    批量获取歌曲信息
+
+    :param music_ids: 歌曲id列表
+    :param cids: 谱面cid列表，会被映射为对应歌曲
+    :return: {"data": {歌曲id: 歌曲信息}, "cids": {cid: {"music_id", "level_index"}}, "not_found": {...}}
+    """
+    catalog = await ensure_music_catalog()
+    data, cid_map = {}, {}
+    not_found = {"music_ids": [], "cids": []}
+    for music_id in music_ids:
+        music = catalog.get(music_id) if catalog is not None else None
+        if music is None:
+            not_found["music_ids"].append(music_id)
+        else:
+            data[music["id"]] = music
+    for cid in cids:
+        hit = catalog.get_by_cid(cid) if catalog is not None else None
+        if hit is None:
+            not_found["cids"].append(cid)
+        else:
+            music, level_index = hit
+            data[music["id"]] = music
+            cid_map[str(cid)] = {"music_id": music["id"], "level_index": level_index}
+    return {"data": data, "cids": cid_map, "not_found": not_found}
+
+
+async def query_chart_stats_batch(music_ids: list[int], cids: list[int]) -> dict:
+    """
+    批量获取铺面统计信息
+
+    :param music_ids: 歌曲id列表，返回该歌曲所有难度的统计
+    :param cids: 谱面cid列表，返回对应难度的统计
+    :return: {"data": {歌曲id: 各难度统计}, "cids": {cid: 单个难度统计}, "not_found": {...}}
+    """
+    store = await ensure_chart_stats_store()
+    catalog = await ensure_music_catalog()
+    charts = store.charts if store is not None else {}
+    data, cid_data = {}, {}
+    not_found = {"music_ids": [], "cids": []}
+    for music_id in music_ids:
+        stats = charts.get(str(music_id))
+        if stats is None:
+            not_found["music_ids"].append(music_id)
+        else:
+            data[str(music_id)] = stats
+    for cid in cids:
+        hit = catalog.by_cid.get(cid) if catalog is not None else None
+        stats = charts.get(hit[0]) if hit is not None else None
+        if stats is None or hit[1] >= len(stats):
+            not_found["cids"].append(cid)
+        else:
+            cid_data[str(cid)] = stats[hit[1]]
+    return {"data": data, "cids": cid_data, "not_found": not_found}
 
 
-async def query_chart_stats(music_id: int) -> dict:
+async def query_chart_stats_encoded(music_id: int) -> EncodedBody:
     """
-    从本地已缓存的水鱼铺面额外信息
+    获取 /get_chart_stats 预先序列化并压缩好的响应体
     :param music_id:
     :return:
     """
-    async with aiofile.async_open("data/divingfish/chart_stats.json", "r", encoding="utf-8") as f:
-        chart_stats = json.loads(await f.read())
-        try:
-            return chart_stats["charts"][str(music_id)]
-        except KeyError:
-            return {}
+    store = await ensure_chart_stats_store()
+    if store is None:
+        return EMPTY_CHART_STATS
+    return store.get_chart_encoded(music_id)
+
 
 async def query_diff_stats() -> dict:
     """
-    从本地已缓存的水鱼铺面额外信息
-    :param music_id:
+    从内存中的铺面统计快照获取各难度统计信息
     :return:
     """
-    async with aiofile.async_open("data/divingfish/chart_stats.json", "r", encoding="utf-8") as f:
-        chart_stats = json.loads(await f.read())
-        try:
-            return chart_stats["diff_data"]
-        except KeyError:
-            return {}
-
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_fixed(1),
-    retry=retry_if_exception_type(httpx.NetworkError) | retry_if_exception_type(httpx.TimeoutException)
-)
-async def query_player_scores_simple(username: str, is_qq: bool, b50: bool = True) -> tuple[bool, dict]:
+    store = await ensure_chart_stats_store()
+    if store is None:
+        return {}
+    return store.diff_data
+
+
+async def query_diff_stats_encoded() -> EncodedBody:
+    """
+    获取 /get_diff_stats 预先序列化并压缩好的响应体
+    :return:
+    """
+    store = await ensure_chart_stats_store()
+    if store is None:
+        return EMPTY_DIFF_STATS
+    return store.get_diff_encoded()
+
+def player_query_result(resp: httpx.Response) -> tuple[bool, dict]:
+    """
+    解析水鱼玩家查询接口（各游戏格式相同）的响应
+
+    :raises httpx.NetworkError: 水鱼返回 5xx，计入熔断并按重试策略重试
+    """
+    match resp.status_code:
+        case 200:
+            return True, resp.json()
+        case 400:
+            return False, resp.json()
+        case 403:
+            return False, resp.json()
+        case code if code >= 500:
+            # 水鱼自身故障，计入熔断并按重试策略重试
+            raise httpx.NetworkError(f"status_code: {resp.status_code}; content: {resp.text}")
+        case _:
+            return False, {
+                "status_code": resp.status_code,
+                "content": resp.text
+            }
+
+
+@upstream_call("query_player")
+async def query_player_scores_simple(username: str, is_qq: bool, b50: bool = True,
+                                     client: httpx.AsyncClient | None = None) -> tuple[bool, dict]:
     """
     从水鱼获取用户的b50或者b40
 
     :param username:
     :param is_qq:
     :param b50:
+    :param client: 发起请求使用的客户端，默认使用应用级共享客户端
     :return:
     """
     try:
-        client = httpx.AsyncClient()
+        client = client or get_client()
         data = {
             "username" if not is_qq else "qq": username,
             "b50": "1" if b50 else "0"
         }
-        resp = await client.post(f"{DIVING_FISH_MAI_ENDPOINT}/query/player", json=data)
-        match resp.status_code:
-            case 200:
-                return True, resp.json()
-            case 400:
-                return False, resp.json()
-            case 403:
-                return False, resp.json()
-            case _:
-                return False, {
-                    "status_code": resp.status_code,
-                    "content": resp.text
-                }
-    except httpx.NetworkError or httpx.TimeoutException as e:
+        resp = await client.post(f"{DIVING_FISH_MAI_ENDPOINT}/query/player", json=data,
+                                 timeout=get_timeout("query_player"))
+        return player_query_result(resp)
+    except UPSTREAM_ERRORS as e:
         raise e
     except Exception as e:
         logger.exception(e)
         return False, {"error": str(e)}
 
 
-@retry(
-    stop=stop_after_attempt(3),
-    wait=wait_fixed(1),
-    retry=retry_if_exception_type(httpx.NetworkError) | retry_if_exception_type(httpx.TimeoutException)
-)
-async def download_music_cover(songs_id: int) -> tuple[bool, dict]:
+async def query_player_scores_cached(username: str, is_qq: bool, b50: bool = True) -> tuple[bool, dict]:
+    """
+    带缓存的 query_player_scores_simple
+
+    相同 (用户, b50) 的结果在 TTL 内直接复用，并发的相同查询只会向水鱼发起一次请求。
+    只缓存查询成功的结果。
+    启用数据库时，B50 查询会优先使用 PlayerStoreMaxAge 内同步过的数据库记录，从水鱼获取的结果在后台写入数据库。
+    水鱼不可用（熔断或请求失败）时，返回缓存或数据库中已过期的旧结果。
+
+    :param username:
+    :param is_qq:
+    :param b50:
+    :return:
+    """
+    key = ("qq" if is_qq else "username", username, b50)
+    try:
+        return await player_score_cache.get_or_load(
+            key,
+            lambda: _load_player_scores(username, is_qq, b50),
+            should_cache=lambda result: result[0],
+        )
+    except (CircuitOpenError, *UPSTREAM_ERRORS) as e:
+        stale = player_score_cache.peek(key)
+        if stale is None and b50:
+            stored = await _get_stored_best(username, is_qq, max_age=None)
+            stale = (True, stored) if stored is not None else None
+        if stale is None:
+            raise
+        logger.warning(f"水鱼不可用，返回 {username} 的过期成绩缓存: {e!r}")
+        return stale
+
+
+async def _get_stored_best(username: str, is_qq: bool, **kwargs) -> dict | None:
+    """
+    从数据库读取玩家的 B50；数据库未启用或读取失败时返回 None，由调用方改为请求水鱼
+    """
+    if not store_available():
+        return None
+    try:
+        return await get_player_best(username, is_qq, **kwargs)
+    except Exception as e:
+        logger.error(f"从数据库读取 {username} 的成绩失败: {e!r}")
+        return None
+
+
+async def _load_player_scores(username: str, is_qq: bool, b50: bool) -> tuple[bool, dict]:
+    """
+    query_player_scores_cached 的加载函数：B50 先查数据库，否则请求水鱼并在后台同步到数据库
+
+    B40 的单曲 rating 按旧版系数计算，与 B50 记录不兼容，因此只同步和读取 B50。
+    """
+    if b50:
+        stored = await _get_stored_best(username, is_qq)
+        if stored is not None:
+            return True, stored
+    success, result = await query_player_scores_simple(username, is_qq, b50)
+    if success and b50:
+        # 先于数据库同步调度，才能读到同步之前的成绩
+        schedule_observe(username, is_qq, result)
+        schedule_sync(username, is_qq, result)
+        update_leaderboard(username, is_qq, result)
+    return success, result
+
+
+@upstream_call("cover")
+async def download_music_cover(songs_id: int, client: httpx.AsyncClient | None = None) -> tuple[bool, dict]:
     """
     从水鱼下载歌曲封面到 data/divingfish/cover/{songs_id}.png
 
+    响应体以流的方式写入临时文件后再原子替换，不会把整张图片缓冲在内存中。
+
     :param songs_id:
-    :return:
+    :param client: 发起请求使用的客户端，默认使用应用级共享客户端
+    :return: (是否成功, {"size": 写入字节数} 或错误信息)
     """
     try:
-        client = httpx.AsyncClient()
-        resp = await client.get(DivingFishCoverUrl.replace("{{cover_id}}", str(songs_id).zfill(5)))
-        if resp.status_code == 200:
-            async with aiofile.async_open(f"data/divingfish/cover/{songs_id}.png", "wb") as f:
-                await f.write(resp.content)
-            return True, {}
-        return False, {}
-    except httpx.NetworkError or httpx.TimeoutException as e:
+        client = client or get_client()
+        async with client.stream(
+                "GET",
+                DivingFishCoverUrl.replace("{{cover_id}}", str(songs_id).zfill(5)),
+                timeout=get_timeout("cover")
+        ) as resp:
+            if resp.status_code >= 500:
+                raise httpx.NetworkError(f"status_code: {resp.status_code}")
+            if resp.status_code != 200:
+                return False, {"status_code": resp.status_code}
+            size = await atomic_write_stream(f"data/divingfish/cover/{songs_id}.png", resp.aiter_bytes())
+            return True, {"size": size}
+    except UPSTREAM_ERRORS as e:
         raise e
     except Exception as e:
         logger.exception(e)
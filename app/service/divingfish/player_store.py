@@ -0,0 +1,267 @@
+import asyncio
+import weakref
+from datetime import datetime, timedelta, timezone
+
+from loguru import logger
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from app.models.divingfish import Player, ChartRecord, PlayerSnapshot
+from cfg.config import PlayerStoreMaxAge
+
+# 水鱼成绩字段 -> ChartRecord 字段
+_RECORD_FIELDS = {
+    "title": "title",
+    "type": "type",
+    "level": "level",
+    "level_label": "level_label",
+    "ds": "ds",
+    "achievements": "achievements",
+    "dxScore": "dx_score",
+    "fc": "fc",
+    "fs": "fs",
+    "rate": "rate",
+    "ra": "ra",
+}
+_UPDATE_FIELDS = list(_RECORD_FIELDS.values()) + ["is_new", "updated_at"]
+
+# 只在有协程持有或等待时保留，不会随见过的玩家数增长
+_player_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary()
+
+
+# 后台同步任务，保留引用直到完成，避免被垃圾回收
+_sync_tasks: set[asyncio.Task] = set()
+
+# 启动时检查到缺少数据表时为 False
+_tables_ready = True
+
+
+def _player_lock(username: str) -> asyncio.Lock:
+    lock = _player_locks.get(username)
+    if lock is None:
+        lock = _player_locks[username] = asyncio.Lock()
+    return lock
+
+
+def store_available() -> bool:
+    """
+    数据库是否可用：lifespan 中注册了 Tortoise，且启动时检查到数据表已创建
+    """
+    return Tortoise._inited and _tables_ready
+
+
+async def check_store() -> bool:
+    """
+    检查各数据表是否可以查询，应在 lifespan 中数据库初始化之后调用
+
+    表结构默认不在启动时创建，未运行 python serve.py --init-db 时数据库视为不可用，
+    成绩查询直接请求水鱼，排行榜不从数据库重建。
+
+    :return: 数据库是否可用
+    """
+    global _tables_ready
+    try:
+        for model in (Player, ChartRecord, PlayerSnapshot):
+            await model.all().limit(1).values_list("id")
+    except Exception as e:
+        logger.warning(f"数据库不可用，成绩将直接从水鱼获取（首次部署请运行 python serve.py --init-db）: {e!r}")
+        _tables_ready = False
+    else:
+        _tables_ready = True
+    return _tables_ready
+
+
+async def _find_player(username: str, is_qq: bool) -> Player | None:
+    if is_qq:
+        return await Player.get_or_none(qq=username)
+    return await Player.get_or_none(username=username)
+
+
+def _record_values(record: dict, is_new: bool) -> dict:
+    values = {field: record.get(key) for key, field in _RECORD_FIELDS.items() if record.get(key) is not None}
+    values["is_new"] = is_new
+    return values
+
+
+async def _sync_player(conn, username: str, is_qq: bool, result: dict) -> dict:
+    canonical = result.get("username") or username
+    async with _player_lock(canonical):
+        charts = result.get("charts", {})
+        incoming = {}
+        for is_new, records in ((False, charts.get("sd", [])), (True, charts.get("dx", []))):
+            for record in records:
+                incoming[(int(record["song_id"]), int(record["level_index"]))] = _record_values(record, is_new)
+
+        player = await Player.get_or_none(username=canonical, using_db=conn)
+        if player is None:
+            player = Player(username=canonical)
+        rating_changed = player.rating != result.get("rating", 0)
+        if is_qq:
+            player.qq = username
+        player.nickname = result.get("nickname") or ""
+        player.rating = result.get("rating", 0)
+        player.profile = {key: value for key, value in result.items() if key != "charts"}
+        player.synced_at = datetime.now(timezone.utc)
+        await player.save(using_db=conn)
+
+        existing = {
+            (row["song_id"], row["level_index"]): row
+            for row in await ChartRecord.filter(player_id=player.id).using_db(conn).values(
+                "song_id", "level_index", "is_new", *_RECORD_FIELDS.values())
+        }
+        changed = [
+            ChartRecord(player_id=player.id, song_id=song_id, level_index=level_index, **values)
+            for (song_id, level_index), values in incoming.items()
+            if (song_id, level_index) not in existing
+            or any(existing[song_id, level_index].get(field) != value for field, value in values.items())
+        ]
+        if changed:
+            await ChartRecord.bulk_create(
+                changed,
+                on_conflict=["player_id", "song_id", "level_index"],
+                update_fields=_UPDATE_FIELDS,
+                using_db=conn,
+            )
+        snapshot = bool(changed) or rating_changed
+        if snapshot:
+            await PlayerSnapshot.create(player_id=player.id, rating=player.rating, changed_records=len(changed),
+                                        using_db=conn)
+    return {"player_id": player.id, "changed": len(changed), "unchanged": len(incoming) - len(changed),
+            "snapshot": snapshot}
+
+
+async def sync_player_scores(username: str, is_qq: bool, result: dict) -> dict:
+    """
+    把水鱼 B50 查询结果增量写入数据库
+
+    只有新增或任一字段变化的谱面成绩才会写入，使用按 (player, song_id, level_index) 冲突更新的批量插入；
+    rating 变化或有成绩更新时记录一条快照。
+
+    :param username: 查询时使用的用户名或 QQ 号
+    :param is_qq: username 是否为 QQ 号
+    :param result: query_player_scores_simple 成功时返回的数据
+    :return: {"player_id", "changed", "unchanged", "snapshot"}
+    """
+    async with in_transaction() as conn:
+        return await _sync_player(conn, username, is_qq, result)
+
+
+async def sync_player_scores_batch(items: list[tuple[str, bool, dict]]) -> list[dict]:
+    """
+    在同一个事务中同步多个玩家的查询结果，用于批量刷新
+
+    :param items: [(username, is_qq, result), ...]
+    :return: 与 items 一一对应的同步结果
+    """
+    async with in_transaction() as conn:
+        return [await _sync_player(conn, username, is_qq, result) for username, is_qq, result in items]
+
+
+async def load_player_baseline(username: str) -> dict | None:
+    """
+    读取玩家在数据库中的 rating 与全部谱面成绩，用于计算成绩变化
+
+    与同步以相同的顺序持有事务与玩家锁（SQLite 的事务独占连接，顺序不同会互相等待），
+    在 schedule_sync 之前发起时，读到的一定是本次同步之前的数据。
+
+    :param username: 水鱼返回的用户名
+    :return: {"rating", "records": {(song_id, level_index): (achievements, dxScore, fc, fs, ra)}}，玩家不存在时返回 None
+    """
+    async with in_transaction() as conn, _player_lock(username):
+        player = await Player.get_or_none(username=username, using_db=conn)
+        if player is None:
+            return None
+        rows = await ChartRecord.filter(player_id=player.id).using_db(conn).values_list(
+            "song_id", "level_index", "achievements", "dx_score", "fc", "fs", "ra")
+    return {"rating": player.rating, "records": {(row[0], row[1]): tuple(row[2:]) for row in rows}}
+
+
+async def iter_stored_players(page_size: int = 500):
+    """
+    按 id 顺序分页遍历数据库中的所有玩家，产出 (username, False)
+    """
+    last_id = 0
+    while True:
+        rows = await Player.filter(id__gt=last_id).order_by("id").limit(page_size).values_list("id", "username")
+        if not rows:
+            return
+        for player_id, username in rows:
+            yield username, False
+        last_id = rows[-1][0]
+
+
+def schedule_sync(username: str, is_qq: bool, result: dict) -> None:
+    """
+    在后台同步查询结果，不阻塞当前请求；数据库未初始化时什么都不做
+    """
+    if not store_available():
+        return
+
+    async def run():
+        try:
+            await sync_player_scores(username, is_qq, result)
+        except Exception as e:
+            logger.error(f"同步 {username} 的成绩到数据库失败: {e!r}")
+
+    task = asyncio.create_task(run())
+    _sync_tasks.add(task)
+    task.add_done_callback(_sync_tasks.discard)
+
+
+def _record_to_dict(record: dict) -> dict:
+    data = {key: record[field] for key, field in _RECORD_FIELDS.items()}
+    data["song_id"] = record["song_id"]
+    data["level_index"] = record["level_index"]
+    return data
+
+
+async def get_player_best(username: str, is_qq: bool, max_age: float | None = PlayerStoreMaxAge) -> dict | None:
+    """
+    从数据库还原与水鱼 B50 查询相同格式的结果
+
+    :param max_age: 同步时间超过该秒数时返回 None，为 None 时不限制
+    :return: 玩家不存在或数据过旧时返回 None
+    """
+    player = await _find_player(username, is_qq)
+    if player is None or player.synced_at is None:
+        return None
+    if max_age is not None and datetime.now(timezone.utc) - player.synced_at > timedelta(seconds=max_age):
+        return None
+    charts = {}
+    for key, is_new, limit in (("sd", False, 35), ("dx", True, 15)):
+        rows = await ChartRecord.filter(player_id=player.id, is_new=is_new) \
+            .order_by("-ra", "-achievements").limit(limit).values("song_id", "level_index", *_RECORD_FIELDS.values())
+        charts[key] = [_record_to_dict(row) for row in rows]
+    return {**player.profile, "charts": charts}
+
+
+async def get_rating_history(username: str, is_qq: bool, limit: int = 100) -> list[dict] | None:
+    """
+    获取玩家的 rating 历史，按时间从新到旧
+
+    :return: 玩家不存在时返回 None
+    """
+    player = await _find_player(username, is_qq)
+    if player is None:
+        return None
+    rows = await PlayerSnapshot.filter(player_id=player.id).order_by("-created_at").limit(limit) \
+        .values("rating", "changed_records", "created_at")
+    return [{**row, "created_at": row["created_at"].isoformat()} for row in rows]
+
+
+async def get_chart_records(username: str, is_qq: bool, song_id: int | None = None) -> list[dict] | None:
+    """
+    获取玩家在数据库中记录过的全部谱面最佳成绩，可按歌曲过滤
+
+    :return: 玩家不存在时返回 None
+    """
+    player = await _find_player(username, is_qq)
+    if player is None:
+        return None
+    query = ChartRecord.filter(player_id=player.id)
+    if song_id is not None:
+        query = query.filter(song_id=song_id)
+    rows = await query.order_by("-ra").values("song_id", "level_index", "is_new", "updated_at",
+                                               *_RECORD_FIELDS.values())
+    return [{**_record_to_dict(row), "is_new": row["is_new"], "updated_at": row["updated_at"].isoformat()}
+            for row in rows]
@@ -0,0 +1,173 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from app.service.divingfish import probe_upstream
+from app.service.divingfish.catalog import MusicCatalog, music_data_dataset
+from app.service.divingfish.chuni import chunithm_music_dataset
+from app.service.divingfish.chart_stats import ensure_chart_stats_store
+from app.service.divingfish.cover import cover_cache
+from app.service.divingfish.dataset import GameDataset
+from app.service.divingfish.mai import update_all_chart_stats
+from app.service.divingfish.search import get_search_index
+from app.service.divingfish.upstream import upstream_health, upstream_priority
+from app.utils.metrics.instruments import REFRESH_DURATION
+from cfg.config import MusicDataRefreshInterval, ChartStatsRefreshInterval, DataRefreshJitter, \
+    UpstreamHealthCheckInterval, ChunithmEnabled, ChunithmMusicDataRefreshInterval, CoverPrefetchInterval
+
+
+class PeriodicRefresher:
+    """
+    按固定间隔（带随机抖动）在后台执行刷新任务
+
+    启动后立即执行一次，之后每隔 interval * (1 ± jitter) 秒执行一次，任务异常只记录日志不会终止循环。
+    """
+
+    def __init__(self, name: str, job: Callable[[], Awaitable[None]], interval: float, jitter: float = 0.1):
+        self.name = name
+        self.job = job
+        self.interval = interval
+        self.jitter = jitter
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"refresher:{self.name}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def next_delay(self) -> float:
+        return max(0.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def _run(self) -> None:
+        # 只作用于本任务，用户请求的水鱼调用优先于后台刷新
+        upstream_priority.set("refresh")
+        while True:
+            start = time.perf_counter()
+            try:
+                await self.job()
+                REFRESH_DURATION.labels(self.name, "success").observe(time.perf_counter() - start)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                REFRESH_DURATION.labels(self.name, "error").observe(time.perf_counter() - start)
+                logger.error(f"后台刷新 {self.name} 失败: {e!r}")
+            await asyncio.sleep(self.next_delay())
+
+
+async def warm_catalog(dataset: GameDataset[MusicCatalog]) -> None:
+    """
+    预先构建当前歌曲目录的搜索索引与完整目录的压缩响应
+    """
+    catalog = dataset.get()
+    if catalog is not None:
+        get_search_index(catalog)
+        await catalog.get_dump(dataset.data_path, dataset.ext_path)
+
+
+async def refresh_catalog(dataset: GameDataset[MusicCatalog]) -> None:
+    """
+    刷新一个游戏的歌曲数据；命中 ETag 缓存时从本地文件加载到内存，并预先构建搜索索引与完整目录的压缩响应
+    """
+    await dataset.ensure()
+    success, use_cache = await dataset.update()
+    await warm_catalog(dataset)
+    logger.info(f"后台刷新 {dataset.name} 完成: success={success}, use_cache={use_cache}")
+
+
+async def refresh_music_data() -> None:
+    """
+    刷新舞萌歌曲数据
+    """
+    await refresh_catalog(music_data_dataset)
+
+
+async def refresh_chunithm_music_data() -> None:
+    """
+    刷新中二节奏歌曲数据
+    """
+    await refresh_catalog(chunithm_music_dataset)
+
+
+async def refresh_chart_stats() -> None:
+    """
+    刷新铺面统计数据；未变化时从本地文件加载到内存
+    """
+    await ensure_chart_stats_store()
+    success = await update_all_chart_stats()
+    logger.info(f"后台刷新铺面统计完成: success={success}")
+
+
+async def prefetch_covers() -> None:
+    """
+    下载歌曲目录中所有本地缺失的封面
+    """
+    await cover_cache.prefetch_all()
+
+
+async def refresh_upstream_health() -> None:
+    """
+    探测水鱼是否存活，结果供 /health 直接读取
+    """
+    if not await probe_upstream():
+        logger.warning(f"水鱼健康检查失败: {upstream_health.message}")
+
+
+_refreshers: list[PeriodicRefresher] = []
+_health_probe: PeriodicRefresher | None = None
+
+
+def start_health_probe() -> None:
+    """
+    启动水鱼健康检查；健康状态保存在进程内，多 worker 部署时每个 worker 都需要启动
+    """
+    global _health_probe
+    if _health_probe is None:
+        _health_probe = PeriodicRefresher("upstream_health", refresh_upstream_health, UpstreamHealthCheckInterval,
+                                          DataRefreshJitter)
+        _health_probe.start()
+
+
+async def stop_health_probe() -> None:
+    global _health_probe
+    if _health_probe is not None:
+        await _health_probe.stop()
+        _health_probe = None
+
+
+def start_refreshers() -> None:
+    """
+    启动下载数据与预取封面的后台刷新任务，多 worker 部署时只由 leader 启动
+    """
+    if _refreshers:
+        return
+    _refreshers.extend([
+        PeriodicRefresher("music_data", refresh_music_data, MusicDataRefreshInterval, DataRefreshJitter),
+        PeriodicRefresher("chart_stats", refresh_chart_stats, ChartStatsRefreshInterval, DataRefreshJitter),
+    ])
+    if ChunithmEnabled:
+        _refreshers.append(PeriodicRefresher("chunithm_music_data", refresh_chunithm_music_data,
+                                             ChunithmMusicDataRefreshInterval, DataRefreshJitter))
+    if CoverPrefetchInterval > 0:
+        _refreshers.append(PeriodicRefresher("covers", prefetch_covers, CoverPrefetchInterval, DataRefreshJitter))
+    for refresher in _refreshers:
+        refresher.start()
+
+
+async def stop_refreshers() -> None:
+    """
+    停止 start_refreshers 启动的后台刷新任务
+    """
+    for refresher in _refreshers:
+        await refresher.stop()
+    _refreshers.clear()
@@ -0,0 +1,350 @@
+import asyncio
+import hashlib
+import hmac
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+import httpx
+from loguru import logger
+
+from app.service.divingfish.player_store import store_available, load_player_baseline
+from app.utils.metrics.instruments import SCORE_FEED_EVENTS, SCORE_FEED_DROPPED, SCORE_FEED_WEBHOOK_DELIVERIES
+from app.utils.metrics.prometheus import CallbackMetric
+from cfg.config import ScoreFeedEnabled, ScoreFeedMaxPlayers, ScoreFeedBacklog, ScoreFeedSubscriberQueueSize, \
+    ScoreFeedMaxSubscribers, ScoreFeedWebhookUrls, ScoreFeedWebhookInterval, ScoreFeedWebhookBatchSize, ScoreFeedWebhookTimeout, \
+    ScoreFeedWebhookSecret
+
+# 比较的成绩字段，与 load_player_baseline 返回的元组顺序一致
+_FIELDS = ("achievements", "dxScore", "fc", "fs", "ra")
+
+
+def _iter_records(result: dict):
+    charts = result.get("charts", {})
+    for record in charts.get("sd", []) + charts.get("dx", []):
+        yield (int(record["song_id"]), int(record["level_index"])), record
+
+
+def _record_state(record: dict) -> tuple:
+    return tuple(record.get(field) for field in _FIELDS)
+
+
+def diff_scores(previous: dict, result: dict) -> dict | None:
+    """
+    比较玩家上次与本次的成绩，返回紧凑的变化
+
+    只比较本次 B50 中出现的谱面：上次没有的为 new，任一字段不同的为 updated 并附带变化字段的旧值；
+    掉出 B50 的谱面不算变化。
+
+    :param previous: {"rating", "records": {(song_id, level_index): (achievements, dxScore, fc, fs, ra)}}
+    :param result: query_player_scores_simple 成功时返回的数据
+    :return: {"username", "nickname", "rating", "rating_delta", "changes"}，没有变化时返回 None
+    """
+    old_records = previous["records"]
+    changes = []
+    for key, record in _iter_records(result):
+        state = _record_state(record)
+        old = old_records.get(key)
+        if old == state:
+            continue
+        change = {
+            "kind": "new" if old is None else "updated",
+            "song_id": key[0],
+            "level_index": key[1],
+            "title": record.get("title"),
+            "type": record.get("type"),
+            "level_label": record.get("level_label"),
+            "ds": record.get("ds"),
+            **dict(zip(_FIELDS, state)),
+        }
+        if old is not None:
+            change["previous"] = {field: before for field, before, after in zip(_FIELDS, old, state)
+                                  if before != after}
+        changes.append(change)
+    rating = result.get("rating", 0)
+    rating_delta = rating - (previous.get("rating") or 0)
+    if not changes and rating_delta == 0:
+        return None
+    return {
+        "username": result.get("username"),
+        "nickname": result.get("nickname") or "",
+        "rating": rating,
+        "rating_delta": rating_delta,
+        "changes": changes,
+    }
+
+
+class Subscriber:
+    """
+    一个变化订阅者：只接收匹配 usernames / qqs 的事件（都为空时接收全部），缓冲满时丢弃新事件
+
+    事件中不包含 QQ 号，按 QQ 号过滤时使用发布方记录的玩家 QQ 号匹配。
+    """
+
+    def __init__(self, kind: str, queue_size: int, usernames: set[str] | None = None, qqs: set[str] | None = None):
+        self.kind = kind
+        self.usernames = usernames or None
+        self.qqs = qqs or None
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(queue_size)
+        self.dropped = 0
+
+    @property
+    def filtered(self) -> bool:
+        return self.usernames is not None or self.qqs is not None
+
+    def matches(self, event: dict, qq: str | None = None) -> bool:
+        """
+        :param qq: 事件所属玩家的 QQ 号，未知时为 None
+        """
+        if not self.filtered:
+            return True
+        return (self.usernames is not None and event["username"] in self.usernames) or \
+            (self.qqs is not None and qq is not None and qq in self.qqs)
+
+
+class ScoreFeed:
+    """
+    玩家成绩变化推送
+
+    为每个玩家保留上次看到的成绩（LRU，最多 max_players 个玩家；未命中且启用了数据库时从数据库读取），
+    每次获取到 B50 时计算变化并发布给订阅者，订阅者只收到变化而不必轮询、重复下载完整成绩。
+    最近 backlog 个事件保留在内存中，供断线重连与轮询补发。
+
+    事件 id 以进程启动时的微秒时间戳为起点递增，重启后的 id 仍大于重启前的。
+    事件只在当前进程内发布，多进程部署时每个进程各自推送经由它获取的变化。
+    玩家的 QQ 号只保存在服务端用于过滤，不会出现在事件中。
+    """
+
+    def __init__(self, max_players: int = 10000, backlog: int = 1000, queue_size: int = 1000,
+                 max_subscribers: int = 1000):
+        self.max_players = max_players
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._baselines: OrderedDict[str, dict] = OrderedDict()
+        # (事件, 玩家 QQ 号)
+        self._backlog: deque[tuple[dict, str | None]] = deque(maxlen=backlog)
+        self._subscribers: set[Subscriber] = set()
+        self._next_id = time.time_ns() // 1000
+        self.observed = 0
+        self.published = 0
+
+    def stats(self) -> dict:
+        return {
+            "players": len(self._baselines),
+            "subscribers": len(self._subscribers),
+            "observed": self.observed,
+            "published": self.published,
+            "backlog": len(self._backlog),
+            "last_event_id": self._next_id - 1,
+        }
+
+    def subscriber_count(self, kind: str) -> int:
+        return sum(1 for subscriber in self._subscribers if subscriber.kind == kind)
+
+    def _remember(self, username: str, baseline: dict) -> None:
+        self._baselines[username] = baseline
+        self._baselines.move_to_end(username)
+        while len(self._baselines) > self.max_players:
+            self._baselines.popitem(last=False)
+
+    async def observe(self, username: str, is_qq: bool, result: dict) -> dict | None:
+        """
+        记录一次 B50 查询结果，有变化时发布事件
+
+        首次看到的玩家（内存与数据库中都没有）只记录，不发布。
+
+        :param username: 查询时使用的用户名或 QQ 号
+        :param is_qq: username 是否为 QQ 号
+        :param result: query_player_scores_simple 成功时返回的数据
+        :return: 发布的事件，没有变化时返回 None
+        """
+        canonical = result.get("username") or username
+        self.observed += 1
+        previous = self._baselines.get(canonical)
+        if previous is None and store_available():
+            try:
+                loaded = await load_player_baseline(canonical)
+            except Exception as e:
+                # 读取失败时按首次看到处理，只记录不发布
+                logger.error(f"从数据库读取 {canonical} 的上次成绩失败: {e!r}")
+                loaded = None
+            # 读取数据库期间可能已有同一玩家的结果写入内存
+            previous = self._baselines.get(canonical) or loaded
+
+        records = dict(previous["records"]) if previous is not None else {}
+        records.update((key, _record_state(record)) for key, record in _iter_records(result))
+        qq = username if is_qq else (previous or {}).get("qq")
+        self._remember(canonical, {"rating": result.get("rating", 0), "records": records, "qq": qq})
+
+        if previous is None:
+            return None
+        diff = diff_scores(previous, result)
+        if diff is None:
+            return None
+        return self.publish(diff, qq)
+
+    def publish(self, diff: dict, qq: str | None = None) -> dict:
+        """
+        :param qq: 玩家的 QQ 号，只用于匹配按 QQ 号过滤的订阅者
+        """
+        event = {"id": self._next_id, "time": datetime.now(timezone.utc).isoformat(), **diff}
+        self._next_id += 1
+        self._backlog.append((event, qq))
+        self.published += 1
+        SCORE_FEED_EVENTS.inc()
+        for subscriber in self._subscribers:
+            if not subscriber.matches(event, qq):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.dropped += 1
+                SCORE_FEED_DROPPED.labels(subscriber.kind).inc()
+        return event
+
+    def recent(self, since_id: int, subscriber: Subscriber | None = None) -> tuple[list[dict], bool]:
+        """
+        id 大于 since_id 的事件
+
+        :param since_id: 上次收到的最后一个事件 id，0 表示没有游标（返回保留的全部事件且不算丢失）
+        :return: (事件列表, 是否有事件已经被移出 backlog 而无法补发)
+        """
+        oldest = self._backlog[0][0]["id"] if self._backlog else self._next_id
+        truncated = 0 < since_id < oldest - 1
+        events = [event for event, qq in self._backlog
+                  if event["id"] > since_id and (subscriber is None or subscriber.matches(event, qq))]
+        return events, truncated
+
+    def is_full(self) -> bool:
+        """
+        SSE 订阅者是否已达到 max_subscribers
+        """
+        return self.subscriber_count("sse") >= self.max_subscribers
+
+    def subscribe(self, kind: str, usernames: set[str] | None = None,
+                  qqs: set[str] | None = None) -> Subscriber | None:
+        """
+        :return: 订阅者，SSE 订阅者已达到 max_subscribers 时返回 None
+        """
+        if kind == "sse" and self.is_full():
+            return None
+        subscriber = Subscriber(kind, self.queue_size, usernames, qqs)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+
+score_feed = ScoreFeed(ScoreFeedMaxPlayers, ScoreFeedBacklog, ScoreFeedSubscriberQueueSize,
+                       ScoreFeedMaxSubscribers)
+
+_webhook_task: asyncio.Task | None = None
+# 后台计算成绩变化的任务，保留引用直到完成，避免被垃圾回收而丢失事件
+_observe_tasks: set[asyncio.Task] = set()
+
+
+async def observe_scores(username: str, is_qq: bool, result: dict) -> None:
+    """
+    计算并发布玩家成绩变化；未启用时什么都不做，失败时只记录日志
+
+    需要在同步数据库之前调用，否则从数据库读取的上次成绩已经是本次的。
+    """
+    if not ScoreFeedEnabled:
+        return
+    try:
+        await score_feed.observe(username, is_qq, result)
+    except Exception as e:
+        logger.error(f"计算 {username} 的成绩变化失败: {e!r}")
+
+
+def schedule_observe(username: str, is_qq: bool, result: dict) -> None:
+    """
+    在后台计算并发布成绩变化，不阻塞当前请求
+
+    应在 schedule_sync 之前调用：两者读写数据库时持有同一个玩家锁，先创建的任务先取得锁。
+    """
+    if ScoreFeedEnabled:
+        task = asyncio.create_task(observe_scores(username, is_qq, result))
+        _observe_tasks.add(task)
+        task.add_done_callback(_observe_tasks.discard)
+
+
+def _sign(body: bytes) -> dict:
+    headers = {"content-type": "application/json"}
+    if ScoreFeedWebhookSecret:
+        digest = hmac.new(ScoreFeedWebhookSecret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+        headers["x-signature"] = f"sha256={digest}"
+    return headers
+
+
+async def _deliver(client: httpx.AsyncClient, url: str, body: bytes, headers: dict) -> None:
+    try:
+        response = await client.post(url, content=body, headers=headers)
+        response.raise_for_status()
+    except Exception as e:
+        SCORE_FEED_WEBHOOK_DELIVERIES.labels("error").inc()
+        logger.warning(f"推送成绩变化到 {url} 失败: {e!r}")
+        return
+    SCORE_FEED_WEBHOOK_DELIVERIES.labels("success").inc()
+
+
+async def _run_webhooks(subscriber: Subscriber) -> None:
+    """
+    每隔 ScoreFeedWebhookInterval 秒或积累 ScoreFeedWebhookBatchSize 个事件，
+    以 {"events": [...]} 推送到所有 webhook；推送失败只记录，不重试
+    """
+    loop = asyncio.get_running_loop()
+    async with httpx.AsyncClient(timeout=ScoreFeedWebhookTimeout) as client:
+        while True:
+            batch = [await subscriber.queue.get()]
+            deadline = loop.time() + ScoreFeedWebhookInterval
+            while len(batch) < ScoreFeedWebhookBatchSize:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(subscriber.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            body = json.dumps({"events": batch}, ensure_ascii=False).encode("utf-8")
+            headers = _sign(body)
+            await asyncio.gather(*(_deliver(client, url, body, headers) for url in ScoreFeedWebhookUrls))
+
+
+def start_score_feed() -> None:
+    """
+    配置了 webhook 时启动批量推送任务，应在 lifespan 中调用
+    """
+    global _webhook_task
+    if not ScoreFeedEnabled or not ScoreFeedWebhookUrls or _webhook_task is not None:
+        return
+    subscriber = score_feed.subscribe("webhook")
+
+    async def run():
+        try:
+            await _run_webhooks(subscriber)
+        finally:
+            score_feed.unsubscribe(subscriber)
+
+    _webhook_task = asyncio.create_task(run(), name="score_feed:webhooks")
+
+
+async def stop_score_feed() -> None:
+    global _webhook_task
+    if _webhook_task is not None:
+        _webhook_task.cancel()
+        try:
+            await _webhook_task
+        except asyncio.CancelledError:
+            pass
+        _webhook_task = None
+
+
+CallbackMetric("maitp_score_feed_subscribers", "成绩变化的订阅者数，kind 为 sse 或 webhook", "gauge", ["kind"],
+               lambda: [((kind,), score_feed.subscriber_count(kind)) for kind in ("sse", "webhook")])
@@ -0,0 +1,174 @@
+import heapq
+import os
+import unicodedata
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish.catalog import MusicCatalog
+
+# 可选的本地别名文件，格式为 {"歌曲id": ["别名", ...]}
+ALIAS_PATH = "data/divingfish/aliases.json"
+NGRAM = 2
+# 模糊匹配时查询 n-gram 至少命中的比例
+MIN_SCORE = 0.5
+
+# 片假名 -> 平假名
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(0x30A1, 0x30F7)}
+
+
+def normalize(text: str) -> str:
+    """
+    搜索用的文本归一化：全半角统一（NFKC）、大小写不敏感、片假名转平假名、去除空白
+    """
+    text = unicodedata.normalize("NFKC", text).casefold().translate(_KATAKANA_TO_HIRAGANA)
+    return "".join(ch for ch in text if not ch.isspace())
+
+
+def ngrams(text: str, n: int = NGRAM) -> set[str]:
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def load_aliases(path: str = ALIAS_PATH) -> dict[str, list[str]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.loads(f.read())
+
+
+class SearchIndex:
+    """
+    歌曲标题/曲师/别名的 n-gram 倒排索引
+
+    每次歌曲目录刷新后构建一次，查询时只访问查询文本 n-gram 对应的倒排列表。
+    """
+
+    def __init__(self, catalog: MusicCatalog, aliases: dict[str, list[str]] | None = None):
+        self.catalog = catalog
+        self.postings: dict[str, set[str]] = {}
+        # 长度不超过 n 的短查询（如单字）使用单字索引
+        self.char_postings: dict[str, set[str]] = {}
+        self.texts: dict[str, list[str]] = {}
+        # 结果按歌曲id数值排序
+        self.rank: dict[str, int] = {music_id: int(music_id) for music_id in catalog.by_id}
+        aliases = aliases or {}
+        for music in catalog.music_list:
+            music_id = str(music["id"])
+            texts = [music["title"], music.get("basic_info", {}).get("artist", ""), *aliases.get(music_id, [])]
+            normalized = [normalize(text) for text in texts if text]
+            self.texts[music_id] = normalized
+            for text in normalized:
+                for gram in ngrams(text):
+                    self.postings.setdefault(gram, set()).add(music_id)
+                for ch in text:
+                    self.char_postings.setdefault(ch, set()).add(music_id)
+
+    def match(self, query: str) -> dict[str, float]:
+        """
+        模糊匹配查询文本
+
+        :return: 歌曲id -> 匹配分数（0~1，完全包含查询文本时为 1）
+        """
+        query = normalize(query)
+        if not query:
+            return {}
+        if len(query) < NGRAM:
+            return {music_id: 1.0 for music_id in self.char_postings.get(query, ())}
+
+        grams = ngrams(query)
+        # 包含完整查询文本的歌曲必然出现在所有 n-gram 的倒排列表中，从最短的列表开始求交集
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        exact = set(postings[0]).intersection(*postings[1:])
+        exact = {music_id for music_id in exact if any(query in text for text in self.texts[music_id])}
+        if exact:
+            return {music_id: 1.0 for music_id in exact}
+
+        hits: dict[str, int] = {}
+        for gram in grams:
+            for music_id in self.postings.get(gram, ()):
+                hits[music_id] = hits.get(music_id, 0) + 1
+        scores = {}
+        for music_id, count in hits.items():
+            if count / len(grams) >= MIN_SCORE:
+                scores[music_id] = count / len(grams)
+        return scores
+
+    def search(
+            self,
+            query: str | None = None,
+            genre: str | None = None,
+            version: str | None = None,
+            music_type: str | None = None,
+            level: str | None = None,
+            ds_min: float | None = None,
+            ds_max: float | None = None,
+            page: int = 1,
+            page_size: int = 20,
+    ) -> dict:
+        """
+        搜索歌曲
+
+        :return: {"total", "page", "page_size", "data": [{"score", "music"}]}
+        """
+        catalog = self.catalog
+        if query:
+            scores = self.match(query)
+            candidates = set(scores)
+        else:
+            scores = {}
+            candidates = None
+
+        def narrow(ids):
+            nonlocal candidates
+            ids = set(ids)
+            candidates = ids if candidates is None else candidates & ids
+
+        if genre:
+            narrow(catalog.by_genre.get(genre, ()))
+        if version:
+            narrow(catalog.by_version.get(version, ()))
+        if level:
+            narrow(music_id for music_id, _ in catalog.by_level.get(level, ()))
+        if ds_min is not None or ds_max is not None:
+            narrow(str(music["id"]) for music, _ in catalog.find_by_ds_range(
+                ds_min if ds_min is not None else 0.0, ds_max if ds_max is not None else 99.0))
+        if candidates is None:
+            candidates = set(catalog.by_id)
+        if music_type:
+            candidates = {music_id for music_id in candidates if catalog.by_id[music_id].get("type") == music_type}
+
+        # 只需要当前页之前的结果，避免对全部命中排序
+        start = (page - 1) * page_size
+        ordered = heapq.nsmallest(start + page_size, candidates,
+                                  key=lambda music_id: (-scores.get(music_id, 0), self.rank[music_id]))
+        return {
+            "total": len(candidates),
+            "page": page,
+            "page_size": page_size,
+            "data": [
+                {"score": scores.get(music_id, 1.0), "music": catalog.by_id[music_id]}
+                for music_id in ordered[start:start + page_size]
+            ],
+        }
+
+
+# 每个游戏一份索引
+_indexes: dict[GameDataType, SearchIndex] = {}
+
+
+def get_search_index(catalog: MusicCatalog) -> SearchIndex:
+    """
+    获取与当前歌曲目录对应的搜索索引，目录刷新后自动重建
+
+    别名文件只适用于舞萌的歌曲 id。
+    """
+    index = _indexes.get(catalog.game)
+    if index is None or index.catalog is not catalog:
+        aliases = load_aliases() if catalog.game == GameDataType.MAIMAI else {}
+        index = _indexes[catalog.game] = SearchIndex(catalog, aliases)
+    return index
@@ -0,0 +1,238 @@
+import mmap
+import os
+import struct
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from app.utils.metrics.instruments import STORAGE_READ_BYTES
+from app.utils.os.storage import atomic_write
+
+SNAPSHOT_PATH = "data/divingfish/music_data.snapshot"
+
+_MAGIC = b"MTPSNAP1"
+# magic, 版本, 歌曲数, 谱面数, 音符数列表长度, 字符串数, 源 JSON 的 sha256
+_HEADER = struct.Struct("<8sIIIII32s")
+_SECTION = struct.Struct("<QQ")
+_VERSION = 1
+
+# (段名, dtype)，顺序即文件中的顺序
+_SECTIONS = [
+    ("str_offsets", np.uint32),
+    ("str_blob", np.uint8),
+    ("song_id", np.uint32),
+    ("song_title", np.uint32),
+    ("song_type", np.uint32),
+    ("song_artist", np.uint32),
+    ("song_genre", np.uint32),
+    ("song_from", np.uint32),
+    ("song_release_date", np.uint32),
+    ("song_bpm", np.float64),
+    ("song_is_new", np.uint8),
+    ("song_chart_start", np.uint32),
+    ("song_chart_count", np.uint8),
+    ("chart_ds", np.float64),
+    ("chart_level", np.uint32),
+    ("chart_cid", np.int64),
+    ("chart_charter", np.uint32),
+    ("chart_notes_start", np.uint32),
+    ("chart_notes_count", np.uint8),
+    ("notes", np.uint32),
+]
+
+
+class _StringTable:
+    def __init__(self):
+        self.index: dict[str, int] = {}
+        self.strings: list[str] = []
+
+    def intern(self, value: str) -> int:
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return i
+
+
+def build_snapshot(music_data: list[dict], source_sha256: str) -> bytes:
+    """
+    把 music_data 编码为列式二进制快照
+
+    数值列（定数、cid、音符数等）按列连续存放，字符串（标题、曲师、谱师等）去重后存入字符串表，
+    各段按 8 字节对齐，加载时可以直接以 mmap 零拷贝映射为 NumPy 数组。
+    """
+    strings = _StringTable()
+    columns: dict[str, list] = {name: [] for name, _ in _SECTIONS}
+    for music in music_data:
+        basic_info = music.get("basic_info", {})
+        columns["song_id"].append(strings.intern(music["id"]))
+        columns["song_title"].append(strings.intern(music["title"]))
+        columns["song_type"].append(strings.intern(music["type"]))
+        columns["song_artist"].append(strings.intern(basic_info.get("artist", "")))
+        columns["song_genre"].append(strings.intern(basic_info.get("genre", "")))
+        columns["song_from"].append(strings.intern(basic_info.get("from", "")))
+        columns["song_release_date"].append(strings.intern(basic_info.get("release_date", "")))
+        columns["song_bpm"].append(basic_info.get("bpm", 0))
+        columns["song_is_new"].append(1 if basic_info.get("is_new") else 0)
+        columns["song_chart_start"].append(len(columns["chart_ds"]))
+        columns["song_chart_count"].append(len(music["ds"]))
+        charts = music.get("charts", [])
+        cids = music.get("cids", [])
+        for level_index, ds in enumerate(music["ds"]):
+            chart = charts[level_index] if level_index < len(charts) else {}
+            columns["chart_ds"].append(ds)
+            columns["chart_level"].append(strings.intern(music["level"][level_index]))
+            columns["chart_cid"].append(cids[level_index] if level_index < len(cids) else -1)
+            columns["chart_charter"].append(strings.intern(chart.get("charter", "")))
+            columns["chart_notes_start"].append(len(columns["notes"]))
+            columns["chart_notes_count"].append(len(chart.get("notes", [])))
+            columns["notes"].extend(chart.get("notes", []))
+
+    encoded = [s.encode("utf-8") for s in strings.strings]
+    columns["str_offsets"] = np.cumsum([0] + [len(b) for b in encoded])
+    columns["str_blob"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    header_size = _HEADER.size + _SECTION.size * len(_SECTIONS)
+    body, table, offset = [], [], _align(header_size)
+    for name, dtype in _SECTIONS:
+        data = np.asarray(columns[name], dtype=dtype).tobytes()
+        table.append(_SECTION.pack(offset, len(data)))
+        body.append(data + b"\0" * (_align(len(data)) - len(data)))
+        offset += _align(len(data))
+    header = _HEADER.pack(_MAGIC, _VERSION, len(music_data), len(columns["chart_ds"]), len(columns["notes"]),
+                          len(encoded), bytes.fromhex(source_sha256)) + b"".join(table)
+    return header + b"\0" * (_align(header_size) - header_size) + b"".join(body)
+
+
+def write_snapshot(music_data: list[dict], source_sha256: str, path: str = SNAPSHOT_PATH) -> None:
+    atomic_write(path, build_snapshot(music_data, source_sha256))
+
+
+def _align(size: int) -> int:
+    return (size + 7) & ~7
+
+
+class CatalogSnapshot:
+    """
+    以 mmap 只读映射的歌曲目录快照
+
+    各列为直接指向映射内存的 NumPy 数组，不会复制数据；
+    多个 worker 映射同一文件时共享操作系统页缓存中的同一份物理内存。
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # 映射的页面在构建索引时基本都会被访问，按文件大小计入读取量
+        STORAGE_READ_BYTES.labels(os.path.basename(path)).inc(len(self._mmap))
+        magic, version, self.song_count, self.chart_count, _, self.string_count, sha = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"不支持的快照文件: {path}")
+        self.source_sha256 = sha.hex()
+        for i, (name, dtype) in enumerate(_SECTIONS):
+            offset, length = _SECTION.unpack_from(self._mmap, _HEADER.size + _SECTION.size * i)
+            setattr(self, name, np.frombuffer(self._mmap, dtype=dtype, count=length // np.dtype(dtype).itemsize,
+                                              offset=offset))
+        self._strings: list[str] | None = None
+
+    @property
+    def strings(self) -> list[str]:
+        """
+        解码后的字符串表，首次访问时解码
+        """
+        if self._strings is None:
+            blob = self.str_blob.tobytes()
+            offsets = self.str_offsets.tolist()
+            self._strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(self.string_count)]
+        return self._strings
+
+    def music(self, i: int) -> dict:
+        """
+        还原第 i 首歌曲为与 music_data.json 相同结构的字典
+        """
+        s = self.strings
+        lo = int(self.song_chart_start[i])
+        hi = lo + int(self.song_chart_count[i])
+        notes_start, notes_count = self.chart_notes_start[lo:hi].tolist(), self.chart_notes_count[lo:hi].tolist()
+        bpm = float(self.song_bpm[i])
+        title = s[self.song_title[i]]
+        return {
+            "id": s[self.song_id[i]],
+            "title": title,
+            "type": s[self.song_type[i]],
+            "ds": self.chart_ds[lo:hi].tolist(),
+            "level": [s[level] for level in self.chart_level[lo:hi].tolist()],
+            "cids": [cid for cid in self.chart_cid[lo:hi].tolist() if cid >= 0],
+            "charts": [
+                {"notes": self.notes[start:start + count].tolist(), "charter": s[charter]}
+                for start, count, charter in zip(notes_start, notes_count, self.chart_charter[lo:hi].tolist())
+            ],
+            "basic_info": {
+                "title": title,
+                "artist": s[self.song_artist[i]],
+                "genre": s[self.song_genre[i]],
+                "bpm": int(bpm) if bpm.is_integer() else bpm,
+                "release_date": s[self.song_release_date[i]],
+                "from": s[self.song_from[i]],
+                "is_new": bool(self.song_is_new[i]),
+            },
+        }
+
+
+class MusicList(Sequence):
+    """
+    按需从快照还原歌曲字典的只读列表
+
+    只有被访问到的歌曲才会创建 Python 对象，worker 启动时无需一次性还原全部歌曲。
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+        self._items: list[dict | None] = [None] * snapshot.song_count
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        music = self._items[i]
+        if music is None:
+            music = self._items[i] = self.snapshot.music(i if i >= 0 else i + len(self))
+        return music
+
+
+class MusicMap(Mapping):
+    """
+    歌曲 id 到歌曲字典的只读映射，值由 MusicList 按需还原
+    """
+
+    def __init__(self, ids: list[str], music_list: MusicList):
+        self._rows = {music_id: row for row, music_id in enumerate(ids)}
+        self._music_list = music_list
+
+    def __getitem__(self, music_id: str) -> dict:
+        return self._music_list[self._rows[music_id]]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, music_id) -> bool:
+        return music_id in self._rows
+
+
+def open_snapshot(source_sha256: str | None, path: str = SNAPSHOT_PATH) -> CatalogSnapshot | None:
+    """
+    打开与指定源数据版本一致的快照，不存在或版本不一致时返回 None
+    """
+    if source_sha256 is None or not os.path.exists(path):
+        return None
+    try:
+        snapshot = CatalogSnapshot(path)
+    except (ValueError, struct.error):
+        return None
+    return snapshot if snapshot.source_sha256 == source_sha256 else None
@@ -0,0 +1,193 @@
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, TypeVar
+
+import httpx
+from loguru import logger
+
+from app.utils.http.priority import PriorityLimiter
+from app.utils.http.resilience import CircuitBreaker, CircuitOpenError, CircuitState, RetryBudget, backoff_delay
+from app.utils.metrics.instruments import UPSTREAM_QUEUE_WAIT
+from app.utils.metrics.prometheus import CallbackMetric
+from cfg.config import UpstreamRetryAttempts, UpstreamRetryBaseDelay, UpstreamRetryMaxDelay, \
+    UpstreamRetryBudgetRatio, UpstreamRetryBudgetMinPerSecond, UpstreamRetryBudgetWindow, \
+    UpstreamBreakerFailureThreshold, UpstreamBreakerRecoveryTimeout, UpstreamBreakerHalfOpenMaxCalls, \
+    UpstreamMaxConcurrency, UpstreamQueueTimeout
+
+T = TypeVar("T")
+
+# 视为上游故障、需要计入熔断并可重试的异常；httpx.TransportError 同时涵盖 NetworkError 与 TimeoutException
+UPSTREAM_ERRORS = (httpx.TransportError,)
+
+# 水鱼请求的优先级，从高到低：用户请求、后台刷新与封面预取、批量刷新与管理接口
+UPSTREAM_PRIORITIES = ("interactive", "refresh", "bulk")
+# 当前调用链发起水鱼请求时使用的优先级，由限流中间件按路由类别、后台任务在启动时设置
+upstream_priority: ContextVar[str] = ContextVar("upstream_priority", default="interactive")
+
+
+class EndpointHealth:
+    """
+    单个水鱼接口最近的调用情况
+    """
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.retries = 0
+        self.last_success_at: float | None = None
+        self.last_failure_at: float | None = None
+        self.last_error: str | None = None
+        self.last_latency: float | None = None
+
+    def stats(self) -> dict:
+        return {
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "last_success_at": self.last_success_at,
+            "last_failure_at": self.last_failure_at,
+            "last_error": self.last_error,
+            "last_latency": round(self.last_latency, 4) if self.last_latency is not None else None,
+        }
+
+
+class UpstreamHealth:
+    """
+    水鱼服务的内存健康状态
+
+    由所有经过 upstream_call 的请求以及后台 /alive 探测共同更新，/health 直接读取，不会发起请求。
+    """
+
+    def __init__(self):
+        self.endpoints: dict[str, EndpointHealth] = {}
+        self.is_alive: bool | None = None
+        self.message: Any = None
+        self.checked_at: float | None = None
+
+    def endpoint(self, name: str) -> EndpointHealth:
+        return self.endpoints.setdefault(name, EndpointHealth())
+
+    def record_probe(self, is_alive: bool, message: Any) -> None:
+        self.is_alive = is_alive
+        self.message = message
+        self.checked_at = time.time()
+
+    def stats(self) -> dict:
+        circuit = breaker.stats()
+        return {
+            # 熔断打开时无论最近一次探测结果如何都视为不可用
+            "is_alive": bool(self.is_alive) and circuit["state"] != "open",
+            "message": self.message,
+            "checked_at": self.checked_at,
+            "circuit": circuit,
+            "retry_budget": retry_budget.stats(),
+            "queue": upstream_queue.stats(),
+            "endpoints": {name: endpoint.stats() for name, endpoint in self.endpoints.items()},
+        }
+
+
+breaker = CircuitBreaker(
+    "水鱼",
+    failure_threshold=UpstreamBreakerFailureThreshold,
+    recovery_timeout=UpstreamBreakerRecoveryTimeout,
+    half_open_max_calls=UpstreamBreakerHalfOpenMaxCalls,
+)
+retry_budget = RetryBudget(
+    ratio=UpstreamRetryBudgetRatio,
+    min_per_second=UpstreamRetryBudgetMinPerSecond,
+    window=UpstreamRetryBudgetWindow,
+)
+upstream_queue = PriorityLimiter(UpstreamMaxConcurrency, UPSTREAM_PRIORITIES)
+upstream_health = UpstreamHealth()
+
+CallbackMetric("maitp_upstream_circuit_state", "水鱼熔断器状态，当前状态为 1", "gauge", ["state"],
+               lambda: [((state.value,), 1 if breaker.state == state else 0) for state in CircuitState])
+CallbackMetric("maitp_upstream_retries_total", "水鱼各接口的重试次数", "counter", ["endpoint"],
+               lambda: [((name,), endpoint.retries) for name, endpoint in upstream_health.endpoints.items()])
+CallbackMetric("maitp_upstream_rejected_total", "熔断期间被直接拒绝的水鱼请求数", "counter", ["endpoint"],
+               lambda: [((name,), endpoint.rejected) for name, endpoint in upstream_health.endpoints.items()])
+CallbackMetric("maitp_upstream_queue_depth", "排队等待发起的水鱼请求数", "gauge", ["priority"],
+               lambda: [((level,), count) for level, count in upstream_queue.waiting.items()])
+CallbackMetric("maitp_upstream_queue_active", "正在进行的水鱼请求数", "gauge", [],
+               lambda: [((), upstream_queue.active)])
+CallbackMetric("maitp_upstream_queue_timeouts_total", "排队超时而放弃的水鱼请求数", "counter", ["priority"],
+               lambda: [((level,), count) for level, count in upstream_queue.timeouts.items()])
+
+
+async def _acquire_slot(priority: str) -> None:
+    """
+    按优先级排队取得发起水鱼请求的名额；interactive 请求排队超时时按连接池超时处理
+    """
+    timeout = UpstreamQueueTimeout if priority == "interactive" else None
+    try:
+        waited = await upstream_queue.acquire(priority, timeout)
+    except asyncio.TimeoutError:
+        raise httpx.PoolTimeout(f"等待水鱼请求名额超过 {timeout} 秒") from None
+    UPSTREAM_QUEUE_WAIT.labels(priority).observe(waited)
+
+
+def upstream_call(endpoint: str, attempts: int = UpstreamRetryAttempts):
+    """
+    水鱼请求的统一包装：熔断、重试与健康状态记录
+
+    - 每次尝试先按 upstream_priority 排队取得名额，重试的退避期间不占用名额
+    - 熔断打开时不发出请求，直接抛出 CircuitOpenError，调用方可以快速失败或返回缓存数据
+    - 被包装函数抛出 UPSTREAM_ERRORS 时计为一次失败，在熔断未打开且重试预算允许时按指数退避 + jitter 重试
+    - 其余返回值（包括业务上的失败结果）均视为上游可用
+
+    :param endpoint: 接口名，用于分接口统计
+    :param attempts: 最多尝试次数（含首次）
+    """
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> T:
+            health = upstream_health.endpoint(endpoint)
+            retry_budget.record_request()
+            priority = upstream_priority.get()
+            attempt = 0
+            while True:
+                await _acquire_slot(priority)
+                try:
+                    try:
+                        breaker.acquire()
+                    except CircuitOpenError:
+                        health.rejected += 1
+                        raise
+                    start = time.perf_counter()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except UPSTREAM_ERRORS as e:
+                        breaker.record_failure()
+                        health.failures += 1
+                        health.last_failure_at = time.time()
+                        health.last_error = repr(e)
+                        health.last_latency = time.perf_counter() - start
+                        attempt += 1
+                        # 本次失败已使熔断打开时不再重试
+                        if attempt >= attempts or breaker.state == CircuitState.OPEN or \
+                                not retry_budget.try_acquire():
+                            raise
+                        health.retries += 1
+                        delay = backoff_delay(attempt - 1, UpstreamRetryBaseDelay, UpstreamRetryMaxDelay)
+                        logger.warning(f"水鱼 {endpoint} 请求失败，{delay:.2f} 秒后第 {attempt} 次重试: {e!r}")
+                    except BaseException:
+                        breaker.release()
+                        raise
+                    else:
+                        breaker.record_success()
+                        health.successes += 1
+                        health.last_success_at = time.time()
+                        health.last_latency = time.perf_counter() - start
+                        return result
+                finally:
+                    upstream_queue.release()
+                await asyncio.sleep(delay)
+
+        return wrapper
+
+    return decorator
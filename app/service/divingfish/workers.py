@@ -0,0 +1,170 @@
+import asyncio
+import os
+from typing import Awaitable, Callable
+
+from loguru import logger
+
+from app.service.divingfish.catalog import music_data_dataset
+from app.service.divingfish.chart_stats import chart_stats_dataset
+from app.service.divingfish.chuni import chunithm_music_dataset
+from app.service.divingfish.dataset import GameDataset
+from app.service.divingfish.refresher import start_refreshers, stop_refreshers, warm_catalog, start_health_probe, \
+    stop_health_probe
+from app.utils.metrics.instruments import DATASET_RELOADS
+from app.utils.metrics.prometheus import CallbackMetric
+from app.utils.os.storage import try_lock_file, read_dataset_meta
+from cfg.config import ChunithmEnabled, DataRefreshEnabled, WorkerSyncInterval
+
+LEADER_LOCK_PATH = "data/divingfish/.leader.lock"
+
+
+class DatasetWatcher:
+    """
+    通过元数据文件的修改时间发现其他 worker 写入的新版本，并重新加载内存快照
+
+    只处理已经加载到内存的数据集，尚未加载的会在首次使用时直接读取最新的文件。
+    元数据文件在每次刷新（包括 304）时都会更新，版本（数据文件 sha256）与内存一致时不会重新加载。
+
+    :param dataset: 数据集
+    :param after_reload: 重新加载后调用，用于预先构建派生的索引
+    """
+
+    def __init__(self, dataset: GameDataset, after_reload: Callable[[GameDataset], Awaitable[None]] | None = None):
+        self.dataset = dataset
+        self.after_reload = after_reload
+        self._mtime = self._stat()
+
+    def _stat(self) -> int | None:
+        try:
+            return os.stat(self.dataset.ext_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    async def check(self) -> bool:
+        """
+        :return: 是否重新加载了内存快照
+        """
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return False
+        store = self.dataset.get()
+        if store is None or mtime is None:
+            self._mtime = mtime
+            return False
+        meta = await read_dataset_meta(self.dataset.data_path, self.dataset.ext_path)
+        if meta is None:
+            # 数据文件与元数据不一致（其他 worker 正在写入），下次再检查
+            return False
+        self._mtime = mtime
+        if meta.get("sha256") == store.version:
+            return False
+        await self.dataset.sync(meta)
+        DATASET_RELOADS.labels(self.dataset.name).inc()
+        if self.after_reload is not None:
+            await self.after_reload(self.dataset)
+        logger.info(f"{self.dataset.name} 已被其他 worker 更新，重新加载: {meta.get('sha256', '')[:12]}")
+        return True
+
+
+class WorkerCoordinator:
+    """
+    多 worker 部署时各 worker 的分工
+
+    各 worker 以非阻塞方式竞争同一个文件锁，持有者为 leader，负责后台刷新与封面预取等访问水鱼的定时任务，
+    其余为 follower，不会重复下载数据。所有 worker 每隔 interval 秒检查各数据集是否已被其他 worker 更新
+    （包括管理接口触发的刷新），并重新加载内存快照。leader 退出后操作系统释放文件锁，
+    follower 在下一次检查时接替。单进程运行时唯一的 worker 就是 leader，行为与以前相同。
+    水鱼健康状态保存在进程内，健康检查在每个 worker 上都会运行。
+
+    :param lock_path: leader 锁文件
+    :param watchers: 需要跟随更新的数据集
+    :param interval: 检查间隔（秒）
+    :param refresh: 是否执行健康检查与（leader）后台刷新
+    """
+
+    def __init__(self, lock_path: str, watchers: list[DatasetWatcher], interval: float = 1.0, refresh: bool = True):
+        self.lock_path = lock_path
+        self.watchers = watchers
+        self.interval = interval
+        self.refresh = refresh
+        self.role: str | None = None
+        self._fd: int | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def _try_lead(self) -> None:
+        if self._fd is not None:
+            return
+        self._fd = try_lock_file(self.lock_path)
+        if self._fd is None:
+            if self.role is None:
+                logger.info(f"worker {os.getpid()} 作为 follower 运行")
+            self.role = "follower"
+            return
+        logger.info(f"worker {os.getpid()} 成为 leader")
+        self.role = "leader"
+        if self.refresh:
+            start_refreshers()
+
+    def start(self) -> None:
+        if self._task is None:
+            if self.refresh:
+                start_health_probe()
+            self._try_lead()
+            self._task = asyncio.create_task(self._run(), name="workers:coordinator")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self._try_lead()
+            for watcher in self.watchers:
+                try:
+                    await watcher.check()
+                except Exception as e:
+                    logger.error(f"重新加载 {watcher.dataset.name} 失败: {e!r}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._fd is not None:
+            await stop_refreshers()
+            os.close(self._fd)
+            self._fd = None
+        await stop_health_probe()
+        self.role = None
+
+
+def _watchers() -> list[DatasetWatcher]:
+    watchers = [DatasetWatcher(music_data_dataset, warm_catalog), DatasetWatcher(chart_stats_dataset)]
+    if ChunithmEnabled:
+        watchers.append(DatasetWatcher(chunithm_music_dataset, warm_catalog))
+    return watchers
+
+
+coordinator = WorkerCoordinator(LEADER_LOCK_PATH, _watchers(), WorkerSyncInterval, DataRefreshEnabled)
+
+
+def start_worker_coordinator() -> None:
+    """
+    竞选 leader 并开始跟随数据更新，应在 lifespan 启动时调用
+    """
+    coordinator.start()
+
+
+async def stop_worker_coordinator() -> None:
+    """
+    停止后台任务并释放 leader 锁，应在 lifespan 结束时调用
+    """
+    await coordinator.stop()
+
+
+CallbackMetric("maitp_worker_leader", "当前 worker 是否为 leader", "gauge", ["pid"],
+               lambda: [((str(os.getpid()),), 1 if coordinator.is_leader else 0)])
@@ -0,0 +1,198 @@
+import numpy as np
+
+from app.service.divingfish.catalog import MusicCatalog
+
+# 评级下限（达成率）与对应名称，按升序排列
+RATE_THRESHOLDS = np.array([0, 50, 60, 70, 75, 80, 90, 94, 97, 98, 99, 99.5, 100, 100.5])
+RATE_NAMES = ["d", "c", "b", "bb", "bbb", "a", "aa", "aaa", "s", "sp", "ss", "ssp", "sss", "sssp"]
+
+# 舞萌DX 2021 起的 rating 系数，阈值为达成率下限
+# 79.9999/96.9999/98.9999/99.9999/100.4999 为各评级临界的特殊系数
+_B50_THRESHOLDS = np.array([0, 10, 20, 30, 40, 50, 60, 70, 75, 79.9999, 80, 90, 94, 96.9999, 97, 98, 98.9999, 99,
+                            99.5, 99.9999, 100, 100.4999, 100.5])
+_B50_FACTORS = np.array([0, 1.6, 3.2, 4.8, 6.4, 8.0, 9.6, 11.2, 12.0, 12.8, 13.6, 15.2, 16.8, 17.6, 20.0, 20.3, 20.6,
+                         20.8, 21.1, 21.4, 21.6, 22.2, 22.4])
+
+# 舞萌DX 2021 之前（B40）的 rating 系数
+_B40_THRESHOLDS = RATE_THRESHOLDS
+_B40_FACTORS = np.array([0, 5, 6, 7, 7.5, 8.5, 9.5, 10.5, 12.5, 12.75, 13, 13.25, 13.5, 14])
+
+# (旧版本曲目数, 新版本曲目数)
+B50_SLOTS = (35, 15)
+B40_SLOTS = (25, 15)
+
+
+def compute_ra(ds: np.ndarray, achievements: np.ndarray, b50: bool = True) -> np.ndarray:
+    """
+    按定数与达成率批量计算单曲 rating
+
+    :param ds: 定数数组
+    :param achievements: 达成率数组（百分数，如 100.5）
+    :param b50: True 使用 B50 系数，False 使用 B40 系数
+    """
+    achievements = np.minimum(achievements, 100.5)
+    if b50:
+        factors = _B50_FACTORS[np.searchsorted(_B50_THRESHOLDS, achievements, side="right") - 1]
+        # 先乘再除，避免 ds * 系数 的浮点误差导致取整少 1
+        return np.floor(np.round(ds * achievements * factors, 4) / 100).astype(np.int64)
+    factors = _B40_FACTORS[np.searchsorted(_B40_THRESHOLDS, achievements, side="right") - 1]
+    return np.floor(np.round(ds * achievements * factors, 4) / 100).astype(np.int64)
+
+
+def rate_name(achievements: float) -> str:
+    return RATE_NAMES[int(np.searchsorted(RATE_THRESHOLDS, achievements, side="right")) - 1]
+
+
+class RatingEngine:
+    """
+    基于歌曲目录在本地计算 DX rating
+
+    构建时把目录中的定数与新旧版本信息展开为 NumPy 数组，
+    之后单个或成批玩家的 rating 计算与 B35/B15 选取都在数组上完成。
+    """
+
+    def __init__(self, catalog: MusicCatalog):
+        self.catalog = catalog
+        self.row_of: dict[str | int, int] = {}
+        self.music_ids: list[str] = []
+        if catalog.snapshot is not None:
+            self._load_snapshot(catalog.snapshot)
+            return
+        max_charts = max((len(music.get("ds", [])) for music in catalog.music_list), default=0)
+        self.ds = np.zeros((len(catalog.music_list), max(max_charts, 1)), dtype=np.float64)
+        self.chart_count = np.zeros(len(catalog.music_list), dtype=np.int64)
+        self.is_new = np.zeros(len(catalog.music_list), dtype=bool)
+        for row, music in enumerate(catalog.music_list):
+            # 水鱼成绩中的 song_id 为 int，上传的数据可能为 str，两种都建立索引
+            self.row_of[music["id"]] = row
+            self.row_of[int(music["id"])] = row
+            self.music_ids.append(music["id"])
+            self.ds[row, :len(music["ds"])] = music["ds"]
+            self.chart_count[row] = len(music["ds"])
+            self.is_new[row] = music.get("basic_info", {}).get("is_new", False)
+
+    def _load_snapshot(self, snapshot) -> None:
+        """
+        直接从快照的列数据展开定数矩阵，不还原歌曲字典
+        """
+        self.music_ids = [snapshot.strings[i] for i in snapshot.song_id.tolist()]
+        for row, music_id in enumerate(self.music_ids):
+            self.row_of[music_id] = row
+            self.row_of[int(music_id)] = row
+        self.chart_count = snapshot.song_chart_count.astype(np.int64)
+        self.is_new = snapshot.song_is_new.astype(bool)
+        level_index = np.arange(snapshot.chart_count) - np.repeat(snapshot.song_chart_start, self.chart_count)
+        self.ds = np.zeros((snapshot.song_count, max(int(self.chart_count.max(initial=0)), 1)), dtype=np.float64)
+        self.ds[np.repeat(np.arange(snapshot.song_count), self.chart_count), level_index] = snapshot.chart_ds
+
+    def compute_many(self, players: list[list[dict]], b50: bool = True, detail: bool = True) -> list[dict]:
+        """
+        成批计算多个玩家的 rating
+
+        :param players: 每个玩家的成绩记录列表，记录至少包含 song_id、level_index、achievements；
+                        同一谱面有多条记录时只取 rating 最高的一条
+        :param b50: True 为 B35+B15，False 为 B25+B15（旧版系数）
+        :param detail: 为 False 时只返回 rating 数值，不构建 charts 与 unknown
+        :return: 与 players 一一对应的计算结果，格式同 compute
+        """
+        old_slots, new_slots = B50_SLOTS if b50 else B40_SLOTS
+        flat = [record for records in players for record in records]
+        count = len(flat)
+        row_of = self.row_of
+        rows = np.fromiter((row_of.get(record.get("song_id"), -1) for record in flat), dtype=np.int64, count=count)
+        levels = np.fromiter((record.get("level_index", -1) for record in flat), dtype=np.int64, count=count)
+        achievements = np.fromiter((record.get("achievements", 0) for record in flat), dtype=np.float64, count=count)
+        lengths = np.fromiter((len(records) for records in players), dtype=np.int64, count=len(players))
+        player = np.repeat(np.arange(len(players)), lengths)
+        position = np.arange(count) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        valid = (rows >= 0) & (levels >= 0) & (levels < self.chart_count[np.maximum(rows, 0)])
+        unknown = np.flatnonzero(~valid)
+        unknown_bounds = np.searchsorted(player[unknown], np.arange(len(players) + 1))
+        rows, levels, achievements, player, position = (
+            rows[valid], levels[valid], achievements[valid], player[valid], position[valid])
+
+        ds = self.ds[rows, levels]
+        ra = compute_ra(ds, achievements, b50)
+
+        # 同一玩家同一谱面只保留 rating（其次达成率）最高的记录，避免重复记录占用多个 B35/B15 名额；
+        # 通常没有重复，先用一次整数排序检查
+        chart = player * self.ds.size + rows * self.ds.shape[1] + levels
+        sorted_chart = np.sort(chart)
+        if (sorted_chart[1:] == sorted_chart[:-1]).any():
+            order = np.lexsort((-achievements, -ra, chart))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = chart[order][1:] != chart[order][:-1]
+            kept = np.sort(order[first])
+            rows, levels, achievements, player, position, ds, ra = (
+                rows[kept], levels[kept], achievements[kept], player[kept], position[kept], ds[kept], ra[kept])
+        is_new = self.is_new[rows]
+
+        # 按 (玩家, 新旧, rating 降序, 定数降序, 达成率降序) 排序后取每组前 N 个
+        order = np.lexsort((-achievements, -ds, -ra, is_new, player))
+        group = player[order] * 2 + is_new[order]
+        rank = np.arange(len(order)) - np.searchsorted(group, group, side="left")
+        selected = order[rank < np.where(is_new[order], new_slots, old_slots)]
+        bounds = np.searchsorted(player[selected], np.arange(len(players) + 1))
+
+        if not detail:
+            minlength = len(players)
+            new_rating = np.bincount(player[selected], weights=ra[selected] * is_new[selected], minlength=minlength)
+            old_rating = np.bincount(player[selected], weights=ra[selected] * ~is_new[selected], minlength=minlength)
+            return [{"rating": int(o + n), "old_rating": int(o), "new_rating": int(n)}
+                    for o, n in zip(old_rating, new_rating)]
+
+        results = []
+        for index, records in enumerate(players):
+            charts = {"sd": [], "dx": []}
+            for i in selected[bounds[index]:bounds[index + 1]]:
+                charts["dx" if is_new[i] else "sd"].append(
+                    self._record(records[position[i]], rows[i], levels[i], ds[i], achievements[i], ra[i]))
+            old_rating = sum(record["ra"] for record in charts["sd"])
+            new_rating = sum(record["ra"] for record in charts["dx"])
+            results.append({
+                "rating": old_rating + new_rating,
+                "old_rating": old_rating,
+                "new_rating": new_rating,
+                "charts": charts,
+                "unknown": [flat[i] for i in unknown[unknown_bounds[index]:unknown_bounds[index + 1]]],
+            })
+        return results
+
+    def compute(self, records: list[dict], b50: bool = True) -> dict:
+        """
+        计算单个玩家的 rating
+
+        :return: {"rating", "old_rating", "new_rating", "charts": {"sd": 旧版本最佳, "dx": 新版本最佳}, "unknown": 无法识别的记录}
+        """
+        return self.compute_many([records], b50)[0]
+
+    def _record(self, source: dict, row: int, level_index: int, ds: float, achievements: float, ra: int) -> dict:
+        music = self.catalog.by_id[self.music_ids[row]]
+        return {
+            "song_id": int(music["id"]),
+            "title": music["title"],
+            "type": music["type"],
+            "level_index": int(level_index),
+            "level": music["level"][level_index],
+            "ds": float(ds),
+            "achievements": float(achievements),
+            "ra": int(ra),
+            "rate": rate_name(float(achievements)),
+            "fc": source.get("fc", ""),
+            "fs": source.get("fs", ""),
+            "dxScore": source.get("dxScore", 0),
+        }
+
+
+_engine: RatingEngine | None = None
+
+
+def get_rating_engine(catalog: MusicCatalog) -> RatingEngine:
+    """
+    获取与当前歌曲目录对应的 rating 引擎，目录刷新后自动重建
+    """
+    global _engine
+    if _engine is None or _engine.catalog is not catalog:
+        _engine = RatingEngine(catalog)
+    return _engine
@@ -0,0 +1,152 @@
+import numpy as np
+
+from app.service.divingfish.catalog import MusicCatalog
+from app.service.divingfish.chart_stats import ChartStatsStore
+from app.service.dxrating.engine import compute_ra, B50_SLOTS, B40_SLOTS
+
+# 推荐时考虑的目标达成率，由高到低
+TARGET_ACHIEVEMENTS = np.array([100.5, 100.0, 99.5, 99.0, 98.0, 97.0])
+# 定数取值范围 1.0 ~ 15.0，步长 0.1
+_DS_GRID = np.round(np.arange(10, 151) / 10, 1)
+# 玩家能力上限之外仍然推荐的拟合难度余量
+FIT_DIFF_MARGIN = 0.3
+
+
+class RecommendIndex:
+    """
+    "下一首打什么" 的预计算索引
+
+    - 全部谱面按 (fit_diff, ds) 排序，按玩家能力上限二分截取候选区间
+    - 阈值表：每个定数在每个目标达成率下的单曲 rating，用于二分求出能超过玩家当前 B50 底分的最低定数
+    """
+
+    def __init__(self, catalog: MusicCatalog, chart_stats: ChartStatsStore | None, b50: bool = True):
+        self.catalog = catalog
+        self.chart_stats = chart_stats
+        self.b50 = b50
+        music_ids, level_indexes, ds, fit_diff, is_new = [], [], [], [], []
+        for music in catalog.music_list:
+            stats = chart_stats.charts.get(music["id"], []) if chart_stats is not None else []
+            for level_index, chart_ds in enumerate(music["ds"]):
+                chart_stat = stats[level_index] if level_index < len(stats) else {}
+                music_ids.append(music["id"])
+                level_indexes.append(level_index)
+                ds.append(chart_ds)
+                # 没有统计数据的谱面以定数作为拟合难度
+                fit_diff.append(chart_stat.get("fit_diff", chart_ds) if chart_stat else chart_ds)
+                is_new.append(music.get("basic_info", {}).get("is_new", False))
+
+        order = np.lexsort((np.asarray(ds), np.asarray(fit_diff)))
+        self.music_ids = [music_ids[i] for i in order]
+        self.level_index = np.asarray(level_indexes, dtype=np.int64)[order]
+        self.ds = np.asarray(ds, dtype=np.float64)[order]
+        self.fit_diff = np.asarray(fit_diff, dtype=np.float64)[order]
+        self.is_new = np.asarray(is_new, dtype=bool)[order]
+        self.position = {(music_id, int(level)): i for i, (music_id, level) in
+                         enumerate(zip(self.music_ids, self.level_index))}
+
+        # threshold_table[k][j]: 定数 _DS_GRID[j] 在 TARGET_ACHIEVEMENTS[k] 下的 rating，随定数单调不减
+        self.threshold_table = np.stack([
+            compute_ra(_DS_GRID, np.full(len(_DS_GRID), achievements), b50) for achievements in TARGET_ACHIEVEMENTS
+        ])
+        # 每个候选谱面在各目标达成率下的 rating
+        self.target_ra = np.stack([
+            compute_ra(self.ds, np.full(len(self.ds), achievements), b50) for achievements in TARGET_ACHIEVEMENTS
+        ])
+
+    def min_ds_for(self, tier: int, floor_ra: int) -> float:
+        """
+        在第 tier 个目标达成率下，rating 超过 floor_ra 所需的最低定数
+        """
+        j = np.searchsorted(self.threshold_table[tier], floor_ra, side="right")
+        return float(_DS_GRID[j]) if j < len(_DS_GRID) else float("inf")
+
+    def recommend(self, best: dict, limit: int = 20) -> list[dict]:
+        """
+        根据玩家当前的最佳成绩推荐预期 rating 提升最大的谱面
+
+        :param best: RatingEngine.compute 的结果
+        :param limit: 返回数量
+        :return: 按预期提升降序排列的谱面
+        """
+        current = {(str(r["song_id"]), r["level_index"]): r for r in best["charts"]["sd"] + best["charts"]["dx"]}
+        # B50 底分：对应分组未满时任何成绩都能直接加入
+        old_slots, new_slots = B50_SLOTS if self.b50 else B40_SLOTS
+        floors = {
+            False: min(r["ra"] for r in best["charts"]["sd"]) if len(best["charts"]["sd"]) >= old_slots else 0,
+            True: min(r["ra"] for r in best["charts"]["dx"]) if len(best["charts"]["dx"]) >= new_slots else 0,
+        }
+        # 玩家能力上限：各目标达成率下已达成谱面的最高拟合难度
+        ceilings = []
+        for achievements in TARGET_ACHIEVEMENTS:
+            fits = [self.fit_diff[self.position[key]] for key, r in current.items()
+                    if r["achievements"] >= achievements and key in self.position]
+            ceilings.append(max(fits, default=0.0) + FIT_DIFF_MARGIN)
+
+        best_gain = np.zeros(len(self.ds), dtype=np.int64)
+        best_tier = np.full(len(self.ds), -1, dtype=np.int64)
+        for tier, ceiling in enumerate(ceilings):
+            end = np.searchsorted(self.fit_diff, ceiling, side="right")
+            if end == 0:
+                continue
+            min_ds = min(self.min_ds_for(tier, floors[False]), self.min_ds_for(tier, floors[True]))
+            window = np.flatnonzero(self.ds[:end] >= min_ds)
+            if len(window) == 0:
+                continue
+            floor = np.where(self.is_new[window], floors[True], floors[False])
+            gain = self.target_ra[tier, window] - floor
+            better = gain > best_gain[window]
+            best_gain[window[better]] = gain[better]
+            best_tier[window[better]] = tier
+
+        # 已在 B50 中的谱面，预期提升按替换自身成绩计算
+        for key, record in current.items():
+            i = self.position.get(key)
+            if i is None:
+                continue
+            gains = self.target_ra[:, i] - record["ra"]
+            reachable = [tier for tier, ceiling in enumerate(ceilings)
+                         if self.fit_diff[i] <= ceiling and TARGET_ACHIEVEMENTS[tier] > record["achievements"]]
+            if reachable:
+                tier = max(reachable, key=lambda t: gains[t])
+                best_gain[i], best_tier[i] = max(int(gains[tier]), 0), tier
+            else:
+                best_gain[i], best_tier[i] = 0, -1
+
+        candidates = np.flatnonzero(best_gain > 0)
+        # 提升越大越靠前；相同提升时优先拟合难度相对定数更低（更"水"）的谱面
+        order = candidates[np.lexsort((self.fit_diff[candidates] - self.ds[candidates], -best_gain[candidates]))]
+        result = []
+        for i in order[:limit]:
+            music = self.catalog.by_id[self.music_ids[i]]
+            level_index = int(self.level_index[i])
+            record = current.get((music["id"], level_index))
+            result.append({
+                "song_id": int(music["id"]),
+                "title": music["title"],
+                "type": music["type"],
+                "level_index": level_index,
+                "level": music["level"][level_index],
+                "ds": float(self.ds[i]),
+                "fit_diff": float(self.fit_diff[i]),
+                "target_achievements": float(TARGET_ACHIEVEMENTS[best_tier[i]]),
+                "target_ra": int(self.target_ra[best_tier[i], i]),
+                "gain": int(best_gain[i]),
+                "in_best": record is not None,
+                "current_achievements": record["achievements"] if record is not None else None,
+            })
+        return result
+
+
+_indexes: dict[bool, RecommendIndex] = {}
+
+
+def get_recommend_index(catalog: MusicCatalog, chart_stats: ChartStatsStore | None, b50: bool = True) -> RecommendIndex:
+    """
+    获取与当前歌曲目录、铺面统计对应的推荐索引，任一数据刷新后自动重建
+    """
+    index = _indexes.get(b50)
+    if index is None or index.catalog is not catalog or index.chart_stats is not chart_stats:
+        index = RecommendIndex(catalog, chart_stats, b50)
+        _indexes[b50] = index
+    return index
@@ -0,0 +1,154 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from loguru import logger
+
+
+@dataclass
+class _Entry:
+    value: Any
+    size: int
+    expires_at: float
+
+
+def _estimate_size(value: Any) -> int:
+    """
+    以 JSON 序列化后的长度近似估算缓存值占用的内存
+    """
+    try:
+        return len(json.dumps(value))
+    except (TypeError, ValueError, OverflowError):
+        return 1024
+
+
+class AsyncTTLCache:
+    """
+    带 TTL 与按内存大小 LRU 淘汰的异步读穿缓存
+
+    - 相同 key 的并发未命中只会触发一次 loader（single-flight），其余调用方共享结果
+    - 开启 stale_while_revalidate 时，过期但仍在 stale_ttl 窗口内的值会被直接返回，同时在后台刷新
+    """
+
+    def __init__(self, ttl: float, max_bytes: int, stale_while_revalidate: bool = False, stale_ttl: float = 0):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_ttl = stale_ttl
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "stale_hits": self.stale_hits,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
+
+    def invalidate(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def peek(self, key: Hashable) -> Any | None:
+        """
+        不计入统计、不考虑过期地读取缓存值
+        """
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        self.invalidate(key)
+        self._entries[key] = _Entry(value, size, time.monotonic() + self.ttl)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+            self.evictions += 1
+
+    async def get_or_load(
+            self,
+            key: Hashable,
+            loader: Callable[[], Awaitable[Any]],
+            should_cache: Callable[[Any], bool] = lambda _: True,
+    ) -> Any:
+        """
+        读取缓存，未命中时调用 loader 加载
+
+        :param key: 缓存键
+        :param loader: 无参异步加载函数
+        :param should_cache: 判断 loader 的结果是否可以写入缓存
+        :return: 缓存值或 loader 的结果
+        """
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if now < entry.expires_at:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if self.stale_while_revalidate and now < entry.expires_at + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self._start_load(key, loader, should_cache)
+                return entry.value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._start_load(key, loader, should_cache)
+        return await asyncio.shield(task)
+
+    def _start_load(
+            self,
+            key: Hashable,
+            loader: Callable[[], Awaitable[Any]],
+            should_cache: Callable[[Any], bool],
+    ) -> asyncio.Task:
+        async def load():
+            try:
+                value = await loader()
+                if should_cache(value):
+                    self.put(key, value)
+                return value
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.create_task(load())
+        task.add_done_callback(_log_background_error)
+        self._inflight[key] = task
+        return task
+
+
+def _log_background_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"缓存加载失败: {task.exception()!r}")
@@ -0,0 +1,162 @@
+import codecs
+import json
+from typing import Any, Iterator
+
+_WHITESPACE = " \t\n\r"
+_CLOSING = {"{": "}", "[": "]"}
+_DELIMITERS = _WHITESPACE + ",]}"
+_NUMBER_START = "-0123456789"
+_decoder = json.JSONDecoder()
+
+
+class JsonStreamDecoder:
+    """
+    增量解析 JSON，按给定深度逐个产出子值
+
+    depth=1 时产出顶层数组的每个元素（或顶层对象的每个成员），depth=2 时再向下一层，依此类推；
+    比 depth 浅的标量直接产出。每项为 (路径, 值)，路径由对象键与数组下标组成。
+    只有尚未解析完的一个子值会留在缓冲区中，适合在下载的同时解析大体积响应。
+    """
+
+    def __init__(self, depth: int = 1):
+        self.depth = depth
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        # 每层容器为 [括号, 状态, 当前键或下标]
+        self._stack: list[list] = []
+        self._done = False
+
+    def feed(self, chunk: bytes) -> list[tuple[tuple, Any]]:
+        """
+        输入一段字节，返回其中已完整的子值
+        """
+        self._buf = self._buf[self._pos:] + self._utf8.decode(chunk)
+        self._pos = 0
+        return self._parse(final=False)
+
+    def close(self) -> list[tuple[tuple, Any]]:
+        """
+        输入结束，返回剩余的子值
+
+        :raises ValueError: JSON 不完整或格式错误
+        """
+        self._buf = self._buf[self._pos:] + self._utf8.decode(b"", final=True)
+        self._pos = 0
+        items = self._parse(final=True)
+        if not self._done:
+            raise ValueError("JSON 数据不完整")
+        return items
+
+    def _path(self) -> tuple:
+        return tuple(level[2] for level in self._stack)
+
+    def _decode(self, final: bool) -> tuple[Any, int] | None:
+        """
+        从当前位置解析一个完整的值；数据不足时返回 None
+        """
+        try:
+            value, end = _decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+        # 数字可能还没有接收完整（如 "1." 或 "1e"），其后必须是分隔符；其他值自带结束符
+        if not final and self._buf[self._pos] in _NUMBER_START and (
+                end == len(self._buf) or self._buf[end] not in _DELIMITERS):
+            return None
+        return value, end
+
+    def _close_container(self) -> None:
+        self._stack.pop()
+        self._pos += 1
+        if self._stack:
+            self._stack[-1][1] = "sep"
+        else:
+            self._done = True
+
+    def _parse(self, final: bool) -> list[tuple[tuple, Any]]:
+        items = []
+        buf = self._buf
+        while True:
+            while self._pos < len(buf) and buf[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos >= len(buf):
+                return items
+            ch = buf[self._pos]
+            if self._done:
+                raise ValueError(f"JSON 结束后存在多余的数据: {ch!r}")
+
+            if not self._stack:
+                if ch in _CLOSING and self.depth > 0:
+                    self._stack.append([ch, "open", None])
+                    self._pos += 1
+                    continue
+                decoded = self._decode(final)
+                if decoded is None:
+                    return items
+                items.append(((), decoded[0]))
+                self._pos = decoded[1]
+                self._done = True
+                continue
+
+            level = self._stack[-1]
+            state = level[1]
+            if state == "open":
+                if ch == _CLOSING[level[0]]:
+                    self._close_container()
+                    continue
+                if level[0] == "{":
+                    state = level[1] = "key"
+                else:
+                    level[2] = 0
+                    state = level[1] = "value"
+
+            if state == "key":
+                if ch != '"':
+                    raise ValueError(f"位置 {self._pos} 处应为对象键: {ch!r}")
+                decoded = self._decode(final)
+                if decoded is None:
+                    return items
+                level[2], self._pos = decoded
+                level[1] = "colon"
+            elif state == "colon":
+                if ch != ":":
+                    raise ValueError(f"位置 {self._pos} 处应为冒号: {ch!r}")
+                self._pos += 1
+                level[1] = "value"
+            elif state == "value":
+                if ch in _CLOSING and len(self._stack) < self.depth:
+                    level[1] = "sep"
+                    self._stack.append([ch, "open", None])
+                    self._pos += 1
+                    continue
+                decoded = self._decode(final)
+                if decoded is None:
+                    return items
+                items.append((self._path(), decoded[0]))
+                self._pos = decoded[1]
+                level[1] = "sep"
+            elif ch == ",":
+                self._pos += 1
+                if level[0] == "{":
+                    level[1] = "key"
+                else:
+                    level[2] += 1
+                    level[1] = "value"
+            elif ch == _CLOSING[level[0]]:
+                self._close_container()
+            else:
+                raise ValueError(f"位置 {self._pos} 处应为逗号或 {_CLOSING[level[0]]}: {ch!r}")
+
+
+def iter_json_items(value: Any, depth: int = 1, path: tuple = ()) -> Iterator[tuple[tuple, Any]]:
+    """
+    按与 JsonStreamDecoder 相同的深度与路径规则遍历已解析的 JSON 值
+    """
+    if depth <= 0 or not isinstance(value, (dict, list)):
+        yield path, value
+        return
+    items = value.items() if isinstance(value, dict) else enumerate(value)
+    for key, child in items:
+        yield from iter_json_items(child, depth - 1, path + (key,))
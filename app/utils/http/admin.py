@@ -0,0 +1,42 @@
+import hmac
+
+from fastapi import HTTPException
+from starlette import status
+
+from cfg.config import AdminToken
+
+
+def is_admin(x_admin_token: str | None) -> bool:
+    """
+    请求携带的管理令牌是否有效，未配置管理令牌时总是 False
+    """
+    return bool(AdminToken) and x_admin_token is not None and \
+        hmac.compare_digest(x_admin_token.encode("utf-8"), AdminToken.encode("utf-8"))
+
+
+def require_refresh_access(x_admin_token: str | None) -> None:
+    """
+    校验数据刷新接口的访问权限：配置了管理令牌时要求 X-Admin-Token 有效（否则返回 403），
+    未配置时与以前一样允许任何人访问
+    """
+    if AdminToken and not is_admin(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理令牌无效"
+        )
+
+
+def require_admin(x_admin_token: str | None) -> None:
+    """
+    校验 X-Admin-Token 头：未配置管理令牌时返回 503，令牌无效时返回 403
+    """
+    if not AdminToken:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="未配置管理令牌，管理接口不可用"
+        )
+    if not is_admin(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="管理令牌无效"
+        )
@@ -0,0 +1,52 @@
+import os
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from app.utils.metrics.instruments import STORAGE_READ_BYTES
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """
+    根据文件大小与修改时间生成弱 ETag
+    """
+    return f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: float | None = None) -> bool:
+    """
+    判断请求携带的 If-None-Match / If-Modified-Since 是否与当前资源一致
+
+    同时存在时按 RFC 9110 只看 If-None-Match。
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # 弱比较：忽略 W/ 前缀
+        bare = etag.removeprefix("W/")
+        return "*" in candidates or any(tag.removeprefix("W/") == bare for tag in candidates)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cached_file_response(request: Request, path: str, max_age: int, media_type: str | None = None) -> Response:
+    """
+    返回带 ETag/Last-Modified/Cache-Control 的文件响应，客户端缓存仍有效时返回 304
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": f"public, max-age={max_age}",
+    }
+    if is_not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+    STORAGE_READ_BYTES.labels(os.path.basename(os.path.dirname(path))).inc(stat.st_size)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
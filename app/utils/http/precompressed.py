@@ -0,0 +1,78 @@
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.utils.http.conditional import is_not_modified
+from cfg.config import CompressMinSize, ItemGzipLevel, ItemBrotliQuality
+
+
+class EncodedBody:
+    """
+    预先序列化并压缩好的响应体
+
+    每种内容编码对应一个强 ETag（同一份数据的 gzip 与原文字节不同，ETag 也必须不同）。
+    小于 CompressMinSize 的响应体不压缩，压缩收益不足以抵消解压开销。
+    默认的压缩级别适合在事件循环中按需构建的小响应体；完整目录等大响应体应在线程中构建，
+    并传入 GzipLevel / BrotliQuality。
+    """
+
+    def __init__(self, content: bytes, tag: str | None = None, gzip_level: int = ItemGzipLevel,
+                 brotli_quality: int = ItemBrotliQuality):
+        # tag 为数据版本，缺省时使用内容的哈希
+        tag = tag or hashlib.sha256(content).hexdigest()[:32]
+        self.bodies: dict[str | None, bytes] = {None: content}
+        if len(content) >= CompressMinSize:
+            self.bodies["gzip"] = gzip.compress(content, compresslevel=gzip_level, mtime=0)
+            if brotli is not None:
+                self.bodies["br"] = brotli.compress(content, quality=brotli_quality)
+        self.etags = {encoding: f'"{tag}-{encoding}"' if encoding else f'"{tag}"' for encoding in self.bodies}
+
+    def __len__(self) -> int:
+        return len(self.bodies[None])
+
+    def negotiate(self, accept_encoding: str | None) -> str | None:
+        """
+        按 Accept-Encoding 选择内容编码，优先 br，其次 gzip，都不接受时返回 None（原文）
+        """
+        if not accept_encoding:
+            return None
+        accepted = {}
+        for item in accept_encoding.split(","):
+            name, _, params = item.strip().partition(";")
+            q = 1.0
+            params = params.strip()
+            if params.startswith("q="):
+                try:
+                    q = float(params[2:])
+                except ValueError:
+                    q = 0.0
+            accepted[name.strip().lower()] = q
+        for encoding in ("br", "gzip"):
+            if encoding in self.bodies and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return None
+
+
+def encoded_response(request: Request, body: EncodedBody, max_age: int,
+                     media_type: str = "application/json") -> Response:
+    """
+    按客户端支持的编码返回预压缩的响应体，带强 ETag 与 Cache-Control，客户端缓存仍有效时返回 304
+    """
+    encoding = body.negotiate(request.headers.get("accept-encoding"))
+    headers = {
+        "ETag": body.etags[encoding],
+        "Cache-Control": f"public, max-age={max_age}",
+        "Vary": "Accept-Encoding",
+    }
+    if is_not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body.bodies[encoding], media_type=media_type, headers=headers)
@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class PriorityLimiter:
+    """
+    按优先级排队的并发限制
+
+    最多 concurrency 个调用同时持有名额；没有空闲名额时排队，名额释放后直接交给
+    优先级最高（levels 中越靠前越高）、其次最早排队的等待者。
+
+    :param concurrency: 同时持有名额的调用数上限
+    :param levels: 优先级名称，按从高到低排列
+    """
+
+    def __init__(self, concurrency: int, levels: tuple[str, ...]):
+        if concurrency <= 0:
+            raise ValueError("concurrency 必须大于 0")
+        self.concurrency = concurrency
+        self.levels = levels
+        self._priority = {level: i for i, level in enumerate(levels)}
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.active = 0
+        self.waiting = {level: 0 for level in levels}
+        self.granted = {level: 0 for level in levels}
+        self.timeouts = {level: 0 for level in levels}
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": dict(self.waiting),
+            "granted": dict(self.granted),
+            "timeouts": dict(self.timeouts),
+        }
+
+    async def acquire(self, level: str, timeout: float | None = None) -> float:
+        """
+        获取一个名额
+
+        :param level: 优先级名称
+        :param timeout: 最多排队的秒数，None 表示一直等待
+        :return: 排队等待的秒数
+        :raises asyncio.TimeoutError: 排队超时
+        """
+        self.granted[level] += 1
+        if self.active < self.concurrency and not any(self.waiting.values()):
+            self.active += 1
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (self._priority[level], next(self._seq), future))
+        self.waiting[level] += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # 名额已经交给了本调用，转交给下一个等待者
+                self.release()
+            else:
+                future.cancel()
+            self.granted[level] -= 1
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts[level] += 1
+            raise
+        finally:
+            self.waiting[level] -= 1
+        return time.perf_counter() - start
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            # 已超时或被取消的等待者留在堆中，出堆时跳过
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, level: str, timeout: float | None = None) -> AsyncIterator[float]:
+        """
+        持有一个名额直到退出，产出排队等待的秒数
+        """
+        waited = await self.acquire(level, timeout)
+        try:
+            yield waited
+        finally:
+            self.release()
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class TokenBucket:
+    """
+    令牌桶限流器
+
+    以 rate 个/秒的速度补充令牌，最多积攒 capacity 个；acquire 在令牌不足时等待，try_acquire 不等待。
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate 必须大于 0")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def time_until(self, tokens: float = 1) -> float:
+        """
+        距离可以取得 tokens 个令牌还需要的秒数
+        """
+        self._refill()
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    async def acquire(self, tokens: float = 1) -> None:
+        # 排队的调用方按先后顺序获得令牌
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                delay = self.time_until(tokens)
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+
+
+class KeyedRateLimiter:
+    """
+    按键（例如客户端与路由类别）分别维护令牌桶的非阻塞限流器
+
+    最多保留 max_keys 个令牌桶，超出时淘汰最久未使用的；被淘汰的键下次从满桶开始，
+    因此长时间不活跃的客户端不会占用内存。
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[Hashable, TokenBucket] = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def check(self, key: Hashable, rate: float, capacity: float) -> float:
+        """
+        为 key 消耗一个令牌
+
+        :return: 0 表示放行，否则为需要等待的秒数
+        """
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.rate != rate or bucket.capacity != capacity:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        if bucket.try_acquire():
+            self.allowed += 1
+            return 0.0
+        self.rejected += 1
+        return max(bucket.time_until(), 1e-3)
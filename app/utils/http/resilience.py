@@ -0,0 +1,146 @@
+import random
+import time
+from collections import deque
+from enum import StrEnum
+
+
+class CircuitState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    熔断器处于打开状态，请求未发出即被拒绝
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} 熔断中，{retry_after:.1f} 秒后重试")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    三态熔断器
+
+    - closed: 正常放行，连续失败达到 failure_threshold 次后打开
+    - open: 直接拒绝请求，经过 recovery_timeout 秒后进入半开
+    - half_open: 最多放行 half_open_max_calls 个探测请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.opened_count = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def retry_after(self) -> float:
+        return max(0.0, self._opened_at + self.recovery_timeout - time.monotonic())
+
+    def acquire(self) -> None:
+        """
+        申请发起一次请求，不允许时抛出 CircuitOpenError
+
+        申请成功后必须以 record_success / record_failure / release 之一结束。
+        """
+        state = self.state
+        if state == CircuitState.OPEN:
+            raise CircuitOpenError(self.name, self.retry_after())
+        if state == CircuitState.HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                raise CircuitOpenError(self.name, 0)
+            self._half_open_calls += 1
+
+    def release(self) -> None:
+        """
+        请求以与上游健康无关的原因结束（例如被取消），只归还半开探测名额
+        """
+        if self._state == CircuitState.HALF_OPEN:
+            self._half_open_calls = max(0, self._half_open_calls - 1)
+
+    def record_success(self) -> None:
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._half_open_calls = 0
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != CircuitState.OPEN:
+                self.opened_count += 1
+            self._state = CircuitState.OPEN
+            self._opened_at = time.monotonic()
+            self._half_open_calls = 0
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self._failures,
+            "retry_after": round(self.retry_after(), 3) if self._state == CircuitState.OPEN else 0,
+            "opened_count": self.opened_count,
+        }
+
+
+class RetryBudget:
+    """
+    重试预算：滑动窗口内的重试次数不超过 min_per_second * window + ratio * 请求数
+
+    上游整体故障时所有请求都会失败，预算会很快耗尽，避免重试把上游负载放大数倍。
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1, window: float = 10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+        self.exhausted = 0
+
+    def _trim(self, now: float) -> None:
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self) -> None:
+        now = time.monotonic()
+        # 每次记录时移出窗口外的事件，队列长度不超过窗口内的请求数
+        self._trim(now)
+        self._requests.append(now)
+
+    def try_acquire(self) -> bool:
+        """
+        尝试消耗一次重试额度
+        """
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= self.min_per_second * self.window + self.ratio * len(self._requests):
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> dict:
+        self._trim(time.monotonic())
+        return {"requests": len(self._requests), "retries": len(self._retries), "exhausted": self.exhausted}
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    带 full jitter 的指数退避：在 [0, min(cap, base * 2^attempt)] 中均匀取值
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,110 @@
+from typing import Callable
+
+from app.utils.metrics.prometheus import Counter, Gauge, Histogram, CallbackMetric
+
+HTTP_REQUEST_DURATION = Histogram(
+    "maitp_http_request_duration_seconds",
+    "各路由的请求处理耗时",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "maitp_http_requests_in_flight",
+    "正在处理的请求数",
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "maitp_upstream_request_duration_seconds",
+    "水鱼各接口从发出请求到收到响应头的耗时，status 为 HTTP 状态码或 error",
+    ["endpoint", "status"],
+)
+STORAGE_READ_BYTES = Counter(
+    "maitp_storage_read_bytes_total",
+    "从 data/divingfish 读取的字节数",
+    ["source"],
+)
+JSON_PARSE_DURATION = Histogram(
+    "maitp_json_parse_duration_seconds",
+    "数据集 JSON 解析耗时",
+    ["dataset"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+UPSTREAM_QUEUE_WAIT = Histogram(
+    "maitp_upstream_queue_wait_seconds",
+    "水鱼请求按优先级排队等待名额的耗时",
+    ["priority"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30),
+)
+REFRESH_DURATION = Histogram(
+    "maitp_refresh_duration_seconds",
+    "后台刷新任务耗时，outcome 为 success 或 error",
+    ["job", "outcome"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
+RATE_LIMIT_REJECTED = Counter(
+    "maitp_ratelimit_rejected_total",
+    "被限流中间件拒绝的请求数，client 为 API key 名称、anonymous 或 invalid",
+    ["route_class", "client"],
+)
+SCORE_FEED_EVENTS = Counter(
+    "maitp_score_feed_events_total",
+    "发布的玩家成绩变化事件数",
+)
+SCORE_FEED_DROPPED = Counter(
+    "maitp_score_feed_dropped_total",
+    "订阅者缓冲已满而丢弃的事件数，subscriber 为 sse 或 webhook",
+    ["subscriber"],
+)
+SCORE_FEED_WEBHOOK_DELIVERIES = Counter(
+    "maitp_score_feed_webhook_deliveries_total",
+    "批量 webhook 推送次数，outcome 为 success 或 error",
+    ["outcome"],
+)
+
+DATASET_RELOADS = Counter(
+    "maitp_dataset_reloads_total",
+    "发现数据文件被其他 worker 更新后重新加载内存快照的次数",
+    ["dataset"],
+)
+
+_cache_stats: dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]) -> None:
+    """
+    注册一个缓存的 stats() 以暴露命中率等指标
+
+    stats() 需要返回 hits、misses，可选 coalesced、stale_hits、evictions、bytes。
+    """
+    _cache_stats[name] = stats
+
+
+def _cache_requests():
+    for name, stats in _cache_stats.items():
+        values = stats()
+        for result in ("hits", "misses", "coalesced", "stale_hits"):
+            if result in values:
+                yield (name, result), values[result]
+
+
+def _cache_hit_ratio():
+    for name, stats in _cache_stats.items():
+        values = stats()
+        hits = values.get("hits", 0) + values.get("stale_hits", 0)
+        total = hits + values.get("misses", 0) + values.get("coalesced", 0)
+        yield (name,), hits / total if total else 0.0
+
+
+def _cache_field(field: str):
+    def collect():
+        for name, stats in _cache_stats.items():
+            values = stats()
+            if field in values:
+                yield (name,), values[field]
+    return collect
+
+
+CallbackMetric("maitp_cache_requests_total", "缓存请求数，result 为 hits/misses/coalesced/stale_hits",
+               "counter", ["cache", "result"], _cache_requests)
+CallbackMetric("maitp_cache_hit_ratio", "缓存命中率（含过期命中）", "gauge", ["cache"], _cache_hit_ratio)
+CallbackMetric("maitp_cache_bytes", "缓存当前占用字节数", "gauge", ["cache"], _cache_field("bytes"))
+CallbackMetric("maitp_cache_evictions_total", "缓存淘汰次数", "counter", ["cache"], _cache_field("evictions"))
@@ -0,0 +1,85 @@
+import collections
+import os
+import sys
+import threading
+import time
+
+from loguru import logger
+
+
+def _fold(frame) -> str:
+    """
+    把调用栈转换为 flamegraph.pl / speedscope 可读取的折叠格式：外层在前，以分号分隔
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    对事件循环线程的采样分析器
+
+    后台线程每隔 interval 秒记录一次目标线程的调用栈，保存在环形缓冲区中；
+    请求耗时超过 threshold 时把该请求期间的采样写成折叠格式文件。
+    事件循环同时处理多个请求，文件中也会包含同一时间段内其他请求的调用栈。
+    """
+
+    def __init__(self, interval: float = 0.005, threshold: float = 1.0, output_dir: str = "data/profiles",
+                 window: float = 60):
+        self.interval = interval
+        self.threshold = threshold
+        self.output_dir = output_dir
+        self._samples: collections.deque[tuple[float, str]] = collections.deque(maxlen=int(window / interval))
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self.dumps = 0
+
+    def start(self, thread_id: int | None = None) -> None:
+        """
+        开始采样，默认采样调用方所在的线程（在 lifespan 中调用即为事件循环线程）
+        """
+        if self._thread is not None:
+            return
+        target = thread_id if thread_id is not None else threading.get_ident()
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, args=(target,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"采样分析器已启动: interval={self.interval}s, threshold={self.threshold}s")
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, thread_id: int) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                self._samples.append((time.perf_counter(), _fold(frame)))
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def dump(self, name: str, start: float, end: float) -> str | None:
+        """
+        写出 [start, end]（perf_counter 时间）内的采样
+
+        :return: 文件路径，期间没有采样时返回 None
+        """
+        counts = collections.Counter(stack for t, stack in list(self._samples) if start <= t <= end)
+        if not counts:
+            return None
+        safe_name = "".join(c if c.isalnum() else "_" for c in name).strip("_") or "root"
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_name}-{self.dumps}.folded")
+        self.dumps += 1
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in counts.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
@@ -1,5 +1,5 @@
 import os
 
 def mkdir_ignore_exists(f_path: str | os.PathLike[str]):
-    if not os.path.exists(f_path):
-        os.mkdir(f_path)
+    # 多个 worker 同时启动时可能并发创建，exist_ok 避免 FileExistsError
+    os.makedirs(f_path, exist_ok=True)
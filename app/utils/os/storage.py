@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterable, AsyncIterator
+
+import aiofile
+
+from app.utils.metrics.instruments import STORAGE_READ_BYTES
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    原子写入文件：先写入同目录下的临时文件并 fsync，再 rename 覆盖目标文件
+
+    读取方要么看到旧文件，要么看到完整的新文件，不会读到写了一半的内容。
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp 创建的文件权限为 0600
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(directory)
+
+
+async def atomic_write_stream(path: str, chunks: AsyncIterable[bytes], fsync: bool = False) -> int:
+    """
+    将异步字节流原子写入文件，无需把完整内容缓冲在内存中
+
+    :param fsync: 替换前是否 fsync 临时文件与目录，与 atomic_write 的持久性保证一致
+    :return: 写入的字节数
+    """
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    size = 0
+    try:
+        async with aiofile.async_open(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                await f.write(chunk)
+                size += len(chunk)
+        if fsync:
+            await asyncio.to_thread(_fsync_file, tmp_path)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if fsync:
+        await asyncio.to_thread(_fsync_dir, directory)
+    return size
+
+
+def _fsync_file(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(directory: str) -> None:
+    if fcntl is None:
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def write_dataset(data_path: str, meta_path: str, data: bytes, meta: dict) -> dict:
+    """
+    原子写入数据文件及其元数据
+
+    元数据中记录数据文件的 sha256，先写数据再写元数据；
+    若两次写入之间进程崩溃，read_dataset_meta 会因哈希不一致而忽略旧元数据（例如 ETag），
+    下次刷新将完整重新下载，而不会出现 ETag 与数据不匹配的情况。
+
+    :return: 实际写入的元数据
+    """
+    meta = {**meta, "sha256": hashlib.sha256(data).hexdigest(), "request_at": time.time()}
+    await asyncio.to_thread(atomic_write, data_path, data)
+    await asyncio.to_thread(atomic_write, meta_path, json.dumps(meta).encode("utf-8"))
+    return meta
+
+
+async def write_dataset_stream(data_path: str, meta_path: str, chunks: AsyncIterable[bytes], meta: dict) -> dict:
+    """
+    以流的方式原子写入数据文件及其元数据，写入的同时计算 sha256
+
+    与 write_dataset 相同，先写数据再写元数据；数据不会完整缓冲在内存中。
+
+    :return: 实际写入的元数据
+    """
+    digest = hashlib.sha256()
+
+    async def hashed() -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            digest.update(chunk)
+            yield chunk
+
+    await atomic_write_stream(data_path, hashed(), fsync=True)
+    meta = {**meta, "sha256": digest.hexdigest(), "request_at": time.time()}
+    await asyncio.to_thread(atomic_write, meta_path, json.dumps(meta).encode("utf-8"))
+    return meta
+
+
+async def touch_dataset_meta(meta_path: str, meta: dict) -> dict:
+    """
+    数据未变化（HTTP 304）时仅更新元数据中的请求时间
+
+    :return: 更新后的元数据
+    """
+    meta = {**meta, "request_at": time.time()}
+    await asyncio.to_thread(atomic_write, meta_path, json.dumps(meta).encode("utf-8"))
+    return meta
+
+
+def _read_dataset(data_path: str, meta_path: str) -> tuple[bytes | None, dict | None]:
+    if not os.path.exists(data_path):
+        return None, None
+    with open(data_path, "rb") as f:
+        data = f.read()
+    STORAGE_READ_BYTES.labels(os.path.basename(data_path)).inc(len(data))
+    meta = None
+    if os.path.exists(meta_path):
+        meta = _read_meta(meta_path)
+        # 哈希不一致说明元数据与数据不同步；没有 sha256 的旧元数据文件按原样使用
+        if "sha256" in meta and meta["sha256"] != hashlib.sha256(data).hexdigest():
+            meta = None
+    return data, meta
+
+
+async def read_dataset(data_path: str, meta_path: str) -> tuple[bytes | None, dict | None]:
+    """
+    读取数据文件及其元数据，元数据与数据不匹配时元数据返回 None
+
+    :return: (数据, 元数据)，数据文件不存在时均为 None
+    """
+    return await asyncio.to_thread(_read_dataset, data_path, meta_path)
+
+
+def _read_meta(meta_path: str) -> dict | None:
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "rb") as f:
+        raw = f.read()
+    STORAGE_READ_BYTES.labels(os.path.basename(meta_path)).inc(len(raw))
+    return json.loads(raw)
+
+
+async def peek_dataset_meta(meta_path: str) -> dict | None:
+    """
+    只读取元数据文件而不校验数据文件的哈希
+
+    用于判断派生文件（例如二进制快照）是否与元数据对应的数据版本一致，避免读取整个数据文件。
+    """
+    return await asyncio.to_thread(_read_meta, meta_path)
+
+
+async def read_dataset_meta(data_path: str, meta_path: str) -> dict | None:
+    """
+    读取与数据文件一致的元数据
+    """
+    _, meta = await read_dataset(data_path, meta_path)
+    return meta
+
+
+def _lock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    else:
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+
+def _unlock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def try_lock_file(lock_path: str) -> int | None:
+    """
+    以非阻塞方式获取进程间的文件锁，并把当前进程 id 写入锁文件
+
+    :return: 成功时返回文件描述符，需要一直保持打开，关闭即释放（进程退出时由操作系统释放）；已被其他进程持有时返回 None
+    """
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        os.close(fd)
+        return None
+    if fcntl is not None:
+        # msvcrt 锁定的是文件第一个字节，Windows 下不写入以免冲突
+        os.ftruncate(fd, 0)
+        os.pwrite(fd, str(os.getpid()).encode("ascii"), 0)
+    return fd
+
+
+_async_locks: dict[str, asyncio.Lock] = {}
+
+
+@asynccontextmanager
+async def dataset_lock(lock_path: str) -> AsyncIterator[None]:
+    """
+    数据集级别的互斥锁
+
+    进程内使用 asyncio.Lock，进程间使用文件锁，保证多个 uvicorn worker 不会同时刷新同一个数据集。
+    """
+    async with _async_locks.setdefault(lock_path, asyncio.Lock()):
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            await asyncio.to_thread(_lock_fd, fd)
+            try:
+                yield
+            finally:
+                _unlock_fd(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,201 @@
+import random
+from typing import Any, Hashable, Iterator
+
+_MAX_LEVEL = 32
+_P = 0.25
+
+
+class _Node:
+    __slots__ = ("member", "score", "forward", "span")
+
+    def __init__(self, member: Any, score: Any, level: int):
+        self.member = member
+        self.score = score
+        self.forward: list[_Node | None] = [None] * level
+        # span[i] 为从当前节点沿第 i 层走到 forward[i] 跨过的节点数
+        self.span: list[int] = [0] * level
+
+
+class RankedSet:
+    """
+    按分数降序排列的有序集合，结构与 Redis 有序集合相同：每层指针记录跨度的跳表
+
+    分数相同时按成员升序排列（成员需要可比较），因此顺序是确定的。
+    插入/更新、删除、按成员求排名、按排名定位、按分数计数均为 O(log n)，取区间为 O(log n + k)。
+    """
+
+    def __init__(self, seed: int | None = None):
+        self._head = _Node(None, None, _MAX_LEVEL)
+        self._level = 1
+        self._length = 0
+        self._scores: dict[Hashable, Any] = {}
+        self._rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __contains__(self, member: Hashable) -> bool:
+        return member in self._scores
+
+    def __iter__(self) -> Iterator[tuple[Any, Any]]:
+        node = self._head.forward[0]
+        while node is not None:
+            yield node.member, node.score
+            node = node.forward[0]
+
+    def score(self, member: Hashable) -> Any | None:
+        return self._scores.get(member)
+
+    @staticmethod
+    def _before(node: _Node, member: Any, score: Any) -> bool:
+        """
+        node 是否排在 (member, score) 之前
+        """
+        return node.score > score or (node.score == score and node.member < member)
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < _MAX_LEVEL and self._rng.random() < _P:
+            level += 1
+        return level
+
+    def add(self, member: Hashable, score: Any) -> bool:
+        """
+        插入成员或更新其分数
+
+        :return: 是否为新成员
+        """
+        old = self._scores.get(member)
+        if old is not None:
+            if old == score:
+                return False
+            self._delete(member, old)
+        self._insert(member, score)
+        self._scores[member] = score
+        return old is None
+
+    def remove(self, member: Hashable) -> bool:
+        """
+        :return: 成员是否存在
+        """
+        score = self._scores.pop(member, None)
+        if score is None:
+            return False
+        self._delete(member, score)
+        return True
+
+    def _insert(self, member: Any, score: Any) -> None:
+        update: list[_Node] = [self._head] * _MAX_LEVEL
+        rank = [0] * _MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            rank[i] = 0 if i == self._level - 1 else rank[i + 1]
+            while node.forward[i] is not None and self._before(node.forward[i], member, score):
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                rank[i] = 0
+                update[i] = self._head
+                self._head.span[i] = self._length
+            self._level = level
+
+        new = _Node(member, score, level)
+        for i in range(level):
+            new.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self._level):
+            update[i].span[i] += 1
+        self._length += 1
+
+    def _delete(self, member: Any, score: Any) -> None:
+        update: list[_Node] = [self._head] * _MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and self._before(node.forward[i], member, score):
+                node = node.forward[i]
+            update[i] = node
+
+        target = node.forward[0]
+        for i in range(self._level):
+            if update[i].forward[i] is target:
+                update[i].span[i] += target.span[i] - 1
+                update[i].forward[i] = target.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._length -= 1
+
+    def rank(self, member: Hashable) -> int | None:
+        """
+        成员的位置（从 0 开始），分数相同的成员按成员升序占据不同位置；成员不存在时返回 None
+        """
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        traversed = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and (
+                    self._before(node.forward[i], member, score) or node.forward[i].member == member):
+                traversed += node.span[i]
+                node = node.forward[i]
+            if node.member == member and node is not self._head:
+                return traversed - 1
+        return None
+
+    def count_above(self, score: Any) -> int:
+        """
+        分数严格高于 score 的成员数，即该分数的并列名次减一
+        """
+        traversed = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].score > score:
+                traversed += node.span[i]
+                node = node.forward[i]
+        return traversed
+
+    def count_at_least(self, score: Any) -> int:
+        """
+        分数不低于 score 的成员数
+        """
+        traversed = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].score >= score:
+                traversed += node.span[i]
+                node = node.forward[i]
+        return traversed
+
+    def _node_at(self, index: int) -> _Node | None:
+        traversed = 0
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and traversed + node.span[i] <= index + 1:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if traversed == index + 1:
+                return node
+        return None
+
+    def range(self, start: int, stop: int) -> list[tuple[Any, Any]]:
+        """
+        位置在 [start, stop) 内的 (成员, 分数)，按分数降序
+        """
+        start = max(start, 0)
+        stop = min(stop, self._length)
+        if start >= stop:
+            return []
+        node = self._node_at(start)
+        result = []
+        while node is not None and len(result) < stop - start:
+            result.append((node.member, node.score))
+            node = node.forward[0]
+        return result
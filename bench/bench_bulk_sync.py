@@ -0,0 +1,61 @@
+"""
+在本地水鱼替身上运行批量刷新，统计吞吐量与限速等待时间
+
+    python -m bench.bench_bulk_sync --players 500 --concurrency 8 --rate 100
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+
+PORT = 18000
+os.environ.setdefault("DIVINGFISH_BASE_URL", f"http://127.0.0.1:{PORT}/api")
+
+from tortoise import Tortoise  # noqa: E402
+
+from app.service.divingfish.bulk_sync import BulkSyncJob, DatabaseSink, JsonlSink, SyncCheckpoint, \
+    iter_players_from_file  # noqa: E402
+from app.service.divingfish.client import create_client  # noqa: E402
+from bench.stub_server import StubServer  # noqa: E402
+
+
+async def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        player_file = os.path.join(tmp, "players.txt")
+        with open(player_file, "w", encoding="utf-8") as f:
+            f.writelines(f"player{i}\n" for i in range(args.players))
+        if args.sink == "db":
+            await Tortoise.init(db_url=f"sqlite://{tmp}/bench.sqlite3",
+                                modules={"models": ["app.models.divingfish"]})
+            await Tortoise.generate_schemas()
+            sink = DatabaseSink()
+        else:
+            sink = JsonlSink(os.path.join(tmp, "out.jsonl"))
+        client = create_client()
+        try:
+            job = BulkSyncJob(iter_players_from_file(player_file), sink,
+                              SyncCheckpoint(os.path.join(tmp, "checkpoint.json"), player_file),
+                              concurrency=args.concurrency, rate=args.rate, burst=args.concurrency,
+                              batch_size=args.batch_size, client=client)
+            stats = await job.run()
+        finally:
+            await client.aclose()
+            if args.sink == "db":
+                await Tortoise.close_connections()
+    print(f"{args.players} players, sink={args.sink}, concurrency={args.concurrency}, rate={args.rate}/s")
+    print(f"throughput     {stats['throughput']:>10.1f} players/s  ({stats['elapsed']:.2f}s)")
+    print(f"succeeded      {stats['succeeded']:>10}")
+    print(f"written        {stats['written']:>10}")
+    print(f"rate limited   {stats['rate_limited_seconds']:>10.2f}s (summed over workers)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=100)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--sink", choices=["db", "jsonl"], default="db")
+    args = parser.parse_args()
+    with StubServer(port=PORT):
+        asyncio.run(main(args))
@@ -0,0 +1,77 @@
+"""
+对比每次请求解析 chart_stats.json 与 ChartStatsStore 的查询延迟和内存占用
+
+    python -m bench.bench_chart_stats --songs 1500 --lookups 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.service.divingfish.chart_stats import ChartStatsStore
+from bench.synthetic import make_music_data, make_chart_stats
+
+
+def percentile(samples: list[float], p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def report(name: str, samples: list[float]) -> None:
+    print(f"{name:<24} p50={statistics.median(samples) * 1e6:>10.1f}us  p99={percentile(samples, 0.99) * 1e6:>10.1f}us")
+
+
+def main(songs: int, lookups: int) -> None:
+    music_data = make_music_data(songs)
+    chart_stats = make_chart_stats(music_data)
+    ids = [music["id"] for music in music_data]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "chart_stats.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(chart_stats))
+        print(f"chart_stats.json: {os.path.getsize(path) / 1024 / 1024:.2f} MiB, {songs} songs")
+
+        # 旧实现：每次请求读取并解析整个文件
+        samples = []
+        for _ in range(max(1, lookups // 100)):
+            music_id = random.choice(ids)
+            start = time.perf_counter()
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.loads(f.read())
+            json.dumps({"stats": data["charts"][music_id]})
+            samples.append(time.perf_counter() - start)
+        report("parse per request", samples)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(path, "r", encoding="utf-8") as f:
+            store = ChartStatsStore(json.loads(f.read()))
+        build = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"store build: {build * 1000:.1f}ms, resident {current / 1024 / 1024:.2f} MiB, peak {peak / 1024 / 1024:.2f} MiB")
+
+    samples = []
+    for _ in range(lookups):
+        music_id = random.choice(ids)
+        start = time.perf_counter()
+        store.get_chart_bytes(music_id)
+        samples.append(time.perf_counter() - start)
+    report("store bytes lookup", samples)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--songs", type=int, default=1500)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    main(args.songs, args.lookups)
@@ -0,0 +1,61 @@
+"""
+封面缩放/转码的首次渲染与缓存命中延迟、以及相对原图节省的字节数
+
+    python -m bench.bench_cover_resize --rounds 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from PIL import Image
+
+from app.enums.divingfish.imageformat import ImageFormat
+from app.service.divingfish.cover import cover_cache, cover_path
+from app.service.divingfish.cover_render import get_rendered_cover, DERIVED_COVER_DIR
+
+SONGS_ID = 999999
+
+
+def make_cover(path: str) -> None:
+    # 封面原图为 400x400 PNG，用随机噪点近似真实图片的压缩率
+    image = Image.frombytes("RGB", (400, 400), random.randbytes(400 * 400 * 3))
+    image.save(path, format="PNG")
+
+
+async def main(rounds: int) -> None:
+    path = cover_path(SONGS_ID)
+    make_cover(path)
+    cover_cache._add(SONGS_ID, os.path.getsize(path))
+    original = os.path.getsize(path)
+    print(f"original png: {original} bytes")
+    try:
+        for size, fmt in [(128, ImageFormat.WEBP), (128, ImageFormat.JPEG), (256, ImageFormat.WEBP),
+                          (None, ImageFormat.WEBP), (128, ImageFormat.PNG)]:
+            first, hit = [], []
+            for _ in range(rounds):
+                for name in os.listdir(DERIVED_COVER_DIR):
+                    if name.startswith(f"{SONGS_ID}_"):
+                        os.remove(os.path.join(DERIVED_COVER_DIR, name))
+                start = time.perf_counter()
+                target = await get_rendered_cover(SONGS_ID, size, fmt, 80)
+                first.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                await get_rendered_cover(SONGS_ID, size, fmt, 80)
+                hit.append(time.perf_counter() - start)
+            derived = os.path.getsize(target)
+            print(f"size={size or 'orig':<5} {fmt.value:<5} {derived:>8} bytes ({1 - derived / original:>6.1%} saved)  "
+                  f"first render {sum(first) / rounds * 1000:>7.2f}ms  cache hit {sum(hit) / rounds * 1000:>6.3f}ms")
+    finally:
+        os.remove(path)
+        for name in os.listdir(DERIVED_COVER_DIR):
+            if name.startswith(f"{SONGS_ID}_"):
+                os.remove(os.path.join(DERIVED_COVER_DIR, name))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rounds))
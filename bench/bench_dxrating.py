@@ -0,0 +1,63 @@
+"""
+RatingEngine 成批计算玩家 rating 的吞吐量
+
+    python -m bench.bench_dxrating --players 5000 --records 300
+"""
+import argparse
+import random
+import time
+
+from app.service.divingfish.catalog import MusicCatalog
+from app.service.dxrating.engine import RatingEngine
+from bench.synthetic import make_music_data
+
+
+def make_players(music_data: list[dict], players: int, records: int) -> list[list[dict]]:
+    rng = random.Random(1)
+    result = []
+    for _ in range(players):
+        songs = rng.sample(music_data, min(records, len(music_data)))
+        result.append([
+            {
+                "song_id": int(music["id"]),
+                "level_index": rng.randrange(len(music["ds"])),
+                "achievements": rng.uniform(90, 101),
+            }
+            for music in songs
+        ])
+    return result
+
+
+def main(players: int, records: int, batch: int) -> None:
+    music_data = make_music_data()
+    start = time.perf_counter()
+    engine = RatingEngine(MusicCatalog(music_data))
+    print(f"engine build: {(time.perf_counter() - start) * 1000:.1f}ms for {len(music_data)} songs")
+    data = make_players(music_data, players, records)
+
+    start = time.perf_counter()
+    for player in data[:min(players, 500)]:
+        engine.compute(player)
+    single = time.perf_counter() - start
+    print(f"one by one : {min(players, 500) / single:>10.1f} players/s")
+
+    start = time.perf_counter()
+    for i in range(0, players, batch):
+        engine.compute_many(data[i:i + batch])
+    elapsed = time.perf_counter() - start
+    print(f"batch={batch:<5}: {players / elapsed:>10.1f} players/s ({records} records each)")
+
+    start = time.perf_counter()
+    for i in range(0, players, batch):
+        engine.compute_many(data[i:i + batch], detail=False)
+    elapsed = time.perf_counter() - start
+    print(f"rating only: {players / elapsed:>10.1f} players/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, default=5000)
+    parser.add_argument("--records", type=int, default=300)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+    main(args.players, args.records, args.batch)
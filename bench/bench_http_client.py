@@ -0,0 +1,56 @@
+"""
+对比每次请求新建 httpx.AsyncClient 与共享连接池的吞吐量
+
+    python -m bench.bench_http_client --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import time
+
+PORT = 18000
+os.environ.setdefault("DIVINGFISH_BASE_URL", f"http://127.0.0.1:{PORT}/api")
+
+import httpx  # noqa: E402
+
+from app.service.divingfish import alive_check  # noqa: E402
+from app.service.divingfish.client import create_client  # noqa: E402
+from bench.stub_server import StubServer  # noqa: E402
+from cfg.config import DivingFishBaseUrl  # noqa: E402
+
+
+async def per_call_client() -> None:
+    # 与旧实现一致：每次请求新建客户端（这里会关闭它，避免压测时句柄耗尽）
+    async with httpx.AsyncClient() as client:
+        await client.get(f"{DivingFishBaseUrl}/alive")
+
+
+async def run(name: str, make_call, total: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await make_call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(total)])
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16} {total / elapsed:>10.1f} req/s  ({elapsed:.2f}s)")
+
+
+async def main(total: int, concurrency: int) -> None:
+    await run("per-call client", per_call_client, total, concurrency)
+    shared = create_client()
+    try:
+        await run("shared client", lambda: alive_check(client=shared), total, concurrency)
+    finally:
+        await shared.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    with StubServer(port=PORT):
+        asyncio.run(main(args.requests, args.concurrency))
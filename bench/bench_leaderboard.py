@@ -0,0 +1,72 @@
+"""
+对比 RankedSet（带跨度的跳表）与有序 list + bisect 维护 rating 排行时的更新与名次查询耗时
+
+有序 list 的插入/删除需要移动元素，为 O(n)；跳表均为 O(log n)：
+
+    python -m bench.bench_leaderboard --players 10000 100000 --ops 20000
+"""
+import argparse
+import bisect
+import random
+import time
+
+from app.utils.structures.skiplist import RankedSet
+
+
+class SortedListBoard:
+    """
+    以 (-rating, username) 有序 list 实现的排行，作为对照
+    """
+
+    def __init__(self):
+        self.keys: list[tuple[int, str]] = []
+        self.ratings: dict[str, int] = {}
+
+    def add(self, username: str, rating: int) -> None:
+        old = self.ratings.get(username)
+        if old is not None:
+            del self.keys[bisect.bisect_left(self.keys, (-old, username))]
+        bisect.insort(self.keys, (-rating, username))
+        self.ratings[username] = rating
+
+    def rank(self, username: str) -> int:
+        return bisect.bisect_left(self.keys, (-self.ratings[username],)) + 1
+
+
+def bench(board, players: int, ops: int, rng: random.Random) -> tuple[float, float, float]:
+    start = time.perf_counter()
+    for i in range(players):
+        board.add(f"player{i}", rng.randint(10000, 16500))
+    build = time.perf_counter() - start
+
+    names = [f"player{rng.randrange(players)}" for _ in range(ops)]
+    start = time.perf_counter()
+    for name in names:
+        board.add(name, rng.randint(10000, 16500))
+    update = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if isinstance(board, RankedSet):
+        for name in names:
+            board.count_above(board.score(name))
+    else:
+        for name in names:
+            board.rank(name)
+    query = time.perf_counter() - start
+    return build, update, query
+
+
+def main(sizes: list[int], ops: int) -> None:
+    for players in sizes:
+        for name, factory in (("sorted list", SortedListBoard), ("skip list", RankedSet)):
+            build, update, query = bench(factory(), players, ops, random.Random(1))
+            print(f"players={players:<8} {name:<12} build={build * 1e3:>9.1f}ms  "
+                  f"update={update / ops * 1e6:>7.2f}us/op  rank={query / ops * 1e6:>6.2f}us/op")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--players", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+    main(args.players, args.ops)
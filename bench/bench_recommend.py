@@ -0,0 +1,44 @@
+"""
+推荐索引的构建耗时与单次推荐延迟
+
+    python -m bench.bench_recommend --songs 1500 --players 500
+"""
+import argparse
+import statistics
+import time
+
+from app.service.divingfish.catalog import MusicCatalog
+from app.service.divingfish.chart_stats import ChartStatsStore
+from app.service.dxrating.engine import RatingEngine
+from app.service.dxrating.recommend import RecommendIndex
+from bench.bench_dxrating import make_players
+from bench.synthetic import make_music_data, make_chart_stats
+
+
+def main(songs: int, players: int) -> None:
+    music_data = make_music_data(songs)
+    catalog = MusicCatalog(music_data)
+    store = ChartStatsStore(make_chart_stats(music_data))
+    engine = RatingEngine(catalog)
+
+    start = time.perf_counter()
+    index = RecommendIndex(catalog, store)
+    print(f"index build: {(time.perf_counter() - start) * 1000:.1f}ms for {len(index.ds)} charts")
+
+    samples = []
+    for records in make_players(music_data, players, 300):
+        best = engine.compute(records)
+        start = time.perf_counter()
+        index.recommend(best)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    print(f"recommend : p50={statistics.median(samples) * 1000:.2f}ms "
+          f"p99={samples[int(len(samples) * 0.99)] * 1000:.2f}ms over {players} players")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--songs", type=int, default=1500)
+    parser.add_argument("--players", type=int, default=500)
+    args = parser.parse_args()
+    main(args.songs, args.players)
@@ -0,0 +1,167 @@
+"""
+对比刷新 music_data / chart_stats 时先缓冲完整响应体再解析，与边下载边写入、边解析边构建索引的耗时和内存占用
+
+替身服务在父进程中运行，以 64KiB 分块返回响应体；每种方式在独立子进程中运行，以获得干净的峰值 RSS。
+同时记录刷新期间事件循环的最长停顿，即同一 worker 上其他请求最多需要等待多久：
+
+    python -m bench.bench_refresh --songs 15000 --runs 3
+"""
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PORT = 18001
+os.environ.setdefault("DIVINGFISH_BASE_URL", f"http://127.0.0.1:{PORT}/api")
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+MODES = ("buffered", "streaming")
+CHUNK_SIZE = 64 * 1024
+
+
+def peak_rss_kb() -> int:
+    """
+    峰值常驻内存
+
+    优先读取 VmHWM：ru_maxrss 在 exec 后会沿用父进程的峰值，子进程中无法得到干净的数据。
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def refresh_buffered(client, directory: str) -> None:
+    """
+    原先的刷新流程：读完整响应体，解析，整体写入文件，再构建内存快照
+    """
+    from cfg.config import DivingFishBaseUrl
+    from app.service.divingfish.catalog import MusicCatalog
+    from app.service.divingfish.chart_stats import ChartStatsStore
+    from app.utils.os.storage import write_dataset
+
+    for resource_name, build in (("music_data", lambda d, m: MusicCatalog(d, m["etag"], m["sha256"])),
+                                 ("chart_stats", lambda d, m: ChartStatsStore(d, m["sha256"]))):
+        resp = await client.get(f"{DivingFishBaseUrl}/maimaidxprober/{resource_name}")
+        parsed = json.loads(resp.content)
+        meta = await write_dataset(os.path.join(directory, f"{resource_name}.json"),
+                                   os.path.join(directory, f"{resource_name}_ext.json"),
+                                   resp.content, {"etag": resp.headers.get("etag")})
+        build(parsed, meta)
+        del resp, parsed
+
+
+async def refresh_streaming(client, directory: str) -> None:
+    from app.enums.divingfish.gametype import GameDataType
+    from app.service.divingfish.catalog import MusicCatalogBuilder
+    from app.service.divingfish.chart_stats import ChartStatsBuilder
+    from app.service.divingfish.dataset import GameDataset
+
+    for resource_name, builder in (("music_data", MusicCatalogBuilder), ("chart_stats", ChartStatsBuilder)):
+        dataset = GameDataset(GameDataType.MAIMAI, resource_name, resource_name, builder, data_dir=directory)
+        await dataset.update(client=client, force=True)
+        assert dataset.get() is not None
+
+
+def child(mode: str, directory: str) -> None:
+    import httpx
+
+    max_stall = 0.0
+
+    async def ticker() -> None:
+        nonlocal max_stall
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_stall = max(max_stall, time.perf_counter() - start)
+
+    async def run_child() -> float:
+        async with httpx.AsyncClient(timeout=60) as client:
+            task = asyncio.create_task(ticker())
+            start = time.perf_counter()
+            if mode == "buffered":
+                await refresh_buffered(client, directory)
+            else:
+                await refresh_streaming(client, directory)
+            elapsed = time.perf_counter() - start
+            task.cancel()
+            return elapsed
+
+    # 排除导入与事件循环本身的内存
+    import app.service.divingfish.dataset  # noqa: F401
+    rss_before = peak_rss_kb()
+    elapsed = asyncio.run(run_child())
+    print(json.dumps({"elapsed": elapsed, "max_stall": max_stall, "peak_rss_delta_kb": peak_rss_kb() - rss_before}))
+
+
+def run(mode: str, directory: str) -> dict:
+    out = subprocess.run([sys.executable, "-m", "bench.bench_refresh", "--child", mode, "--dir", directory],
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def make_stub_app(songs: int):
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+
+    from bench.synthetic import make_chart_stats, make_music_data
+
+    music_data = make_music_data(songs)
+    bodies = {
+        "music_data": json.dumps(music_data, ensure_ascii=False).encode("utf-8"),
+        "chart_stats": json.dumps(make_chart_stats(music_data), ensure_ascii=False).encode("utf-8"),
+    }
+    app = FastAPI()
+
+    @app.get("/api/maimaidxprober/{resource_name}")
+    async def dataset(resource_name: str):
+        body = bodies[resource_name]
+        chunks = (body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+        return StreamingResponse(chunks, media_type="application/json", headers={"etag": f'"{resource_name}"'})
+
+    return app, bodies
+
+
+def main(songs: int, runs: int) -> None:
+    from bench.stub_server import StubServer
+
+    app, bodies = make_stub_app(songs)
+    print(f"songs={songs}  music_data={len(bodies['music_data']) / 1024:.0f}KiB  "
+          f"chart_stats={len(bodies['chart_stats']) / 1024:.0f}KiB")
+    with StubServer(app, port=PORT):
+        for mode in MODES:
+            results = []
+            for _ in range(runs):
+                with tempfile.TemporaryDirectory() as tmp:
+                    results.append(run(mode, tmp))
+            elapsed = statistics.median(r["elapsed"] for r in results)
+            stall = statistics.median(r["max_stall"] for r in results)
+            rss = statistics.median(r["peak_rss_delta_kb"] for r in results)
+            print(f"{mode:<10} refresh={elapsed * 1e3:>8.2f}ms  max_loop_stall={stall * 1e3:>8.2f}ms  "
+                  f"peak_rss_delta={rss / 1024:>7.2f}MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--songs", type=int, default=15000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", choices=MODES)
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.dir)
+    else:
+        main(args.songs, args.runs)
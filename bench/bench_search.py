@@ -0,0 +1,74 @@
+"""
+通过 ASGI 直接压测 /v1/divingfish/search，统计并发查询下的延迟分布
+
+    python -m bench.bench_search --queries 3000 --concurrency 3000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from app.service.divingfish.catalog import MusicCatalog, set_music_catalog
+from app.service.divingfish.search import get_search_index
+from bench.synthetic import make_music_data, GENRES, LEVELS
+from main import app
+
+
+def make_queries(music_data: list[dict], count: int) -> list[dict]:
+    rng = random.Random(1)
+    queries = []
+    for _ in range(count):
+        music = rng.choice(music_data)
+        kind = rng.random()
+        if kind < 0.4:
+            # 标题片段，混入全角与片假名/平假名差异
+            title = music["title"]
+            start = rng.randrange(max(1, len(title) - 4))
+            queries.append({"q": title[start:start + rng.randint(2, 6)].replace("タ", "た")})
+        elif kind < 0.6:
+            queries.append({"q": music["basic_info"]["artist"].upper()})
+        elif kind < 0.8:
+            queries.append({"genre": rng.choice(GENRES), "level": rng.choice(LEVELS[-8:])})
+        else:
+            ds = round(rng.uniform(12, 14.5), 1)
+            queries.append({"ds_min": ds, "ds_max": ds + 0.2, "type": rng.choice(["DX", "SD"])})
+    return queries
+
+
+async def main(queries: int, concurrency: int) -> None:
+    music_data = make_music_data()
+    catalog = MusicCatalog(music_data)
+    set_music_catalog(catalog)
+    start = time.perf_counter()
+    get_search_index(catalog)
+    print(f"index build: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(params: dict):
+            async with semaphore:
+                begin = time.perf_counter()
+                resp = await client.get("/v1/divingfish/search", params=params)
+                latencies.append(time.perf_counter() - begin)
+                assert resp.status_code == 200, resp.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one(params) for params in make_queries(music_data, queries)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    pick = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    print(f"{queries} queries, concurrency {concurrency}: {queries / elapsed:.0f} req/s  "
+          f"p50={pick(0.5):.2f}ms p95={pick(0.95):.2f}ms p99={pick(0.99):.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=3000)
+    args = parser.parse_args()
+    asyncio.run(main(args.queries, args.concurrency))
@@ -0,0 +1,89 @@
+"""
+对比 worker 启动时解析 music_data.json 与映射二进制快照构建歌曲目录（含 RatingEngine）的耗时和内存占用
+
+每种方式在独立子进程中运行，以获得干净的 RSS 数据：
+
+    python -m bench.bench_snapshot --songs 1500 --runs 5
+"""
+import argparse
+import hashlib
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.service.divingfish.catalog import MusicCatalog
+from app.service.divingfish.snapshot import CatalogSnapshot, write_snapshot
+from app.service.dxrating.engine import RatingEngine
+from bench.synthetic import make_music_data
+
+MODES = ("json", "snapshot")
+
+
+def rss_kb() -> int:
+    """
+    当前常驻内存；没有 /proc 的平台退回为峰值常驻内存
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(mode: str, directory: str) -> None:
+    rss_before = rss_kb()
+    start = time.perf_counter()
+    if mode == "json":
+        with open(os.path.join(directory, "music_data.json"), "rb") as f:
+            catalog = MusicCatalog(json.loads(f.read()))
+    else:
+        catalog = MusicCatalog.from_snapshot(CatalogSnapshot(os.path.join(directory, "music_data.snapshot")))
+    RatingEngine(catalog)
+    elapsed = time.perf_counter() - start
+    rss_after = rss_kb()
+    print(json.dumps({"elapsed": elapsed, "rss_delta_kb": rss_after - rss_before}))
+
+
+def run(mode: str, directory: str) -> dict:
+    out = subprocess.run([sys.executable, "-m", "bench.bench_snapshot", "--child", mode, "--dir", directory],
+                         check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+
+def main(songs: int, runs: int) -> None:
+    music_data = make_music_data(songs)
+    with tempfile.TemporaryDirectory() as tmp:
+        data = json.dumps(music_data).encode("utf-8")
+        with open(os.path.join(tmp, "music_data.json"), "wb") as f:
+            f.write(data)
+        write_snapshot(music_data, hashlib.sha256(data).hexdigest(), os.path.join(tmp, "music_data.snapshot"))
+        print(f"songs={songs}  json={len(data) / 1024:.0f}KiB  "
+              f"snapshot={os.path.getsize(os.path.join(tmp, 'music_data.snapshot')) / 1024:.0f}KiB")
+
+        for mode in MODES:
+            results = [run(mode, tmp) for _ in range(runs)]
+            elapsed = statistics.median(r["elapsed"] for r in results)
+            rss = statistics.median(r["rss_delta_kb"] for r in results)
+            print(f"{mode:<10} load={elapsed * 1e3:>8.2f}ms  rss_delta={rss / 1024:>7.2f}MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--songs", type=int, default=1500)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", choices=MODES)
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.dir)
+    else:
+        main(args.songs, args.runs)
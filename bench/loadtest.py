@@ -0,0 +1,394 @@
+"""
+对所有 /v1/divingfish 接口压测，记录吞吐量、延迟分位数与被测服务的内存占用
+
+水鱼替身（bench.stub_server）与被测服务各自在独立子进程中运行；被测服务以临时目录为工作目录
+（数据文件、SQLite 数据库、封面缓存），不会影响仓库中的 data/。关闭了后台定时刷新，数据由压测先调用更新接口拉取。
+结果写入 JSON 文件，可对比两次提交的结果，任一接口退化超过阈值时以非零状态码退出：
+
+    python -m bench.loadtest --requests 500 --concurrency 32 --output results/head.json
+    python -m bench.loadtest --latency 0.05 --error-rate 0.05 --routes get_user_b_scores,get_music_cover
+    python -m bench.loadtest --compare results/base.json results/head.json
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+import httpx
+
+from bench.stub_server import add_behavior_arguments
+from bench.synthetic import LEVELS, TITLE_WORDS, make_music_data, make_player_b50
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREFIX = "/v1/divingfish"
+ADMIN_TOKEN = "loadtest"
+# 压测客户端使用不限流的 API key，测的是服务本身的吞吐而不是限额
+API_KEY = "loadtest"
+
+
+class Scenario:
+    """
+    一个压测场景：对同一接口发起的一组请求
+
+    :param name: 场景名，用于 --routes 过滤与结果对比
+    :param method: HTTP 方法
+    :param path: /v1/divingfish 之后的路径
+    :param make: 以随机数生成器生成 httpx 请求参数（params/json/headers）的函数
+    :param once: 只请求一次（会启动后台任务的接口）
+    """
+
+    def __init__(self, name: str, method: str, path: str, make=None, once: bool = False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.make = make or (lambda rng: {})
+        self.once = once
+
+
+def build_scenarios(songs: int, players: int, cover_pool: int) -> list[Scenario]:
+    """
+    按执行顺序排列的场景；更新接口在前，历史成绩只查询已经查询过成绩的玩家
+    """
+    music_data = make_music_data(songs)
+    music_ids = [int(music["id"]) for music in music_data]
+    cids = [cid for music in music_data for cid in music["cids"]]
+    covers = music_ids[:cover_pool]
+    admin = {"headers": {"X-Admin-Token": ADMIN_TOKEN}}
+    queried: list[str] = []
+
+    def player(rng: random.Random) -> str:
+        username = f"player{rng.randrange(players)}"
+        queried.append(username)
+        return username
+
+    def queried_player(rng: random.Random) -> str:
+        return rng.choice(queried) if queried else player(rng)
+
+    def search(rng: random.Random) -> dict:
+        kind = rng.randrange(3)
+        if kind == 0:
+            return {"params": {"q": rng.choice(TITLE_WORDS)}}
+        if kind == 1:
+            return {"params": {"level": rng.choice(LEVELS[-8:]), "page_size": 50}}
+        ds_min = round(rng.uniform(10, 14), 1)
+        return {"params": {"ds_min": ds_min, "ds_max": ds_min + 0.5}}
+
+    def player_chart(rng: random.Random) -> dict:
+        username = queried_player(rng)
+        charts = make_player_b50(music_data, username)["charts"]
+        record = rng.choice(charts["sd"] + charts["dx"])
+        return {"params": {"song_id": record["song_id"], "level_index": record["level_index"],
+                           "username": username}}
+
+    def batch(rng: random.Random) -> dict:
+        return {"json": {"music_ids": rng.sample(music_ids, 20), "cids": rng.sample(cids, 20)}}
+
+    return [
+        Scenario("health", "GET", "/health"),
+        Scenario("music_update", "POST", "/music_update", lambda rng: admin),
+        Scenario("chart_stats_update", "POST", "/chart_stats_update", lambda rng: admin),
+        Scenario("get_music_info", "GET", "/get_music_info",
+                 lambda rng: {"params": {"music_id": rng.choice(music_ids)}}),
+        Scenario("get_chart_stats", "GET", "/get_chart_stats",
+                 lambda rng: {"params": {"music_id": rng.choice(music_ids)}}),
+        Scenario("get_diff_stats", "GET", "/get_diff_stats"),
+        Scenario("music_data", "GET", "/music_data"),
+        Scenario("music_info_batch", "POST", "/music_info/batch", batch),
+        Scenario("chart_stats_batch", "POST", "/chart_stats/batch", batch),
+        Scenario("search", "GET", "/search", search),
+        Scenario("get_music_cover", "GET", "/get_music_cover",
+                 lambda rng: {"params": {"songs_id": rng.choice(covers)}}),
+        Scenario("get_music_cover_resized", "GET", "/get_music_cover",
+                 lambda rng: {"params": {"songs_id": rng.choice(covers), "size": 128, "format": "webp"}}),
+        Scenario("get_user_b_scores", "POST", "/get_user_b_scores",
+                 lambda rng: {"json": {"username": player(rng), "is_qq": False, "b50": True}}),
+        Scenario("cache_stats", "GET", "/cache_stats"),
+        Scenario("player_rating_history", "GET", "/player/rating_history",
+                 lambda rng: {"params": {"username": queried_player(rng)}}),
+        Scenario("player_chart_records", "GET", "/player/chart_records",
+                 lambda rng: {"params": {"username": queried_player(rng)}}),
+        Scenario("leaderboard", "GET", "/leaderboard",
+                 lambda rng: {"params": {"offset": rng.randrange(players), "limit": 20}}),
+        Scenario("leaderboard_rank", "GET", "/leaderboard/rank",
+                 lambda rng: {"params": {"username": queried_player(rng), "radius": 5}}),
+        Scenario("leaderboard_chart", "GET", "/leaderboard/chart",
+                 lambda rng: {"params": {k: v for k, v in player_chart(rng)["params"].items() if k != "username"}}),
+        Scenario("leaderboard_chart_rank", "GET", "/leaderboard/chart/rank", player_chart),
+        Scenario("cover_prefetch", "POST", "/cover_prefetch", lambda rng: admin, once=True),
+        Scenario("bulk_sync_start", "POST", "/admin/bulk_sync",
+                 lambda rng: {**admin, "json": {"resume": False}}, once=True),
+        Scenario("bulk_sync_status", "GET", "/admin/bulk_sync", lambda rng: admin),
+    ]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    最近秩法求分位数，q 取 0~100
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def process_memory_kb(pid: int) -> dict:
+    """
+    读取进程当前与峰值常驻内存（VmRSS/VmHWM），没有 /proc 的平台返回空字典
+    """
+    result = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    result["rss_kb" if line.startswith("VmRSS") else "peak_rss_kb"] = int(line.split()[1])
+    except OSError:
+        pass
+    return result
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int,
+                       warmup: int, rng: random.Random) -> dict:
+    total = 1 if scenario.once else requests
+    concurrency = min(concurrency, total)
+    url = PREFIX + scenario.path
+    latencies: list[float] = []
+    status_counts: dict[str, int] = {}
+    errors: dict[str, int] = {}
+
+    async def one(record: bool) -> None:
+        kwargs = scenario.make(rng)
+        start = time.perf_counter()
+        try:
+            resp = await client.request(scenario.method, url, **kwargs)
+            await resp.aread()
+        except httpx.HTTPError as e:
+            if record:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            return
+        if record:
+            latencies.append(time.perf_counter() - start)
+            status_counts[str(resp.status_code)] = status_counts.get(str(resp.status_code), 0) + 1
+
+    async def worker(count: int, record: bool) -> None:
+        for _ in range(count):
+            await one(record)
+
+    def split(count: int) -> list[int]:
+        return [count // concurrency + (1 if i < count % concurrency else 0) for i in range(concurrency)]
+
+    if not scenario.once and warmup > 0:
+        await asyncio.gather(*[worker(n, False) for n in split(min(warmup, total))])
+    start = time.perf_counter()
+    await asyncio.gather(*[worker(n, True) for n in split(total)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "name": scenario.name,
+        "once": scenario.once,
+        "method": scenario.method,
+        "path": url,
+        "requests": total,
+        "concurrency": concurrency,
+        "elapsed": round(elapsed, 4),
+        "throughput": round(total / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1e3, 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1e3, 3),
+            "p95": round(percentile(latencies, 95) * 1e3, 3),
+            "p99": round(percentile(latencies, 99) * 1e3, 3),
+            "max": round(latencies[-1] * 1e3, 3) if latencies else 0.0,
+        },
+        "status": status_counts,
+        "errors": errors,
+    }
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} 对应的进程已退出，退出码 {process.returncode}")
+            try:
+                await client.get(url, timeout=1)
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.1)
+    raise TimeoutError(f"等待 {url} 就绪超时")
+
+
+def git_revision() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def start_stub(args: argparse.Namespace, log) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "bench.stub_server", "--port", str(args.stub_port), "--songs", str(args.songs),
+           "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+           "--error-status", str(args.error_status)]
+    if args.no_etag:
+        cmd.append("--no-etag")
+    if args.seed is not None:
+        cmd += ["--seed", str(args.seed)]
+    return subprocess.Popen(cmd, cwd=ROOT, stdout=log, stderr=subprocess.STDOUT)
+
+
+def start_server(args: argparse.Namespace, workdir: str, log) -> subprocess.Popen:
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])),
+        "DIVINGFISH_BASE_URL": f"{stub_url}/api",
+        "DIVINGFISH_COVER_URL": f"{stub_url}/covers/{{{{cover_id}}}}.png",
+        "DATA_REFRESH_ENABLED": "0",
+        "DATABASE_GENERATE_SCHEMAS": "1",
+        "ADMIN_TOKEN": ADMIN_TOKEN,
+        "API_KEYS": f"loadtest:{API_KEY}:0",
+        "BULK_SYNC_CHECKPOINT_PATH": "data/divingfish/bulk_sync.checkpoint.json",
+    }
+    os.makedirs(os.path.join(workdir, "data", "divingfish"), exist_ok=True)
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.port),
+           "--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def run_all(args: argparse.Namespace, server: subprocess.Popen) -> dict:
+    routes = set(args.routes.split(",")) if args.routes else None
+    scenarios = [s for s in build_scenarios(args.songs, args.players, args.cover_pool)
+                 if routes is None or s.name in routes]
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = []
+    memory_start = process_memory_kb(server.pid)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits,
+                                 timeout=args.timeout, headers={"X-API-Key": API_KEY}) as client:
+        # 先拉取歌曲与铺面统计，否则依赖它们的接口只会返回 503
+        for path in ("/music_update", "/chart_stats_update"):
+            await client.post(PREFIX + path, headers={"X-Admin-Token": ADMIN_TOKEN})
+        for scenario in scenarios:
+            result = await run_scenario(client, scenario, args.requests, args.concurrency, args.warmup, rng)
+            result["server_memory_kb"] = process_memory_kb(server.pid)
+            results.append(result)
+            print_result(result)
+        try:
+            stub_stats = (await client.get(f"http://127.0.0.1:{args.stub_port}/stub/stats")).json()
+        except httpx.HTTPError:
+            stub_stats = None
+    return {
+        "meta": {
+            **git_revision(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("compare", "output")},
+        },
+        "server_memory_kb": {"start": memory_start, "end": process_memory_kb(server.pid)},
+        "stub": stub_stats,
+        "results": results,
+    }
+
+
+def print_result(result: dict) -> None:
+    latency = result["latency_ms"]
+    failed = sum(n for code, n in result["status"].items() if int(code) >= 500) + sum(result["errors"].values())
+    rss = result["server_memory_kb"].get("rss_kb")
+    print(f"{result['name']:<26} {result['throughput']:>9.1f} req/s  p50={latency['p50']:>8.2f}ms  "
+          f"p95={latency['p95']:>8.2f}ms  p99={latency['p99']:>8.2f}ms  failed={failed:<4} "
+          f"rss={rss / 1024 if rss else 0:>7.1f}MiB")
+
+
+def compare(base_path: str, head_path: str, threshold: float) -> int:
+    """
+    对比两次压测结果，吞吐量下降或 p95 上升超过 threshold（比例）视为退化
+
+    :return: 退化的场景数
+    """
+    with open(base_path, "rb") as f:
+        base = json.loads(f.read())
+    with open(head_path, "rb") as f:
+        head = json.loads(f.read())
+    print(f"base: {base['meta'].get('commit')}  head: {head['meta'].get('commit')}")
+    changed = {k for k in set(base["meta"]["args"]) | set(head["meta"]["args"])
+               if base["meta"]["args"].get(k) != head["meta"]["args"].get(k)}
+    if changed:
+        print(f"注意：两次压测的参数不同（{', '.join(sorted(changed))}），结果不能直接比较")
+    base_results = {r["name"]: r for r in base["results"]}
+    regressions = 0
+    for result in head["results"]:
+        old = base_results.get(result["name"])
+        if old is None or result.get("once"):
+            continue
+        throughput = result["throughput"] / old["throughput"] - 1 if old["throughput"] else 0.0
+        p95 = result["latency_ms"]["p95"] / old["latency_ms"]["p95"] - 1 if old["latency_ms"]["p95"] else 0.0
+        regressed = throughput < -threshold or p95 > threshold
+        regressions += regressed
+        print(f"{result['name']:<26} throughput {old['throughput']:>9.1f} -> {result['throughput']:>9.1f} "
+              f"({throughput:+7.1%})  p95 {old['latency_ms']['p95']:>8.2f} -> {result['latency_ms']['p95']:>8.2f}ms "
+              f"({p95:+7.1%}){'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as workdir:
+        log_path = os.path.join(workdir, "processes.log")
+        with open(log_path, "wb") as log:
+            stub = start_stub(args, log)
+            server = start_server(args, workdir, log)
+            try:
+                asyncio.run(wait_ready(f"http://127.0.0.1:{args.stub_port}/api/alive", stub))
+                asyncio.run(wait_ready(f"http://127.0.0.1:{args.port}/metrics", server))
+                report = asyncio.run(run_all(args, server))
+            except Exception:
+                log.flush()
+                with open(log_path, encoding="utf-8", errors="replace") as f:
+                    sys.stderr.write(f.read()[-4000:])
+                raise
+            finally:
+                for process in (server, stub):
+                    process.terminate()
+                    process.wait(timeout=30)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="每个场景开始计时前的预热请求数")
+    parser.add_argument("--players", type=int, default=100, help="查询的玩家数")
+    parser.add_argument("--cover-pool", type=int, default=50, help="封面场景请求的歌曲数")
+    parser.add_argument("--routes", help="只运行这些场景，逗号分隔")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--port", type=int, default=18080, help="被测服务端口")
+    parser.add_argument("--stub-port", type=int, default=18000, help="水鱼替身端口")
+    parser.add_argument("--output", help="结果 JSON 文件路径")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="对比两次压测结果后退出")
+    parser.add_argument("--threshold", type=float, default=0.1, help="--compare 判定退化的比例")
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+    main(args)
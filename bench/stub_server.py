@@ -0,0 +1,222 @@
+"""
+本地水鱼替身服务，仅供 bench/ 下的基准测试与压测使用
+
+提供 music_data / chart_stats（带 ETag，支持 If-None-Match）、玩家查询、封面以及中二节奏的对应接口，
+可通过 stub_behavior 注入延迟与错误。也可以单独运行，供手动启动的服务压测使用：
+
+    python -m bench.stub_server --port 18000 --songs 1500 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import threading
+import time
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+import uvicorn
+from fastapi import FastAPI, Body, Request
+from fastapi.responses import JSONResponse, Response
+
+from bench.synthetic import make_music_data, make_chart_stats, make_player_b50, make_chuni_music_data, \
+    make_chuni_player, make_cover_png
+
+
+class StubBehavior:
+    """
+    替身服务的延迟与故障注入配置，运行中修改立即生效
+
+    :param latency: 每个请求固定增加的延迟（秒）
+    :param jitter: 在固定延迟之上再增加 [0, jitter) 的随机延迟（秒）
+    :param error_rate: 以该概率直接返回 error_status（/api/alive 除外）
+    :param error_status: 注入错误时返回的状态码
+    :param etag: 是否为 music_data / chart_stats 返回 ETag 并响应 If-None-Match
+    :param seed: 随机数种子，便于复现
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 502, etag: bool = True, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.etag = etag
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.injected_errors = 0
+        self.not_modified = 0
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "injected_errors": self.injected_errors,
+                "not_modified": self.not_modified}
+
+
+class StubData:
+    """
+    替身服务返回的合成数据，响应体在首次请求时序列化并缓存
+    """
+
+    def __init__(self, songs: int = 1500, chuni_songs: int = 1000):
+        self.music_data = make_music_data(songs)
+        self.chuni_music_data = make_chuni_music_data(chuni_songs)
+        self._bodies: dict[str, tuple[bytes, str]] = {}
+        self._covers: dict[int, bytes] = {}
+
+    def body(self, name: str) -> tuple[bytes, str]:
+        """
+        :return: (响应体, ETag)
+        """
+        if name not in self._bodies:
+            if name == "music_data":
+                value = self.music_data
+            elif name == "chart_stats":
+                value = make_chart_stats(self.music_data)
+            else:
+                value = self.chuni_music_data
+            body = json.dumps(value, ensure_ascii=False).encode("utf-8")
+            self._bodies[name] = body, f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        return self._bodies[name]
+
+    def cover(self, cover_id: int) -> bytes:
+        if cover_id not in self._covers:
+            self._covers[cover_id] = make_cover_png(cover_id)
+        return self._covers[cover_id]
+
+
+stub_app = FastAPI()
+stub_behavior = StubBehavior()
+stub_data = StubData()
+
+
+@stub_app.middleware("http")
+async def inject_faults(request: Request, call_next):
+    behavior = stub_behavior
+    behavior.requests += 1
+    delay = behavior.latency + (behavior.rng.uniform(0, behavior.jitter) if behavior.jitter > 0 else 0)
+    if delay > 0:
+        await asyncio.sleep(delay)
+    if request.url.path != "/api/alive" and behavior.error_rate > 0 and behavior.rng.random() < behavior.error_rate:
+        behavior.injected_errors += 1
+        return JSONResponse({"message": "injected error"}, status_code=behavior.error_status)
+    return await call_next(request)
+
+
+def dataset_response(request: Request, name: str) -> Response:
+    body, etag = stub_data.body(name)
+    if not stub_behavior.etag:
+        return Response(body, media_type="application/json")
+    if request.headers.get("if-none-match") == etag:
+        stub_behavior.not_modified += 1
+        return Response(status_code=304, headers={"etag": etag})
+    return Response(body, media_type="application/json", headers={"etag": etag})
+
+
+@stub_app.get("/api/alive")
+async def alive():
+    return {"message": "ok"}
+
+
+@stub_app.get("/api/maimaidxprober/music_data")
+async def music_data(request: Request):
+    return dataset_response(request, "music_data")
+
+
+@stub_app.get("/api/maimaidxprober/chart_stats")
+async def chart_stats(request: Request):
+    return dataset_response(request, "chart_stats")
+
+
+@stub_app.post("/api/maimaidxprober/query/player")
+async def query_player(payload: dict = Body(...)):
+    username = payload.get("username") or payload.get("qq")
+    # 以 missing 开头的用户名模拟不存在的玩家
+    if not username or str(username).startswith("missing"):
+        return JSONResponse({"message": "user not exists"}, status_code=400)
+    return make_player_b50(stub_data.music_data, str(username))
+
+
+@stub_app.get("/covers/{cover_id}.png")
+async def cover(cover_id: int):
+    return Response(stub_data.cover(cover_id), media_type="image/png")
+
+
+@stub_app.get("/api/chunithmprober/music_data")
+async def chuni_music_data(request: Request):
+    return dataset_response(request, "chuni_music_data")
+
+
+@stub_app.post("/api/chunithmprober/query/player")
+async def chuni_query_player(payload: dict = Body(...)):
+    username = payload.get("username") or payload.get("qq")
+    if not username or str(username).startswith("missing"):
+        return JSONResponse({"message": "user not exists"}, status_code=400)
+    return make_chuni_player(stub_data.chuni_music_data, str(username))
+
+
+@stub_app.get("/stub/stats")
+async def stub_stats():
+    return stub_behavior.stats()
+
+
+class StubServer:
+    """
+    在后台线程中运行的 uvicorn 服务
+
+    用法::
+
+        with StubServer(app, port=18000) as base_url:
+            ...
+    """
+
+    def __init__(self, app: FastAPI = stub_app, host: str = "127.0.0.1", port: int = 18000):
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError(f"替身服务启动失败，端口 {self.port} 可能已被占用")
+            time.sleep(0.05)
+        return f"http://{self.host}:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def add_behavior_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--songs", type=int, default=1500, help="合成歌曲数")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的固定延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="额外的随机延迟上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="注入错误的概率")
+    parser.add_argument("--error-status", type=int, default=502)
+    parser.add_argument("--no-etag", action="store_true", help="不返回 ETag，每次刷新都完整下载")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def configure_stub(args: argparse.Namespace) -> None:
+    """
+    按命令行参数重新生成合成数据并设置故障注入
+    """
+    global stub_data, stub_behavior
+    if args.songs != len(stub_data.music_data):
+        stub_data = StubData(args.songs)
+    stub_behavior = StubBehavior(args.latency, args.jitter, args.error_rate, args.error_status, not args.no_etag,
+                                 args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18000)
+    add_behavior_arguments(parser)
+    args = parser.parse_args()
+    configure_stub(args)
+    uvicorn.run(stub_app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,199 @@
+"""
+生成与水鱼格式一致的合成数据，规模接近线上（约 1500 首歌、7000 张谱面）
+"""
+import random
+import struct
+import zlib
+
+VERSIONS = ["maimai", "maimai PLUS", "maimai でらっくす", "舞萌DX", "舞萌DX 2021", "舞萌DX 2022", "舞萌DX 2023",
+            "舞萌DX 2024"]
+GENRES = ["流行&动漫", "niconico & VOCALOID", "东方Project", "其他游戏", "舞萌", "音击&中二节奏"]
+TITLE_WORDS = ["Star", "Night", "Dream", "Heart", "Sky", "Fire", "Blue", "Love", "World", "Future", "ラブ", "ミライ",
+               "ソラ", "ユメ", "ホシ", "ハート", "さくら", "ひかり", "こころ", "夜明け", "星空", "未来", "世界", "青春",
+               "桜", "光", "Ω", "∞", "Re:", "DX"]
+LEVELS = ["1", "2", "3", "4", "5", "6", "7", "7+", "8", "8+", "9", "9+", "10", "10+", "11", "11+", "12", "12+", "13",
+          "13+", "14", "14+", "15"]
+
+
+def ds_to_level(ds: float) -> str:
+    return f"{int(ds)}+" if ds - int(ds) >= 0.6 else str(int(ds))
+
+
+def make_music_data(n: int = 1500, seed: int = 1) -> list[dict]:
+    rng = random.Random(seed)
+    music_data = []
+    cid = 1
+    for i in range(n):
+        music_id = i + 1 if i < n // 2 else 10000 + i
+        music_type = "DX" if music_id >= 10000 else "SD"
+        chart_count = 5 if rng.random() < 0.9 else 4
+        base = rng.uniform(1, 5)
+        ds = [round(min(15.0, base + j * 2.3 + rng.random()), 1) for j in range(chart_count)]
+        title = " ".join(rng.sample(TITLE_WORDS, rng.randint(1, 3))) + f" {i}"
+        music_data.append({
+            "id": str(music_id),
+            "title": title,
+            "type": music_type,
+            "ds": ds,
+            "level": [ds_to_level(d) for d in ds],
+            "cids": list(range(cid, cid + chart_count)),
+            "charts": [
+                {
+                    "notes": [rng.randint(100, 800), rng.randint(10, 80), rng.randint(10, 80), rng.randint(0, 60),
+                              rng.randint(10, 60)][: 5 if music_type == "DX" else 4],
+                    "charter": f"charter{rng.randint(0, 50)}",
+                }
+                for _ in range(chart_count)
+            ],
+            "basic_info": {
+                "title": title,
+                "artist": f"Artist {i % 200}",
+                "genre": rng.choice(GENRES),
+                "bpm": rng.randint(100, 220),
+                "release_date": "",
+                "from": rng.choice(VERSIONS),
+                "is_new": rng.random() < 0.05,
+            },
+        })
+        cid += chart_count
+    return music_data
+
+
+def make_chart_stats(music_data: list[dict], seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    charts = {}
+    for music in music_data:
+        charts[music["id"]] = [
+            {
+                "cnt": float(rng.randint(100, 30000)),
+                "diff": level,
+                "fit_diff": round(ds + rng.uniform(-0.4, 0.4), 4),
+                "avg": round(rng.uniform(90, 100.5), 4),
+                "avg_dx": round(rng.uniform(500, 3000), 4),
+                "std_dev": round(rng.uniform(1, 8), 4),
+                "dist": [rng.randint(0, 3000) for _ in range(14)],
+                "fc_dist": [float(rng.randint(0, 3000)) for _ in range(5)],
+            }
+            for ds, level in zip(music["ds"], music["level"])
+        ]
+    diff_data = {
+        level: {
+            "achievements": round(rng.uniform(90, 100), 4),
+            "dist": [round(rng.random(), 4) for _ in range(14)],
+            "fc_dist": [round(rng.random(), 4) for _ in range(5)],
+        }
+        for level in LEVELS
+    }
+    return {"charts": charts, "diff_data": diff_data}
+
+
+LEVEL_LABELS = ["Basic", "Advanced", "Expert", "Master", "Re:MASTER"]
+
+
+def make_player_b50(music_data: list[dict], username: str, seed: int = 1) -> dict:
+    """
+    生成与 /query/player (b50) 返回格式一致的玩家成绩，同一用户名总是生成相同的结果
+    """
+    rng = random.Random(f"{seed}:{username}")
+    charts = {"sd": [], "dx": []}
+    for key, count in (("sd", 35), ("dx", 15)):
+        for music in rng.sample(music_data, count):
+            level_index = rng.randrange(len(music["ds"]))
+            ds = music["ds"][level_index]
+            achievements = round(rng.uniform(97, 101), 4)
+            charts[key].append({
+                "achievements": achievements,
+                "ds": ds,
+                "dxScore": rng.randint(500, 3000),
+                "fc": rng.choice(["", "fc", "fcp", "ap"]),
+                "fs": rng.choice(["", "fs", "fsp", "fsd"]),
+                "level": music["level"][level_index],
+                "level_index": level_index,
+                "level_label": LEVEL_LABELS[level_index],
+                "ra": int(ds * min(achievements, 100.5) * 0.224),
+                "rate": "sssp" if achievements >= 100.5 else "sss" if achievements >= 100 else "ssp",
+                "song_id": int(music["id"]),
+                "title": music["title"],
+                "type": music["type"],
+            })
+    rating = sum(c["ra"] for c in charts["sd"] + charts["dx"])
+    return {"additional_rating": 0, "charts": charts, "nickname": username[:8], "plate": "", "rating": rating,
+            "user_general_data": None, "username": username}
+
+
+def make_chuni_music_data(n: int = 1000, seed: int = 1) -> list[dict]:
+    """
+    生成与水鱼 chunithmprober/music_data 格式一致的歌曲数据，id 为 int
+    """
+    rng = random.Random(seed)
+    music_data = []
+    cid = 1
+    for i in range(n):
+        chart_count = 5 if rng.random() < 0.3 else 4
+        base = rng.uniform(1, 4)
+        ds = [round(min(15.4, base + j * 2.8 + rng.random()), 1) for j in range(chart_count)]
+        title = " ".join(rng.sample(TITLE_WORDS, rng.randint(1, 3))) + f" {i}"
+        music_data.append({
+            "id": i + 1,
+            "title": title,
+            "ds": ds,
+            "level": [ds_to_level(d) for d in ds],
+            "cids": list(range(cid, cid + chart_count)),
+            "charts": [{"combo": rng.randint(300, 3000), "charter": f"charter{rng.randint(0, 50)}"}
+                       for _ in range(chart_count)],
+            "basic_info": {
+                "title": title,
+                "artist": f"Artist {i % 200}",
+                "genre": rng.choice(GENRES),
+                "bpm": rng.randint(100, 220),
+                "from": rng.choice(VERSIONS),
+            },
+        })
+        cid += chart_count
+    return music_data
+
+
+def make_chuni_player(music_data: list[dict], username: str, seed: int = 1) -> dict:
+    """
+    生成与 chunithmprober/query/player 返回格式一致的玩家成绩
+    """
+    rng = random.Random(f"{seed}:{username}")
+
+    def record(music: dict) -> dict:
+        level_index = rng.randrange(len(music["ds"]))
+        return {
+            "cid": music["cids"][level_index],
+            "ds": music["ds"][level_index],
+            "fc": rng.choice(["", "fullcombo", "alljustice"]),
+            "level": music["level"][level_index],
+            "level_index": level_index,
+            "level_label": ["Basic", "Advanced", "Expert", "Master", "Ultima"][level_index],
+            "mid": music["id"],
+            "ra": 0.0,
+            "score": rng.randint(950000, 1010000),
+            "title": music["title"],
+        }
+
+    return {
+        "nickname": username[:8],
+        "rating": 0.0,
+        "records": {"b30": [record(m) for m in rng.sample(music_data, 30)],
+                    "r10": [record(m) for m in rng.sample(music_data, 10)]},
+        "username": username,
+    }
+
+
+def make_cover_png(cover_id: int, size: int = 200) -> bytes:
+    """
+    生成一张随机噪点的 PNG 封面，同一 id 总是生成相同的图片；噪点几乎无法压缩，体积与真实封面相当
+    """
+    rng = random.Random(cover_id)
+    rows = b"".join(b"\x00" + rng.randbytes(size * 3) for _ in range(size))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(rows))
+            + chunk(b"IEND", b""))
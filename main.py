@@ -1,32 +1,68 @@
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
 
 from fastapi import FastAPI
+from app.middleware.metrics import MetricsMiddleware, profiler
+from app.middleware.ratelimit import RateLimitMiddleware
+from app.routes.metrics import router as metrics_router
 from app.routes.v1 import router as v1_router
+from app.service.divingfish.client import init_client, close_client
+from app.service.divingfish.cover import cover_cache
+from app.service.divingfish.cover_render import derived_covers
+from app.service.divingfish.leaderboard import start_leaderboard_loader, stop_leaderboard_loader
+from app.service.divingfish.player_store import check_store
+from app.service.divingfish.score_feed import start_score_feed, stop_score_feed
+from app.service.divingfish.workers import start_worker_coordinator, stop_worker_coordinator
 from cfg import config as cfg
 from tortoise.contrib.fastapi import RegisterTortoise, tortoise_exception_handlers
 from tortoise import Tortoise
 
 
-# @asynccontextmanager
-# async def lifespan(app: FastAPI):
-#     # 使用RegisterTortoise和Aerich管理的迁移，而不是生成模式
-#     async with RegisterTortoise(
-#         app,
-#         config=cfg.TORTOISE_ORM,
-#         generate_schemas=False,  # 由于使用Aerich，这里设置为False
-#         add_exception_handlers=True,
-#     ):
-#         yield
-#
-#     await Tortoise.close_connections()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with AsyncExitStack() as stack:
+        if cfg.DatabaseEnabled:
+            # 表结构由 python serve.py --init-db 创建，DATABASE_GENERATE_SCHEMAS=1 时启动时自动创建
+            await stack.enter_async_context(RegisterTortoise(
+                app,
+                config=cfg.TORTOISE_ORM,
+                generate_schemas=cfg.DatabaseGenerateSchemas,
+                add_exception_handlers=True,
+            ))
+            # 缺少数据表时不使用数据库，成绩查询直接请求水鱼
+            if await check_store() and cfg.LeaderboardEnabled:
+                start_leaderboard_loader()
+        # 所有水鱼请求共用一个连接池
+        await init_client()
+        # 在线程中扫描封面目录建立 LRU 索引，首个封面请求不必在事件循环中扫描
+        await cover_cache.load()
+        await derived_covers.load()
+        # 多 worker 时只有 leader 执行后台刷新，其他 worker 跟随数据文件的更新
+        start_worker_coordinator()
+        start_score_feed()
+        if profiler is not None:
+            profiler.start()
+        yield
+        if profiler is not None:
+            profiler.stop()
+        await stop_worker_coordinator()
+        await stop_score_feed()
+        await stop_leaderboard_loader()
+        await close_client()
 
 app = FastAPI(
     title="Third party api for remi service about maimaidx",
+    lifespan=lifespan,
 )
 
+# 后添加的中间件在外层，限流拒绝的请求同样计入请求指标
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(v1_router)
+app.include_router(metrics_router)
 
 
 if __name__ == "__main__":
     import uvicorn
+    # 开发用，生产环境使用 serve.py
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
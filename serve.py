@@ -0,0 +1,87 @@
+"""
+生产环境入口：不自动重载，可以以多个 worker 进程运行
+
+worker 之间通过 data/divingfish 下的文件锁选出 leader 执行后台刷新与封面预取，
+其他 worker 跟随数据文件的更新重新加载内存快照（见 app/service/divingfish/workers.py）。
+
+排行榜、成绩变化推送与限流的状态保存在进程内，多个 worker 会各自维护一份互不一致的状态，
+因此只有单个 worker（默认）时才默认启用：
+
+    python serve.py --port 8000
+
+使用多个 worker 时这三项默认关闭（限流可交给反向代理），其余功能不受影响；
+显式设置 LEADERBOARD_ENABLED=1、SCORE_FEED_ENABLED=1 或 RATE_LIMIT_ENABLED=1 时拒绝以多个 worker 启动：
+
+    python serve.py --workers 4 --port 8000
+
+首次部署或升级新增了数据库表后，先运行一次建表：
+
+    python serve.py --init-db
+"""
+import argparse
+import asyncio
+import os
+
+import uvicorn
+from loguru import logger
+
+from cfg.config import ServerHost, ServerPort, ServerWorkers, LeaderboardEnabled, ScoreFeedEnabled, RateLimitEnabled, \
+    TORTOISE_ORM
+
+# 状态保存在进程内、要求单个 worker 的功能（环境变量名）及其当前开关
+PER_PROCESS_FEATURES = {
+    "LEADERBOARD_ENABLED": LeaderboardEnabled,
+    "SCORE_FEED_ENABLED": ScoreFeedEnabled,
+    "RATE_LIMIT_ENABLED": RateLimitEnabled,
+}
+
+
+async def init_db() -> None:
+    """
+    创建不存在的数据库表，已有的表保持不变
+    """
+    from tortoise import Tortoise
+
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        await Tortoise.generate_schemas(safe=True)
+    finally:
+        await Tortoise.close_connections()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=ServerHost)
+    parser.add_argument("--port", type=int, default=ServerPort)
+    parser.add_argument("--workers", type=int, default=ServerWorkers,
+                        help="worker 进程数，默认为 1；大于 1 时默认关闭排行榜、成绩变化推送与限流")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--forwarded-allow-ips", default=None,
+                        help="信任其 X-Forwarded-* 头的反向代理地址，逗号分隔")
+    parser.add_argument("--init-db", action="store_true", help="创建不存在的数据库表后退出")
+    args = parser.parse_args()
+    if args.init_db:
+        asyncio.run(init_db())
+        return
+    if args.workers > 1:
+        explicit = [name for name in PER_PROCESS_FEATURES if os.getenv(name) == "1"]
+        if explicit:
+            parser.error(f"{', '.join(explicit)} 的状态保存在进程内，启用时只能使用 --workers 1")
+        # worker 进程重新导入配置时读取环境变量
+        disabled = [name for name, value in PER_PROCESS_FEATURES.items() if value]
+        for name in PER_PROCESS_FEATURES:
+            os.environ[name] = "0"
+        if disabled:
+            logger.info(f"以 {args.workers} 个 worker 运行，关闭状态保存在进程内的 {', '.join(disabled)}")
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=max(1, args.workers),
+        log_level=args.log_level,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+    )
+
+
+if __name__ == "__main__":
+    main()
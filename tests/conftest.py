@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+import pytest
+
+
+def pytest_sessionstart(session):
+    # 部分服务模块在导入时会在当前目录下创建 data/ 目录，测试在临时目录中运行，不改动仓库
+    os.chdir(tempfile.mkdtemp(prefix="mai-tp-api-tests-"))
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """
+    为每个测试替换水鱼熔断器、重试预算与排队器，重试不退避，避免测试之间互相影响
+    """
+    from app.service.divingfish import upstream as module
+    from app.utils.http.priority import PriorityLimiter
+    from app.utils.http.resilience import CircuitBreaker, RetryBudget
+
+    monkeypatch.setattr(module, "breaker", CircuitBreaker("test", failure_threshold=5, recovery_timeout=30))
+    monkeypatch.setattr(module, "retry_budget", RetryBudget())
+    monkeypatch.setattr(module, "upstream_queue", PriorityLimiter(4, module.UPSTREAM_PRIORITIES))
+    monkeypatch.setattr(module, "UpstreamRetryBaseDelay", 0)
+    return module
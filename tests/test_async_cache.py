@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from app.utils.cache.async_cache import AsyncTTLCache
+
+
+def test_concurrent_misses_load_once():
+    cache = AsyncTTLCache(ttl=60, max_bytes=1 << 20)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"rating": calls}
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load("player", loader) for _ in range(10)))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert all(result == {"rating": 1} for result in results)
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["coalesced"] == 9
+
+
+def test_hit_until_expired(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("app.utils.cache.async_cache.time.monotonic", lambda: now)
+    cache = AsyncTTLCache(ttl=10, max_bytes=1 << 20)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    assert asyncio.run(cache.get_or_load("k", loader)) == 1
+    now += 5
+    assert asyncio.run(cache.get_or_load("k", loader)) == 1
+    now += 6
+    assert asyncio.run(cache.get_or_load("k", loader)) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_stale_value_served_while_revalidating(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("app.utils.cache.async_cache.time.monotonic", lambda: now)
+    cache = AsyncTTLCache(ttl=10, max_bytes=1 << 20, stale_while_revalidate=True, stale_ttl=30)
+    cache.put("k", "old")
+    now += 20
+
+    async def loader():
+        return "new"
+
+    async def main():
+        stale = await cache.get_or_load("k", loader)
+        # 后台刷新完成后读到新值
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return stale, cache.peek("k")
+
+    assert asyncio.run(main()) == ("old", "new")
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_should_cache_and_errors_are_not_cached():
+    cache = AsyncTTLCache(ttl=60, max_bytes=1 << 20)
+
+    async def failed():
+        return None
+
+    async def broken():
+        raise RuntimeError("upstream down")
+
+    assert asyncio.run(cache.get_or_load("k", failed, should_cache=lambda v: v is not None)) is None
+    assert cache.peek("k") is None
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_load("k", broken))
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["inflight"] == 0
+
+
+def test_evicts_least_recently_used_by_size():
+    cache = AsyncTTLCache(ttl=60, max_bytes=25)
+    cache.put("a", "x" * 8)
+    cache.put("b", "x" * 8)
+
+    async def loader():
+        return None
+
+    # 命中会刷新 a 的 LRU 位置
+    asyncio.run(cache.get_or_load("a", loader))
+    cache.put("c", "x" * 8)
+    assert cache.peek("a") is not None
+    assert cache.peek("b") is None
+    assert cache.stats()["evictions"] == 1
+    # 单个值超过上限时不缓存
+    cache.put("d", "x" * 100)
+    assert cache.peek("d") is None
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes.v1 import divingfish as routes
+from app.service.divingfish.catalog import MusicCatalog, music_data_dataset
+from app.service.divingfish.chart_stats import ChartStatsStore, chart_stats_dataset
+from app.service.divingfish.mai import query_music_info_batch, query_chart_stats_batch
+
+
+def _music(music_id: int, charts: int) -> dict:
+    return {"id": str(music_id), "title": f"song {music_id}", "type": "SD", "ds": [10.0] * charts,
+            "level": ["10"] * charts, "cids": [music_id * 10 + i for i in range(charts)],
+            "charts": [{"notes": [1, 1, 1, 1], "charter": "-"}] * charts,
+            "basic_info": {"title": f"song {music_id}", "artist": "-", "genre": "-", "bpm": 150, "release_date": "",
+                           "from": "-", "is_new": False}}
+
+
+@pytest.fixture
+def loaded(monkeypatch):
+    """
+    以内存中的歌曲目录与铺面统计代替从本地文件加载
+    """
+    monkeypatch.setattr(music_data_dataset, "_store", MusicCatalog([_music(1, 4), _music(2, 5)]))
+    stats = {"charts": {"1": [{"fit_diff": 1.0 + i} for i in range(4)], "2": [{"fit_diff": 2.0}]}}
+    monkeypatch.setattr(chart_stats_dataset, "_store", ChartStatsStore(stats))
+
+
+def test_music_info_batch(loaded):
+    result = asyncio.run(query_music_info_batch([1, 3], [22, 99]))
+    assert sorted(result["data"]) == ["1", "2"]
+    assert result["cids"] == {"22": {"music_id": "2", "level_index": 2}}
+    assert result["not_found"] == {"music_ids": [3], "cids": [99]}
+
+
+def test_chart_stats_batch(loaded):
+    result = asyncio.run(query_chart_stats_batch([2, 3], [13, 21]))
+    assert result["data"] == {"2": [{"fit_diff": 2.0}]}
+    assert result["cids"] == {"13": {"fit_diff": 4.0}}
+    # 歌曲存在但统计中没有该难度
+    assert result["not_found"] == {"music_ids": [3], "cids": [21]}
+
+
+@pytest.fixture
+def client(loaded):
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def test_batch_routes(client, monkeypatch):
+    response = client.post("/divingfish/music_info/batch", json={"music_ids": [1, 2]})
+    assert response.status_code == 200
+    assert response.json()["status"] == "success"
+    response = client.post("/divingfish/chart_stats/batch", json={"music_ids": [1], "cids": [99]})
+    assert response.json()["status"] == "partial"
+    monkeypatch.setattr(routes, "BatchQueryMaxItems", 2)
+    response = client.post("/divingfish/music_info/batch", json={"music_ids": [1, 2], "cids": [10]})
+    assert response.status_code == 400
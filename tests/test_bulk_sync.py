@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.service.divingfish import bulk_sync
+from app.service.divingfish.bulk_sync import BulkSyncJob, JsonlSink, SyncCheckpoint, iter_players_from_file
+
+
+@pytest.fixture
+def queries(monkeypatch):
+    """
+    以固定结果代替水鱼查询：用户名以 skip 开头时返回查询失败，返回被查询的玩家列表
+    """
+    queried = []
+
+    async def query(username, is_qq, b50=True, client=None):
+        queried.append(username)
+        await asyncio.sleep(0.001)
+        if username.startswith("skip"):
+            return False, {"message": "user not exists"}
+        return True, {"username": username, "rating": len(username), "charts": {"sd": [], "dx": []}}
+
+    monkeypatch.setattr(bulk_sync, "query_player_scores_simple", query)
+    return queried
+
+
+async def _players(names):
+    for name in names:
+        yield name, False
+
+
+def _job(names, sink, checkpoint=None, **options) -> BulkSyncJob:
+    options = {"concurrency": 3, "rate": 10_000, "burst": 10_000, "batch_size": 4, **options}
+    return BulkSyncJob(_players(names), sink, checkpoint, **options)
+
+
+def _read_jsonl(path) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_iter_players_from_file(tmp_path):
+    path = tmp_path / "users.txt"
+    path.write_text("alice\n\n# comment\nqq:10001\n  bob  \n", encoding="utf-8")
+
+    async def main():
+        return [item async for item in iter_players_from_file(str(path), chunk_size=4)]
+
+    assert asyncio.run(main()) == [("alice", False), ("10001", True), ("bob", False)]
+
+
+def test_checkpoint_watermark(tmp_path):
+    checkpoint = SyncCheckpoint(str(tmp_path / "checkpoint.json"), "db")
+    for index in (0, 2, 3, 5):
+        checkpoint.mark(index)
+    assert checkpoint.watermark == 0
+    assert checkpoint.done == {2, 3, 5}
+    checkpoint.mark(1)
+    assert checkpoint.watermark == 3
+    assert [checkpoint.is_done(i) for i in range(7)] == [True, True, True, True, False, True, False]
+    asyncio.run(checkpoint.save({}))
+    restored = SyncCheckpoint(checkpoint.path, "db")
+    assert (restored.watermark, restored.done) == (3, {5})
+    # 来源不同时从头开始
+    assert SyncCheckpoint(checkpoint.path, "file:/tmp/users.txt").watermark == -1
+
+
+def test_run_and_resume(tmp_path, queries):
+    names = [f"player{i}" for i in range(10)] + ["skip0"]
+    output = tmp_path / "out.jsonl"
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    stats = asyncio.run(_job(names, JsonlSink(str(output)), SyncCheckpoint(checkpoint_path, "db")).run())
+    assert (stats["succeeded"], stats["skipped"], stats["written"], stats["running"]) == (10, 1, 10, False)
+    assert sorted(row["username"] for row in _read_jsonl(output)) == sorted(names[:10])
+    assert SyncCheckpoint(checkpoint_path, "db").watermark == len(names) - 1
+
+    queries.clear()
+    stats = asyncio.run(_job(names + ["player10"], JsonlSink(str(output)),
+                             SyncCheckpoint(checkpoint_path, "db")).run())
+    assert stats["resumed"] == len(names)
+    assert queries == ["player10"]
+
+
+class _FailingSink:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.written = []
+
+    async def write(self, items):
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.written.extend(username for username, _, _ in items)
+
+
+def test_write_failure_keeps_players_pending(tmp_path, queries):
+    names = [f"player{i}" for i in range(4)]
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    sink = _FailingSink(failures=1)
+    stats = asyncio.run(_job(names, sink, SyncCheckpoint(checkpoint_path, "db")).run())
+    assert (stats["write_failed"], stats["written"]) == (4, 0)
+    checkpoint = SyncCheckpoint(checkpoint_path, "db")
+    assert checkpoint.watermark == -1
+    assert sorted(failure["username"] for failure in checkpoint.failures) == names
+
+    # 续跑时重新查询写入失败的玩家
+    stats = asyncio.run(_job(names, sink, checkpoint).run())
+    assert (stats["resumed"], stats["written"]) == (0, 4)
+    assert sorted(sink.written) == names
+
+
+def test_worker_crash_stops_job(tmp_path, queries, monkeypatch):
+    job = _job([f"player{i}" for i in range(100)], JsonlSink(str(tmp_path / "out.jsonl")),
+               SyncCheckpoint(str(tmp_path / "checkpoint.json"), "db"), concurrency=2, batch_size=1000)
+
+    async def broken_fetch(username, is_qq):
+        return "unknown", {}
+
+    monkeypatch.setattr(job, "_fetch", broken_fetch)
+
+    async def main():
+        # 生产者不会阻塞在无人消费的队列上
+        await asyncio.wait_for(job.run(), timeout=5)
+
+    with pytest.raises(KeyError):
+        asyncio.run(main())
+    assert job.stats()["running"] is False
+
+
+def test_start_job_rejects_concurrent_runs(tmp_path, queries, monkeypatch):
+    players = tmp_path / "users.txt"
+    players.write_text("\n".join(f"player{i}" for i in range(5)), encoding="utf-8")
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+    original = bulk_sync.create_job
+
+    async def create_job(*args, **options):
+        return await original(*args, checkpoint_path=checkpoint_path, **options)
+
+    monkeypatch.setattr(bulk_sync, "create_job", create_job)
+    monkeypatch.setattr(bulk_sync, "_job", None)
+    monkeypatch.setattr(bulk_sync, "_job_task", None)
+
+    async def main():
+        output = str(tmp_path / "out.jsonl")
+        job = await bulk_sync.start_job(str(players), output, False, rate=10_000, burst=10_000)
+        rejected = await bulk_sync.start_job(str(players), output, False)
+        running = bulk_sync.is_running()
+        await bulk_sync._job_task
+        await asyncio.sleep(0)
+        return job, rejected, running, bulk_sync.is_running()
+
+    job, rejected, running, still_running = asyncio.run(main())
+    assert job is bulk_sync.get_job()
+    assert rejected is None
+    assert running and not still_running
+    assert job.stats()["written"] == 5
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.service.divingfish.catalog import MusicCatalog, MusicCatalogBuilder
+
+
+def _music(music_id: int, title: str, artist: str, genre: str, version: str, ds: list[float],
+           level: list[str]) -> dict:
+    return {
+        "id": str(music_id),
+        "title": title,
+        "type": "SD",
+        "ds": ds,
+        "level": level,
+        "cids": [music_id * 10 + i for i in range(len(ds))],
+        "charts": [{"notes": [100, 10, 10, 10], "charter": "-"} for _ in ds],
+        "basic_info": {"title": title, "artist": artist, "genre": genre, "bpm": 150, "release_date": "",
+                       "from": version, "is_new": False},
+    }
+
+
+MUSIC = [
+    _music(1, "Oshama Scramble!", "t+pazolite", "maimai", "maimai", [3.0, 7.0, 10.5, 12.8], ["3", "7", "10+", "12+"]),
+    _music(2, "Garakuta Doll Play", "t+pazolite", "maimai", "maimai PLUS", [4.0, 8.0, 11.0, 13.7],
+           ["4", "8", "11", "13+"]),
+    _music(3, "PANDORA PARADOXXX", "Sakuzyo", "maimai", "maimai FiNALE", [5.0, 9.0, 12.5, 14.8, 15.0],
+           ["5", "9", "12+", "14+", "15"]),
+]
+
+
+@pytest.fixture
+def catalog():
+    return MusicCatalog(MUSIC, version="a" * 64)
+
+
+def test_get_by_id_and_cid(catalog):
+    assert len(catalog) == 3
+    assert catalog.get(2)["title"] == "Garakuta Doll Play"
+    assert catalog.get("2") is catalog.get(2)
+    assert catalog.get(4) is None
+    music, level_index = catalog.get_by_cid(33)
+    assert music["id"] == "3"
+    assert level_index == 3
+    assert catalog.get_by_cid(99) is None
+
+
+def test_find_ignores_case(catalog):
+    assert [m["id"] for m in catalog.find_by_title("oshama scramble!")] == ["1"]
+    assert [m["id"] for m in catalog.find_by_artist("T+PAZOLITE")] == ["1", "2"]
+    assert [m["id"] for m in catalog.find_by_genre("maimai")] == ["1", "2", "3"]
+    assert [m["id"] for m in catalog.find_by_version("maimai FiNALE")] == ["3"]
+    assert catalog.find_by_title("missing") == []
+
+
+def test_find_by_level(catalog):
+    assert [(m["id"], i) for m, i in catalog.find_by_level("12+")] == [("1", 3), ("3", 2)]
+
+
+def test_find_by_ds_range_is_inclusive_and_sorted(catalog):
+    charts = catalog.find_by_ds_range(12.5, 13.7)
+    assert [(m["id"], i) for m, i in charts] == [("3", 2), ("1", 3), ("2", 3)]
+    assert catalog.find_by_ds_range(15.1, 16.0) == []
+
+
+def test_get_encoded_is_cached(catalog):
+    body = catalog.get_encoded(1)
+    assert json.loads(body.bodies[None]) == MUSIC[0]
+    assert body.etags[None].startswith("\"aaaaaaaaaaaaaaaa-1")
+    assert catalog.get_encoded("1") is body
+    assert catalog.get_encoded(4) is None
+
+
+def test_get_dump_serializes_without_file(catalog, tmp_path):
+    body = asyncio.run(catalog.get_dump(str(tmp_path / "music_data.json"), str(tmp_path / "music_data_ext.json")))
+    assert json.loads(body.bodies[None]) == MUSIC
+
+
+def test_builder_matches_catalog(catalog):
+    builder = MusicCatalogBuilder()
+    for i, music in enumerate(MUSIC):
+        builder.add((i,), music)
+    built = builder.finish({"etag": "W/\"1\"", "sha256": "a" * 64})
+    assert built.etag == "W/\"1\""
+    assert list(built.music_list) == MUSIC
+    assert built.by_cid == catalog.by_cid
+    assert built.by_level == catalog.by_level
+    assert built.find_by_ds_range(0, 20) == catalog.find_by_ds_range(0, 20)
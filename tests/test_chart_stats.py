@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish.chart_stats import ChartStatsStore, ChartStatsBuilder, EMPTY_CHART_STATS
+from app.service.divingfish.dataset import GameDataset
+from app.utils.os.storage import write_dataset
+
+CHART_STATS = {
+    "charts": {
+        "1": [{"cnt": 100.0, "diff": "3", "fit_diff": 3.2, "avg": 99.1, "avg_dx": 300.0, "std_dev": 1.2,
+               "dist": [0] * 13, "fc_dist": [0] * 5}],
+        "2": [{}, {"cnt": 20.0, "diff": "7", "fit_diff": 7.4, "avg": 97.3, "avg_dx": 500.0, "std_dev": 2.5,
+                   "dist": [0] * 13, "fc_dist": [0] * 5}],
+    },
+    "diff_data": {"13+": {"achievements": 99.5, "dist": [0] * 13, "fc_dist": [0] * 5}},
+}
+
+
+def test_serialized_responses():
+    store = ChartStatsStore(CHART_STATS, version="b" * 64)
+    assert store.get_chart(2) == CHART_STATS["charts"]["2"]
+    assert json.loads(store.get_chart_bytes("1")) == {"stats": CHART_STATS["charts"]["1"]}
+    assert json.loads(store.diff_bytes) == {"stats": CHART_STATS["diff_data"]}
+    assert store.get_chart(3) == []
+    assert store.get_chart_bytes(3) == b'{"stats":[]}'
+
+
+def test_encoded_bodies_are_cached_per_version():
+    store = ChartStatsStore(CHART_STATS, version="b" * 64)
+    body = store.get_chart_encoded(1)
+    assert store.get_chart_encoded("1") is body
+    assert body.etags[None] == '"bbbbbbbbbbbbbbbb-1"'
+    assert store.get_diff_encoded().etags[None] == '"bbbbbbbbbbbbbbbb-diff"'
+    assert store.get_chart_encoded(3) is EMPTY_CHART_STATS
+
+
+def test_builder_matches_store():
+    builder = ChartStatsBuilder()
+    for song_id, stats in CHART_STATS["charts"].items():
+        builder.add(("charts", song_id), stats)
+    for level, stats in CHART_STATS["diff_data"].items():
+        builder.add(("diff_data", level), stats)
+    # 其他层级的值忽略
+    builder.add(("status",), "ok")
+    built = builder.finish({"sha256": "c" * 64})
+    store = ChartStatsStore(CHART_STATS)
+    assert built.version == "c" * 64
+    assert built.chart_bytes == store.chart_bytes
+    assert built.diff_bytes == store.diff_bytes
+
+
+def test_load_builds_off_the_event_loop(tmp_path):
+    threads = []
+
+    class RecordingBuilder(ChartStatsBuilder):
+        def finish(self, meta):
+            threads.append(threading.get_ident())
+            return super().finish(meta)
+
+    dataset = GameDataset(GameDataType.MAIMAI, "chart_stats", "chart_stats", RecordingBuilder,
+                          data_dir=str(tmp_path))
+
+    async def main():
+        data = json.dumps(CHART_STATS).encode("utf-8")
+        meta = await write_dataset(dataset.data_path, dataset.ext_path, data, {"etag": None})
+        store = await dataset.ensure()
+        return store, meta, threading.get_ident()
+
+    store, meta, loop_thread = asyncio.run(main())
+    assert dataset.get() is store
+    assert store.version == meta["sha256"]
+    assert store.chart_bytes == ChartStatsStore(CHART_STATS).chart_bytes
+    assert threads and loop_thread not in threads
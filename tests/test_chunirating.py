@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.chunirating import engine as chuni
+from app.service.divingfish.catalog import MusicCatalog
+
+
+def _music(music_id: int, ds: list[float]) -> dict:
+    return {
+        "id": str(music_id),
+        "title": f"song {music_id}",
+        "type": "SD",
+        "ds": ds,
+        "level": [str(int(d)) for d in ds],
+        "cids": list(range(len(ds))),
+        "charts": [{"notes": [100, 10, 10, 10], "charter": "-"} for _ in ds],
+        "basic_info": {"title": f"song {music_id}", "artist": "-", "genre": "-", "bpm": 150, "release_date": "",
+                       "from": "-", "is_new": False},
+    }
+
+
+@pytest.mark.parametrize("ds, score, expected", [
+    (14.0, 1010000, 16.15),
+    (14.0, 1009000, 16.15),
+    (14.0, 1007500, 16.0),
+    (14.0, 1005000, 15.5),
+    (14.0, 1000000, 15.0),
+    (14.0, 990000, 14.6),
+    (14.0, 975000, 14.0),
+    (14.0, 950000, 12.5),
+    (14.0, 900000, 9.0),
+    (14.0, 800000, 4.5),
+    (14.0, 500000, 0.0),
+    (3.0, 800000, 0.0),
+])
+def test_chuni_compute_ra(ds, score, expected):
+    assert chuni.compute_ra(np.array([ds]), np.array([score]))[0] == pytest.approx(expected)
+
+
+@pytest.fixture(scope="module")
+def chuni_engine():
+    music = [_music(i, [3.0, 7.0, 11.0, 13.0 + i / 10]) for i in range(1, 41)]
+    return chuni.ChuniRatingEngine(MusicCatalog(music, game=GameDataType.CHUNITHM))
+
+
+def test_chuni_b30_r10(chuni_engine):
+    best = [{"mid": i, "level_index": 3, "score": 1000000} for i in range(1, 41)]
+    # 同一谱面只计一次
+    best += [{"mid": 40, "level_index": 3, "score": 990000}]
+    recent = [{"mid": i, "level_index": 3, "score": 1007500} for i in range(1, 16)]
+    result = chuni_engine.compute(best, recent)
+    assert len(result["b30"]) == 30
+    assert len({(record["mid"], record["level_index"]) for record in result["b30"]}) == 30
+    assert result["b30"][0]["mid"] == 40
+    assert result["b30"][0]["score"] == 1000000
+    assert len(result["r10"]) == 10
+    best_total = sum(14.0 + i / 10 for i in range(11, 41))
+    recent_total = sum(15.0 + i / 10 for i in range(6, 16))
+    assert result["best_rating"] == pytest.approx(np.floor(best_total / 30 * 100) / 100)
+    assert result["recent_rating"] == pytest.approx(np.floor(recent_total / 10 * 100) / 100)
+    assert result["rating"] == pytest.approx(np.floor((best_total + recent_total) / 40 * 100) / 100)
+
+
+def test_chuni_unknown_records(chuni_engine):
+    unknown = [{"mid": 999, "level_index": 0, "score": 1000000}]
+    recent_unknown = [{"mid": 1, "level_index": 5, "score": 1000000}]
+    result = chuni_engine.compute(unknown + [{"song_id": 1, "level_index": 3, "score": 1000000}], recent_unknown)
+    assert result["unknown"] == unknown + recent_unknown
+    assert [record["mid"] for record in result["b30"]] == [1]
+    assert result["r10"] == []
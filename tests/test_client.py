@@ -0,0 +1,94 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish import client
+from app.service.divingfish.dataset import GameDataset
+from app.utils.metrics.instruments import UPSTREAM_REQUEST_DURATION
+
+
+@pytest.mark.parametrize("path, endpoint", [
+    ("/api/maimaidxprober/music_data", "music_data"),
+    ("/api/maimaidxprober/chart_stats", "chart_stats"),
+    ("/api/maimaidxprober/query/player", "query_player"),
+    ("/api/chunithmprober/music_data", "chunithm_music_data"),
+    ("/api/maimaidxprober/alive", "alive"),
+    ("/covers/00001.png", "cover"),
+    ("/api/maimaidxprober/player/records", "other"),
+])
+def test_upstream_endpoint(path, endpoint):
+    assert client.upstream_endpoint(path) == endpoint
+
+
+def test_instrumented_transport_records_status():
+    transport = client.InstrumentedTransport(httpx.MockTransport(lambda request: httpx.Response(418)))
+    child = UPSTREAM_REQUEST_DURATION.labels("alive", 418)
+    before = sum(child.counts)
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as c:
+            return await c.get("https://example.com/api/maimaidxprober/alive")
+
+    assert asyncio.run(main()).status_code == 418
+    assert sum(child.counts) == before + 1
+
+
+def test_shared_client_lifecycle():
+    async def main():
+        shared = await client.init_client()
+        assert client.get_client() is shared
+        assert await client.init_client() is shared
+        await client.close_client()
+        assert client.get_client() is not shared
+        await client.close_client()
+
+    asyncio.run(main())
+
+
+class _ListBuilder:
+    depth = 1
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, path, value):
+        self.items.append(value)
+
+    def finish(self, meta):
+        return meta
+
+
+def _refresh(tmp_path, handler) -> tuple[tuple[bool, bool] | Exception, int]:
+    calls = 0
+
+    def counting(request):
+        nonlocal calls
+        calls += 1
+        return handler(request)
+
+    dataset = GameDataset(GameDataType.MAIMAI, "music_data", "test", _ListBuilder, data_dir=str(tmp_path))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(counting)) as c:
+            try:
+                return await dataset.update(client=c)
+            except Exception as e:
+                return e
+
+    return asyncio.run(main()), calls
+
+
+def test_client_errors_are_not_retried(tmp_path, upstream):
+    result, calls = _refresh(tmp_path, lambda request: httpx.Response(404, text="not found"))
+    assert result == (False, False)
+    assert calls == 1
+    assert upstream.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_server_errors_are_retried(tmp_path, upstream):
+    result, calls = _refresh(tmp_path, lambda request: httpx.Response(503))
+    assert isinstance(result, httpx.NetworkError)
+    assert calls == upstream.UpstreamRetryAttempts
+    assert upstream.breaker.stats()["consecutive_failures"] == calls
@@ -0,0 +1,102 @@
+import asyncio
+import os
+from email.utils import formatdate
+
+import pytest
+from starlette.requests import Request
+
+from app.service.divingfish import cover as cover_module
+from app.service.divingfish.cover import CoverCache
+from app.utils.http.conditional import is_not_modified
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    """
+    以写入本地文件代替从水鱼下载封面，返回每个封面的下载次数
+    """
+    monkeypatch.setattr(cover_module, "COVER_DIR", str(tmp_path))
+    counts = {}
+
+    async def download(songs_id: int):
+        counts[songs_id] = counts.get(songs_id, 0) + 1
+        await asyncio.sleep(0.01)
+        if songs_id < 0:
+            return False, {"message": "not found"}
+        with open(cover_module.cover_path(songs_id), "wb") as f:
+            f.write(b"x" * 100)
+        return True, {"size": 100}
+
+    monkeypatch.setattr(cover_module, "download_music_cover", download)
+    return counts
+
+
+def test_concurrent_misses_download_once(tmp_path, downloads):
+    cache = CoverCache(str(tmp_path), max_bytes=10_000)
+
+    async def main():
+        return await asyncio.gather(*(cache.get(1) for _ in range(5)))
+
+    paths = asyncio.run(main())
+    assert downloads == {1: 1}
+    assert set(paths) == {cover_module.cover_path(1)}
+    assert asyncio.run(cache.get(1)) == cover_module.cover_path(1)
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+
+
+def test_failed_download_is_not_cached(tmp_path, downloads):
+    cache = CoverCache(str(tmp_path), max_bytes=10_000)
+    assert asyncio.run(cache.get(-1)) is None
+    assert asyncio.run(cache.get(-1)) is None
+    assert downloads == {-1: 2}
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used(tmp_path, downloads):
+    cache = CoverCache(str(tmp_path), max_bytes=250)
+
+    async def main():
+        await cache.get(1)
+        await cache.get(2)
+        await cache.get(1)
+        await cache.get(3)
+
+    asyncio.run(main())
+    assert not os.path.exists(cover_module.cover_path(2))
+    assert os.path.exists(cover_module.cover_path(1))
+    assert cache.stats()["bytes"] == 200
+    assert cache.stats()["evictions"] == 1
+
+
+def test_indexes_existing_files(tmp_path, downloads):
+    for songs_id in (1, 2):
+        with open(cover_module.cover_path(songs_id), "wb") as f:
+            f.write(b"x" * 100)
+    (tmp_path / "notes.txt").write_text("ignored")
+    cache = CoverCache(str(tmp_path), max_bytes=10_000)
+    asyncio.run(cache.load())
+    assert cache.stats()["entries"] == 2
+    assert asyncio.run(cache.get(2)) == cover_module.cover_path(2)
+    assert downloads == {}
+
+
+def _request(**headers) -> Request:
+    return Request({"type": "http", "headers": [(k.replace("_", "-").encode(), v.encode())
+                                                for k, v in headers.items()]})
+
+
+def test_is_not_modified():
+    etag = 'W/"1a-64"'
+    assert is_not_modified(_request(if_none_match='W/"1a-64"'), etag)
+    assert is_not_modified(_request(if_none_match='"other", "1a-64"'), etag)
+    assert is_not_modified(_request(if_none_match="*"), etag)
+    assert not is_not_modified(_request(if_none_match='"other"'), etag)
+    assert not is_not_modified(_request(), etag, 1_700_000_000)
+    assert is_not_modified(_request(if_modified_since=formatdate(1_700_000_000, usegmt=True)), etag, 1_700_000_000.5)
+    assert not is_not_modified(_request(if_modified_since=formatdate(1_600_000_000, usegmt=True)), etag, 1_700_000_000)
+    # If-None-Match 存在时忽略 If-Modified-Since
+    assert not is_not_modified(_request(if_none_match='"other"',
+                                        if_modified_since=formatdate(1_700_000_000, usegmt=True)),
+                               etag, 1_600_000_000)
+    assert not is_not_modified(_request(if_modified_since="not a date"), etag, 1_600_000_000)
@@ -0,0 +1,88 @@
+import asyncio
+import os
+
+import pytest
+
+from app.enums.divingfish.imageformat import ImageFormat
+from app.service.divingfish import cover_render
+from app.service.divingfish.cover_render import DerivedCoverIndex, normalize_render_params, derived_cover_path
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.mark.parametrize("size, fmt, quality, expected", [
+    (100, ImageFormat.JPEG, 75, (128, 80)),
+    (128, ImageFormat.WEBP, 80, (128, 80)),
+    (16, ImageFormat.WEBP, 1, (64, 10)),
+    (2000, ImageFormat.JPEG, 100, (1024, 100)),
+    (None, ImageFormat.JPEG, 91, (None, 100)),
+    (300, ImageFormat.PNG, 50, (512, None)),
+])
+def test_normalize_render_params(size, fmt, quality, expected):
+    assert normalize_render_params(size, fmt, quality) == expected
+
+
+def test_derived_cover_path():
+    assert derived_cover_path(11, 128, ImageFormat.WEBP, 80).endswith("/11_128_q80.webp")
+    assert derived_cover_path(11, None, ImageFormat.PNG, None).endswith("/11_orig.png")
+
+
+def test_index_evicts_least_recently_used(tmp_path):
+    index = DerivedCoverIndex(str(tmp_path), max_bytes=250)
+    paths = [str(tmp_path / f"{i}_64_q80.webp") for i in range(3)]
+    for path in paths[:2]:
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+        index.add(path, 100)
+    assert index.lookup(paths[0])
+    with open(paths[2], "wb") as f:
+        f.write(b"x" * 100)
+    # 其他 worker 渲染的文件在首次访问时加入索引
+    assert index.lookup(paths[2])
+    assert not os.path.exists(paths[1])
+    assert index.stats()["evictions"] == 1
+    assert not index.lookup(paths[1])
+
+
+@pytest.fixture
+def source_cover(tmp_path, monkeypatch):
+    """
+    以本地生成的图片作为原始封面，返回原图的获取次数
+    """
+    source = str(tmp_path / "1.png")
+    Image.new("RGBA", (400, 200), (255, 0, 0, 128)).save(source)
+    fetched = []
+
+    class FakeCoverCache:
+        async def get(self, songs_id):
+            fetched.append(songs_id)
+            await asyncio.sleep(0.01)
+            return source if songs_id == 1 else None
+
+    derived_dir = tmp_path / "derived"
+    derived_dir.mkdir()
+    monkeypatch.setattr(cover_render, "cover_cache", FakeCoverCache())
+    monkeypatch.setattr(cover_render, "DERIVED_COVER_DIR", str(derived_dir))
+    monkeypatch.setattr(cover_render, "derived_covers", DerivedCoverIndex(str(derived_dir)))
+    return fetched
+
+
+def test_renders_once_and_reuses(source_cover):
+    async def main():
+        return await asyncio.gather(*(cover_render.get_rendered_cover(1, 100, ImageFormat.JPEG, 75)
+                                      for _ in range(4)))
+
+    paths = asyncio.run(main())
+    assert len(set(paths)) == 1
+    assert paths[0].endswith("/1_128_q80.jpeg")
+    assert source_cover == [1]
+    with Image.open(paths[0]) as image:
+        assert image.format == "JPEG"
+        assert image.size == (128, 64)
+    assert asyncio.run(cover_render.get_rendered_cover(1, 128, ImageFormat.JPEG, 80)) == paths[0]
+    assert source_cover == [1]
+
+
+def test_missing_source(source_cover):
+    assert asyncio.run(cover_render.get_rendered_cover(2, 64, ImageFormat.WEBP, 80)) is None
+    assert cover_render.derived_covers.stats()["entries"] == 0
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from app.service.divingfish.catalog import MusicCatalog
+from app.service.dxrating import engine as dx
+
+
+def _music(music_id: int, ds: list[float], is_new: bool = False) -> dict:
+    return {
+        "id": str(music_id),
+        "title": f"song {music_id}",
+        "type": "DX" if is_new else "SD",
+        "ds": ds,
+        "level": [str(int(d)) for d in ds],
+        "cids": list(range(len(ds))),
+        "charts": [{"notes": [100, 10, 10, 10], "charter": "-"} for _ in ds],
+        "basic_info": {"title": f"song {music_id}", "artist": "-", "genre": "-", "bpm": 150, "release_date": "",
+                       "from": "-", "is_new": is_new},
+    }
+
+
+@pytest.mark.parametrize("ds, achievements, b50, expected", [
+    (13.0, 100.5, True, 292),
+    (14.9, 100.5, True, 335),
+    (13.0, 101.0, True, 292),
+    (12.7, 100.0, True, 274),
+    (13.0, 100.4999, True, 290),
+    (13.0, 97.0, True, 252),
+    (13.0, 100.5, False, 182),
+])
+def test_dx_compute_ra(ds, achievements, b50, expected):
+    assert dx.compute_ra(np.array([ds]), np.array([achievements]), b50)[0] == expected
+
+
+def test_dx_rate_name():
+    assert dx.rate_name(100.5) == "sssp"
+    assert dx.rate_name(100.4999) == "sss"
+    assert dx.rate_name(97.0) == "s"
+    assert dx.rate_name(49.0) == "d"
+
+
+@pytest.fixture(scope="module")
+def dx_engine():
+    music = [_music(i, [5.0, 7.0, 10.0, 12.0 + i / 100]) for i in range(1, 51)]
+    music += [_music(10000 + i, [5.0, 7.0, 10.0, 13.0 + i / 100], is_new=True) for i in range(1, 21)]
+    return dx.RatingEngine(MusicCatalog(music))
+
+
+def _expected_total(ds: list[float], achievements: float, slots: int) -> int:
+    ra = dx.compute_ra(np.array(ds), np.full(len(ds), achievements))
+    return int(np.sort(ra)[::-1][:slots].sum())
+
+
+def test_dx_b35_b15(dx_engine):
+    records = [{"song_id": i, "level_index": 3, "achievements": 100.5} for i in range(1, 51)]
+    records += [{"song_id": 10000 + i, "level_index": 3, "achievements": 100.5} for i in range(1, 21)]
+    result = dx_engine.compute(records)
+    assert len(result["charts"]["sd"]) == 35
+    assert len(result["charts"]["dx"]) == 15
+    assert result["old_rating"] == _expected_total([12.0 + i / 100 for i in range(1, 51)], 100.5, 35)
+    assert result["new_rating"] == _expected_total([13.0 + i / 100 for i in range(1, 21)], 100.5, 15)
+    assert result["rating"] == result["old_rating"] + result["new_rating"]
+    # 按 rating 降序
+    ra = [record["ra"] for record in result["charts"]["sd"]]
+    assert ra == sorted(ra, reverse=True)
+    assert result["charts"]["sd"][0]["song_id"] == 50
+    assert result["unknown"] == []
+
+
+def test_dx_duplicate_records_count_once(dx_engine):
+    records = [{"song_id": 1, "level_index": 3, "achievements": 99.0},
+               {"song_id": "1", "level_index": 3, "achievements": 100.5},
+               {"song_id": 1, "level_index": 3, "achievements": 100.0},
+               {"song_id": 2, "level_index": 3, "achievements": 98.0}]
+    result = dx_engine.compute(records)
+    assert [(record["song_id"], record["achievements"]) for record in result["charts"]["sd"]] == [
+        (1, 100.5), (2, 98.0)]
+
+
+def test_dx_unknown_records(dx_engine):
+    unknown = [{"song_id": 99999, "level_index": 0, "achievements": 100.0},
+               {"song_id": 1, "level_index": 4, "achievements": 100.0}]
+    result = dx_engine.compute(unknown + [{"song_id": 1, "level_index": 0, "achievements": 100.0}])
+    assert result["unknown"] == unknown
+    assert len(result["charts"]["sd"]) == 1
+
+
+def test_dx_compute_many_matches_compute(dx_engine):
+    players = [
+        [{"song_id": i, "level_index": i % 4, "achievements": 95.0 + i % 6} for i in range(1, 51)],
+        [],
+        [{"song_id": 10001, "level_index": 3, "achievements": 100.1},
+         {"song_id": 10001, "level_index": 3, "achievements": 100.2}],
+    ]
+    many = dx_engine.compute_many(players)
+    assert many == [dx_engine.compute(records) for records in players]
+    summary = dx_engine.compute_many(players, detail=False)
+    assert [result["rating"] for result in summary] == [result["rating"] for result in many]
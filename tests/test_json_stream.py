@@ -0,0 +1,108 @@
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish.dataset import GameDataset
+from app.utils.codec.json_stream import JsonStreamDecoder, iter_json_items
+
+DOCUMENTS = [
+    [{"id": "1", "title": "ガラクタドール", "ds": [1.5, -2e-3, 13.7], "basic_info": {"is_new": True}}, {"id": "2"}],
+    {"charts": {"1": [{"fit_diff": 12.34}], "2": []}, "diff_data": {"13+": {"avg": 99.5}}, "ok": None},
+    [],
+    {},
+    [1, 22, 333, 4444e10, "x\"y\\z", False, [[[]]]],
+    12345,
+    "scalar é",
+]
+
+
+def _stream(text: str, depth: int, rng: random.Random) -> list:
+    data = text.encode("utf-8")
+    decoder = JsonStreamDecoder(depth)
+    items, pos = [], 0
+    while pos < len(data):
+        size = rng.randint(1, 7)
+        items.extend(decoder.feed(data[pos:pos + size]))
+        pos += size
+    return items + decoder.close()
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("depth", [0, 1, 2, 3])
+def test_matches_json_loads(document, depth):
+    rng = random.Random(depth)
+    for indent in (None, 2):
+        text = json.dumps(document, ensure_ascii=False, indent=indent)
+        assert _stream(text, depth, rng) == list(iter_json_items(document, depth))
+
+
+def test_whole_document_in_one_chunk():
+    decoder = JsonStreamDecoder(1)
+    assert decoder.feed(b'[1, {"a": 2}]') == [((0,), 1), ((1,), {"a": 2})]
+    assert decoder.close() == []
+
+
+@pytest.mark.parametrize("text", ['[1, 2', '{"a": 1,', '{"a" 1}', '[1 2]', '[1] [2]', '{1: 2}', '[tru]', ''])
+def test_invalid_documents(text):
+    decoder = JsonStreamDecoder(1)
+    with pytest.raises(ValueError):
+        decoder.feed(text.encode("utf-8"))
+        decoder.close()
+
+
+class _ListBuilder:
+    depth = 1
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, path, value):
+        self.items.append(value)
+
+    def finish(self, meta):
+        return self.items
+
+
+def _update(tmp_path, handler):
+    dataset = GameDataset(GameDataType.MAIMAI, "music_data", "test", _ListBuilder, data_dir=str(tmp_path))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+            return await dataset.update(force=True, client=c)
+
+    return dataset, asyncio.run(main())
+
+
+def test_streamed_refresh_writes_file_and_snapshot(tmp_path, upstream):
+    music = [{"id": str(i), "title": f"song {i}"} for i in range(2000)]
+
+    async def body():
+        data = json.dumps(music).encode("utf-8")
+        for start in range(0, len(data), 1000):
+            yield data[start:start + 1000]
+
+    dataset, result = _update(tmp_path, lambda request: httpx.Response(200, content=body()))
+    assert result == (True, False)
+    assert dataset.get() == music
+    with open(dataset.data_path, encoding="utf-8") as f:
+        assert json.load(f) == music
+
+
+def test_failed_refresh_keeps_local_file(tmp_path, upstream):
+    _update(tmp_path, lambda request: httpx.Response(200, content=b'[{"id": "1"}]'))
+
+    async def broken():
+        yield b'[{"id": "2"}, '
+        raise httpx.ReadError("connection reset")
+
+    dataset, result = _update(tmp_path, lambda request: httpx.Response(200, content=b'[{"id": "2"}, {'))
+    assert result == (False, False)
+    with pytest.raises(httpx.ReadError):
+        _update(tmp_path, lambda request: httpx.Response(200, content=broken()))
+    with open(dataset.data_path, encoding="utf-8") as f:
+        assert json.load(f) == [{"id": "1"}]
+    assert [name for name in tmp_path.iterdir() if name.suffix == ".tmp"] == []
@@ -0,0 +1,85 @@
+from app.service.divingfish.leaderboard import Leaderboard
+
+
+def _result(username: str, rating: int, charts: list[tuple[int, int, float]] = ()) -> dict:
+    return {
+        "username": username,
+        "nickname": username.upper(),
+        "rating": rating,
+        "charts": {
+            "sd": [{"song_id": song_id, "level_index": level_index, "achievements": achievements}
+                   for song_id, level_index, achievements in charts],
+            "dx": [],
+        },
+    }
+
+
+def _board(ratings: dict[str, int]) -> Leaderboard:
+    board = Leaderboard()
+    for username, rating in ratings.items():
+        board.update(_result(username, rating))
+    return board
+
+
+RATINGS = {"a": 15000, "b": 14000, "c": 14000, "d": 14000, "e": 13000, "f": 12000}
+
+
+def test_top_tied_ranks():
+    page = _board(RATINGS).top(0, 10)
+    assert page["total"] == 6
+    assert [(entry["username"], entry["rank"]) for entry in page["data"]] == [
+        ("a", 1), ("b", 2), ("c", 2), ("d", 2), ("e", 5), ("f", 6)]
+    assert page["data"][0]["nickname"] == "A"
+
+
+def test_page_starting_inside_a_tie():
+    board = _board(RATINGS)
+    assert [(entry["username"], entry["rank"]) for entry in board.top(2, 3)["data"]] == [
+        ("c", 2), ("d", 2), ("e", 5)]
+    assert [(entry["username"], entry["rank"]) for entry in board.top(3, 1)["data"]] == [("d", 2)]
+    assert board.top(10, 5)["data"] == []
+
+
+def test_rank_and_percentile():
+    board = _board(RATINGS)
+    board.update(_result("c", 14000), qq="10001")
+    position = board.rank("c")
+    assert position["rank"] == 2
+    assert position["total"] == 6
+    # 严格低于 14000 的有 2 人
+    assert position["percentile"] == round(100 * 2 / 6, 2)
+    assert board.rank("10001", is_qq=True)["username"] == "c"
+    assert board.rank("nobody") is None
+    assert board.rank("10002", is_qq=True) is None
+
+    neighbors = board.rank("e", radius=1)["neighbors"]
+    assert [(entry["username"], entry["rank"]) for entry in neighbors] == [("d", 2), ("e", 5), ("f", 6)]
+
+
+def test_update_moves_player():
+    board = _board(RATINGS)
+    board.update(_result("f", 16000))
+    assert [entry["username"] for entry in board.top(0, 2)["data"]] == ["f", "a"]
+    assert board.rank("f")["rank"] == 1
+    assert board.top()["total"] == 6
+
+
+def test_chart_rankings():
+    board = Leaderboard()
+    board.update(_result("a", 15000, [(100, 3, 100.5)]))
+    board.update(_result("b", 14000, [(100, 3, 100.5), (200, 2, 99.0)]))
+    board.update(_result("c", 13000, [(100, 3, 99.5)]))
+    top = board.chart_top(100, 3)
+    assert top["total"] == 3
+    assert [(entry["username"], entry["rank"], entry["achievements"]) for entry in top["data"]] == [
+        ("a", 1, 100.5), ("b", 1, 100.5), ("c", 3, 99.5)]
+    assert board.chart_rank(100, 3, "c")["rank"] == 3
+    assert board.chart_rank(200, 2, "a") is None
+    assert board.chart_top(300, 0) == {"total": 0, "data": []}
+
+
+def test_chart_rankings_disabled():
+    board = Leaderboard(chart_rankings=False)
+    board.update(_result("a", 15000, [(100, 3, 100.5)]))
+    assert board.chart_top(100, 3)["total"] == 0
+    assert board.rank("a")["rank"] == 1
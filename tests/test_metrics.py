@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.metrics import MetricsMiddleware
+from app.utils.metrics.instruments import HTTP_REQUEST_DURATION
+from app.utils.metrics.profiler import SamplingProfiler
+from app.utils.metrics.prometheus import Registry, Counter, Gauge, Histogram, CallbackMetric
+
+
+def test_render_text_format():
+    registry = Registry()
+    requests = Counter("test_requests_total", "请求数", ["route"], registry=registry)
+    in_flight = Gauge("test_in_flight", "进行中的请求数", registry=registry)
+    duration = Histogram("test_duration_seconds", "耗时", buckets=(0.1, 1), registry=registry)
+    CallbackMetric("test_entries", "条目数", "gauge", ["cache"], lambda: [(("a",), 3)], registry=registry)
+    requests.labels('/a"b').inc()
+    requests.labels(route='/a"b').inc(2)
+    in_flight.labels().inc()
+    in_flight.labels().dec()
+    duration.observe(0.05)
+    duration.observe(0.5)
+    duration.observe(5)
+    assert registry.render().splitlines() == [
+        "# HELP test_requests_total 请求数",
+        "# TYPE test_requests_total counter",
+        'test_requests_total{route="/a\\"b"} 3.0',
+        "# HELP test_in_flight 进行中的请求数",
+        "# TYPE test_in_flight gauge",
+        "test_in_flight 0.0",
+        "# HELP test_duration_seconds 耗时",
+        "# TYPE test_duration_seconds histogram",
+        'test_duration_seconds_bucket{le="0.1"} 1',
+        'test_duration_seconds_bucket{le="1.0"} 2',
+        'test_duration_seconds_bucket{le="+Inf"} 3',
+        "test_duration_seconds_sum 5.55",
+        "test_duration_seconds_count 3",
+        "# HELP test_entries 条目数",
+        "# TYPE test_entries gauge",
+        'test_entries{cache="a"} 3',
+    ]
+
+
+def test_registration_and_label_errors():
+    registry = Registry()
+    counter = Counter("test_total", "-", ["a", "b"], registry=registry)
+    with pytest.raises(ValueError):
+        Counter("test_total", "-", registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels("only one")
+
+
+def test_middleware_labels_route_templates():
+    router = APIRouter(prefix="/v1")
+
+    @router.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(MetricsMiddleware)
+    client = TestClient(app)
+    matched = HTTP_REQUEST_DURATION.labels("GET", "/v1/items/{item_id}", 200)
+    unmatched = HTTP_REQUEST_DURATION.labels("GET", "unmatched", 404)
+    before = sum(matched.counts), sum(unmatched.counts)
+    assert client.get("/v1/items/1").status_code == 200
+    assert client.get("/v1/items/2").status_code == 200
+    assert client.get("/v1/missing").status_code == 404
+    assert (sum(matched.counts), sum(unmatched.counts)) == (before[0] + 2, before[1] + 1)
+
+
+def test_profiler_dumps_slow_window(tmp_path):
+    profiler = SamplingProfiler(interval=0.001, output_dir=str(tmp_path))
+    done = threading.Event()
+
+    def busy_loop():
+        while not done.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy_loop)
+    thread.start()
+    try:
+        profiler.start(thread.ident)
+        start = time.perf_counter()
+        time.sleep(0.05)
+        end = time.perf_counter()
+    finally:
+        profiler.stop()
+        done.set()
+        thread.join()
+    assert not profiler.running
+    path = profiler.dump("/v1/items/{item_id}", start, end)
+    assert path is not None
+    assert os.path.basename(path).split("-", 2)[2].startswith("v1_items__item_id")
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert any("busy_loop" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert profiler.dump("/", end + 10, end + 20) is None
@@ -0,0 +1,167 @@
+import asyncio
+
+import pytest
+from tortoise import Tortoise
+
+from app.service.divingfish import mai, player_store
+from cfg.config import TORTOISE_ORM
+
+
+def _record(song_id: int, level_index: int, achievements: float, ra: int) -> dict:
+    return {"song_id": song_id, "level_index": level_index, "title": f"song {song_id}", "type": "SD",
+            "level": "13", "level_label": "Master", "ds": 13.0, "achievements": achievements, "dxScore": 1000,
+            "fc": "", "fs": "", "rate": "sss", "ra": ra}
+
+
+def _result(rating: int, sd: list[dict], dx: list[dict] = ()) -> dict:
+    return {"username": "player", "nickname": "Player", "rating": rating, "plate": "", "additional_rating": 21,
+            "charts": {"sd": list(sd), "dx": list(dx)}}
+
+
+@pytest.fixture
+def run_with_store(tmp_path, monkeypatch):
+    """
+    在临时 SQLite 数据库上运行协程，schemas 为 False 时不建表
+    """
+    monkeypatch.setattr(player_store, "_tables_ready", True)
+    config = {**TORTOISE_ORM, "connections": {"default": f"sqlite://{tmp_path / 'db.sqlite3'}"}}
+
+    def run(main, schemas: bool = True):
+        async def wrapper():
+            await Tortoise.init(config=config)
+            try:
+                if schemas:
+                    await Tortoise.generate_schemas()
+                return await main()
+            finally:
+                await Tortoise.close_connections()
+
+        return asyncio.run(wrapper())
+
+    return run
+
+
+def test_incremental_sync(run_with_store):
+    first = [_record(1, 3, 99.5, 272), _record(2, 3, 100.0, 280)]
+    second = [_record(1, 3, 100.5, 292), _record(2, 3, 100.0, 280)]
+
+    async def main():
+        results = [
+            await player_store.sync_player_scores("10001", True, _result(12000, first)),
+            await player_store.sync_player_scores("player", False, _result(12000, first)),
+            await player_store.sync_player_scores("player", False, _result(12020, second, [_record(3, 2, 98.0, 200)])),
+            # 被挤出 B50 的成绩保留在数据库中
+            await player_store.sync_player_scores("player", False, _result(12020, second[:1])),
+        ]
+        return results, await player_store.get_rating_history("10001", True), \
+            await player_store.get_chart_records("player", False), \
+            await player_store.get_chart_records("player", False, song_id=1)
+
+    results, history, records, song_records = run_with_store(main)
+    assert [(r["changed"], r["unchanged"], r["snapshot"]) for r in results] == [
+        (2, 0, True), (0, 2, False), (2, 1, True), (0, 1, False)]
+    assert len({r["player_id"] for r in results}) == 1
+    assert [h["rating"] for h in history] == [12020, 12000]
+    assert [(r["song_id"], r["is_new"]) for r in records] == [(1, False), (2, False), (3, True)]
+    assert [r["achievements"] for r in song_records] == [100.5]
+
+
+def test_get_player_best(run_with_store):
+    sd = [_record(i, 3, 99.0, 200 + i) for i in range(40)]
+    dx = [_record(1000 + i, 3, 99.0, 250 + i) for i in range(3)]
+
+    async def main():
+        await player_store.sync_player_scores("10001", True, _result(12345, sd, dx))
+        return await player_store.get_player_best("10001", True), \
+            await player_store.get_player_best("player", False, max_age=0), \
+            await player_store.get_player_best("nobody", False), \
+            await player_store.load_player_baseline("player")
+
+    best, stale, missing, baseline = run_with_store(main)
+    assert best["rating"] == 12345
+    assert best["additional_rating"] == 21
+    # 只还原 B35 + B15，按 rating 降序
+    assert [r["song_id"] for r in best["charts"]["sd"]] == list(range(39, 4, -1))
+    assert [r["song_id"] for r in best["charts"]["dx"]] == [1002, 1001, 1000]
+    assert best["charts"]["sd"][0] == sd[39]
+    assert stale is None
+    assert missing is None
+    assert baseline["rating"] == 12345
+    assert baseline["records"][(1000, 3)] == (99.0, 1000, "", "", 250)
+
+
+def test_iter_stored_players(run_with_store):
+    async def main():
+        for name in ("a", "b", "c"):
+            await player_store.sync_player_scores(name, False, {**_result(0, []), "username": name})
+        return [item async for item in player_store.iter_stored_players(page_size=2)]
+
+    assert run_with_store(main) == [("a", False), ("b", False), ("c", False)]
+
+
+def test_schedule_sync_holds_task_until_done(run_with_store):
+    async def main():
+        player_store.schedule_sync("player", False, _result(12000, [_record(1, 3, 100.0, 280)]))
+        pending = len(player_store._sync_tasks)
+        await asyncio.gather(*player_store._sync_tasks)
+        await asyncio.sleep(0)
+        return pending, len(player_store._sync_tasks), await player_store.get_player_best("player", False)
+
+    pending, remaining, best = run_with_store(main)
+    assert (pending, remaining) == (1, 0)
+    assert best["rating"] == 12000
+
+
+@pytest.fixture
+def upstream_scores(monkeypatch):
+    """
+    以固定结果代替水鱼查询，并记录后台同步的调用
+    """
+    calls = []
+
+    async def query(username, is_qq, b50=True):
+        calls.append(username)
+        return True, _result(12000, [_record(1, 3, 100.0, 280)])
+
+    monkeypatch.setattr(mai, "query_player_scores_simple", query)
+    monkeypatch.setattr(mai, "schedule_observe", lambda *args: None)
+    monkeypatch.setattr(mai, "update_leaderboard", lambda *args: None)
+    monkeypatch.setattr(mai, "schedule_sync", lambda *args: calls.append("sync"))
+    return calls
+
+
+def test_missing_tables_fall_back_to_upstream(run_with_store, upstream_scores):
+    async def main():
+        ready = await player_store.check_store()
+        return ready, player_store.store_available(), await mai._load_player_scores("player", False, True)
+
+    ready, available, (success, result) = run_with_store(main, schemas=False)
+    assert not ready
+    assert not available
+    assert success
+    assert result["rating"] == 12000
+    assert upstream_scores == ["player", "sync"]
+
+
+def test_store_errors_fall_back_to_upstream(run_with_store, upstream_scores):
+    async def main():
+        # 启动检查之后数据表被删除
+        await Tortoise.get_connection("default").execute_script("DROP TABLE divingfish_chart_record")
+        return player_store.store_available(), await mai._load_player_scores("player", False, True)
+
+    available, (success, result) = run_with_store(main)
+    assert available
+    assert success
+    assert upstream_scores[0] == "player"
+
+
+def test_stored_scores_skip_upstream(run_with_store, upstream_scores):
+    async def main():
+        assert await player_store.check_store()
+        await player_store.sync_player_scores("player", False, _result(11111, [_record(2, 3, 99.0, 250)]))
+        return await mai._load_player_scores("player", False, True)
+
+    success, result = run_with_store(main)
+    assert success
+    assert result["rating"] == 11111
+    assert upstream_scores == []
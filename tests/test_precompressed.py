@@ -0,0 +1,73 @@
+import gzip
+
+import pytest
+from starlette.requests import Request
+
+from app.utils.http import precompressed
+from app.utils.http.precompressed import EncodedBody, encoded_response
+
+CONTENT = b'{"stats": [' + b", ".join(b'{"fit_diff": 13.5}' for _ in range(100)) + b"]}"
+
+
+def _request(**headers) -> Request:
+    return Request({"type": "http", "headers": [(k.replace("_", "-").encode(), v.encode())
+                                                for k, v in headers.items()]})
+
+
+def test_bodies_and_etags():
+    body = EncodedBody(CONTENT, "v1")
+    assert gzip.decompress(body.bodies["gzip"]) == CONTENT
+    assert body.etags[None] == '"v1"'
+    assert body.etags["gzip"] == '"v1-gzip"'
+    assert len(body) == len(CONTENT)
+    if precompressed.brotli is not None:
+        assert precompressed.brotli.decompress(body.bodies["br"]) == CONTENT
+        assert body.etags["br"] == '"v1-br"'
+
+
+def test_small_bodies_are_not_compressed():
+    body = EncodedBody(b'{"stats":[]}')
+    assert list(body.bodies) == [None]
+    assert body.negotiate("gzip, br") is None
+    # 未指定 tag 时使用内容哈希
+    assert body.etags[None] == EncodedBody(b'{"stats":[]}').etags[None]
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0, deflate", None),
+    ("identity", None),
+    ("*", "br"),
+    ("br;q=0, *", "gzip"),
+    ("gzip, br", "br"),
+    ("br;q=abc, gzip", "gzip"),
+])
+def test_negotiate(accept, expected):
+    body = EncodedBody(CONTENT, "v1")
+    if precompressed.brotli is None and expected == "br":
+        expected = "gzip"
+    assert body.negotiate(accept) == expected
+
+
+def test_encoded_response():
+    body = EncodedBody(CONTENT, "v1")
+    response = encoded_response(_request(accept_encoding="gzip"), body, 60)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] == '"v1-gzip"'
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["cache-control"] == "public, max-age=60"
+    assert response.body == body.bodies["gzip"]
+
+    response = encoded_response(_request(), body, 60)
+    assert "content-encoding" not in response.headers
+    assert response.body == CONTENT
+
+    response = encoded_response(_request(accept_encoding="gzip", if_none_match='"v1-gzip"'), body, 60)
+    assert response.status_code == 304
+    assert response.body == b""
+    # 原文的 ETag 与 gzip 的不同，不能互相命中
+    response = encoded_response(_request(if_none_match='"v1-gzip"'), body, 60)
+    assert response.status_code == 200
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.http import admin
+from app.utils.http.priority import PriorityLimiter
+
+LEVELS = ("interactive", "background", "bulk")
+
+
+def test_waiters_served_by_priority_then_fifo():
+    limiter = PriorityLimiter(1, LEVELS)
+    order = []
+
+    async def worker(name, level):
+        async with limiter.slot(level):
+            order.append(name)
+
+    async def main():
+        await limiter.acquire("interactive")
+        tasks = [asyncio.create_task(worker(name, level)) for name, level in
+                 [("bulk", "bulk"), ("bg1", "background"), ("ui1", "interactive"), ("bg2", "background"),
+                  ("ui2", "interactive")]]
+        await asyncio.sleep(0)
+        assert limiter.stats()["waiting"] == {"interactive": 2, "background": 2, "bulk": 1}
+        limiter.release()
+        await asyncio.gather(*tasks)
+        assert limiter.active == 0
+
+    asyncio.run(main())
+    assert order == ["ui1", "ui2", "bg1", "bg2", "bulk"]
+
+
+def test_timeout_is_counted_and_skipped():
+    limiter = PriorityLimiter(1, LEVELS)
+
+    async def main():
+        await limiter.acquire("interactive")
+        with pytest.raises(asyncio.TimeoutError):
+            await limiter.acquire("bulk", timeout=0.01)
+        waiter = asyncio.create_task(limiter.acquire("background"))
+        await asyncio.sleep(0)
+        limiter.release()
+        await waiter
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(main())
+    stats = limiter.stats()
+    assert stats["timeouts"] == {"interactive": 0, "background": 0, "bulk": 1}
+    assert stats["granted"] == {"interactive": 1, "background": 1, "bulk": 0}
+
+
+def test_cancelled_waiter_hands_slot_on():
+    limiter = PriorityLimiter(1, LEVELS)
+
+    async def main():
+        await limiter.acquire("interactive")
+        first = asyncio.create_task(limiter.acquire("interactive"))
+        second = asyncio.create_task(limiter.acquire("background"))
+        await asyncio.sleep(0)
+        # 名额已经交给 first，但 first 在恢复运行前被取消
+        limiter.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, 1)
+        assert limiter.active == 1 and sum(limiter.waiting.values()) == 0
+
+    asyncio.run(main())
+
+
+def test_invalid_concurrency():
+    with pytest.raises(ValueError):
+        PriorityLimiter(0, LEVELS)
+
+
+def test_refresh_access(monkeypatch):
+    monkeypatch.setattr(admin, "AdminToken", "")
+    admin.require_refresh_access(None)
+    monkeypatch.setattr(admin, "AdminToken", "secret")
+    admin.require_refresh_access("secret")
+    for token in (None, "wrong"):
+        with pytest.raises(HTTPException) as e:
+            admin.require_refresh_access(token)
+        assert e.value.status_code == 403
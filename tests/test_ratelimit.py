@@ -0,0 +1,67 @@
+import pytest
+
+from app.utils.http import ratelimit
+from app.utils.http.ratelimit import KeyedRateLimiter
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+def test_burst_then_reject(clock):
+    limiter = KeyedRateLimiter()
+    assert [limiter.check("a", 2, 3) for _ in range(3)] == [0, 0, 0]
+    retry_after = limiter.check("a", 2, 3)
+    assert retry_after == pytest.approx(0.5)
+    assert limiter.allowed == 3
+    assert limiter.rejected == 1
+
+
+def test_refill(clock):
+    limiter = KeyedRateLimiter()
+    for _ in range(3):
+        limiter.check("a", 2, 3)
+    clock.now += 0.5
+    assert limiter.check("a", 2, 3) == 0
+    assert limiter.check("a", 2, 3) > 0
+    # 最多积攒 capacity 个令牌
+    clock.now += 60
+    assert [limiter.check("a", 2, 3) for _ in range(4)].count(0) == 3
+
+
+def test_keys_are_independent(clock):
+    limiter = KeyedRateLimiter()
+    assert limiter.check("a", 1, 1) == 0
+    assert limiter.check("a", 1, 1) > 0
+    assert limiter.check("b", 1, 1) == 0
+    assert len(limiter) == 2
+
+
+def test_changed_limits_reset_bucket(clock):
+    limiter = KeyedRateLimiter()
+    assert limiter.check("a", 1, 1) == 0
+    assert limiter.check("a", 1, 1) > 0
+    assert limiter.check("a", 1, 2) == 0
+
+
+def test_evicts_least_recently_used(clock):
+    limiter = KeyedRateLimiter(max_keys=2)
+    limiter.check("a", 1, 1)
+    limiter.check("b", 1, 1)
+    # a 最近使用过，超出上限时淘汰 b
+    limiter.check("a", 1, 1)
+    limiter.check("c", 1, 1)
+    assert len(limiter) == 2
+    assert limiter.check("b", 1, 1) == 0
+    assert limiter.check("c", 1, 1) > 0
@@ -0,0 +1,96 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.service.divingfish.catalog import MusicCatalog
+from app.service.divingfish.chart_stats import ChartStatsStore
+from app.service.dxrating import engine as dx
+from app.service.dxrating.recommend import RecommendIndex, TARGET_ACHIEVEMENTS, FIT_DIFF_MARGIN, \
+    get_recommend_index
+
+
+def _music(music_id: int, ds: list[float], is_new: bool) -> dict:
+    return {
+        "id": str(music_id),
+        "title": f"song {music_id}",
+        "type": "DX" if is_new else "SD",
+        "ds": ds,
+        "level": [str(int(d)) for d in ds],
+        "cids": [],
+        "charts": [{"notes": [100, 10, 10, 10], "charter": "-"} for _ in ds],
+        "basic_info": {"title": f"song {music_id}", "artist": "-", "genre": "-", "bpm": 150, "release_date": "",
+                       "from": "-", "is_new": is_new},
+    }
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = random.Random(7)
+    music, charts = [], {}
+    for music_id in range(1, 121):
+        ds = sorted(round(rng.uniform(5.0, 15.0), 1) for _ in range(4))
+        music.append(_music(music_id, ds, is_new=music_id > 90))
+        charts[str(music_id)] = [{"fit_diff": round(d + rng.uniform(-0.5, 0.5), 2)} for d in ds]
+    catalog = MusicCatalog(music)
+    records = [{"song_id": rng.randint(1, 120), "level_index": rng.randint(0, 3),
+                "achievements": rng.choice([96.0, 98.5, 99.2, 99.7, 100.1, 100.6])} for _ in range(80)]
+    return catalog, ChartStatsStore({"charts": charts}), dx.RatingEngine(catalog).compute(records)
+
+
+def _reference(catalog: MusicCatalog, stats: ChartStatsStore, best: dict) -> dict:
+    """
+    逐个谱面枚举目标达成率计算预期提升
+    """
+    sd, new = best["charts"]["sd"], best["charts"]["dx"]
+    old_slots, new_slots = dx.B50_SLOTS
+    floors = {False: min(r["ra"] for r in sd) if len(sd) >= old_slots else 0,
+              True: min(r["ra"] for r in new) if len(new) >= new_slots else 0}
+    current = {(str(r["song_id"]), r["level_index"]): r for r in sd + new}
+    fit = {(music_id, i): chart["fit_diff"] for music_id, charts in stats.charts.items()
+           for i, chart in enumerate(charts)}
+    ceilings = [max((fit[key] for key, r in current.items() if r["achievements"] >= target), default=0.0)
+                + FIT_DIFF_MARGIN for target in TARGET_ACHIEVEMENTS]
+    expected = {}
+    for music in catalog.music_list:
+        for i, ds in enumerate(music["ds"]):
+            key = (music["id"], i)
+            record = current.get(key)
+            gains = []
+            for tier, target in enumerate(TARGET_ACHIEVEMENTS):
+                if fit[key] > ceilings[tier] or (record is not None and target <= record["achievements"]):
+                    continue
+                ra = int(dx.compute_ra(np.array([ds]), np.array([target]))[0])
+                floor = record["ra"] if record is not None else floors[music["basic_info"]["is_new"]]
+                gains.append((ra - floor, -tier))
+            gain, tier = max(gains, default=(0, 0))
+            if gain > 0:
+                expected[(int(music["id"]), i)] = (gain, float(TARGET_ACHIEVEMENTS[-tier]))
+    return expected
+
+
+def test_matches_reference(data):
+    catalog, stats, best = data
+    result = RecommendIndex(catalog, stats).recommend(best, limit=1000)
+    expected = _reference(catalog, stats, best)
+    assert expected
+    assert {(r["song_id"], r["level_index"]): (r["gain"], r["target_achievements"]) for r in result} == expected
+    gains = [r["gain"] for r in result]
+    assert gains == sorted(gains, reverse=True)
+    in_best = {(r["song_id"], r["level_index"]) for r in best["charts"]["sd"] + best["charts"]["dx"]}
+    for r in result:
+        assert r["in_best"] == ((r["song_id"], r["level_index"]) in in_best)
+
+
+def test_limit(data):
+    catalog, stats, best = data
+    index = RecommendIndex(catalog, stats)
+    assert index.recommend(best, limit=5) == index.recommend(best, limit=1000)[:5]
+
+
+def test_index_rebuilt_when_data_changes(data):
+    catalog, stats, _ = data
+    index = get_recommend_index(catalog, stats)
+    assert get_recommend_index(catalog, stats) is index
+    assert get_recommend_index(catalog, ChartStatsStore({})) is not index
+    assert get_recommend_index(catalog, stats, b50=False).b50 is False
@@ -0,0 +1,115 @@
+import asyncio
+
+import httpx
+
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish import dataset as dataset_module
+from app.service.divingfish.dataset import GameDataset
+from app.service.divingfish.refresher import PeriodicRefresher
+from app.service.divingfish.upstream import upstream_priority
+
+
+def test_runs_immediately_and_survives_errors():
+    runs = []
+
+    async def job():
+        runs.append(upstream_priority.get())
+        if len(runs) == 1:
+            raise RuntimeError("upstream down")
+
+    async def main():
+        refresher = PeriodicRefresher("test", job, interval=0.01, jitter=0)
+        refresher.start()
+        await asyncio.sleep(0.1)
+        await refresher.stop()
+        stopped_at = len(runs)
+        await asyncio.sleep(0.03)
+        return stopped_at
+
+    stopped_at = asyncio.run(main())
+    assert len(runs) >= 3
+    assert len(runs) == stopped_at
+    # 后台刷新以 refresh 优先级请求水鱼
+    assert set(runs) == {"refresh"}
+    assert upstream_priority.get() == "interactive"
+
+
+def test_next_delay_within_jitter():
+    refresher = PeriodicRefresher("test", None, interval=100, jitter=0.1)
+    delays = [refresher.next_delay() for _ in range(200)]
+    assert all(90 <= delay <= 110 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+class _ListBuilder:
+    depth = 1
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, path, value):
+        self.items.append(value)
+
+    def finish(self, meta):
+        return _Items(self.items, meta["sha256"])
+
+
+class _Items(list):
+    def __init__(self, items, version):
+        super().__init__(items)
+        self.version = version
+
+
+def test_conditional_refresh(tmp_path, upstream, monkeypatch):
+    monkeypatch.setattr(dataset_module, "DataRefreshMinInterval", 0)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=b'[{"id": 1}, {"id": 2}]', headers={"etag": '"v1"'})
+
+    dataset = GameDataset(GameDataType.MAIMAI, "music_data", "test", _ListBuilder, data_dir=str(tmp_path))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+            first = await dataset.update(client=c)
+            loaded = dataset.get()
+            # 未变化时继续使用内存快照，不重新解析
+            second = await dataset.update(client=c)
+            unchanged = dataset.get() is loaded
+            forced = await dataset.update(force=True, client=c)
+            return first, second, forced, loaded, unchanged
+
+    first, second, forced, loaded, unchanged = asyncio.run(main())
+    assert first == (True, False)
+    assert second == (True, True)
+    assert forced == (True, False)
+    assert loaded == [{"id": 1}, {"id": 2}]
+    assert unchanged
+    assert "if-none-match" not in requests[0].headers
+    assert requests[1].headers["if-none-match"] == '"v1"'
+    assert "if-none-match" not in requests[2].headers
+
+
+def test_recent_refresh_uses_local_file(tmp_path, upstream):
+    calls = 0
+
+    def handler(request):
+        nonlocal calls
+        calls += 1
+        return httpx.Response(200, content=b'[{"id": 1}]')
+
+    dataset = GameDataset(GameDataType.MAIMAI, "music_data", "test", _ListBuilder, data_dir=str(tmp_path))
+    other_worker = GameDataset(GameDataType.MAIMAI, "music_data", "test", _ListBuilder, data_dir=str(tmp_path))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+            await dataset.update(client=c)
+            # 其他 worker 在 DataRefreshMinInterval 内直接加载刚写入的文件
+            return await other_worker.update(client=c)
+
+    assert asyncio.run(main()) == (True, True)
+    assert calls == 1
+    assert other_worker.get() == [{"id": 1}]
@@ -0,0 +1,149 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils.http import resilience
+from app.utils.http.resilience import CircuitBreaker, CircuitOpenError, CircuitState, RetryBudget, backoff_delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    可手动推进的 time.monotonic
+    """
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_breaker_opens_and_recovers(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=10, half_open_max_calls=1)
+    for _ in range(2):
+        breaker.acquire()
+        breaker.record_failure()
+    breaker.acquire()
+    breaker.record_success()
+    # 成功后重新计数
+    for _ in range(3):
+        assert breaker.state == CircuitState.CLOSED
+        breaker.acquire()
+        breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.acquire()
+    assert e.value.retry_after == 10
+    clock[0] += 10
+    assert breaker.state == CircuitState.HALF_OPEN
+    breaker.acquire()
+    # 半开状态只放行一个探测请求
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    breaker.record_success()
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.opened_count == 1
+
+
+def test_half_open_failure_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=10)
+    breaker.acquire()
+    breaker.record_failure()
+    clock[0] += 10
+    breaker.acquire()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    assert breaker.opened_count == 2
+
+
+def test_half_open_release_returns_probe(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=10)
+    breaker.acquire()
+    breaker.record_failure()
+    clock[0] += 10
+    breaker.acquire()
+    breaker.release()
+    breaker.acquire()
+
+
+def test_retry_budget(clock):
+    budget = RetryBudget(ratio=0.5, min_per_second=0.1, window=10)
+    for _ in range(4):
+        budget.record_request()
+    # 1（0.1 * 10）+ 0.5 * 4
+    assert [budget.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert budget.exhausted == 1
+    clock[0] += 11
+    assert budget.stats() == {"requests": 0, "retries": 0, "exhausted": 1}
+
+
+def test_retry_budget_trims_on_record(clock):
+    budget = RetryBudget(window=10)
+    for _ in range(1000):
+        budget.record_request()
+        clock[0] += 1
+    assert len(budget._requests) <= 11
+
+
+def test_backoff_delay_bounds():
+    delays = [backoff_delay(attempt, 0.2, 2) for attempt in range(8) for _ in range(50)]
+    assert all(0 <= delay <= 2 for delay in delays)
+    assert all(backoff_delay(0, 0.2, 2) <= 0.2 for _ in range(50))
+
+
+def _flaky(failures: int, error: Exception = httpx.ConnectError("refused")):
+    calls = []
+
+    async def call():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise error
+        return "ok"
+
+    return call, calls
+
+
+def test_upstream_call_retries(upstream):
+    call, calls = _flaky(2)
+    assert asyncio.run(upstream.upstream_call("test", attempts=3)(call)()) == "ok"
+    assert len(calls) == 3
+    health = upstream.upstream_health.endpoint("test")
+    assert health.retries >= 2
+    assert upstream.breaker.state == CircuitState.CLOSED
+    assert upstream.upstream_queue.active == 0
+
+
+def test_upstream_call_gives_up(upstream):
+    call, calls = _flaky(5)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(upstream.upstream_call("test", attempts=3)(call)())
+    assert len(calls) == 3
+
+
+def test_upstream_call_stops_when_breaker_opens(upstream, monkeypatch):
+    monkeypatch.setattr(upstream, "breaker", CircuitBreaker("test", failure_threshold=2, recovery_timeout=30))
+    call, calls = _flaky(5)
+    wrapped = upstream.upstream_call("test", attempts=5)(call)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(wrapped())
+    assert len(calls) == 2
+    # 熔断打开后不再发出请求
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(wrapped())
+    assert len(calls) == 2
+
+
+def test_upstream_call_passes_other_errors(upstream):
+    call, calls = _flaky(1, ValueError("bad payload"))
+    with pytest.raises(ValueError):
+        asyncio.run(upstream.upstream_call("test", attempts=3)(call)())
+    assert len(calls) == 1
+    assert upstream.breaker.stats()["consecutive_failures"] == 0
+    assert upstream.upstream_queue.active == 0
+
+
+def test_upstream_call_respects_retry_budget(upstream, monkeypatch):
+    monkeypatch.setattr(upstream, "retry_budget", RetryBudget(ratio=0, min_per_second=0, window=10))
+    call, calls = _flaky(5)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(upstream.upstream_call("test", attempts=3)(call)())
+    assert len(calls) == 1
@@ -0,0 +1,64 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.enums.divingfish.imageformat import ImageFormat
+from app.routes.v1 import divingfish as routes
+from app.service.divingfish.catalog import MusicCatalog, music_data_dataset
+
+
+def _music(music_id: int, music_type: str) -> dict:
+    return {"id": str(music_id), "title": f"song {music_id}", "type": music_type, "ds": [10.0], "level": ["10"],
+            "cids": [music_id * 10], "charts": [{"notes": [1, 1, 1, 1], "charter": "-"}],
+            "basic_info": {"title": f"song {music_id}", "artist": "-", "genre": "-", "bpm": 150, "release_date": "",
+                           "from": "-", "is_new": False}}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(music_data_dataset, "_store", MusicCatalog([_music(1, "SD"), _music(2, "DX")]))
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def test_sub_routers_are_mounted_under_prefix(client):
+    paths = client.app.openapi()["paths"]
+    for path in ("/divingfish/player/rating_history", "/divingfish/player/chart_records",
+                 "/divingfish/leaderboard", "/divingfish/leaderboard/chart/rank",
+                 "/divingfish/score_feed", "/divingfish/score_feed/recent", "/divingfish/admin/bulk_sync"):
+        assert path in paths
+    # 未启用数据库时拆分后的路由仍走同一个检查
+    response = client.get("/divingfish/player/rating_history", params={"username": "x"})
+    assert response.status_code == 503
+
+
+def test_query_aliases_keep_public_names(client):
+    paths = client.app.openapi()["paths"]
+    search = {p["name"] for p in paths["/divingfish/search"]["get"]["parameters"]}
+    cover = {p["name"] for p in paths["/divingfish/get_music_cover"]["get"]["parameters"]}
+    assert "type" in search and "music_type" not in search
+    assert "format" in cover and "image_format" not in cover
+
+
+def test_search_type_filter(client):
+    response = client.get("/divingfish/search", params={"type": "DX"})
+    assert response.status_code == 200
+    assert [item["music"]["id"] for item in response.json()["data"]] == ["2"]
+
+
+def test_cover_format_parameter(client, monkeypatch, tmp_path):
+    requested = []
+    path = tmp_path / "cover.webp"
+    path.write_bytes(b"RIFF")
+
+    async def fake_render(songs_id, size, fmt, quality):
+        requested.append(fmt)
+        return str(path)
+
+    monkeypatch.setattr(routes, "get_rendered_cover", fake_render)
+    monkeypatch.setattr(routes, "render_available", lambda: True)
+    response = client.get("/divingfish/get_music_cover", params={"songs_id": 1, "format": "webp"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert requested == [ImageFormat.WEBP]
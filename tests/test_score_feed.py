@@ -0,0 +1,112 @@
+import asyncio
+
+from app.service.divingfish import score_feed as score_feed_module
+from app.service.divingfish.score_feed import diff_scores, ScoreFeed
+
+
+def _record(song_id: int, level_index: int, achievements: float, ra: int, fc: str = "", fs: str = "",
+            dx_score: int = 1000) -> dict:
+    return {"song_id": song_id, "level_index": level_index, "title": f"song {song_id}", "type": "DX",
+            "level_label": "Master", "ds": 13.0, "achievements": achievements, "dxScore": dx_score, "fc": fc,
+            "fs": fs, "ra": ra}
+
+
+def _result(rating: int, records: list[dict]) -> dict:
+    return {"username": "player", "nickname": "Player", "rating": rating, "charts": {"sd": records, "dx": []}}
+
+
+def _previous(rating: int, records: list[dict]) -> dict:
+    return {"rating": rating, "records": {
+        (record["song_id"], record["level_index"]): (record["achievements"], record["dxScore"], record["fc"],
+                                                     record["fs"], record["ra"])
+        for record in records}}
+
+
+def test_no_change():
+    records = [_record(1, 3, 100.5, 292), _record(2, 2, 99.0, 200)]
+    assert diff_scores(_previous(12000, records), _result(12000, records)) is None
+
+
+def test_new_and_updated_records():
+    before = [_record(1, 3, 99.5, 272), _record(2, 2, 99.0, 200)]
+    after = [_record(1, 3, 100.5, 292, fc="ap"), _record(2, 2, 99.0, 200), _record(3, 3, 98.0, 250)]
+    diff = diff_scores(_previous(12000, before), _result(12040, after))
+    assert diff["username"] == "player"
+    assert diff["nickname"] == "Player"
+    assert diff["rating"] == 12040
+    assert diff["rating_delta"] == 40
+    updated, new = diff["changes"]
+    assert updated["kind"] == "updated"
+    assert (updated["song_id"], updated["level_index"]) == (1, 3)
+    assert updated["achievements"] == 100.5
+    assert updated["fc"] == "ap"
+    # 只附带发生变化的字段的旧值
+    assert updated["previous"] == {"achievements": 99.5, "fc": "", "ra": 272}
+    assert new["kind"] == "new"
+    assert (new["song_id"], new["level_index"]) == (3, 3)
+    assert "previous" not in new
+
+
+def test_records_leaving_b50_are_not_changes():
+    before = [_record(1, 3, 100.5, 292), _record(2, 2, 99.0, 200)]
+    assert diff_scores(_previous(12000, before), _result(12000, before[:1])) is None
+
+
+def test_rating_only_change():
+    records = [_record(1, 3, 100.5, 292)]
+    diff = diff_scores(_previous(12000, records), _result(11990, records))
+    assert diff["rating_delta"] == -10
+    assert diff["changes"] == []
+
+
+def test_events_filtered_by_qq_without_exposing_it():
+    feed = ScoreFeed(backlog=10)
+    by_qq = feed.subscribe("sse", qqs={"10001"})
+    by_name = feed.subscribe("sse", usernames={"other"})
+    # 首次看到的玩家只记录，不发布
+    assert asyncio.run(feed.observe("10001", True, _result(12000, [_record(1, 3, 99.5, 272)]))) is None
+    event = asyncio.run(feed.observe("10001", True, _result(12020, [_record(1, 3, 100.5, 292)])))
+    assert event is not None
+    assert "qq" not in event
+    assert by_qq.queue.get_nowait() is event
+    assert by_name.queue.empty()
+
+
+def test_recent_since_id():
+    feed = ScoreFeed(backlog=2)
+    diff = diff_scores(_previous(0, []), _result(100, []))
+    first, second, third = (feed.publish(diff) for _ in range(3))
+    # 0 表示没有游标，返回保留的全部事件且不算丢失
+    assert feed.recent(0) == ([second, third], False)
+    assert feed.recent(second["id"]) == ([third], False)
+    assert feed.recent(first["id"]) == ([second, third], False)
+    # 游标之后的事件已被移出 backlog
+    assert feed.recent(first["id"] - 1) == ([second, third], True)
+
+
+def test_observe_uses_database_baseline(monkeypatch):
+    before = [_record(1, 3, 99.5, 272)]
+
+    async def load(username):
+        assert username == "player"
+        return _previous(12000, before)
+
+    monkeypatch.setattr(score_feed_module, "store_available", lambda: True)
+    monkeypatch.setattr(score_feed_module, "load_player_baseline", load)
+    feed = ScoreFeed()
+    event = asyncio.run(feed.observe("player", False, _result(12020, [_record(1, 3, 100.0, 292)])))
+    assert event is not None and event["rating"] == 12020
+
+
+def test_observe_baseline_failure_is_first_sighting(monkeypatch):
+    async def load(username):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(score_feed_module, "store_available", lambda: True)
+    monkeypatch.setattr(score_feed_module, "load_player_baseline", load)
+    feed = ScoreFeed()
+    assert asyncio.run(feed.observe("player", False, _result(12000, [_record(1, 3, 99.5, 272)]))) is None
+    assert feed.stats()["players"] == 1 and feed.published == 0
+    # 之后的查询以内存中记录的结果为基准
+    event = asyncio.run(feed.observe("player", False, _result(12020, [_record(1, 3, 100.0, 292)])))
+    assert event is not None and feed.published == 1
@@ -0,0 +1,79 @@
+import pytest
+
+from app.service.divingfish.catalog import MusicCatalog
+from app.service.divingfish.search import SearchIndex, normalize
+
+
+def _music(music_id: int, title: str, artist: str, music_type: str, genre: str, ds: list[float],
+           level: list[str]) -> dict:
+    return {"id": str(music_id), "title": title, "type": music_type, "ds": ds, "level": level, "cids": [],
+            "charts": [{"notes": [1, 1, 1, 1], "charter": "-"} for _ in ds],
+            "basic_info": {"title": title, "artist": artist, "genre": genre, "bpm": 150, "release_date": "",
+                           "from": "maimai", "is_new": False}}
+
+
+MUSIC = [
+    _music(8, "ガラクタドール", "Someone", "SD", "maimai", [4.0, 8.0, 11.0, 13.7], ["4", "8", "11", "13+"]),
+    _music(17, "Oshama Scramble!", "t+pazolite", "SD", "maimai", [3.0, 7.0, 10.5, 12.8], ["3", "7", "10+", "12+"]),
+    _music(11017, "Oshama Scramble! (DX)", "t+pazolite", "DX", "maimai", [3.0, 7.5, 11.0, 13.0],
+           ["3", "7+", "11", "13"]),
+    _music(834, "PANDORA PARADOXXX", "Sakuzyo", "SD", "オンゲキ&CHUNITHM", [5.0, 9.0, 12.5, 14.8],
+           ["5", "9", "12+", "14+"]),
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    return SearchIndex(MusicCatalog(MUSIC), {"834": ["潘多拉"]})
+
+
+def _ids(result: dict) -> list[str]:
+    return [item["music"]["id"] for item in result["data"]]
+
+
+def test_normalize():
+    assert normalize("Ｏｓｈａｍａ  Scramble") == "oshamascramble"
+    assert normalize("ガラクタ") == "がらくた"
+
+
+def test_substring_match(index):
+    result = index.search("oshama")
+    assert result["total"] == 2
+    assert _ids(result) == ["17", "11017"]
+    assert all(item["score"] == 1.0 for item in result["data"])
+
+
+def test_kana_width_and_alias(index):
+    assert _ids(index.search("がらくた")) == ["8"]
+    assert _ids(index.search("ｶﾞﾗｸﾀ")) == ["8"]
+    assert _ids(index.search("潘多拉")) == ["834"]
+    assert _ids(index.search("sakuzyo")) == ["834"]
+
+
+def test_single_character_query(index):
+    assert _ids(index.search("潘")) == ["834"]
+
+
+def test_fuzzy_match(index):
+    # 拼写错误时按 n-gram 命中比例打分
+    result = index.search("pandora paradox")
+    assert _ids(result) == ["834"]
+    fuzzy = index.match("pandoraparadoxx!")
+    assert 0.5 <= fuzzy["834"] < 1.0
+    assert index.search("zzzz")["total"] == 0
+
+
+def test_filters(index):
+    assert _ids(index.search(music_type="DX")) == ["11017"]
+    assert _ids(index.search("oshama", music_type="SD")) == ["17"]
+    assert _ids(index.search(genre="オンゲキ&CHUNITHM")) == ["834"]
+    assert _ids(index.search(level="13+")) == ["8"]
+    assert _ids(index.search(ds_min=13.0, ds_max=13.7)) == ["8", "11017"]
+    assert _ids(index.search(ds_min=14.0)) == ["834"]
+
+
+def test_pagination(index):
+    first = index.search(page=1, page_size=3)
+    second = index.search(page=2, page_size=3)
+    assert first["total"] == second["total"] == 4
+    assert _ids(first) + _ids(second) == ["8", "17", "834", "11017"]
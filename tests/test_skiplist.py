@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+from app.utils.structures.skiplist import RankedSet
+
+
+def _reference(scores: dict) -> list[tuple]:
+    # 分数降序，分数相同时按成员升序
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _check(ranked: RankedSet, scores: dict, rng: random.Random) -> None:
+    expected = _reference(scores)
+    assert len(ranked) == len(expected)
+    assert list(ranked) == expected
+    for index, (member, score) in enumerate(expected):
+        assert member in ranked
+        assert ranked.score(member) == score
+        assert ranked.rank(member) == index
+    for score in {score for _, score in expected} | {-1, 101}:
+        assert ranked.count_above(score) == sum(1 for _, s in expected if s > score)
+        assert ranked.count_at_least(score) == sum(1 for _, s in expected if s >= score)
+    for _ in range(5):
+        start = rng.randint(0, len(expected) + 2)
+        stop = rng.randint(start, len(expected) + 5)
+        assert ranked.range(start, stop) == expected[start:stop]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_matches_sorted_reference(seed):
+    rng = random.Random(seed)
+    ranked = RankedSet(seed)
+    scores = {}
+    for step in range(300):
+        member = f"p{rng.randint(0, 60)}"
+        if rng.random() < 0.25:
+            assert ranked.remove(member) == (member in scores)
+            scores.pop(member, None)
+        else:
+            # 分数范围很小，保证有大量并列
+            score = rng.randint(0, 20)
+            assert ranked.add(member, score) == (member not in scores)
+            scores[member] = score
+        if step % 25 == 0:
+            _check(ranked, scores, rng)
+    _check(ranked, scores, rng)
+
+
+def test_missing_member():
+    ranked = RankedSet(0)
+    ranked.add("a", 1)
+    assert ranked.score("b") is None
+    assert ranked.rank("b") is None
+    assert not ranked.remove("b")
+    assert "b" not in ranked
+    assert ranked.range(5, 10) == []
@@ -0,0 +1,60 @@
+import hashlib
+
+import pytest
+
+from app.service.divingfish.catalog import MusicCatalog
+from app.service.divingfish.snapshot import write_snapshot, open_snapshot
+
+MUSIC = [
+    {"id": "8", "title": "ガラクタドール", "type": "SD", "ds": [4.0, 8.0, 11.0, 13.7], "level": ["4", "8", "11", "13+"],
+     "cids": [1, 2, 3, 4],
+     "charts": [{"notes": [100, 10, 10, 10], "charter": "-"}, {"notes": [200, 20, 20, 20], "charter": "-"},
+                {"notes": [300, 30, 30, 30], "charter": "譜面-100号"},
+                {"notes": [400, 40, 40, 40], "charter": "はっぴー"}],
+     "basic_info": {"title": "ガラクタドール", "artist": "Someone", "genre": "niconico＆ボーカロイド", "bpm": 180,
+                    "release_date": "", "from": "maimai", "is_new": False}},
+    {"id": "11017", "title": "Oshama Scramble! (DX)", "type": "DX", "ds": [3.0, 7.5, 11.0, 13.0, 14.2],
+     "level": ["3", "7+", "11", "13", "14"], "cids": [],
+     "charts": [{"notes": [100, 10, 10, 10, 5], "charter": "-"} for _ in range(5)],
+     "basic_info": {"title": "Oshama Scramble! (DX)", "artist": "t+pazolite", "genre": "maimai", "bpm": 190.5,
+                    "release_date": "2020-01-01", "from": "maimai でらっくす", "is_new": True}},
+]
+SHA = hashlib.sha256(b"music_data").hexdigest()
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    path = str(tmp_path / "music_data.snapshot")
+    write_snapshot(MUSIC, SHA, path)
+    return path
+
+
+def test_round_trip(snapshot_path):
+    snapshot = open_snapshot(SHA, snapshot_path)
+    assert snapshot is not None
+    assert snapshot.source_sha256 == SHA
+    assert [snapshot.music(i) for i in range(snapshot.song_count)] == MUSIC
+
+
+def test_version_mismatch(snapshot_path, tmp_path):
+    assert open_snapshot("0" * 64, snapshot_path) is None
+    assert open_snapshot(None, snapshot_path) is None
+    assert open_snapshot(SHA, str(tmp_path / "missing.snapshot")) is None
+    corrupt = tmp_path / "corrupt.snapshot"
+    corrupt.write_bytes(b"not a snapshot")
+    assert open_snapshot(SHA, str(corrupt)) is None
+
+
+def test_catalog_from_snapshot_matches_json(snapshot_path):
+    expected = MusicCatalog(MUSIC, version=SHA)
+    catalog = MusicCatalog.from_snapshot(open_snapshot(SHA, snapshot_path), etag='"v1"')
+    assert catalog.version == SHA
+    assert catalog.etag == '"v1"'
+    assert len(catalog) == 2
+    assert "11017" in catalog.by_id
+    assert catalog.get(11017) == MUSIC[1]
+    assert list(catalog.music_list) == MUSIC
+    assert catalog.music_list[-1] == MUSIC[-1]
+    for name in ("by_cid", "by_title", "by_artist", "by_genre", "by_version", "by_level"):
+        assert getattr(catalog, name) == getattr(expected, name), name
+    assert catalog.find_by_ds_range(0, 20) == expected.find_by_ds_range(0, 20)
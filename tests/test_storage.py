@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+import os
+import subprocess
+import sys
+
+import pytest
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+from app.utils.os.storage import atomic_write, atomic_write_stream, write_dataset, write_dataset_stream, \
+    read_dataset, read_dataset_meta, touch_dataset_meta, peek_dataset_meta, try_lock_file, dataset_lock
+
+
+def _leftovers(directory) -> list[str]:
+    return [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+
+def test_atomic_write_replaces_file(tmp_path):
+    path = str(tmp_path / "data.json")
+    atomic_write(path, b"old")
+    atomic_write(path, b"new")
+    with open(path, "rb") as f:
+        assert f.read() == b"new"
+    assert _leftovers(tmp_path) == []
+
+
+def test_atomic_write_stream_keeps_old_file_on_error(tmp_path):
+    path = str(tmp_path / "data.json")
+    atomic_write(path, b"old")
+
+    async def chunks():
+        yield b"partial"
+        raise ConnectionError("connection reset")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(atomic_write_stream(path, chunks()))
+    with open(path, "rb") as f:
+        assert f.read() == b"old"
+    assert _leftovers(tmp_path) == []
+
+
+def test_dataset_round_trip(tmp_path):
+    data_path, meta_path = str(tmp_path / "music_data.json"), str(tmp_path / "music_data_ext.json")
+
+    async def chunks():
+        yield b'[{"id": '
+        yield b'1}]'
+
+    async def main():
+        meta = await write_dataset_stream(data_path, meta_path, chunks(), {"etag": '"v1"'})
+        return meta, await read_dataset(data_path, meta_path)
+
+    meta, (data, read_meta) = asyncio.run(main())
+    assert data == b'[{"id": 1}]'
+    assert meta["sha256"] == hashlib.sha256(data).hexdigest()
+    assert read_meta == meta
+    touched = asyncio.run(touch_dataset_meta(meta_path, meta))
+    assert touched["request_at"] >= meta["request_at"]
+    assert asyncio.run(peek_dataset_meta(meta_path)) == touched
+
+
+def test_mismatched_meta_is_ignored(tmp_path):
+    data_path, meta_path = str(tmp_path / "music_data.json"), str(tmp_path / "music_data_ext.json")
+    asyncio.run(write_dataset(data_path, meta_path, b"[]", {"etag": '"v1"'}))
+    # 模拟写入数据后、写入元数据前进程崩溃
+    atomic_write(data_path, b"[1]")
+    assert asyncio.run(read_dataset_meta(data_path, meta_path)) is None
+    # 没有 sha256 的旧元数据按原样使用
+    atomic_write(meta_path, json.dumps({"etag": '"v0"'}).encode("utf-8"))
+    assert asyncio.run(read_dataset_meta(data_path, meta_path)) == {"etag": '"v0"'}
+
+
+def test_missing_dataset(tmp_path):
+    assert asyncio.run(read_dataset(str(tmp_path / "a.json"), str(tmp_path / "a_ext.json"))) == (None, None)
+    assert asyncio.run(peek_dataset_meta(str(tmp_path / "a_ext.json"))) is None
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="需要 fcntl")
+def test_lock_file_excludes_other_processes(tmp_path):
+    lock_path = str(tmp_path / ".music_data.lock")
+    fd = try_lock_file(lock_path)
+    assert fd is not None
+    try:
+        with open(lock_path) as f:
+            assert f.read() == str(os.getpid())
+        probe = "from app.utils.os.storage import try_lock_file; import sys; " \
+                "sys.exit(0 if try_lock_file(sys.argv[1]) is None else 1)"
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+        assert subprocess.run([sys.executable, "-c", probe, lock_path], env=env).returncode == 0
+    finally:
+        os.close(fd)
+    fd = try_lock_file(lock_path)
+    assert fd is not None
+    os.close(fd)
+
+
+def test_dataset_lock_serializes_tasks(tmp_path):
+    lock_path = str(tmp_path / ".chart_stats.lock")
+    inside = 0
+    overlapped = False
+
+    async def worker():
+        nonlocal inside, overlapped
+        async with dataset_lock(lock_path):
+            inside += 1
+            overlapped |= inside > 1
+            await asyncio.sleep(0.01)
+            inside -= 1
+
+    async def main():
+        await asyncio.gather(*(worker() for _ in range(5)))
+
+    asyncio.run(main())
+    assert not overlapped
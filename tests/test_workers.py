@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+import pytest
+
+import serve
+from app.enums.divingfish.gametype import GameDataType
+from app.service.divingfish.dataset import GameDataset
+from app.service.divingfish.workers import DatasetWatcher, WorkerCoordinator
+
+
+def test_single_leader(tmp_path):
+    lock_path = str(tmp_path / ".leader.lock")
+    first = WorkerCoordinator(lock_path, [], refresh=False)
+    second = WorkerCoordinator(lock_path, [], refresh=False)
+
+    async def main():
+        first.start()
+        second.start()
+        assert (first.role, second.role) == ("leader", "follower")
+        assert first.is_leader and not second.is_leader
+        # leader 退出后 follower 在下一次检查时接替
+        await first.stop()
+        second._try_lead()
+        assert second.role == "leader"
+        await second.stop()
+
+    asyncio.run(main())
+
+
+class _Music(list):
+    version = None
+
+
+class _MusicBuilder:
+    depth = 1
+
+    def __init__(self):
+        self.music = _Music()
+
+    def add(self, path, value):
+        self.music.append(value)
+
+    def finish(self, meta):
+        self.music.version = meta.get("sha256")
+        return self.music
+
+
+def _dataset(tmp_path) -> GameDataset:
+    return GameDataset(GameDataType.MAIMAI, "music_data", "test", _MusicBuilder, data_dir=str(tmp_path))
+
+
+def _refresh(dataset: GameDataset, music: list) -> None:
+    async def main():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=json.dumps(music).encode()))
+        async with httpx.AsyncClient(transport=transport) as c:
+            assert await dataset.update(force=True, client=c) == (True, False)
+
+    asyncio.run(main())
+
+
+def test_watcher_reloads_files_written_by_other_worker(tmp_path, upstream):
+    leader, follower = _dataset(tmp_path), _dataset(tmp_path)
+    _refresh(leader, [{"id": "1"}])
+    reloaded = []
+
+    async def after_reload(dataset):
+        reloaded.append(dataset.get())
+
+    async def main():
+        await follower.ensure()
+        watcher = DatasetWatcher(follower, after_reload)
+        assert not await watcher.check()
+        return watcher
+
+    watcher = asyncio.run(main())
+    _refresh(leader, [{"id": "1"}, {"id": "2"}])
+    assert asyncio.run(watcher.check())
+    assert follower.get() == [{"id": "1"}, {"id": "2"}] and reloaded == [follower.get()]
+    # 内容未变化的刷新（如 304）只更新元数据，不重新加载
+    os.utime(follower.ext_path, ns=(0, 0))
+    assert not asyncio.run(watcher.check())
+
+
+@pytest.fixture
+def serve_env(monkeypatch):
+    calls = []
+    for name in serve.PER_PROCESS_FEATURES:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setitem(serve.PER_PROCESS_FEATURES, "LEADERBOARD_ENABLED", True)
+    monkeypatch.setattr(serve.uvicorn, "run", lambda app, **kwargs: calls.append(kwargs))
+    return monkeypatch, calls
+
+
+def test_multiple_workers_disable_per_process_features(serve_env):
+    monkeypatch, calls = serve_env
+    monkeypatch.setattr(sys, "argv", ["serve.py", "--workers", "4"])
+    serve.main()
+    assert calls[0]["workers"] == 4
+    assert all(os.environ[name] == "0" for name in serve.PER_PROCESS_FEATURES)
+
+
+def test_explicitly_enabled_feature_requires_single_worker(serve_env):
+    monkeypatch, calls = serve_env
+    monkeypatch.setenv("LEADERBOARD_ENABLED", "1")
+    monkeypatch.setattr(sys, "argv", ["serve.py", "--workers", "2"])
+    with pytest.raises(SystemExit):
+        serve.main()
+    monkeypatch.setattr(sys, "argv", ["serve.py"])
+    serve.main()
+    assert calls[0]["workers"] == 1 and os.environ["LEADERBOARD_ENABLED"] == "1"